@@ -227,6 +227,258 @@ CREATE INDEX IF NOT EXISTS idx_compras_status_preco
 -- .read backup_tabela_precos.sql
 -- .read backup_comissao_comprador.sql
 
+-- ============================================================================
+-- 8. TABELA: versoes_tabela
+-- Descrição: Contador de versão por tabela, base dos ETags (ver versoes.py).
+-- Criada por `flask atualizar-esquema`.
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS versoes_tabela (
+    tabela VARCHAR(64) PRIMARY KEY,
+    versao INTEGER NOT NULL DEFAULT 0,
+    atualizado_em DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- ============================================================================
+-- 9. ALTERAÇÕES NA TABELA: compras (geohash)
+-- Descrição: Geohash (precisão 9) do local da compra, base das consultas por
+-- raio/retângulo (ver geo.py). Depois de criar a coluna, preencher as compras
+-- existentes com `flask preencher-geohash`.
+-- ============================================================================
+
+ALTER TABLE compras ADD COLUMN geohash VARCHAR(12);
+
+CREATE INDEX IF NOT EXISTS ix_compras_tipo_geohash
+ON compras(tipo_coleta, geohash, latitude, longitude, status_aprovacao);
+
+-- ============================================================================
+-- 10. TABELA: compras_grid_dia
+-- Descrição: Soma diária de kg/valor/compras por célula de geohash (precisão
+-- 7), base do mapa de calor (ver agregados.py). Criada por
+-- `flask atualizar-esquema`; preencher com `flask reconstruir-grid`.
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS compras_grid_dia (
+    dia DATE NOT NULL,
+    celula VARCHAR(7) NOT NULL,
+    quantidade_kg FLOAT NOT NULL DEFAULT 0,
+    valor_total FLOAT NOT NULL DEFAULT 0,
+    compras INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (dia, celula)
+);  -- no SQLite, criada WITHOUT ROWID
+
+-- ============================================================================
+-- 11. ÍNDICE: tabela_precos (fornecedor_id, nome_item)
+-- Descrição: Busca de item pelo nome dentro do fornecedor na importação de
+-- catálogo CSV/XLSX e na cópia de tabela entre fornecedores (importacao.py).
+-- ============================================================================
+
+CREATE INDEX IF NOT EXISTS ix_tabela_precos_fornecedor_nome
+ON tabela_precos(fornecedor_id, nome_item);
+
+-- ============================================================================
+-- 12. TABELA: historico_precos
+-- Descrição: Preço por kg de cada item em intervalos [valido_de, valido_ate)
+-- (valido_ate NULL = preço atual), só acrescentado (ver historico_precos.py).
+-- Criada por `flask atualizar-esquema`; registrar os preços atuais dos itens
+-- já cadastrados com `flask sincronizar-historico-precos`.
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS historico_precos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tabela_preco_id INTEGER NOT NULL REFERENCES tabela_precos(id) ON DELETE CASCADE,
+    preco_por_kg FLOAT NOT NULL,
+    valido_de DATETIME NOT NULL,
+    valido_ate DATETIME
+);
+
+CREATE INDEX IF NOT EXISTS ix_historico_precos_item_valido_de
+ON historico_precos(tabela_preco_id, valido_de);
+
+-- ============================================================================
+-- 13. ALTERAÇÕES NA TABELA: compras (motivo_anomalia)
+-- Descrição: Por que a compra foi considerada atípica no cadastro (preço ou
+-- quantidade fora do padrão do item/comprador, ver anomalias.py). Essas
+-- compras ficam pendentes de aprovação do admin.
+-- ============================================================================
+
+ALTER TABLE compras ADD COLUMN motivo_anomalia VARCHAR(255);
+
+-- ============================================================================
+-- 14. TABELA: estatisticas_compras
+-- Descrição: Mediana e MAD (em log) de preço/kg e quantidade por item e por
+-- comprador, usadas para notar compras novas. Criada por
+-- `flask atualizar-esquema`; recalcular com `flask recalcular-anomalias`.
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS estatisticas_compras (
+    escopo VARCHAR(20) NOT NULL,
+    chave INTEGER NOT NULL,
+    compras INTEGER NOT NULL,
+    mediana_log_preco FLOAT,
+    mad_log_preco FLOAT,
+    mediana_log_kg FLOAT NOT NULL,
+    mad_log_kg FLOAT NOT NULL,
+    atualizado_em DATETIME NOT NULL,
+    PRIMARY KEY (escopo, chave)
+);  -- no SQLite, criada WITHOUT ROWID
+
+-- ============================================================================
+-- 15. TABELAS: compras_cubo_dia e compras_cubo_comprador_dia
+-- Descrição: Totais diários das compras não rejeitadas por fornecedor, item,
+-- comprador e tipo de coleta (e o resumo só por comprador e tipo), base da
+-- API analítica (ver agregados.py).
+-- Criada por `flask atualizar-esquema`; preencher com `flask reconstruir-cubo`.
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS compras_cubo_dia (
+    dia DATE NOT NULL,
+    fornecedor_id INTEGER NOT NULL,
+    tabela_preco_id INTEGER NOT NULL,
+    comprador_id INTEGER NOT NULL,
+    tipo_coleta VARCHAR(20) NOT NULL,
+    quantidade_kg FLOAT NOT NULL DEFAULT 0,
+    valor_total FLOAT NOT NULL DEFAULT 0,
+    valor_comissao FLOAT NOT NULL DEFAULT 0,
+    compras INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (dia, fornecedor_id, tabela_preco_id, comprador_id, tipo_coleta)
+);  -- no SQLite, criada WITHOUT ROWID
+
+CREATE INDEX IF NOT EXISTS ix_compras_cubo_dia_fornecedor_dia
+ON compras_cubo_dia(fornecedor_id, dia);
+
+-- Resumo sem fornecedor e item (consultas por período/comprador/tipo)
+CREATE TABLE IF NOT EXISTS compras_cubo_comprador_dia (
+    dia DATE NOT NULL,
+    comprador_id INTEGER NOT NULL,
+    tipo_coleta VARCHAR(20) NOT NULL,
+    quantidade_kg FLOAT NOT NULL DEFAULT 0,
+    valor_total FLOAT NOT NULL DEFAULT 0,
+    valor_comissao FLOAT NOT NULL DEFAULT 0,
+    compras INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (dia, comprador_id, tipo_coleta)
+);  -- no SQLite, criada WITHOUT ROWID
+
+-- ============================================================================
+-- 16. TABELA: previsoes_compras
+-- Descrição: Volume (kg) e valor previstos por mês para cada item, fornecedor
+-- e o total, com faixa de ~95% (ver previsao.py). Criada por
+-- `flask atualizar-esquema`; recalcular com `flask recalcular-previsoes`.
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS previsoes_compras (
+    escopo VARCHAR(20) NOT NULL,
+    chave INTEGER NOT NULL,
+    mes DATE NOT NULL,
+    modelo VARCHAR(20) NOT NULL,
+    quantidade_kg FLOAT NOT NULL,
+    quantidade_kg_min FLOAT NOT NULL,
+    quantidade_kg_max FLOAT NOT NULL,
+    valor_total FLOAT NOT NULL,
+    valor_total_min FLOAT NOT NULL,
+    valor_total_max FLOAT NOT NULL,
+    gerado_em DATETIME NOT NULL,
+    PRIMARY KEY (escopo, chave, mes)
+);  -- no SQLite, criada WITHOUT ROWID
+
+-- ============================================================================
+-- 17. TABELAS: compras_arquivo, despesas_arquivo e totais_arquivo
+-- Descrição: Compras e despesas antigas movidas por `flask arquivar` (mesmas
+-- colunas das tabelas de origem, sem chaves estrangeiras) e os totais por
+-- mês do que foi arquivado (ver arquivo.py). Criadas por
+-- `flask atualizar-esquema`.
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS compras_arquivo (
+    id INTEGER PRIMARY KEY,
+    fornecedor_id INTEGER NOT NULL,
+    tabela_preco_id INTEGER NOT NULL,
+    quantidade_kg FLOAT NOT NULL,
+    preco_unitario FLOAT NOT NULL,
+    valor_total FLOAT NOT NULL,
+    preco_maximo FLOAT NOT NULL,
+    status_preco VARCHAR(20),
+    status_aprovacao VARCHAR(20),
+    tipo_coleta VARCHAR(20) NOT NULL,
+    observacao TEXT,
+    comprador_id INTEGER NOT NULL,
+    latitude FLOAT,
+    longitude FLOAT,
+    endereco_coleta VARCHAR(255),
+    geohash VARCHAR(12),
+    motivo_anomalia VARCHAR(255),
+    comissao_percentual FLOAT,
+    valor_comissao FLOAT,
+    data DATETIME NOT NULL,
+    criado_em DATETIME,
+    atualizado_em DATETIME
+);
+
+CREATE INDEX IF NOT EXISTS ix_compras_arquivo_data ON compras_arquivo(data);
+
+CREATE TABLE IF NOT EXISTS despesas_arquivo (
+    id INTEGER PRIMARY KEY,
+    nome_social VARCHAR(200) NOT NULL,
+    endereco_rua VARCHAR(255),
+    endereco_numero VARCHAR(20),
+    endereco_cidade VARCHAR(100),
+    endereco_cep VARCHAR(10),
+    endereco_estado VARCHAR(2),
+    telefone VARCHAR(20),
+    email VARCHAR(120),
+    vendedor_id INTEGER NOT NULL,
+    conta VARCHAR(20),
+    agencia VARCHAR(10),
+    chave_pix VARCHAR(255),
+    banco VARCHAR(100),
+    condicao_pagamento VARCHAR(20),
+    forma_pagamento VARCHAR(20),
+    descricao_gasto TEXT,
+    data DATETIME NOT NULL,
+    valor FLOAT NOT NULL,
+    observacao TEXT,
+    comprovante VARCHAR(255),
+    criado_em DATETIME,
+    atualizado_em DATETIME
+);
+
+CREATE INDEX IF NOT EXISTS ix_despesas_arquivo_data ON despesas_arquivo(data);
+
+CREATE TABLE IF NOT EXISTS totais_arquivo (
+    tabela VARCHAR(20) NOT NULL,
+    mes DATE NOT NULL,
+    registros INTEGER NOT NULL DEFAULT 0,
+    valor FLOAT NOT NULL DEFAULT 0,
+    quantidade_kg FLOAT NOT NULL DEFAULT 0,
+    atualizado_em DATETIME NOT NULL,
+    PRIMARY KEY (tabela, mes)
+);  -- no SQLite, criada WITHOUT ROWID
+
+-- ============================================================================
+-- 18. TABELA: auditoria
+-- Descrição: Trilha de auditoria (aprovações, remoções, mudanças de preço),
+-- gravada em lotes por uma thread de cada worker (ver auditoria.py). O
+-- evento é único para o reenvio dos arquivos da fila não duplicar linhas.
+-- Criada por `flask atualizar-esquema`.
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS auditoria (
+    id INTEGER PRIMARY KEY,
+    evento VARCHAR(32) NOT NULL UNIQUE,
+    criado_em DATETIME NOT NULL,
+    usuario_id INTEGER,
+    entidade VARCHAR(64) NOT NULL,
+    entidade_id INTEGER,
+    acao VARCHAR(30) NOT NULL,
+    alteracoes TEXT NOT NULL,
+    origem VARCHAR(120),
+    ip VARCHAR(45)
+);
+
+CREATE INDEX IF NOT EXISTS ix_auditoria_entidade ON auditoria(entidade, entidade_id, criado_em);
+CREATE INDEX IF NOT EXISTS ix_auditoria_usuario ON auditoria(usuario_id, criado_em);
+CREATE INDEX IF NOT EXISTS ix_auditoria_criado_em ON auditoria(criado_em);
+
 -- ============================================================================
 -- FIM DO SCRIPT SQL
 -- ============================================================================
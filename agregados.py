@@ -0,0 +1,299 @@
+"""
+Agregados diários das compras, mantidos na mesma transação das escritas.
+
+- compras_grid_dia: por (dia, geohash de precisão 7), soma de quantidade_kg,
+  valor_total e número de compras com localização; base do mapa de calor.
+- compras_cubo_dia: por (dia, fornecedor, item, comprador, tipo_coleta),
+  soma de quantidade_kg, valor_total, valor_comissao e número de compras;
+  base da API analítica, que agrupa por qualquer combinação dessas
+  dimensões (e por mês/ano) sem ler a tabela de compras.
+- compras_cubo_comprador_dia: o mesmo cubo sem fornecedor e item, muito
+  menor; consultas que não envolvem essas duas dimensões leem este.
+
+Compras rejeitadas ficam fora dos dois. As tabelas são mantidas por deltas:
+antes do flush são lidos do banco os valores antigos das compras
+alteradas/removidas (saem dos agregados) e depois do flush entram os
+valores novos. Inserções em lote fora do ORM (gerar-dados, importações) e
+update()/delete() em massa não passam por aqui: depois delas, rodar
+reconstruir_grid()/reconstruir_cubo() (flask reconstruir-grid,
+flask reconstruir-cubo). O arquivamento (arquivo.py) apaga compras sem
+tocar nos agregados, e as reconstruções leem compras e compras_arquivo.
+"""
+
+from datetime import datetime, time, timedelta
+from sqlalchemy import and_, delete, event, func, insert, inspect, or_, select
+from sqlalchemy.dialects.postgresql import insert as insert_postgresql
+from sqlalchemy.dialects.sqlite import insert as insert_sqlite
+from models import (
+    db, Compra, CompraCuboCompradorDia, CompraCuboDia, CompraGridDia, Fornecedor, TabelaPreco, Usuario,
+)
+from database import sessao_leitura
+from geo import faixas_geohash, limites_geohash, tamanho_celula
+from arquivo import origem_compras
+
+PRECISAO_GRID = 7
+
+_grid = CompraGridDia.__table__
+_cubo = CompraCuboDia.__table__
+_cubo_comprador = CompraCuboCompradorDia.__table__
+_CHAVE_DELTAS = 'agregados_deltas'
+
+# Colunas da compra que alimentam os agregados (ordem de _contribuicoes)
+_COLUNAS_COMPRA = (
+    'data', 'geohash', 'quantidade_kg', 'valor_total', 'valor_comissao', 'status_aprovacao',
+    'fornecedor_id', 'tabela_preco_id', 'comprador_id', 'tipo_coleta',
+)
+
+
+def _contribuicoes(data, geohash, quantidade_kg, valor_total, valor_comissao, status_aprovacao,
+                   fornecedor_id, tabela_preco_id, comprador_id, tipo_coleta):
+    """(tabela, chave, medidas) de uma compra em cada agregado."""
+    if status_aprovacao == 'rejeitada':
+        return
+    dia = data.date() if isinstance(data, datetime) else data
+    kg, valor = quantidade_kg or 0.0, valor_total or 0.0
+    if geohash:
+        yield _grid, (dia, geohash[:PRECISAO_GRID]), (kg, valor, 1)
+    medidas = (kg, valor, valor_comissao or 0.0, 1)
+    yield _cubo, (dia, fornecedor_id, tabela_preco_id, comprador_id, tipo_coleta), medidas
+    yield _cubo_comprador, (dia, comprador_id, tipo_coleta), medidas
+
+
+def _somar(deltas, sinal, valores):
+    for tabela, chave, medidas in _contribuicoes(*valores):
+        da_tabela = deltas.setdefault(tabela, {})
+        anterior = da_tabela.get(chave) or (0,) * len(medidas)
+        da_tabela[chave] = tuple(a + sinal * m for a, m in zip(anterior, medidas))
+
+
+def aplicar_deltas(conexao, tabela, deltas):
+    """Soma os deltas {chave primária: medidas} na tabela de agregado (a última medida é `compras`)."""
+    deltas = {chave: delta for chave, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+    chaves = list(tabela.primary_key.columns)
+    medidas = [coluna for coluna in tabela.columns if not coluna.primary_key]
+    insert = insert_postgresql if conexao.dialect.name == 'postgresql' else insert_sqlite
+    comando = insert(tabela).values([
+        {**dict(zip((c.name for c in chaves), chave)), **dict(zip((m.name for m in medidas), delta))}
+        for chave, delta in sorted(deltas.items())
+    ])
+    comando = comando.on_conflict_do_update(
+        index_elements=chaves,
+        set_={medida.name: medida + comando.excluded[medida.name] for medida in medidas},
+    )
+    conexao.execute(comando)
+    # Linhas que perderam compras e ficaram vazias saem da tabela
+    reduzidas = [chave for chave, delta in deltas.items() if delta[-1] < 0]
+    if reduzidas:
+        conexao.execute(delete(tabela).where(
+            tabela.c.compras <= 0,
+            or_(*(and_(*(coluna == valor for coluna, valor in zip(chaves, chave))) for chave in reduzidas)),
+        ))
+
+
+def _antes_do_flush(sessao, contexto, instancias):
+    # O banco ainda tem os valores antigos: tudo que muda ou sai é retirado dos agregados
+    ids = [
+        obj.id for obj in sessao.dirty | sessao.deleted
+        if isinstance(obj, Compra) and obj.id is not None and inspect(obj).persistent
+    ]
+    if not ids:
+        return
+    tabela = Compra.__table__
+    antigos = sessao.connection().execute(
+        select(*(tabela.c[coluna] for coluna in _COLUNAS_COMPRA)).where(tabela.c.id.in_(ids))
+    )
+    deltas = sessao.info.setdefault(_CHAVE_DELTAS, {})
+    for linha in antigos:
+        _somar(deltas, -1, linha)
+
+
+def _apos_flush(sessao, contexto):
+    deltas = sessao.info.pop(_CHAVE_DELTAS, None) or {}
+    # Depois do flush: data padrão e geohash (before_insert/before_update) já preenchidos
+    for obj in sessao.new | sessao.dirty:
+        if isinstance(obj, Compra) and obj not in sessao.deleted:
+            _somar(deltas, 1, [getattr(obj, coluna) for coluna in _COLUNAS_COMPRA])
+    for tabela, da_tabela in deltas.items():
+        aplicar_deltas(sessao.connection(), tabela, da_tabela)
+
+
+def _apos_rollback(sessao):
+    sessao.info.pop(_CHAVE_DELTAS, None)
+
+
+def _reconstruir(tabela, compras, colunas, *filtros_compras, inicio=None, fim=None):
+    """Apaga o período de `tabela` e regrava a partir de `compras` agrupadas por `colunas`."""
+    from versoes import marcar_alteracao
+
+    filtro_agregado, filtro_compras = [], [compras.c.status_aprovacao != 'rejeitada', *filtros_compras]
+    if inicio:
+        filtro_agregado.append(tabela.c.dia >= inicio)
+        filtro_compras.append(compras.c.data >= datetime.combine(inicio, time.min))
+    if fim:
+        filtro_agregado.append(tabela.c.dia <= fim)
+        filtro_compras.append(compras.c.data < datetime.combine(fim + timedelta(days=1), time.min))
+
+    medidas = [coluna for coluna in tabela.columns if not coluna.primary_key]
+    somas = [func.count() if medida.name == 'compras' else func.sum(func.coalesce(compras.c[medida.name], 0.0))
+             for medida in medidas]
+    db.session.execute(delete(tabela).where(*filtro_agregado))
+    resultado = db.session.execute(insert(tabela).from_select(
+        [coluna.name for coluna in tabela.primary_key.columns] + [medida.name for medida in medidas],
+        select(*colunas, *somas).where(*filtro_compras).group_by(*colunas),
+    ).execution_options(preserve_rowcount=True))  # sem isso o PostgreSQL devolve rowcount -1
+    marcar_alteracao(tabela.name)
+    db.session.commit()
+    return resultado.rowcount
+
+
+def reconstruir_grid(inicio=None, fim=None):
+    """Recalcula compras_grid_dia a partir das compras (todo o período ou [inicio, fim])."""
+    compras = origem_compras(*_COLUNAS_COMPRA)
+    return _reconstruir(
+        _grid, compras, [func.date(compras.c.data), func.substr(compras.c.geohash, 1, PRECISAO_GRID)],
+        compras.c.geohash.isnot(None), inicio=inicio, fim=fim,
+    )
+
+
+def reconstruir_cubo(inicio=None, fim=None):
+    """Recalcula compras_cubo_dia e o resumo por comprador (todo o período ou [inicio, fim])."""
+    compras = origem_compras(*_COLUNAS_COMPRA)
+    dia = func.date(compras.c.data)
+    _reconstruir(_cubo_comprador, compras, [dia, compras.c.comprador_id, compras.c.tipo_coleta], inicio=inicio, fim=fim)
+    return _reconstruir(_cubo, compras, [
+        dia, compras.c.fornecedor_id, compras.c.tabela_preco_id, compras.c.comprador_id, compras.c.tipo_coleta,
+    ], inicio=inicio, fim=fim)
+
+
+def precisao_para_zoom(zoom):
+    """Precisão de geohash para o zoom do mapa (Leaflet/OSM): células de ~16 px na tela."""
+    largura_desejada = 360.0 / 2 ** (zoom + 4)
+    precisao = 1
+    for candidata in range(1, PRECISAO_GRID + 1):
+        if tamanho_celula(candidata)[1] < largura_desejada:
+            break
+        precisao = candidata
+    return precisao
+
+
+def mapa_calor(inicio, fim, precisao, retangulo=None):
+    """Células (centro, kg, valor e compras somados) no período [inicio, fim].
+
+    Todas têm o tamanho dado por geo.tamanho_celula(precisao).
+    """
+    precisao = max(1, min(precisao, PRECISAO_GRID))
+    celula = func.substr(_grid.c.celula, 1, precisao)
+    consulta = select(
+        celula.label('celula'),
+        func.sum(_grid.c.quantidade_kg).label('quantidade_kg'),
+        func.sum(_grid.c.valor_total).label('valor_total'),
+        func.sum(_grid.c.compras).label('compras'),
+    ).where(_grid.c.dia >= inicio, _grid.c.dia <= fim).group_by(celula)
+    if retangulo:
+        faixas = faixas_geohash(*retangulo, precisao_maxima=PRECISAO_GRID)
+        consulta = consulta.where(or_(*(
+            and_(_grid.c.celula >= inicio_faixa, _grid.c.celula < fim_faixa) if fim_faixa else _grid.c.celula >= inicio_faixa
+            for inicio_faixa, fim_faixa in faixas
+        )))
+
+    celulas = []
+    for linha in sessao_leitura().execute(consulta):
+        min_lat, min_lon, max_lat, max_lon = limites_geohash(linha.celula)
+        celulas.append({
+            'celula': linha.celula,
+            'latitude': (min_lat + max_lat) / 2,
+            'longitude': (min_lon + max_lon) / 2,
+            'quantidade_kg': round(linha.quantidade_kg, 1),
+            'valor_total': round(linha.valor_total, 2),
+            'compras': linha.compras,
+        })
+    return celulas
+
+
+MEDIDAS_CUBO = ('quantidade_kg', 'valor_total', 'valor_comissao', 'compras')
+DIMENSOES_CUBO = ('dia', 'mes', 'ano', 'fornecedor', 'item', 'comprador', 'tipo_coleta')
+
+# Dimensão -> coluna do cubo; mes/ano são montados sobre `dia` conforme o banco
+_COLUNAS_DIMENSAO = {
+    'dia': 'dia',
+    'fornecedor': 'fornecedor_id',
+    'item': 'tabela_preco_id',
+    'comprador': 'comprador_id',
+    'tipo_coleta': 'tipo_coleta',
+}
+
+# Nomes exibidos junto com os ids
+_NOMES_DIMENSAO = {
+    'fornecedor': ('fornecedor_nome', Fornecedor.id, Fornecedor.nome_social),
+    'item': ('nome_item', TabelaPreco.id, TabelaPreco.nome_item),
+    'comprador': ('comprador_nome', Usuario.id, Usuario.nome),
+}
+
+
+def _expressao_dimensao(tabela, dimensao, dialeto):
+    if dimensao in ('mes', 'ano'):
+        if dialeto == 'postgresql':
+            return func.to_char(tabela.c.dia, 'YYYY-MM' if dimensao == 'mes' else 'YYYY')
+        return func.strftime('%Y-%m' if dimensao == 'mes' else '%Y', tabela.c.dia)
+    return tabela.c[_COLUNAS_DIMENSAO[dimensao]]
+
+
+def consultar_cubo(inicio, fim, dimensoes, filtros=None, ordem=None, limite=1000):
+    """Totais de [inicio, fim] agrupados pelas `dimensoes` (subconjunto de DIMENSOES_CUBO).
+
+    `filtros` restringe por igualdade ({'fornecedor': 3, 'tipo_coleta': 'coleta'}).
+    Sem `ordem` as linhas seguem as dimensões; com uma medida de MEDIDAS_CUBO, da
+    maior para a menor. Retorna (linhas, totais do período filtrado).
+    """
+    filtros = filtros or {}
+    sessao = sessao_leitura()
+    dialeto = sessao.get_bind().dialect.name
+    # Sem fornecedor/item na consulta, o resumo por comprador dá o mesmo resultado lendo bem menos
+    tabela = _cubo if {'fornecedor', 'item'} & (set(dimensoes) | set(filtros)) else _cubo_comprador
+    colunas = [_expressao_dimensao(tabela, dimensao, dialeto).label(dimensao) for dimensao in dimensoes]
+    somas = [func.sum(tabela.c[medida]).label(medida) for medida in MEDIDAS_CUBO]
+    condicoes = [tabela.c.dia >= inicio, tabela.c.dia <= fim]
+    for dimensao, valor in filtros.items():
+        condicoes.append(tabela.c[_COLUNAS_DIMENSAO[dimensao]] == valor)
+
+    consulta = select(*colunas, *somas).where(*condicoes)
+    if colunas:
+        consulta = consulta.group_by(*colunas)
+    if ordem:
+        consulta = consulta.order_by(func.sum(tabela.c[ordem]).desc(), *colunas)
+    elif colunas:
+        consulta = consulta.order_by(*colunas)
+
+    conexao = sessao.connection()
+    linhas = [dict(linha._mapping) for linha in conexao.execute(consulta.limit(limite))]
+    totais = dict(conexao.execute(select(*somas).where(*condicoes)).one()._mapping)
+
+    for linha in linhas + [totais]:
+        for medida in MEDIDAS_CUBO:
+            valor = linha[medida] or 0.0
+            linha[medida] = int(valor) if medida == 'compras' else round(valor, 2)
+        if isinstance(linha.get('dia'), str):
+            linha['dia'] = linha['dia'][:10]
+        elif linha.get('dia') is not None:
+            linha['dia'] = linha['dia'].isoformat()
+
+    # Nomes das dimensões de cadastro: uma consulta por dimensão, só com os ids do resultado
+    for dimensao in dimensoes:
+        if dimensao not in _NOMES_DIMENSAO:
+            continue
+        campo, coluna_id, coluna_nome = _NOMES_DIMENSAO[dimensao]
+        ids = {linha[dimensao] for linha in linhas}
+        nomes = dict(conexao.execute(select(coluna_id, coluna_nome).where(coluna_id.in_(ids))).all()) if ids else {}
+        for linha in linhas:
+            linha[campo] = nomes.get(linha[dimensao])
+    return linhas, totais
+
+
+def configurar_agregados(app):
+    """Mantém o mapa de calor e os cubos de compras em dia com as escritas do ORM."""
+    if not event.contains(db.session, 'after_flush', _apos_flush):
+        event.listen(db.session, 'before_flush', _antes_do_flush)
+        event.listen(db.session, 'after_flush', _apos_flush)
+        event.listen(db.session, 'after_rollback', _apos_rollback)
@@ -0,0 +1,218 @@
+"""
+Detecção de compras atípicas: preço por kg e quantidade fora do padrão do
+item (que já identifica o fornecedor) ou do comprador.
+
+As medidas são robustas e em escala log (razões, não diferenças): mediana
+e MAD, com z = (x - mediana) / (1,4826 * MAD); |z| acima de LIMIAR_Z é
+anomalia. O histórico é lido em lotes colunares (arrays NumPy) e as
+estatísticas por grupo são calculadas ordenando uma vez, sem laço por item.
+
+- recalcular_estatisticas(): mediana/MAD dos últimos JANELA_DIAS por item e
+  por comprador, gravadas em estatisticas_compras (flask recalcular-anomalias).
+- avaliar_compra(): nota uma compra nova contra essas estatísticas (uma
+  consulta pela chave primária); compras atípicas vão para aprovação do admin.
+- detectar_anomalias(): revisa o histórico comparando cada compra com as
+  JANELA_COMPRAS anteriores do mesmo item/comprador (janela móvel).
+"""
+
+from datetime import datetime, timedelta
+from itertools import chain
+from sqlalchemy import and_, case, delete, insert, literal, or_, select
+from models import db, Compra, EstatisticaCompra
+from database import sessao_leitura
+
+LIMIAR_Z = 3.5
+MIN_COMPRAS = 10  # abaixo disso o grupo não tem padrão para comparar
+JANELA_DIAS = 180
+JANELA_COMPRAS = 50
+TAMANHO_LOTE = 100000
+ESCALA_MAD = 1.4826  # MAD -> desvio padrão na normal
+MAD_MINIMO = 0.01  # em log: variações abaixo de ~1% não contam como dispersão
+
+_estatisticas = EstatisticaCompra.__table__
+
+
+def _carregar_colunas(*filtros, colunas_extras=()):
+    """Compras não rejeitadas em ordem de data, como colunas NumPy (lidas em lotes)."""
+    import numpy as np
+
+    consulta = select(
+        Compra.id, Compra.tabela_preco_id, Compra.comprador_id, Compra.preco_unitario, Compra.quantidade_kg,
+        *colunas_extras,
+    ).where(
+        Compra.status_aprovacao != 'rejeitada', Compra.preco_unitario > 0, Compra.quantidade_kg > 0, *filtros,
+    ).order_by(Compra.data, Compra.id)
+    colunas = 5 + len(colunas_extras)
+    resultado = sessao_leitura().connection().execution_options(yield_per=TAMANHO_LOTE).execute(consulta)
+    # fromiter sobre as tuplas achatadas: sem montar listas nem objetos por linha no NumPy
+    lotes = [
+        np.fromiter(chain.from_iterable(parte), dtype=float, count=len(parte) * colunas).reshape(-1, colunas)
+        for parte in resultado.partitions()
+    ]
+    matriz = np.concatenate(lotes) if lotes else np.empty((0, colunas))
+    return {
+        'id': matriz[:, 0].astype(np.int64),
+        'item': matriz[:, 1].astype(np.int64),
+        'comprador': matriz[:, 2].astype(np.int64),
+        'log_preco': np.log(matriz[:, 3]),
+        'log_kg': np.log(matriz[:, 4]),
+        'extras': matriz[:, 5:],
+    }
+
+
+def _mediana_por_grupo(grupos, valores):
+    """(chaves, contagens, medianas) de `valores` agrupados por `grupos`."""
+    import numpy as np
+
+    ordem = np.lexsort((valores, grupos))
+    grupos, valores = grupos[ordem], valores[ordem]
+    chaves, inicios, contagens = np.unique(grupos, return_index=True, return_counts=True)
+    medianas = (valores[inicios + (contagens - 1) // 2] + valores[inicios + contagens // 2]) / 2
+    return chaves, contagens, medianas
+
+
+def _mediana_mad_por_grupo(grupos, valores):
+    import numpy as np
+
+    chaves, contagens, medianas = _mediana_por_grupo(grupos, valores)
+    desvios = np.abs(valores - medianas[np.searchsorted(chaves, grupos)])
+    _, _, mads = _mediana_por_grupo(grupos, desvios)
+    return chaves, contagens, medianas, mads
+
+
+def _z(valor, mediana, mad):
+    import numpy as np
+
+    return (valor - mediana) / (ESCALA_MAD * np.maximum(mad, MAD_MINIMO))
+
+
+def recalcular_estatisticas(janela_dias=JANELA_DIAS):
+    """Regrava estatisticas_compras com as compras dos últimos `janela_dias`. Retorna {escopo: grupos}."""
+    dados = _carregar_colunas(Compra.data >= datetime.utcnow() - timedelta(days=janela_dias))
+    agora = datetime.utcnow()
+    linhas = []
+
+    chaves, contagens, med_preco, mad_preco = _mediana_mad_por_grupo(dados['item'], dados['log_preco'])
+    _, _, med_kg, mad_kg = _mediana_mad_por_grupo(dados['item'], dados['log_kg'])
+    linhas += [
+        {'escopo': 'item', 'chave': int(chave), 'compras': int(n), 'mediana_log_preco': float(mp),
+         'mad_log_preco': float(dp), 'mediana_log_kg': float(mk), 'mad_log_kg': float(dk), 'atualizado_em': agora}
+        for chave, n, mp, dp, mk, dk in zip(chaves, contagens, med_preco, mad_preco, med_kg, mad_kg)
+    ]
+    chaves, contagens, med_kg, mad_kg = _mediana_mad_por_grupo(dados['comprador'], dados['log_kg'])
+    linhas += [
+        {'escopo': 'comprador', 'chave': int(chave), 'compras': int(n), 'mediana_log_preco': None,
+         'mad_log_preco': None, 'mediana_log_kg': float(mk), 'mad_log_kg': float(dk), 'atualizado_em': agora}
+        for chave, n, mk, dk in zip(chaves, contagens, med_kg, mad_kg)
+    ]
+
+    db.session.execute(delete(_estatisticas))
+    for inicio in range(0, len(linhas), 5000):
+        db.session.execute(insert(_estatisticas), linhas[inicio:inicio + 5000])
+    db.session.commit()
+    return {escopo: sum(1 for linha in linhas if linha['escopo'] == escopo) for escopo in ('item', 'comprador')}
+
+
+def avaliar_compra(tabela_preco_id, comprador_id, preco_unitario, quantidade_kg):
+    """Motivos (lista de textos) pelos quais a compra é atípica; vazia se está no padrão."""
+    import math
+
+    if not preco_unitario or preco_unitario <= 0 or not quantidade_kg or quantidade_kg <= 0:
+        return []
+    estatisticas = {
+        linha.escopo: linha for linha in db.session.execute(select(_estatisticas).where(or_(
+            and_(_estatisticas.c.escopo == 'item', _estatisticas.c.chave == tabela_preco_id),
+            and_(_estatisticas.c.escopo == 'comprador', _estatisticas.c.chave == comprador_id),
+        )))
+        if linha.compras >= MIN_COMPRAS
+    }
+    log_preco, log_kg = math.log(preco_unitario), math.log(quantidade_kg)
+    motivos = []
+    item = estatisticas.get('item')
+    if item is not None:
+        z = float(_z(log_preco, item.mediana_log_preco, item.mad_log_preco))
+        if abs(z) > LIMIAR_Z:
+            motivos.append(f'preço/kg fora do padrão do item (z={z:+.1f})')
+        z = float(_z(log_kg, item.mediana_log_kg, item.mad_log_kg))
+        if abs(z) > LIMIAR_Z:
+            motivos.append(f'quantidade fora do padrão do item (z={z:+.1f})')
+    comprador = estatisticas.get('comprador')
+    if comprador is not None:
+        z = float(_z(log_kg, comprador.mediana_log_kg, comprador.mad_log_kg))
+        if abs(z) > LIMIAR_Z:
+            motivos.append(f'quantidade fora do padrão do comprador (z={z:+.1f})')
+    return motivos
+
+
+def _z_janela_movel(grupos, valores, janela):
+    """z de cada valor contra os `janela` anteriores do mesmo grupo (entrada ordenada por grupo e data).
+
+    NaN onde o grupo ainda tem menos de MIN_COMPRAS anteriores.
+    """
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+
+    n = len(valores)
+    z = np.full(n, np.nan)
+    # Posição i da janela = os `janela` valores antes de i (os primeiros vêm do preenchimento)
+    valores_janela = sliding_window_view(np.concatenate([np.full(janela, np.nan), valores]), janela)
+    grupos_janela = sliding_window_view(np.concatenate([np.full(janela, -1, dtype=grupos.dtype), grupos]), janela)
+    linhas_bloco = max(1, TAMANHO_LOTE // 2)
+    for inicio in range(0, n, linhas_bloco):
+        fim = min(n, inicio + linhas_bloco)
+        mesmo_grupo = grupos_janela[inicio:fim] == grupos[inicio:fim, None]
+        contagem = mesmo_grupo.sum(axis=1)
+        linhas = np.arange(fim - inicio)
+        # NaN vai para o fim da ordenação: a mediana fica nos `contagem` primeiros
+        janelas = np.sort(np.where(mesmo_grupo, valores_janela[inicio:fim], np.nan), axis=1)
+        baixo, alto = np.maximum(contagem - 1, 0) // 2, contagem // 2
+        mediana = (janelas[linhas, baixo] + janelas[linhas, alto]) / 2
+        desvios = np.sort(np.abs(janelas - mediana[:, None]), axis=1)
+        mad = (desvios[linhas, baixo] + desvios[linhas, alto]) / 2
+        z_bloco = _z(valores[inicio:fim], mediana, mad)
+        z[inicio:fim] = np.where(contagem >= MIN_COMPRAS, z_bloco, np.nan)
+    return z
+
+
+def _z_por_grupo(grupos, valores, janela):
+    import numpy as np
+
+    ordem = np.argsort(grupos, kind='stable')  # estável: mantém a ordem de data dentro do grupo
+    z = np.empty(len(valores))
+    z[ordem] = _z_janela_movel(grupos[ordem], valores[ordem], janela)
+    return z
+
+
+def detectar_anomalias(inicio=None, fim=None, janela=JANELA_COMPRAS, limiar=LIMIAR_Z):
+    """Compras de [inicio, fim) atípicas em relação às `janela` anteriores do item/comprador.
+
+    As janelas olham no máximo JANELA_DIAS para trás do início.
+
+    Retorna dicts com compra_id e os z de cada medida, da mais atípica para a menos.
+    """
+    import numpy as np
+
+    filtros = [Compra.data < fim] if fim else []
+    if inicio:
+        # Compras antes do início entram só como histórico das janelas, até JANELA_DIAS antes
+        filtros.append(Compra.data >= inicio - timedelta(days=JANELA_DIAS))
+    no_periodo = case((Compra.data >= inicio, 1), else_=0) if inicio else literal(1)
+    dados = _carregar_colunas(*filtros, colunas_extras=[no_periodo])
+    if not len(dados['id']):
+        return []
+
+    medidas = {
+        'z_preco_item': _z_por_grupo(dados['item'], dados['log_preco'], janela),
+        'z_kg_item': _z_por_grupo(dados['item'], dados['log_kg'], janela),
+        'z_kg_comprador': _z_por_grupo(dados['comprador'], dados['log_kg'], janela),
+    }
+    maior = np.nan_to_num(np.abs(np.column_stack(list(medidas.values()))), nan=0.0).max(axis=1)
+    selecionadas = np.flatnonzero((dados['extras'][:, 0] == 1) & (maior > limiar))
+    selecionadas = selecionadas[np.argsort(-maior[selecionadas], kind='stable')]
+    return [
+        {
+            'compra_id': int(dados['id'][i]),
+            **{nome: (None if np.isnan(z[i]) else round(float(z[i]), 2)) for nome, z in medidas.items()},
+        }
+        for i in selecionadas
+    ]
@@ -1,36 +1,74 @@
 import os
 import json
 from sqlalchemy import extract
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import (
+    Flask, current_app, render_template, request, redirect, url_for, flash, jsonify, send_from_directory,
+    stream_with_context,
+)
 from flask_login import LoginManager, login_user, logout_user, current_user
-from flask_migrate import Migrate
 from flask_cors import CORS
 from datetime import datetime, timedelta
 from io import BytesIO
 from config import config
-from models import db, Usuario, RoleEnum, Funcionario, Fornecedor, Compra, Despesa, TabelaPreco, ComissaoComprador
+from models import (
+    db, Usuario, RoleEnum, Funcionario, Fornecedor, Compra, CompraArquivo, Despesa, TabelaPreco, ComissaoComprador
+)
 from auth import (
     login_required_custom, role_required, admin_required, comprador_required,
     validar_cpf, validar_cnpj, formatar_cpf, formatar_cnpj
 )
-from extras import (
-    gerar_relatorio_compras_pdf, gerar_relatorio_despesas_pdf,
-    filtrar_compras, filtrar_despesas, obter_resumo_periodo
+from extras import filtrar_compras, filtrar_despesas, obter_resumo_periodo
+from database import configurar_banco, sessao_leitura
+from comandos import registrar_comandos
+from metricas import configurar_metricas
+from estaticos import configurar_estaticos
+from uploads import UploadError, configurar_uploads, salvar_comprovante
+from versoes import condicional, configurar_versoes
+from cache_templates import configurar_cache_templates
+from geo import TIPOS_COLETA, compras_no_raio, compras_no_retangulo, configurar_geo, tamanho_celula
+from roteirizacao import STATUS_A_COLETAR, STATUS_APROVACAO, roteirizar_coletas
+from agregados import (
+    DIMENSOES_CUBO, MEDIDAS_CUBO, configurar_agregados, consultar_cubo, mapa_calor, precisao_para_zoom,
 )
+from importacao import ImportacaoError, clonar_tabela, importar_catalogo, importar_fornecedores
+from historico_precos import configurar_historico_precos, evolucao_preco, precos_em
+from anomalias import avaliar_compra, detectar_anomalias
+from rankings import MEDIDAS_RANKING, ranking_compradores, ranking_fornecedores, ranking_itens
+from previsao import ESCOPOS_PREVISAO, consultar_previsoes
+from arquivo import precisa_arquivo, totais_arquivados
+from auditoria import ENTIDADES_AUDITADAS, MAX_REGISTROS_CONSULTA, configurar_auditoria, consultar_auditoria
+from notificacoes import assinar, configurar_notificacoes, fluxo_eventos
+from concorrencia import configurar_concorrencia
+
+# Rotas, tratadores de erro e context processors são coletados aqui pelos
+# decoradores abaixo e registrados no app por create_app(), mantendo os
+# mesmos nomes de endpoint usados nos templates (url_for('compras'), ...).
+_rotas = []
+_tratadores_erro = []
+_processadores_contexto = []
+
+
+def rota(regra, **opcoes):
+    def decorador(view):
+        _rotas.append((regra, opcoes, view))
+        return view
+    return decorador
 
-# Inicializar aplicação
-app = Flask(__name__)
-env = os.environ.get('FLASK_ENV', 'development')
-app.config.from_object(config[env])
 
-# Inicializar extensões
-db.init_app(app)
-migrate = Migrate(app, db)
-CORS(app)
+def tratador_erro(codigo):
+    def decorador(funcao):
+        _tratadores_erro.append((codigo, funcao))
+        return funcao
+    return decorador
 
-# Inicializar Flask-Login
+
+def processador_contexto(funcao):
+    _processadores_contexto.append(funcao)
+    return funcao
+
+
+# Flask-Login
 login_manager = LoginManager()
-login_manager.init_app(app)
 login_manager.login_view = 'login'
 login_manager.login_message = 'Por favor, faça login para acessar esta página.'
 login_manager.login_message_category = 'warning'
@@ -41,13 +79,21 @@ def load_user(user_id):
 
 # ==================== ROTAS DE API ====================
 
-@app.route('/api/validar-peca', methods=['POST'])
+@rota('/api/validar-peca', methods=['GET', 'POST'])
 @comprador_required
+@condicional('tabela_precos')
 def api_validar_peca():
-    """API para validar peça por código de barras."""
-    dados = request.get_json()
-    codigo_barras = dados.get('codigo_barras', '').strip()
-    fornecedor_id = dados.get('fornecedor_id', type=int)
+    """API para validar peça por código de barras.
+
+    GET com ?codigo_barras=&fornecedor_id= aceita If-None-Match: o scanner
+    revalida peças já lidas sem baixar a resposta de novo.
+    """
+    dados = request.args if request.method == 'GET' else (request.get_json(silent=True) or {})
+    codigo_barras = str(dados.get('codigo_barras') or '').strip()
+    try:
+        fornecedor_id = int(dados.get('fornecedor_id') or 0)
+    except (TypeError, ValueError):
+        fornecedor_id = None
     
     if not codigo_barras or not fornecedor_id:
         return jsonify({'sucesso': False, 'mensagem': 'Código ou fornecedor inválido'}), 400
@@ -74,9 +120,384 @@ def api_validar_peca():
         }
     }), 200
 
+def _filtros_geo():
+    """Lê ?tipo=, ?status= e ?limite= das consultas geográficas; ValueError se o tipo for inválido."""
+    tipo = request.args.get('tipo', 'coleta').strip()
+    if tipo == 'todos':
+        tipo = None
+    elif tipo not in TIPOS_COLETA:
+        raise ValueError('Tipo de coleta inválido')
+    status = [s.strip() for s in request.args.get('status', '').split(',') if s.strip()] or None
+    limite = min(max(request.args.get('limite', 500, type=int), 1), 5000)
+    return tipo, status, limite
+
+
+@rota('/api/compras/raio')
+@comprador_required
+@condicional('compras', 'fornecedores')
+def api_compras_raio():
+    """Compras num raio (km) em volta de ?lat=&lon=, da mais próxima para a mais distante."""
+    latitude = request.args.get('lat', type=float)
+    longitude = request.args.get('lon', type=float)
+    raio_km = request.args.get('raio_km', type=float)
+    if latitude is None or longitude is None or not raio_km or not (-90 <= latitude <= 90) \
+            or not (-180 <= longitude <= 180) or not (0 < raio_km <= 500):
+        return jsonify({'sucesso': False, 'mensagem': 'Informe lat, lon e raio_km (até 500 km)'}), 400
+    try:
+        tipo, status, limite = _filtros_geo()
+    except ValueError as erro:
+        return jsonify({'sucesso': False, 'mensagem': str(erro)}), 400
+
+    compras_encontradas = compras_no_raio(latitude, longitude, raio_km, tipo, status, limite)
+    return jsonify({'sucesso': True, 'total': len(compras_encontradas), 'compras': compras_encontradas}), 200
+
+
+@rota('/api/compras/bbox')
+@comprador_required
+@condicional('compras', 'fornecedores')
+def api_compras_bbox():
+    """Compras dentro do retângulo ?min_lat=&min_lon=&max_lat=&max_lon=, últimas cadastradas primeiro."""
+    limites = [request.args.get(nome, type=float) for nome in ('min_lat', 'min_lon', 'max_lat', 'max_lon')]
+    if None in limites:
+        return jsonify({'sucesso': False, 'mensagem': 'Informe min_lat, min_lon, max_lat e max_lon'}), 400
+    min_lat, min_lon, max_lat, max_lon = limites
+    if not (-90 <= min_lat <= max_lat <= 90) or not (-180 <= min_lon <= max_lon <= 180):
+        return jsonify({'sucesso': False, 'mensagem': 'Retângulo inválido'}), 400
+    try:
+        tipo, status, limite = _filtros_geo()
+    except ValueError as erro:
+        return jsonify({'sucesso': False, 'mensagem': str(erro)}), 400
+
+    compras_encontradas = compras_no_retangulo(min_lat, min_lon, max_lat, max_lon, tipo, status, limite)
+    return jsonify({'sucesso': True, 'total': len(compras_encontradas), 'compras': compras_encontradas}), 200
+
+@rota('/api/rotas/coletas', methods=['POST'])
+@admin_required
+def api_rotas_coletas():
+    """Ordem de visita das coletas do dia por caminhão.
+
+    JSON: data (AAAA-MM-DD, padrão hoje), deposito {latitude, longitude},
+    caminhoes, capacidade_kg e status (lista); os omitidos vêm de ROTA_* na config.
+    """
+    dados = request.get_json(silent=True) or {}
+    config_app = current_app.config
+    deposito = dados.get('deposito') or {}
+    try:
+        dia = datetime.strptime(dados['data'], '%Y-%m-%d').date() if dados.get('data') else datetime.utcnow().date()
+        latitude = float(deposito.get('latitude', config_app['ROTA_DEPOSITO_LATITUDE']))
+        longitude = float(deposito.get('longitude', config_app['ROTA_DEPOSITO_LONGITUDE']))
+        caminhoes = int(dados.get('caminhoes', config_app['ROTA_CAMINHOES']))
+        capacidade_kg = float(dados.get('capacidade_kg', config_app['ROTA_CAPACIDADE_KG']))
+    except (TypeError, ValueError):
+        return jsonify({'sucesso': False, 'mensagem': 'Data, depósito, caminhões ou capacidade inválidos'}), 400
+    status = dados.get('status') or list(STATUS_A_COLETAR)
+    if not (-90 <= latitude <= 90) or not (-180 <= longitude <= 180) or caminhoes < 1 or capacidade_kg <= 0 \
+            or not isinstance(status, list):
+        return jsonify({'sucesso': False, 'mensagem': 'Data, depósito, caminhões ou capacidade inválidos'}), 400
+    if any(valor not in STATUS_APROVACAO for valor in status):
+        return jsonify({'sucesso': False, 'mensagem': f"Status: {', '.join(STATUS_APROVACAO)}"}), 400
+
+    resultado = roteirizar_coletas(dia, (latitude, longitude), caminhoes, capacidade_kg, status)
+    return jsonify({'sucesso': True, **resultado}), 200
+
+@rota('/api/compras/mapa-calor')
+@admin_required
+@condicional('compras', 'compras_grid_dia')
+def api_compras_mapa_calor():
+    """Kg e valor somados por célula do mapa no período ?inicio=&fim= (AAAA-MM-DD).
+
+    ?zoom= (0-20, como no Leaflet) define o tamanho das células; ?min_lat=&min_lon=
+    &max_lat=&max_lon= limita à área visível. Lê só os agregados diários.
+    """
+    try:
+        fim = datetime.strptime(request.args['fim'], '%Y-%m-%d').date() if request.args.get('fim') \
+            else datetime.utcnow().date()
+        inicio = datetime.strptime(request.args['inicio'], '%Y-%m-%d').date() if request.args.get('inicio') \
+            else fim - timedelta(days=30)
+    except ValueError:
+        return jsonify({'sucesso': False, 'mensagem': 'Datas devem estar no formato AAAA-MM-DD'}), 400
+    if inicio > fim:
+        return jsonify({'sucesso': False, 'mensagem': 'Início depois do fim'}), 400
+    zoom = min(max(request.args.get('zoom', 10, type=int), 0), 20)
+
+    retangulo = [request.args.get(nome, type=float) for nome in ('min_lat', 'min_lon', 'max_lat', 'max_lon')]
+    if all(valor is None for valor in retangulo):
+        retangulo = None
+    elif None in retangulo or not (-90 <= retangulo[0] <= retangulo[2] <= 90) \
+            or not (-180 <= retangulo[1] <= retangulo[3] <= 180):
+        return jsonify({'sucesso': False, 'mensagem': 'Retângulo inválido'}), 400
+
+    precisao = precisao_para_zoom(zoom)
+    celulas = mapa_calor(inicio, fim, precisao, retangulo)
+    altura, largura = tamanho_celula(precisao)
+    return jsonify({
+        'sucesso': True,
+        'inicio': inicio.isoformat(),
+        'fim': fim.isoformat(),
+        'precisao': precisao,
+        'tamanho_celula': {'altura': altura, 'largura': largura},  # graus de latitude/longitude
+        'celulas': celulas,
+    }), 200
+
+@rota('/api/precos/vigentes')
+@comprador_required
+@condicional('tabela_precos')
+def api_precos_vigentes():
+    """Preço por kg de vários itens numa data: ?itens=1,2,3&em=AAAA-MM-DDTHH:MM (padrão: agora).
+
+    Serve para conferir o preco_unitario de compras antigas contra o histórico.
+    """
+    try:
+        itens = {int(item) for item in request.args.get('itens', '').split(',') if item.strip()}
+        em = datetime.fromisoformat(request.args['em']) if request.args.get('em') else datetime.utcnow()
+    except ValueError:
+        return jsonify({'sucesso': False, 'mensagem': 'Itens ou data inválidos'}), 400
+    if not itens or len(itens) > 1000:
+        return jsonify({'sucesso': False, 'mensagem': 'Informe de 1 a 1000 itens'}), 400
+
+    precos = precos_em(itens, em)
+    return jsonify({
+        'sucesso': True,
+        'em': em.isoformat(),
+        'precos': {str(item_id): preco for item_id, preco in precos.items()},
+        'sem_preco': sorted(itens - precos.keys()),
+    }), 200
+
+@rota('/api/tabela-precos/<int:tabela_id>/historico')
+@comprador_required
+@condicional('tabela_precos')
+def api_historico_preco(tabela_id):
+    """Evolução do preço do item: intervalos que tocam ?inicio=&fim= (AAAA-MM-DD, opcionais)."""
+    try:
+        inicio = datetime.strptime(request.args['inicio'], '%Y-%m-%d') if request.args.get('inicio') else None
+        fim = datetime.strptime(request.args['fim'], '%Y-%m-%d') + timedelta(days=1) if request.args.get('fim') \
+            else None
+    except ValueError:
+        return jsonify({'sucesso': False, 'mensagem': 'Datas devem estar no formato AAAA-MM-DD'}), 400
+    tabela = TabelaPreco.query.get_or_404(tabela_id)
+    return jsonify({
+        'sucesso': True,
+        'item': {'id': tabela.id, 'nome_item': tabela.nome_item, 'fornecedor_id': tabela.fornecedor_id},
+        'historico': evolucao_preco(tabela_id, inicio, fim),
+    }), 200
+
+@rota('/api/compras/anomalias')
+@admin_required
+@condicional('compras')
+def api_compras_anomalias():
+    """Compras atípicas do período ?inicio=&fim= (AAAA-MM-DD, padrão: últimos 30 dias).
+
+    Cada compra é comparada com as anteriores do mesmo item e do mesmo comprador.
+    """
+    try:
+        fim = datetime.strptime(request.args['fim'], '%Y-%m-%d') if request.args.get('fim') \
+            else datetime.combine(datetime.utcnow().date(), datetime.min.time())
+        inicio = datetime.strptime(request.args['inicio'], '%Y-%m-%d') if request.args.get('inicio') \
+            else fim - timedelta(days=30)
+    except ValueError:
+        return jsonify({'sucesso': False, 'mensagem': 'Datas devem estar no formato AAAA-MM-DD'}), 400
+    if inicio > fim:
+        return jsonify({'sucesso': False, 'mensagem': 'Início depois do fim'}), 400
+    limite = min(max(request.args.get('limite', 500, type=int), 1), 5000)
+
+    anomalias = detectar_anomalias(inicio, fim + timedelta(days=1))
+    return jsonify({
+        'sucesso': True,
+        'inicio': inicio.date().isoformat(),
+        'fim': fim.date().isoformat(),
+        'total': len(anomalias),
+        'anomalias': anomalias[:limite],
+    }), 200
+
+@rota('/api/analitico/compras')
+@admin_required
+@condicional('compras', 'compras_cubo_dia', 'compras_cubo_comprador_dia',
+             'fornecedores', 'tabela_precos', 'usuarios')
+def api_analitico_compras():
+    """Totais de compras agrupados por ?dimensoes= (dia, mes, ano, fornecedor, item, comprador, tipo_coleta).
+
+    ?inicio=&fim= (AAAA-MM-DD, padrão: últimos 30 dias); ?fornecedor=&item=&comprador=&tipo_coleta=
+    filtram; ?ordem= (quantidade_kg, valor_total, valor_comissao, compras) ordena da maior para a
+    menor. Lê só o cubo diário (compras_cubo_dia).
+    """
+    try:
+        fim = datetime.strptime(request.args['fim'], '%Y-%m-%d').date() if request.args.get('fim') \
+            else datetime.utcnow().date()
+        inicio = datetime.strptime(request.args['inicio'], '%Y-%m-%d').date() if request.args.get('inicio') \
+            else fim - timedelta(days=30)
+        filtros = {dimensao: int(request.args[dimensao])
+                   for dimensao in ('fornecedor', 'item', 'comprador') if request.args.get(dimensao)}
+    except ValueError:
+        return jsonify({'sucesso': False, 'mensagem': 'Datas (AAAA-MM-DD) ou filtros inválidos'}), 400
+    if request.args.get('tipo_coleta'):
+        filtros['tipo_coleta'] = request.args['tipo_coleta']
+    dimensoes = [d.strip() for d in request.args.get('dimensoes', '').split(',') if d.strip()]
+    ordem = request.args.get('ordem') or None
+    if any(d not in DIMENSOES_CUBO for d in dimensoes) or len(set(dimensoes)) != len(dimensoes):
+        return jsonify({'sucesso': False, 'mensagem': f"Dimensões válidas: {', '.join(DIMENSOES_CUBO)}"}), 400
+    if ordem and ordem not in MEDIDAS_CUBO:
+        return jsonify({'sucesso': False, 'mensagem': f"Ordem válida: {', '.join(MEDIDAS_CUBO)}"}), 400
+    if inicio > fim:
+        return jsonify({'sucesso': False, 'mensagem': 'Início depois do fim'}), 400
+    limite = min(max(request.args.get('limite', 1000, type=int), 1), 10000)
+
+    linhas, totais = consultar_cubo(inicio, fim, dimensoes, filtros, ordem, limite)
+    return jsonify({
+        'sucesso': True,
+        'inicio': inicio.isoformat(),
+        'fim': fim.isoformat(),
+        'dimensoes': dimensoes,
+        'linhas': linhas,
+        'totais': totais,
+    }), 200
+
+def _filtros_ranking(medida_padrao, limite_padrao):
+    """Lê ?inicio=&fim= (padrão: últimos 30 dias), ?medida= e ?limite= dos rankings; ValueError se inválidos."""
+    try:
+        fim = datetime.strptime(request.args['fim'], '%Y-%m-%d').date() if request.args.get('fim') \
+            else datetime.utcnow().date()
+        inicio = datetime.strptime(request.args['inicio'], '%Y-%m-%d').date() if request.args.get('inicio') \
+            else fim - timedelta(days=29)
+    except ValueError:
+        raise ValueError('Datas inválidas (use AAAA-MM-DD)')
+    if inicio > fim:
+        raise ValueError('Início depois do fim')
+    medida = request.args.get('medida') or medida_padrao
+    if medida not in MEDIDAS_RANKING:
+        raise ValueError(f"Medida válida: {', '.join(MEDIDAS_RANKING)}")
+    limite = min(max(request.args.get('limite', limite_padrao, type=int), 1), 100)
+    return inicio, fim, medida, limite
+
+
+def _resposta_ranking(inicio, fim, medida, ranking):
+    dias = (fim - inicio).days + 1
+    return jsonify({
+        'sucesso': True,
+        'inicio': inicio.isoformat(),
+        'fim': fim.isoformat(),
+        'inicio_anterior': (inicio - timedelta(days=dias)).isoformat(),
+        'medida': medida,
+        'ranking': ranking,
+    }), 200
+
+
+@rota('/api/rankings/fornecedores')
+@admin_required
+@condicional('compras', 'compras_cubo_dia', 'fornecedores')
+def api_ranking_fornecedores():
+    """Top fornecedores por ?medida= (quantidade_kg, valor_total, ...) com a posição no período anterior."""
+    try:
+        inicio, fim, medida, limite = _filtros_ranking('quantidade_kg', 10)
+    except ValueError as erro:
+        return jsonify({'sucesso': False, 'mensagem': str(erro)}), 400
+    return _resposta_ranking(inicio, fim, medida, ranking_fornecedores(inicio, fim, medida, limite))
+
+
+@rota('/api/rankings/itens')
+@admin_required
+@condicional('compras', 'compras_cubo_dia', 'fornecedores', 'tabela_precos')
+def api_ranking_itens():
+    """Top itens de cada fornecedor de ?fornecedor_id=1,2 (padrão: os 10 maiores do período)."""
+    try:
+        inicio, fim, medida, limite = _filtros_ranking('quantidade_kg', 5)
+    except ValueError as erro:
+        return jsonify({'sucesso': False, 'mensagem': str(erro)}), 400
+    try:
+        fornecedores = tuple(sorted({int(f) for f in request.args.get('fornecedor_id', '').split(',') if f.strip()}))
+    except ValueError:
+        return jsonify({'sucesso': False, 'mensagem': 'fornecedor_id inválido'}), 400
+    return _resposta_ranking(inicio, fim, medida, ranking_itens(inicio, fim, medida, limite, fornecedores or None))
+
+
+@rota('/api/rankings/compradores')
+@admin_required
+@condicional('compras', 'compras_cubo_comprador_dia', 'usuarios')
+def api_ranking_compradores():
+    """Compradores por ?medida= (padrão: valor_comissao) com a posição no período anterior."""
+    try:
+        inicio, fim, medida, limite = _filtros_ranking('valor_comissao', 10)
+    except ValueError as erro:
+        return jsonify({'sucesso': False, 'mensagem': str(erro)}), 400
+    return _resposta_ranking(inicio, fim, medida, ranking_compradores(inicio, fim, medida, limite))
+
+@rota('/api/previsoes/<escopo>')
+@admin_required
+@condicional('previsoes_compras', 'fornecedores', 'tabela_precos')
+def api_previsoes(escopo):
+    """Previsão mensal de kg e valor (com faixa mínima/máxima) gravada por flask recalcular-previsoes.
+
+    escopo: 'total', 'fornecedor' ou 'item'; ?id=1,2 escolhe as séries (até 500) e, para itens,
+    ?fornecedor_id= traz todos os itens do fornecedor.
+    """
+    if escopo not in ESCOPOS_PREVISAO:
+        return jsonify({'sucesso': False, 'mensagem': f"Escopos válidos: {', '.join(ESCOPOS_PREVISAO)}"}), 404
+    try:
+        chaves = sorted({int(c) for c in request.args.get('id', '').split(',') if c.strip()}) or None
+        fornecedor_id = request.args.get('fornecedor_id', type=int) if escopo == 'item' else None
+    except ValueError:
+        return jsonify({'sucesso': False, 'mensagem': 'id inválido'}), 400
+    if escopo != 'total' and chaves is None and fornecedor_id is None:
+        return jsonify({'sucesso': False, 'mensagem': 'Informe ?id= (ou ?fornecedor_id= para itens)'}), 400
+    if chaves and len(chaves) > 500:
+        return jsonify({'sucesso': False, 'mensagem': 'No máximo 500 séries por consulta'}), 400
+
+    return jsonify({
+        'sucesso': True,
+        'escopo': escopo,
+        'series': consultar_previsoes(escopo, chaves, fornecedor_id),
+    }), 200
+
+@rota('/api/auditoria')
+@admin_required
+def api_auditoria():
+    """Trilha de auditoria, do mais recente para trás (eventos chegam em alguns segundos, ver auditoria.py).
+
+    Filtros: ?entidade=compras&id=10, ?usuario_id=, ?inicio=&fim= (AAAA-MM-DD) e ?limite= (até 500);
+    ?antes= com o `proximo` da resposta (criado_em,id do último evento) traz a página seguinte.
+    """
+    entidade = request.args.get('entidade') or None
+    if entidade is not None and entidade not in ENTIDADES_AUDITADAS:
+        return jsonify({'sucesso': False, 'mensagem': f"Entidades: {', '.join(ENTIDADES_AUDITADAS)}"}), 400
+    try:
+        entidade_id = int(request.args['id']) if request.args.get('id') else None
+        usuario_id = int(request.args['usuario_id']) if request.args.get('usuario_id') else None
+        inicio = datetime.strptime(request.args['inicio'], '%Y-%m-%d') if request.args.get('inicio') else None
+        fim = datetime.strptime(request.args['fim'], '%Y-%m-%d') + timedelta(days=1) if request.args.get('fim') else None
+        antes = None
+        if request.args.get('antes'):
+            criado_em, evento_id = request.args['antes'].rsplit(',', 1)
+            antes = datetime.fromisoformat(criado_em), int(evento_id)
+    except ValueError:
+        return jsonify({'sucesso': False, 'mensagem': 'Filtros inválidos (datas em AAAA-MM-DD)'}), 400
+    limite = min(max(request.args.get('limite', 100, type=int), 1), MAX_REGISTROS_CONSULTA)
+
+    eventos = consultar_auditoria(entidade, entidade_id, usuario_id, inicio, fim, antes, limite)
+    return jsonify({
+        'sucesso': True,
+        'eventos': eventos,
+        'proximo': f"{eventos[-1]['criado_em']},{eventos[-1]['id']}" if len(eventos) == limite else None,
+    }), 200
+
+@rota('/api/eventos/compras')
+@admin_required
+def api_eventos_compras():
+    """Server-sent events: compras pendentes, aprovações/rejeições e remoções (ver notificacoes.py)."""
+    assinante = assinar()
+    if assinante is None:
+        return jsonify({'sucesso': False, 'mensagem': 'Muitas conexões abertas, tente novamente'}), 503
+    # A conexão fica aberta por horas: não segura conexão nem transação do banco
+    db.session.remove()
+    resposta = current_app.response_class(
+        stream_with_context(fluxo_eventos(assinante, request.headers.get('Last-Event-ID'))),
+        mimetype='text/event-stream',
+    )
+    resposta.headers['Cache-Control'] = 'no-cache'
+    resposta.headers['X-Accel-Buffering'] = 'no'  # nginx entrega cada evento na hora
+    return resposta
+
 # ==================== ROTAS DE AUTENTICAÇÃO ====================
 
-@app.route('/login', methods=['GET', 'POST'])
+@rota('/login', methods=['GET', 'POST'])
 def login():
     """Rota de login."""
     if current_user.is_authenticated:
@@ -101,7 +522,7 @@ def login():
     
     return render_template('login.html')
 
-@app.route('/logout')
+@rota('/logout')
 @login_required_custom
 def logout():
     """Rota de logout."""
@@ -111,48 +532,56 @@ def logout():
 
 # ==================== ROTA DE DASHBOARD ====================
 
-@app.route('/')
-@app.route('/dashboard')
+@rota('/')
+@rota('/dashboard')
 @login_required_custom
 def dashboard():
     """Dashboard com resumo e gráficos."""
+    # Agregados do dashboard vão para o bind somente leitura
+    leitura = sessao_leitura()
+    
     # Dados para o dashboard
-    total_funcionarios = Funcionario.query.count()
-    total_fornecedores = Fornecedor.query.count()
-    total_compras = Compra.query.count()
-    total_despesas = Despesa.query.count()
+    total_funcionarios = leitura.query(Funcionario).count()
+    total_fornecedores = leitura.query(Fornecedor).count()
+    # Tabelas quentes mais os totais guardados do que foi arquivado (arquivo.py)
+    compras_arquivadas, compras_valor_arquivado = totais_arquivados('compras')
+    despesas_arquivadas, despesas_valor_arquivado = totais_arquivados('despesas')
+    total_compras = leitura.query(Compra).count() + compras_arquivadas
+    total_despesas = leitura.query(Despesa).count() + despesas_arquivadas
     
     # Valor total de compras
-    compras_valor = db.session.query(db.func.sum(Compra.valor_total)).scalar() or 0
+    compras_valor = (leitura.query(db.func.sum(Compra.valor_total)).scalar() or 0) + compras_valor_arquivado
     
     # Valor total de despesas
-    despesas_valor = db.session.query(db.func.sum(Despesa.valor)).scalar() or 0
+    despesas_valor = (leitura.query(db.func.sum(Despesa.valor)).scalar() or 0) + despesas_valor_arquivado
     
-    # Últimas compras
-    ultimas_compras = Compra.query.order_by(Compra.data.desc()).limit(5).all()
-    
-    # Últimas despesas
-    ultimas_despesas = Despesa.query.order_by(Despesa.data.desc()).limit(5).all()
+    # Últimas compras e despesas: consultas executadas pelo template, só quando
+    # o fragmento em cache precisa ser refeito (ver cache_templates.py)
+    ultimas_compras = leitura.query(Compra).order_by(Compra.data.desc()).limit(5)
+    ultimas_despesas = leitura.query(Despesa).order_by(Despesa.data.desc()).limit(5)
     
     # Dados para gráfico de compras por mês
     hoje = datetime.utcnow()
     seis_meses_atras = hoje - timedelta(days=180)
     
-    compras_query = db.session.query(
-        db.func.strftime('%Y-%m', Compra.data).label('mes'),
+    # extract() funciona no SQLite e no PostgreSQL (strftime só existe no SQLite)
+    compras_query = leitura.query(
+        extract('year', Compra.data).label('ano'),
+        extract('month', Compra.data).label('mes'),
         db.func.sum(Compra.valor_total).label('total')
-    ).filter(Compra.data >= seis_meses_atras).group_by('mes').all()
+    ).filter(Compra.data >= seis_meses_atras).group_by('ano', 'mes').order_by('ano', 'mes').all()
     
     # Converter para dicionário para serialização JSON
-    compras_por_mes = [{'mes': row[0], 'total': float(row[1]) if row[1] else 0} for row in compras_query]
+    compras_por_mes = [{'mes': f"{int(row.ano)}-{int(row.mes):02d}", 'total': float(row.total) if row.total else 0} for row in compras_query]
     
-    despesas_query = db.session.query(
-        db.func.strftime('%Y-%m', Despesa.data).label('mes'),
+    despesas_query = leitura.query(
+        extract('year', Despesa.data).label('ano'),
+        extract('month', Despesa.data).label('mes'),
         db.func.sum(Despesa.valor).label('total')
-    ).filter(Despesa.data >= seis_meses_atras).group_by('mes').all()
+    ).filter(Despesa.data >= seis_meses_atras).group_by('ano', 'mes').order_by('ano', 'mes').all()
     
     # Converter para dicionário para serialização JSON
-    despesas_por_mes = [{'mes': row[0], 'total': float(row[1]) if row[1] else 0} for row in despesas_query]
+    despesas_por_mes = [{'mes': f"{int(row.ano)}-{int(row.mes):02d}", 'total': float(row.total) if row.total else 0} for row in despesas_query]
     
     return render_template('dashboard.html',
         total_funcionarios=total_funcionarios,
@@ -169,7 +598,7 @@ def dashboard():
 
 # ==================== ROTAS CRUD - FUNCIONÁRIOS ====================
 
-@app.route('/funcionarios', methods=['GET', 'POST'])
+@rota('/funcionarios', methods=['GET', 'POST'])
 @admin_required
 def funcionarios():
     """CRUD de funcionários."""
@@ -206,7 +635,7 @@ def funcionarios():
     funcionarios_list = Funcionario.query.paginate(page=page, per_page=10)
     return render_template('funcionarios.html', funcionarios=funcionarios_list)
 
-@app.route('/funcionarios/<int:id>/editar', methods=['GET', 'POST'])
+@rota('/funcionarios/<int:id>/editar', methods=['GET', 'POST'])
 @admin_required
 def editar_funcionario(id):
     """Editar funcionário."""
@@ -223,7 +652,7 @@ def editar_funcionario(id):
     
     return render_template('editar_funcionario.html', funcionario=funcionario)
 
-@app.route('/funcionarios/<int:id>/deletar', methods=['POST'])
+@rota('/funcionarios/<int:id>/deletar', methods=['POST'])
 @admin_required
 def deletar_funcionario(id):
     """Deletar funcionário."""
@@ -236,8 +665,9 @@ def deletar_funcionario(id):
 
 # ==================== ROTAS CRUD - FORNECEDORES ====================
 
-@app.route('/fornecedores', methods=['GET', 'POST'])
+@rota('/fornecedores', methods=['GET', 'POST'])
 @comprador_required
+@condicional('fornecedores', 'usuarios')
 def fornecedores():
     """CRUD de fornecedores."""
     if request.method == 'POST':
@@ -279,8 +709,9 @@ def fornecedores():
     fornecedores_list = Fornecedor.query.paginate(page=page, per_page=10)
     return render_template('fornecedores.html', fornecedores=fornecedores_list)
 
-@app.route('/fornecedores/<int:id>/editar', methods=['GET', 'POST'])
+@rota('/fornecedores/<int:id>/editar', methods=['GET', 'POST'])
 @comprador_required
+@condicional('fornecedores', 'usuarios')
 def editar_fornecedor(id):
     """Editar fornecedor."""
     fornecedor = Fornecedor.query.get_or_404(id)
@@ -298,7 +729,7 @@ def editar_fornecedor(id):
     
     return render_template('editar_fornecedor.html', fornecedor=fornecedor)
 
-@app.route('/fornecedores/<int:id>/deletar', methods=['POST'])
+@rota('/fornecedores/<int:id>/deletar', methods=['POST'])
 @comprador_required
 def deletar_fornecedor(id):
     """Deletar fornecedor."""
@@ -309,10 +740,46 @@ def deletar_fornecedor(id):
     flash(f'Fornecedor {nome} deletado com sucesso!', 'success')
     return redirect(url_for('fornecedores'))
 
+@rota('/fornecedores/importar', methods=['GET', 'POST'])
+@admin_required
+def importar_fornecedores_view():
+    """Importar lista de fornecedores (CSV/XLSX), criando ou atualizando pelo CNPJ/CPF."""
+    if request.method == 'POST':
+        arquivo = request.files.get('arquivo')
+        if not arquivo or not arquivo.filename:
+            flash('Envie um arquivo CSV ou XLSX.', 'danger')
+            return redirect(url_for('importar_fornecedores_view'))
+        try:
+            resultado = importar_fornecedores(
+                arquivo.stream, arquivo.filename, current_app.config['IMPORTACAO_PASTA'],
+                ignorar_erros=bool(request.form.get('ignorar_erros')),
+            )
+        except ImportacaoError as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('importar_fornecedores_view'))
+
+        for linha, mensagem in resultado['erros'][:10]:
+            flash(f'Linha {linha}: {mensagem}', 'warning')
+        if resultado['total_erros'] and not (resultado['inseridos'] or resultado['atualizados']):
+            flash(f"Fornecedores não importados: {resultado['total_erros']} linha(s) recusada(s).", 'danger')
+        else:
+            flash(f"Fornecedores importados: {resultado['inseridos']} novo(s), {resultado['atualizados']} "
+                  f"atualizado(s), {resultado['total_erros']} linha(s) recusada(s).", 'success')
+        return render_template('importar_fornecedores.html', relatorio=resultado['relatorio'])
+
+    return render_template('importar_fornecedores.html', relatorio=None)
+
+@rota('/fornecedores/importar/recusados/<nome>')
+@admin_required
+def relatorio_importacao_fornecedores(nome):
+    """Baixar o CSV com as linhas recusadas de uma importação de fornecedores."""
+    return send_from_directory(current_app.config['IMPORTACAO_PASTA'], nome, as_attachment=True, mimetype='text/csv')
+
 # ==================== ROTAS CRUD - TABELA DE PREÇOS ====================
 
-@app.route('/tabela-precos/<int:fornecedor_id>', methods=['GET', 'POST'])
+@rota('/tabela-precos/<int:fornecedor_id>', methods=['GET', 'POST'])
 @comprador_required
+@condicional('tabela_precos', 'fornecedores', 'usuarios')
 def tabela_precos(fornecedor_id):
     """Gerenciar tabela de preços de um fornecedor."""
     fornecedor = Fornecedor.query.get_or_404(fornecedor_id)
@@ -341,11 +808,13 @@ def tabela_precos(fornecedor_id):
         flash(f'Item "{nome_item}" adicionado à tabela de preços!', 'success')
         return redirect(url_for('tabela_precos', fornecedor_id=fornecedor_id))
     
-    tabelas = TabelaPreco.query.filter_by(fornecedor_id=fornecedor_id, ativo=True).all()
+    # Executada pelo template só quando o fragmento das linhas em cache precisa ser refeito
+    tabelas = TabelaPreco.query.filter_by(fornecedor_id=fornecedor_id, ativo=True)
     return render_template('tabela_precos.html', fornecedor=fornecedor, tabelas=tabelas)
 
-@app.route('/tabela-precos/<int:tabela_id>/editar', methods=['GET', 'POST'])
+@rota('/tabela-precos/<int:tabela_id>/editar', methods=['GET', 'POST'])
 @comprador_required
+@condicional('tabela_precos', 'fornecedores', 'usuarios')
 def editar_tabela_preco(tabela_id):
     """Editar item da tabela de preços."""
     tabela = TabelaPreco.query.get_or_404(tabela_id)
@@ -361,7 +830,7 @@ def editar_tabela_preco(tabela_id):
     
     return render_template('editar_tabela_preco.html', tabela=tabela)
 
-@app.route('/tabela-precos/<int:tabela_id>/deletar', methods=['POST'])
+@rota('/tabela-precos/<int:tabela_id>/deletar', methods=['POST'])
 @comprador_required
 def deletar_tabela_preco(tabela_id):
     """Deletar item da tabela de preços."""
@@ -373,38 +842,48 @@ def deletar_tabela_preco(tabela_id):
     flash(f'Item "{nome_item}" removido da tabela de preços!', 'success')
     return redirect(url_for('tabela_precos', fornecedor_id=fornecedor_id))
 
-@app.route('/tabela-precos/<int:fornecedor_id>/importar', methods=['GET', 'POST'])
+@rota('/tabela-precos/<int:fornecedor_id>/importar', methods=['GET', 'POST'])
 @admin_required
 def importar_tabela_preco(fornecedor_id):
-    """Importar tabela de preços de outro fornecedor."""
+    """Importar tabela de preços de outro fornecedor ou de um catálogo CSV/XLSX."""
     fornecedor_destino = Fornecedor.query.get_or_404(fornecedor_id)
     
     if request.method == 'POST':
+        arquivo = request.files.get('arquivo')
+        if arquivo and arquivo.filename:
+            try:
+                resultado = importar_catalogo(
+                    fornecedor_id, arquivo.stream, arquivo.filename,
+                    ignorar_erros=bool(request.form.get('ignorar_erros')),
+                )
+            except ImportacaoError as e:
+                flash(str(e), 'danger')
+                return redirect(url_for('importar_tabela_preco', fornecedor_id=fornecedor_id))
+            
+            for linha, mensagem in resultado['erros'][:10]:
+                flash(f'Linha {linha}: {mensagem}', 'warning')
+            if resultado['total_erros'] and not (resultado['inseridos'] or resultado['atualizados']):
+                flash(f"Catálogo não importado: {resultado['total_erros']} linha(s) com erro.", 'danger')
+                return redirect(url_for('importar_tabela_preco', fornecedor_id=fornecedor_id))
+            flash(f"Catálogo importado: {resultado['inseridos']} item(ns) novo(s), "
+                  f"{resultado['atualizados']} atualizado(s), {resultado['total_erros']} linha(s) ignorada(s).",
+                  'success')
+            return redirect(url_for('tabela_precos', fornecedor_id=fornecedor_id))
+        
         fornecedor_origem_id = request.form.get('fornecedor_origem_id', type=int)
         
         if not fornecedor_origem_id:
-            flash('Selecione um fornecedor de origem.', 'danger')
+            flash('Selecione um fornecedor de origem ou envie um arquivo.', 'danger')
             return redirect(url_for('importar_tabela_preco', fornecedor_id=fornecedor_id))
         
         fornecedor_origem = Fornecedor.query.get_or_404(fornecedor_origem_id)
-        tabelas_origem = TabelaPreco.query.filter_by(fornecedor_id=fornecedor_origem_id, ativo=True).all()
+        copiados = clonar_tabela(fornecedor_origem_id, fornecedor_id)
         
-        if not tabelas_origem:
-            flash('Fornecedor de origem não possui tabela de preços.', 'warning')
+        if not copiados:
+            flash('Nenhum item novo para copiar do fornecedor de origem.', 'warning')
             return redirect(url_for('importar_tabela_preco', fornecedor_id=fornecedor_id))
         
-        # Copiar tabelas
-        for tabela_origem in tabelas_origem:
-            nova_tabela = TabelaPreco(
-                fornecedor_id=fornecedor_id,
-                nome_item=tabela_origem.nome_item,
-                preco_por_kg=tabela_origem.preco_por_kg,
-                descricao=tabela_origem.descricao
-            )
-            db.session.add(nova_tabela)
-        
-        db.session.commit()
-        flash(f'Tabela de preços importada de {fornecedor_origem.nome_social} com sucesso!', 'success')
+        flash(f'{copiados} item(ns) importado(s) de {fornecedor_origem.nome_social} com sucesso!', 'success')
         return redirect(url_for('tabela_precos', fornecedor_id=fornecedor_id))
     
     fornecedores_lista = Fornecedor.query.filter(Fornecedor.id != fornecedor_id).all()
@@ -412,8 +891,9 @@ def importar_tabela_preco(fornecedor_id):
 
 # ==================== ROTAS CRUD - COMPRAS ====================
 
-@app.route('/compras', methods=['GET', 'POST'])
+@rota('/compras', methods=['GET', 'POST'])
 @comprador_required
+@condicional('compras', 'fornecedores', 'tabela_precos', 'usuarios')
 def compras():
     """CRUD de compras com tabela de preços."""
     if request.method == 'POST':
@@ -454,6 +934,11 @@ def compras():
             status_preco = 'maior'
             status_aprovacao = 'pendente'  # Aguarda aprovação admin
         
+        # Preço ou quantidade fora do padrão do item/comprador também vai para o admin
+        motivos_anomalia = avaliar_compra(tabela_preco_id, current_user.id, preco_unitario, quantidade_kg)
+        if motivos_anomalia:
+            status_aprovacao = 'pendente'
+        
         # Obter comissão do comprador
         comissao = ComissaoComprador.query.filter_by(comprador_id=current_user.id).first()
         comissao_percentual = comissao.percentual_comissao if comissao else 0.0
@@ -475,13 +960,17 @@ def compras():
             observacao=observacao,
             comprador_id=current_user.id,
             comissao_percentual=comissao_percentual,
-            valor_comissao=valor_comissao
+            valor_comissao=valor_comissao,
+            motivo_anomalia='; '.join(motivos_anomalia)[:255] or None
         )
         db.session.add(compra)
         db.session.commit()
         
         if status_aprovacao == 'aprovada':
             flash(f'Compra cadastrada e aprovada automaticamente! Valor: R$ {valor_total:.2f}', 'success')
+        elif motivos_anomalia:
+            flash(f'Compra cadastrada com {"; ".join(motivos_anomalia)}. Aguardando aprovação do admin. '
+                  f'Valor: R$ {valor_total:.2f}', 'warning')
         else:
             flash(f'Compra cadastrada! Aguardando aprovação do admin. Valor: R$ {valor_total:.2f}', 'warning')
         
@@ -492,8 +981,9 @@ def compras():
     fornecedores_list = Fornecedor.query.all()
     return render_template('compras.html', compras=compras_list, fornecedores=fornecedores_list)
 
-@app.route('/compras/<int:id>/editar', methods=['GET', 'POST'])
+@rota('/compras/<int:id>/editar', methods=['GET', 'POST'])
 @comprador_required
+@condicional('compras', 'fornecedores', 'tabela_precos', 'usuarios')
 def editar_compra(id):
     """Editar compra."""
     compra = Compra.query.get_or_404(id)
@@ -517,7 +1007,7 @@ def editar_compra(id):
     fornecedores_list = Fornecedor.query.all()
     return render_template('editar_compra.html', compra=compra, fornecedores=fornecedores_list)
 
-@app.route('/compras/<int:id>/deletar', methods=['POST'])
+@rota('/compras/<int:id>/deletar', methods=['POST'])
 @comprador_required
 def deletar_compra(id):
     """Deletar compra."""
@@ -528,7 +1018,7 @@ def deletar_compra(id):
     flash(f'Compra de {item_nome} deletada com sucesso!', 'success')
     return redirect(url_for('compras'))
 
-@app.route('/compras/<int:id>/aprovar', methods=['POST'])
+@rota('/compras/<int:id>/aprovar', methods=['POST'])
 @admin_required
 def aprovar_compra(id):
     """Aprovar compra pendente."""
@@ -538,7 +1028,7 @@ def aprovar_compra(id):
     flash(f'Compra aprovada com sucesso! Valor: R$ {compra.valor_total:.2f}', 'success')
     return redirect(url_for('compras'))
 
-@app.route('/compras/<int:id>/rejeitar', methods=['POST'])
+@rota('/compras/<int:id>/rejeitar', methods=['POST'])
 @admin_required
 def rejeitar_compra(id):
     """Rejeitar compra pendente."""
@@ -550,7 +1040,7 @@ def rejeitar_compra(id):
 
 # ==================== ROTAS CRUD - DESPESAS ====================
 
-@app.route('/despesas', methods=['GET', 'POST'])
+@rota('/despesas', methods=['GET', 'POST'])
 @comprador_required
 def despesas():
     """CRUD de despesas."""
@@ -598,6 +1088,15 @@ def despesas():
             valor=valor,
             observacao=request.form.get('observacao', '').strip()
         )
+
+        arquivo = request.files.get('comprovante')
+        if arquivo and arquivo.filename:
+            try:
+                despesa.comprovante = salvar_comprovante(arquivo)
+            except UploadError as erro:
+                flash(str(erro), 'danger')
+                return redirect(url_for('despesas'))
+
         db.session.add(despesa)
         db.session.commit()
         flash('Despesa cadastrada com sucesso!', 'success')
@@ -607,7 +1106,7 @@ def despesas():
     despesas_list = Despesa.query.order_by(Despesa.data.desc()).paginate(page=page, per_page=10)
     return render_template('despesas.html', despesas=despesas_list)
 
-@app.route('/despesas/<int:id>/editar', methods=['GET', 'POST'])
+@rota('/despesas/<int:id>/editar', methods=['GET', 'POST'])
 @comprador_required
 def editar_despesa(id):
     """Editar despesa."""
@@ -644,6 +1143,15 @@ def editar_despesa(id):
         despesa.forma_pagamento = request.form.get('forma_pagamento', '').strip()
         despesa.descricao_gasto = request.form.get('descricao_gasto', '').strip()
         despesa.observacao = request.form.get('observacao', '').strip()
+
+        arquivo = request.files.get('comprovante')
+        if arquivo and arquivo.filename:
+            try:
+                despesa.comprovante = salvar_comprovante(arquivo)
+            except UploadError as erro:
+                db.session.rollback()
+                flash(str(erro), 'danger')
+                return redirect(url_for('editar_despesa', id=id))
         
         db.session.commit()
         flash('Despesa atualizada com sucesso!', 'success')
@@ -651,7 +1159,7 @@ def editar_despesa(id):
     
     return render_template('editar_despesa.html', despesa=despesa)
 
-@app.route('/despesas/<int:id>/deletar', methods=['POST'])
+@rota('/despesas/<int:id>/deletar', methods=['POST'])
 @comprador_required
 def deletar_despesa(id):
     """Deletar despesa."""
@@ -664,7 +1172,7 @@ def deletar_despesa(id):
 
 # ==================== ROTAS CRUD - USUÁRIOS (ADMIN) ====================
 
-@app.route('/usuarios', methods=['GET', 'POST'])
+@rota('/usuarios', methods=['GET', 'POST'])
 @admin_required
 def usuarios():
     """CRUD de usuários."""
@@ -698,7 +1206,7 @@ def usuarios():
     roles = [role.name for role in RoleEnum]
     return render_template('usuarios.html', usuarios=usuarios_list, roles=roles)
 
-@app.route('/usuarios/<int:id>/editar', methods=['GET', 'POST'])
+@rota('/usuarios/<int:id>/editar', methods=['GET', 'POST'])
 @admin_required
 def editar_usuario(id):
     """Editar usuário."""
@@ -716,7 +1224,7 @@ def editar_usuario(id):
     roles = [role.name for role in RoleEnum]
     return render_template('editar_usuario.html', usuario=usuario, roles=roles)
 
-@app.route('/usuarios/<int:id>/deletar', methods=['POST'])
+@rota('/usuarios/<int:id>/deletar', methods=['POST'])
 @admin_required
 def deletar_usuario(id):
     """Deletar usuário."""
@@ -734,7 +1242,7 @@ def deletar_usuario(id):
 
 # ==================== ROTAS DE EXPORTAÇÃO E FILTROS ====================
 
-@app.route('/compras/exportar-pdf')
+@rota('/compras/exportar-pdf')
 @comprador_required
 def exportar_compras_pdf():
     """Exporta compras em PDF."""
@@ -757,15 +1265,17 @@ def exportar_compras_pdf():
         except ValueError:
             pass
     
+    from relatorios_pdf import gerar_relatorio_compras_pdf
+
     pdf_buffer = gerar_relatorio_compras_pdf(data_inicio, data_fim, fornecedor_id)
     
-    return app.response_class(
+    return current_app.response_class(
         response=pdf_buffer.getvalue(),
         mimetype='application/pdf',
         headers={'Content-Disposition': 'attachment; filename=relatorio_compras.pdf'}
     )
 
-@app.route('/despesas/exportar-pdf')
+@rota('/despesas/exportar-pdf')
 @comprador_required
 def exportar_despesas_pdf():
     """Exporta despesas em PDF."""
@@ -788,9 +1298,11 @@ def exportar_despesas_pdf():
         except ValueError:
             pass
     
+    from relatorios_pdf import gerar_relatorio_despesas_pdf
+
     pdf_buffer = gerar_relatorio_despesas_pdf(data_inicio, data_fim, forma_pagamento)
     
-    return app.response_class(
+    return current_app.response_class(
         response=pdf_buffer.getvalue(),
         mimetype='application/pdf',
         headers={'Content-Disposition': 'attachment; filename=relatorio_despesas.pdf'}
@@ -798,7 +1310,7 @@ def exportar_despesas_pdf():
 
 # ==================== ROTAS CRUD - COMISSÕES ====================
 
-@app.route('/comissoes', methods=['GET'])
+@rota('/comissoes', methods=['GET'])
 @admin_required
 def comissoes():
     """Listar comissões de compradores."""
@@ -806,7 +1318,7 @@ def comissoes():
     comissoes_list = ComissaoComprador.query.order_by(ComissaoComprador.mes_referencia.desc()).paginate(page=page, per_page=10)
     return render_template('comissoes.html', comissoes=comissoes_list)
 
-@app.route('/comissoes/<int:comprador_id>/editar', methods=['GET', 'POST'])
+@rota('/comissoes/<int:comprador_id>/editar', methods=['GET', 'POST'])
 @admin_required
 def editar_comissao(comprador_id):
     """Editar percentual de comissão de um comprador."""
@@ -833,7 +1345,7 @@ def editar_comissao(comprador_id):
     comissao = ComissaoComprador.query.filter_by(comprador_id=comprador_id).first()
     return render_template('editar_comissao.html', comprador=comprador, comissao=comissao)
 
-@app.route('/comissoes/<int:comprador_id>/calcular', methods=['POST'])
+@rota('/comissoes/<int:comprador_id>/calcular', methods=['POST'])
 @admin_required
 def calcular_comissao(comprador_id):
     """Calcular comissão mensal de um comprador."""
@@ -847,18 +1359,21 @@ def calcular_comissao(comprador_id):
     try:
         ano, mes = mes_referencia.split('-')
         ano, mes = int(ano), int(mes)
+        inicio_mes = datetime(ano, mes, 1)  # mês fora de 1..12 também cai aqui
     except ValueError:
         flash('Formato de mês inválido.', 'danger')
         return redirect(url_for('comissoes'))
     
-    compras = Compra.query.filter(
-        Compra.comprador_id == comprador_id,
-        Compra.status_aprovacao == 'aprovada',
-        db.extract('year', Compra.data) == ano,
-        db.extract('month', Compra.data) == mes
-    ).all()
-    
-    valor_total = sum(c.valor_total for c in compras)
+    # Mês já arquivado: as compras estão em compras_arquivo
+    modelos = [Compra, CompraArquivo] if precisa_arquivo('compras', inicio_mes) else [Compra]
+    valor_total = 0.0
+    for modelo in modelos:
+        valor_total += db.session.query(db.func.coalesce(db.func.sum(modelo.valor_total), 0.0)).filter(
+            modelo.comprador_id == comprador_id,
+            modelo.status_aprovacao == 'aprovada',
+            db.extract('year', modelo.data) == ano,
+            db.extract('month', modelo.data) == mes
+        ).scalar()
     
     # Obter comissão
     comissao = ComissaoComprador.query.filter_by(comprador_id=comprador_id).first()
@@ -874,7 +1389,7 @@ def calcular_comissao(comprador_id):
     flash(f'Comissão calculada! Total de compras: R$ {valor_total:.2f}, Comissão: R$ {comissao.valor_comissao_total:.2f}', 'success')
     return redirect(url_for('comissoes'))
 
-@app.route('/comissoes/<int:comissao_id>/pagar', methods=['POST'])
+@rota('/comissoes/<int:comissao_id>/pagar', methods=['POST'])
 @admin_required
 def pagar_comissao(comissao_id):
     """Marcar comissão como paga."""
@@ -887,7 +1402,7 @@ def pagar_comissao(comissao_id):
 
 # ==================== ROTAS CRUD - DADOS BANCÁRIOS ====================
 
-@app.route('/fornecedores/<int:id>/dados-bancarios', methods=['GET', 'POST'])
+@rota('/fornecedores/<int:id>/dados-bancarios', methods=['GET', 'POST'])
 @admin_required
 def dados_bancarios_fornecedor(id):
     """Gerenciar dados bancários de um fornecedor."""
@@ -909,29 +1424,87 @@ def dados_bancarios_fornecedor(id):
 
 # ==================== TRATAMENTO DE ERROS ====================
 
-@app.errorhandler(404)
+@tratador_erro(404)
 def not_found(error):
     return render_template('404.html'), 404
 
-@app.errorhandler(403)
+@tratador_erro(403)
 def forbidden(error):
     return render_template('403.html'), 403
 
-@app.errorhandler(500)
+@tratador_erro(500)
 def internal_error(error):
     db.session.rollback()
     return render_template('500.html'), 500
 
 # ==================== CONTEXTO DE TEMPLATE ====================
 
-@app.context_processor
+@processador_contexto
 def inject_user():
     """Injeta usuário atual no contexto de template."""
     return {'current_user': current_user}
 
+# ==================== FÁBRICA DA APLICAÇÃO ====================
+
+def create_app(config_name=None):
+    """Cria e configura uma instância da aplicação.
+
+    config_name: chave de config.config; padrão FLASK_ENV ou 'development'.
+    """
+    app = Flask(__name__)
+    app.config.from_object(config[config_name or os.environ.get('FLASK_ENV', 'development')])
+
+    # Inicializar extensões
+    db.init_app(app)
+    configurar_banco(app)
+    CORS(app)
+    login_manager.init_app(app)
+    registrar_comandos(app)
+    configurar_metricas(app)
+    configurar_concorrencia(app)
+    configurar_estaticos(app)
+    configurar_uploads(app)
+    configurar_versoes(app)
+    configurar_cache_templates(app)
+    configurar_geo(app)
+    configurar_agregados(app)
+    configurar_historico_precos(app)
+    configurar_auditoria(app)
+    configurar_notificacoes(app)
+
+    # Flask-Migrate puxa o alembic inteiro e só serve para `flask db ...`:
+    # os workers do gunicorn não o carregam
+    if os.environ.get('FLASK_RUN_FROM_CLI'):
+        from flask_migrate import Migrate
+        Migrate(app, db)
+
+    for regra, opcoes, view in _rotas:
+        app.add_url_rule(regra, view_func=view, **opcoes)
+    for codigo, funcao in _tratadores_erro:
+        app.register_error_handler(codigo, funcao)
+    for funcao in _processadores_contexto:
+        app.context_processor(funcao)
+
+    return app
+
+
+def __getattr__(nome):
+    """Instância padrão criada no primeiro acesso a `app.app`.
+
+    Mantém funcionando `gunicorn app:app`, FLASK_APP=app.py e `from app import app`
+    sem construir a aplicação só por importar o módulo.
+    """
+    if nome == 'app':
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {nome!r}")
+
+
 # ==================== INICIALIZAÇÃO ====================
 
 if __name__ == '__main__':
+    app = create_app()
     with app.app_context():
         db.create_all()
         
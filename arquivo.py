@@ -0,0 +1,159 @@
+"""
+Arquivamento de compras e despesas antigas (compras_arquivo, despesas_arquivo).
+
+arquivar() (flask arquivar) move, um mês por transação, as linhas anteriores
+ao início do mês de ARQUIVO_HORIZONTE_DIAS atrás: INSERT ... SELECT na
+tabela de arquivo, soma do mês em totais_arquivo e DELETE. Listagens,
+contagens e filtros do dia a dia passam a ler só as tabelas quentes; os
+totais de todo o histórico somam totais_arquivo, sem ler o arquivo.
+
+Os filtros e relatórios (extras.py, relatorios_pdf.py) leem também o
+arquivo só quando o período pedido começa antes do corte (precisa_arquivo()).
+Os agregados por dia (agregados.py) não mudam com o arquivamento e são
+reconstruídos a partir das duas tabelas.
+"""
+
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, insert, literal, or_, select, union_all
+from sqlalchemy.dialects.postgresql import insert as insert_postgresql
+from sqlalchemy.dialects.sqlite import insert as insert_sqlite
+from models import db, Compra, CompraArquivo, Despesa, DespesaArquivo, TotalArquivo
+from database import sessao_leitura
+from versoes import marcar_alteracao
+
+# O dashboard (gráfico de 6 meses) e as anomalias (JANELA_DIAS) leem só as tabelas quentes
+HORIZONTE_MINIMO_DIAS = 190
+
+_totais = TotalArquivo.__table__
+# tabela -> (quente, arquivo, coluna de valor)
+_TABELAS = {
+    'compras': (Compra.__table__, CompraArquivo.__table__, 'valor_total'),
+    'despesas': (Despesa.__table__, DespesaArquivo.__table__, 'valor'),
+}
+
+
+def _inicio_mes(valor):
+    return datetime(valor.year, valor.month, 1)
+
+
+def _mes_seguinte(valor):
+    return datetime(valor.year + valor.month // 12, valor.month % 12 + 1, 1)
+
+
+def corte_arquivo(tabela):
+    """Início do mês seguinte ao último arquivado de `tabela` ('compras'/'despesas'); None se nada foi."""
+    ultimo = sessao_leitura().execute(select(func.max(_totais.c.mes)).where(_totais.c.tabela == tabela)).scalar()
+    return _mes_seguinte(ultimo) if ultimo else None
+
+
+def precisa_arquivo(tabela, data_inicio):
+    """Se uma consulta de `tabela` a partir de `data_inicio` (None = desde sempre) tem de ler o arquivo."""
+    corte = corte_arquivo(tabela)
+    return corte is not None and (data_inicio is None or data_inicio < corte)
+
+
+def _arquivar_mes(tabela, inicio, fim):
+    quente, arquivo, valor = _TABELAS[tabela]
+    # A linha de maior id fica: no SQLite (sem AUTOINCREMENT) o próximo id seria max(id) + 1
+    # e repetiria o dela no arquivo. Sai num próximo arquivamento, quando houver outra depois.
+    maior_id = select(func.max(quente.c.id)).scalar_subquery()
+    filtro = [quente.c.data >= inicio, quente.c.data < fim, quente.c.id < maior_id]
+    quantidade_kg = func.sum(quente.c.quantidade_kg) if tabela == 'compras' else literal(0.0)
+    registros, soma, soma_kg = db.session.execute(select(
+        func.count(), func.coalesce(func.sum(quente.c[valor]), 0.0), func.coalesce(quantidade_kg, 0.0),
+    ).where(*filtro)).one()
+    if not registros:
+        return 0
+
+    colunas = [coluna.name for coluna in arquivo.columns]
+    db.session.execute(insert(arquivo).from_select(colunas, select(*(quente.c[c] for c in colunas)).where(*filtro)))
+    # Soma ao mês já arquivado: linhas com data retroativa podem chegar depois do corte
+    insert_dialeto = insert_postgresql if db.session.connection().dialect.name == 'postgresql' else insert_sqlite
+    comando = insert_dialeto(_totais).values(
+        tabela=tabela, mes=inicio.date(), registros=registros, valor=soma, quantidade_kg=soma_kg,
+        atualizado_em=datetime.utcnow(),
+    )
+    db.session.execute(comando.on_conflict_do_update(
+        index_elements=[_totais.c.tabela, _totais.c.mes],
+        set_={
+            'registros': _totais.c.registros + comando.excluded.registros,
+            'valor': _totais.c.valor + comando.excluded.valor,
+            'quantidade_kg': _totais.c.quantidade_kg + comando.excluded.quantidade_kg,
+            'atualizado_em': comando.excluded.atualizado_em,
+        },
+    ))
+    db.session.execute(delete(quente).where(*filtro))
+    marcar_alteracao(tabela, arquivo.name, _totais.name)
+    db.session.commit()
+    return registros
+
+
+def arquivar(horizonte_dias):
+    """Move para o arquivo compras e despesas de antes do mês de `horizonte_dias` atrás.
+
+    Retorna {tabela: linhas movidas}.
+    """
+    if horizonte_dias < HORIZONTE_MINIMO_DIAS:
+        raise ValueError(f'O horizonte mínimo é de {HORIZONTE_MINIMO_DIAS} dias')
+    corte = _inicio_mes(datetime.utcnow() - timedelta(days=horizonte_dias))
+    movidas = {}
+    for tabela, (quente, _, _) in _TABELAS.items():
+        movidas[tabela] = 0
+        mais_antiga = db.session.execute(select(func.min(quente.c.data))).scalar()
+        mes = _inicio_mes(mais_antiga) if mais_antiga else corte
+        while mes < corte:
+            seguinte = _mes_seguinte(mes)
+            movidas[tabela] += _arquivar_mes(tabela, mes, seguinte)
+            mes = seguinte
+    return movidas
+
+
+def totais_arquivados(tabela):
+    """(registros, valor) de tudo que foi arquivado de `tabela`, pelos totais mensais."""
+    registros, valor = sessao_leitura().execute(select(
+        func.coalesce(func.sum(_totais.c.registros), 0), func.coalesce(func.sum(_totais.c.valor), 0.0),
+    ).where(_totais.c.tabela == tabela)).one()
+    return int(registros), float(valor)
+
+
+def somar_arquivo(tabela, data_inicio, data_fim):
+    """(registros, valor) arquivados de `tabela` com data em [data_inicio, data_fim] (None = sem limite).
+
+    Meses inteiros no período vêm de totais_arquivo; só as pontas leem a tabela de arquivo.
+    """
+    corte = corte_arquivo(tabela)
+    if corte is None or (data_inicio is not None and data_inicio >= corte):
+        return 0, 0.0
+    _, arquivo, valor = _TABELAS[tabela]
+    leitura = sessao_leitura()
+
+    # Meses inteiros: de `primeiro` (inclusive) até `ultimo` (exclusive)
+    primeiro = None if data_inicio is None else (
+        data_inicio if data_inicio == _inicio_mes(data_inicio) else _mes_seguinte(data_inicio))
+    ultimo = corte if data_fim is None or data_fim >= corte else _inicio_mes(data_fim)
+    filtro_totais = [_totais.c.tabela == tabela, _totais.c.mes < ultimo.date()]
+    if primeiro is not None:
+        filtro_totais.append(_totais.c.mes >= primeiro.date())
+    registros, soma = leitura.execute(select(
+        func.coalesce(func.sum(_totais.c.registros), 0), func.coalesce(func.sum(_totais.c.valor), 0.0),
+    ).where(*filtro_totais)).one()
+
+    pontas = [arquivo.c.data >= ultimo] if primeiro is None else [or_(arquivo.c.data < primeiro, arquivo.c.data >= ultimo)]
+    if data_inicio is not None:
+        pontas.append(arquivo.c.data >= data_inicio)
+    if data_fim is not None:
+        pontas.append(arquivo.c.data <= data_fim)
+    registros_pontas, soma_pontas = leitura.execute(select(
+        func.count(), func.coalesce(func.sum(arquivo.c[valor]), 0.0),
+    ).where(*pontas)).one()
+    return int(registros) + registros_pontas, float(soma) + float(soma_pontas)
+
+
+def origem_compras(*colunas):
+    """`colunas` de compras e, se houver arquivo, também de compras_arquivo (UNION ALL), como subconsulta."""
+    quente, arquivo, _ = _TABELAS['compras']
+    if corte_arquivo('compras') is None:
+        return quente
+    return union_all(
+        select(*(quente.c[c] for c in colunas)), select(*(arquivo.c[c] for c in colunas)),
+    ).subquery('compras')
@@ -0,0 +1,346 @@
+"""
+Trilha de auditoria: quem aprovou, rejeitou, removeu ou mudou o preço de quê.
+
+As mudanças são capturadas no flush do ORM (after_flush), com o usuário e a
+rota da requisição, e só entram na fila quando a transação é confirmada
+(after_commit; rollback descarta). Uma thread por worker grava a fila na
+tabela auditoria em lotes, a cada AUDITORIA_INTERVALO_SEGUNDOS ou quando
+junta AUDITORIA_LOTE eventos: a requisição não paga um INSERT a mais.
+
+Para não perder eventos se o processo cair antes de gravar, cada evento
+confirmado também é anexado a AUDITORIA_PASTA/auditoria-<pid>-<n>.jsonl;
+o arquivo é apagado depois que o lote dele entra no banco. Arquivos de
+processos que não existem mais (e os de lotes que falharam) são
+reenviados pela thread; os de outros processos antes passam para um nome
+deste (auditoria-<pid>-r<n>.jsonl), que nunca coincide com o arquivo que
+está recebendo eventos. O id do evento é único, então reenviar não
+duplica nada.
+
+Escritas em lote fora do ORM (importação de catálogo, clonagem) chamam
+registrar_evento() na transação delas.
+"""
+
+import atexit
+import glob
+import json
+import logging
+import os
+import re
+import threading
+import uuid
+from datetime import date, datetime
+from enum import Enum
+from flask import has_request_context, request
+from flask_login import current_user
+from sqlalchemy import and_, event, inspect, or_, select
+from sqlalchemy.dialects.postgresql import insert as insert_postgresql
+from sqlalchemy.dialects.sqlite import insert as insert_sqlite
+from models import db, RegistroAuditoria, Usuario
+from database import sessao_leitura
+
+logger = logging.getLogger('mrx.auditoria')
+
+# tabela -> campos cujas alterações são registradas (remoções guardam a linha inteira)
+ENTIDADES_AUDITADAS = {
+    'compras': ('status_aprovacao', 'quantidade_kg', 'preco_unitario', 'valor_total'),
+    'tabela_precos': ('preco_por_kg', 'ativo'),
+    'fornecedores': ('preco_maximo_automatico',),
+    'usuarios': ('papel', 'ativo'),
+    'despesas': ('valor',),
+    'funcionarios': (),
+}
+CAMPOS_OMITIDOS = {'senha_hash'}
+MAX_REGISTROS_CONSULTA = 500
+
+_auditoria = RegistroAuditoria.__table__
+_padrao_arquivo = re.compile(r'auditoria-(\d+)-(r?)(\d+)\.jsonl$')  # r: recuperado de outro processo
+
+# Estado do worker (refeito depois do fork: ver _garantir_thread)
+_trava = threading.Lock()  # fila e arquivo atual
+_trava_gravacao = threading.Lock()  # uma descarga por vez (thread e atexit)
+_acordar = threading.Event()
+_fila = []
+_pid = None
+_sequencia = 0
+_recuperados = 0
+_arquivo = None
+_config = {}
+
+
+def _valor_json(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, Enum):
+        return valor.value
+    return str(valor)
+
+
+def _autor():
+    """(usuario_id, origem, ip) da requisição atual; fora dela (CLI), origem 'cli'."""
+    if not has_request_context():
+        return None, 'cli', None
+    usuario_id = int(current_user.get_id()) if current_user and current_user.is_authenticated else None
+    return usuario_id, request.endpoint, request.remote_addr
+
+
+def _evento(entidade, entidade_id, acao, alteracoes, autor):
+    usuario_id, origem, ip = autor
+    return {
+        'evento': uuid.uuid4().hex, 'criado_em': datetime.utcnow(), 'usuario_id': usuario_id,
+        'entidade': entidade, 'entidade_id': entidade_id, 'acao': acao,
+        'alteracoes': json.dumps(alteracoes, default=_valor_json, ensure_ascii=False),
+        'origem': origem, 'ip': ip,
+    }
+
+
+def registrar_evento(entidade, entidade_id, acao, alteracoes):
+    """Registra um evento na transação de db.session (para escritas que não passam pelo ORM)."""
+    db.session.info.setdefault('auditoria', []).append(
+        _evento(entidade, entidade_id, acao, alteracoes, _autor()))
+
+
+def _apos_flush(sessao, contexto):
+    eventos = []
+    autor = None
+    for obj in sessao.dirty:
+        estado = inspect(obj)
+        campos = ENTIDADES_AUDITADAS.get(estado.mapper.local_table.name)
+        if not campos:
+            continue
+        alteracoes = {}
+        for campo in campos:
+            historico = estado.attrs[campo].history
+            antes = historico.deleted[0] if historico.deleted else None
+            depois = historico.added[0] if historico.added else None
+            if historico.has_changes() and antes != depois:
+                alteracoes[campo] = [antes, depois]
+        if alteracoes:
+            autor = autor or _autor()
+            eventos.append(_evento(estado.mapper.local_table.name, estado.identity[0], 'alteracao', alteracoes, autor))
+
+    for obj in sessao.deleted:
+        estado = inspect(obj)
+        if estado.mapper.local_table.name not in ENTIDADES_AUDITADAS:
+            continue
+        linha = {
+            coluna.key: estado.dict.get(coluna.key) for coluna in estado.mapper.column_attrs
+            if coluna.key not in CAMPOS_OMITIDOS
+        }
+        autor = autor or _autor()
+        eventos.append(_evento(estado.mapper.local_table.name, estado.identity[0], 'remocao', linha, autor))
+
+    if eventos:
+        sessao.info.setdefault('auditoria', []).extend(eventos)
+
+
+def _valor_anterior(alvo, valor, anterior, iniciador):
+    """Só para o active_history: o campo auditado carrega o valor antigo antes de mudar."""
+
+
+def _apos_commit(sessao):
+    eventos = sessao.info.pop('auditoria', None)
+    if eventos:
+        _enfileirar(eventos)
+
+
+def _apos_rollback(sessao):
+    sessao.info.pop('auditoria', None)
+
+
+# ---------------------------------------------------------------- gravação
+
+def _caminho(pid, sequencia, recuperado=False):
+    return os.path.join(_config['pasta'], f"auditoria-{pid}-{'r' if recuperado else ''}{sequencia}.jsonl")
+
+
+def _garantir_thread():
+    """Inicia a thread de gravação no processo atual (no primeiro evento e de novo depois de um fork)."""
+    global _pid, _fila, _arquivo
+    if _pid == os.getpid():
+        return
+    # Processo novo: a fila e o arquivo herdados são do pai, que grava os dele
+    _pid, _fila, _arquivo = os.getpid(), [], None
+    if _config['intervalo'] > 0:
+        threading.Thread(target=_laco, name='auditoria', daemon=True).start()
+        atexit.register(descarregar)
+
+
+def _enfileirar(eventos):
+    global _arquivo
+    with _trava:
+        _garantir_thread()
+        if _arquivo is None:
+            os.makedirs(_config['pasta'], exist_ok=True)
+            _arquivo = open(_caminho(_pid, _sequencia), 'a', encoding='utf-8')
+        _arquivo.write(''.join(json.dumps(e, default=_valor_json, ensure_ascii=False) + '\n' for e in eventos))
+        _arquivo.flush()  # no sistema operacional: sobrevive à queda do processo
+        _fila.extend(eventos)
+        cheia = len(_fila) >= _config['lote']
+    if _config['intervalo'] <= 0:
+        descarregar()
+    elif cheia:
+        _acordar.set()
+
+
+def _gravar(eventos):
+    engine = _config['engine']
+    insert = insert_postgresql if engine.dialect.name == 'postgresql' else insert_sqlite
+    with engine.begin() as conexao:
+        conexao.execute(insert(_auditoria).on_conflict_do_nothing(index_elements=[_auditoria.c.evento]), eventos)
+
+
+def _reenviar(caminho):
+    """Grava os eventos de um arquivo da fila e o apaga. Linha cortada (queda no meio da escrita) é ignorada."""
+    eventos = []
+    with open(caminho, encoding='utf-8') as f:
+        for numero, linha in enumerate(f, 1):
+            try:
+                evento = json.loads(linha)
+            except ValueError:
+                logger.warning('Linha %d inválida em %s ignorada', numero, caminho)
+                continue
+            evento['criado_em'] = datetime.fromisoformat(evento['criado_em'])
+            eventos.append(evento)
+    for inicio in range(0, len(eventos), _config['lote']):
+        _gravar(eventos[inicio:inicio + _config['lote']])
+    os.remove(caminho)
+    return len(eventos)
+
+
+def _processo_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _recuperar():
+    """Reenvia os arquivos de lotes que falharam e os deixados por processos encerrados."""
+    global _recuperados
+    for caminho in glob.glob(os.path.join(_config['pasta'], 'auditoria-*.jsonl')):
+        encontrado = _padrao_arquivo.search(caminho)
+        if not encontrado:
+            continue
+        pid, recuperado, sequencia = int(encontrado.group(1)), encontrado.group(2), int(encontrado.group(3))
+        if pid == _pid:
+            with _trava:
+                # O arquivo que está recebendo eventos (ou o próximo, de um pid reaproveitado) fica
+                if (_arquivo is not None and caminho == _arquivo.name) or (not recuperado and sequencia >= _sequencia):
+                    continue
+        elif _processo_vivo(pid):
+            continue
+        else:
+            # Renomear para um nome deste processo: só um worker consegue, os outros deixam o arquivo
+            with _trava:
+                destino = _caminho(_pid, _recuperados, recuperado=True)
+                while os.path.exists(destino):
+                    _recuperados += 1
+                    destino = _caminho(_pid, _recuperados, recuperado=True)
+                _recuperados += 1
+            try:
+                os.rename(caminho, destino)
+            except FileNotFoundError:
+                continue
+            caminho = destino
+        try:
+            logger.info('Reenviando %d eventos de auditoria de %s', _reenviar(caminho), caminho)
+        except Exception:
+            logger.exception('Falha ao reenviar %s; nova tentativa na próxima descarga', caminho)
+
+
+def descarregar():
+    """Grava no banco os eventos da fila do processo. Retorna quantos foram gravados."""
+    global _arquivo, _sequencia
+    with _trava_gravacao:
+        with _trava:
+            if _pid != os.getpid():
+                return 0
+            lote, _fila[:] = list(_fila), []
+            caminho = None
+            if _arquivo is not None:
+                _arquivo.close()
+                caminho, _arquivo = _arquivo.name, None
+                _sequencia += 1
+        gravados = 0
+        if lote:
+            try:
+                for inicio in range(0, len(lote), _config['lote']):
+                    _gravar(lote[inicio:inicio + _config['lote']])
+                gravados = len(lote)
+                os.remove(caminho)
+            except Exception:
+                # O arquivo fica: _recuperar() tenta de novo
+                logger.exception('Falha ao gravar %d eventos de auditoria (mantidos em %s)', len(lote), caminho)
+        _recuperar()
+        return gravados
+
+
+def _laco():
+    while True:
+        _acordar.wait(_config['intervalo'])
+        _acordar.clear()
+        try:
+            descarregar()
+        except Exception:
+            logger.exception('Falha na descarga da auditoria')
+
+
+# ---------------------------------------------------------------- consulta
+
+def consultar_auditoria(entidade=None, entidade_id=None, usuario_id=None, inicio=None, fim=None,
+                        antes=None, limite=100):
+    """Eventos gravados, do mais recente para o mais antigo, com o nome do usuário.
+
+    `antes` = (criado_em, id) do último evento da página anterior pagina a consulta; o id
+    desempata eventos com o mesmo criado_em (vários no mesmo commit).
+    """
+    filtros = []
+    if entidade is not None:
+        filtros.append(_auditoria.c.entidade == entidade)
+    if entidade_id is not None:
+        filtros.append(_auditoria.c.entidade_id == entidade_id)
+    if usuario_id is not None:
+        filtros.append(_auditoria.c.usuario_id == usuario_id)
+    if inicio is not None:
+        filtros.append(_auditoria.c.criado_em >= inicio)
+    if fim is not None:
+        filtros.append(_auditoria.c.criado_em < fim)
+    if antes is not None:
+        criado_em, evento_id = antes
+        filtros.append(or_(_auditoria.c.criado_em < criado_em,
+                           and_(_auditoria.c.criado_em == criado_em, _auditoria.c.id < evento_id)))
+    consulta = select(_auditoria, Usuario.nome.label('usuario_nome')).outerjoin(
+        Usuario, Usuario.id == _auditoria.c.usuario_id,
+    ).where(*filtros).order_by(_auditoria.c.criado_em.desc(), _auditoria.c.id.desc()).limit(limite)
+    return [
+        {
+            'id': linha.id, 'criado_em': linha.criado_em.isoformat(), 'usuario_id': linha.usuario_id,
+            'usuario_nome': linha.usuario_nome, 'entidade': linha.entidade, 'entidade_id': linha.entidade_id,
+            'acao': linha.acao, 'alteracoes': json.loads(linha.alteracoes), 'origem': linha.origem, 'ip': linha.ip,
+        }
+        for linha in sessao_leitura().connection().execute(consulta)
+    ]
+
+
+def configurar_auditoria(app):
+    """Liga a captura das mudanças auditadas e a gravação em segundo plano."""
+    with app.app_context():
+        _config.update(
+            engine=db.engine,
+            pasta=app.config['AUDITORIA_PASTA'],
+            intervalo=app.config.get('AUDITORIA_INTERVALO_SEGUNDOS', 2.0),
+            lote=app.config.get('AUDITORIA_LOTE', 500),
+        )
+    # Sem active_history, mudar um campo expirado (depois de commit/rollback) não guarda o valor antigo
+    for mapper in db.Model.registry.mappers:
+        for campo in ENTIDADES_AUDITADAS.get(mapper.local_table.name, ()):
+            atributo = getattr(mapper.class_, campo)
+            if not event.contains(atributo, 'set', _valor_anterior):
+                event.listen(atributo, 'set', _valor_anterior, active_history=True)
+    if not event.contains(db.session, 'after_flush', _apos_flush):
+        event.listen(db.session, 'after_flush', _apos_flush)
+        event.listen(db.session, 'after_commit', _apos_commit)
+        event.listen(db.session, 'after_rollback', _apos_rollback)
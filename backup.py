@@ -0,0 +1,343 @@
+"""
+Backup online do banco SQLite.
+
+O backup completo usa a API de backup do sqlite3 em passos de N páginas com
+pausa entre eles, então nunca segura o lock por muito tempo. Cada escrita de
+outro processo no meio da cópia a faz recomeçar do zero; depois de
+max_reinicios recomeços (banco muito movimentado) a cópia é refeita com
+VACUUM INTO, que lê tudo numa única transação de leitura sem bloquear as
+escritas.
+
+O modo incremental copia só os frames novos do arquivo -wal desde a última
+execução e depois faz o checkpoint (RESTART): o WAL recomeça com um salt
+novo e a cadeia continua nessa nova geração. Qualquer outro checkpoint que
+reinicie o WAL entre duas execuções (wal_autocheckpoint, otimizar-banco,
+o fechamento da última conexão) muda o salt sem passar por aqui: a cadeia
+termina e a próxima execução faz um backup completo. O checkpoint
+automático fica ligado (o WAL não pode depender deste checkpoint, que
+desiste se houver leitores); o incremental economiza enquanto as escritas
+entre duas execuções cabem nas wal_autocheckpoint páginas. Na
+restauração os segmentos de cada geração são concatenados num -wal que o
+SQLite reaplica sobre a base, uma geração por vez.
+
+Arquivos gerados em BACKUP_FOLDER:
+    mrx_AAAAMMDD_HHMMSS.db.gz               base completa
+    mrx_AAAAMMDD_HHMMSS.wal.0001.gz, ...    segmentos incrementais da base
+    incremental.json                        estado da cadeia incremental
+"""
+
+import glob
+import gzip
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import struct
+import time
+from datetime import datetime
+
+WAL_HEADER = 32
+FRAME_HEADER = 24
+WAL_MAGICOS = (0x377f0682, 0x377f0683)
+ESTADO = 'incremental.json'
+
+logger = logging.getLogger('mrx.backup')
+
+
+class BackupError(Exception):
+    """Falha ao gerar, verificar ou restaurar um backup."""
+
+
+class _CopiaInstavel(Exception):
+    """A cópia pela API de backup recomeçou mais vezes que o permitido."""
+
+
+def _compactar(origem, destino):
+    with open(origem, 'rb') as entrada, gzip.open(destino, 'wb', compresslevel=6) as saida:
+        shutil.copyfileobj(entrada, saida, 1024 * 1024)
+
+
+def verificar_integridade(caminho):
+    """Roda PRAGMA integrity_check; lança BackupError se o resultado não for 'ok'."""
+    conn = sqlite3.connect(caminho)
+    try:
+        resultado = [linha[0] for linha in conn.execute("PRAGMA integrity_check")]
+    finally:
+        conn.close()
+    if resultado != ['ok']:
+        raise BackupError(f"integrity_check falhou em {caminho}: {resultado[:5]}")
+
+
+def _ler_cabecalho_wal(caminho_wal):
+    """Retorna (big_endian, page_size, salt, checksum) do -wal, ou None se vazio/inválido."""
+    try:
+        with open(caminho_wal, 'rb') as f:
+            cabecalho = f.read(WAL_HEADER)
+    except FileNotFoundError:
+        return None
+    if len(cabecalho) < WAL_HEADER:
+        return None
+
+    magic, _versao, page_size, _seq, salt1, salt2, ck1, ck2 = struct.unpack('>8I', cabecalho)
+    if magic not in WAL_MAGICOS:
+        return None
+    big_endian = magic == 0x377f0683
+    if _checksum_wal(cabecalho[:24], 0, 0, big_endian) != (ck1, ck2):
+        return None
+    return big_endian, page_size, (salt1, salt2), (ck1, ck2)
+
+
+def _checksum_wal(dados, s1, s2, big_endian):
+    """Checksum cumulativo do WAL (mesmo algoritmo de wal.c)."""
+    palavras = struct.unpack(('>' if big_endian else '<') + f'{len(dados) // 4}I', dados)
+    for i in range(0, len(palavras), 2):
+        s1 = (s1 + palavras[i] + s2) & 0xFFFFFFFF
+        s2 = (s2 + palavras[i + 1] + s1) & 0xFFFFFFFF
+    return s1, s2
+
+
+def _caminho_base(pasta, nome):
+    return os.path.join(pasta, f'{nome}.db.gz')
+
+
+def _carregar_estado(pasta):
+    try:
+        with open(os.path.join(pasta, ESTADO)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _salvar_estado(pasta, estado):
+    caminho = os.path.join(pasta, ESTADO)
+    with open(caminho + '.tmp', 'w') as f:
+        json.dump(estado, f)
+    os.replace(caminho + '.tmp', caminho)
+
+
+def _copiar(caminho_db, temporario, paginas_por_passo, pausa, max_reinicios):
+    """Copia o banco para `temporario` pela API de backup; VACUUM INTO se ela recomeçar demais."""
+    reinicios = 0
+    restantes_antes = None
+
+    def progresso(status, restantes, total):
+        nonlocal reinicios, restantes_antes
+        # Um passo normal sempre diminui o que falta; se não diminuiu, a cópia recomeçou
+        if status == sqlite3.SQLITE_OK and restantes_antes is not None and 0 < restantes_antes <= restantes:
+            reinicios += 1
+            if reinicios > max_reinicios:
+                raise _CopiaInstavel
+        restantes_antes = restantes
+        if restantes and pausa:
+            time.sleep(pausa)
+
+    origem = sqlite3.connect(caminho_db)
+    try:
+        destino = sqlite3.connect(temporario)
+        try:
+            origem.backup(destino, pages=paginas_por_passo, progress=progresso, sleep=pausa)
+            return
+        except _CopiaInstavel:
+            pass
+        finally:
+            destino.close()
+
+        logger.warning('Backup recomeçou %d vezes com o banco em uso; copiando com VACUUM INTO.', reinicios)
+        for sufixo in ('', '-journal'):
+            if os.path.exists(temporario + sufixo):
+                os.remove(temporario + sufixo)
+        origem.execute('VACUUM INTO ?', (temporario,))
+    finally:
+        origem.close()
+
+    # VACUUM INTO gera a base em modo rollback; em WAL ela aceita os segmentos incrementais
+    conn = sqlite3.connect(temporario)
+    try:
+        conn.execute('PRAGMA journal_mode=WAL')
+    finally:
+        conn.close()
+
+
+def backup_completo(caminho_db, pasta, paginas_por_passo=256, pausa=0.05, max_reinicios=5):
+    """Copia o banco com a API de backup, verifica, compacta e inicia nova cadeia incremental.
+
+    Retorna o caminho do arquivo .db.gz gerado.
+    """
+    os.makedirs(pasta, exist_ok=True)
+    nome = f"mrx_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    sufixo = 1
+    while os.path.exists(_caminho_base(pasta, nome)):
+        # Duas bases no mesmo segundo não podem compartilhar segmentos
+        nome = f"{nome.split('-')[0]}-{sufixo}"
+        sufixo += 1
+    temporario = os.path.join(pasta, f'.{nome}.db')
+
+    # Salt do WAL lido antes da cópia: se ainda for o mesmo na próxima execução
+    # incremental, o WAL não foi reiniciado e todos os frames desde então estão nele.
+    cabecalho = _ler_cabecalho_wal(caminho_db + '-wal')
+
+    try:
+        _copiar(caminho_db, temporario, paginas_por_passo, pausa, max_reinicios)
+        verificar_integridade(temporario)
+        _compactar(temporario, _caminho_base(pasta, nome))
+    finally:
+        for sufixo in ('', '-wal', '-shm'):
+            if os.path.exists(temporario + sufixo):
+                os.remove(temporario + sufixo)
+
+    _salvar_estado(pasta, {
+        'base': nome,
+        'salt': list(cabecalho[2]) if cabecalho else None,
+        'offset': 0,
+        'checksum': None,
+        'segmentos': 0,
+        'proximo_salt': None,
+    })
+    return _caminho_base(pasta, nome)
+
+
+def _reiniciar_wal(caminho_db, estado, tamanho_frame):
+    """Checkpoint RESTART depois de a geração atual do WAL ter sido enviada.
+
+    A próxima escrita recomeça o WAL com salt1 + 1, que a cadeia aceita como a
+    geração seguinte. Se entraram frames depois da leitura, eles foram para a
+    base sem passar pelo backup: a cadeia é encerrada e a próxima execução faz
+    um backup completo. Com leitores no WAL o checkpoint fica para a próxima.
+    """
+    conn = sqlite3.connect(caminho_db, timeout=1)  # segura as escritas só enquanto espera
+    try:
+        busy, frames_wal, _copiados = conn.execute('PRAGMA wal_checkpoint(RESTART)').fetchone()
+    except sqlite3.OperationalError:
+        return
+    finally:
+        conn.close()
+    if busy:
+        return
+
+    enviados = (estado['offset'] - WAL_HEADER) // tamanho_frame if estado['offset'] else 0
+    if frames_wal == enviados:
+        estado['proximo_salt'] = (estado['salt'][0] + 1) & 0xFFFFFFFF
+    else:
+        estado['salt'] = None
+
+
+def backup_incremental(caminho_db, pasta, paginas_por_passo=256, pausa=0.05, max_reinicios=5):
+    """Envia os frames do WAL confirmados desde a última execução e faz o checkpoint.
+
+    Se a cadeia não puder continuar (sem base, WAL reiniciado por outro
+    checkpoint, arquivo truncado) faz um backup completo. Retorna (caminho, completo).
+    """
+    estado = _carregar_estado(pasta)
+    cabecalho = _ler_cabecalho_wal(caminho_db + '-wal')
+
+    cadeia_valida = (
+        estado is not None
+        and estado.get('salt') is not None
+        and os.path.exists(_caminho_base(pasta, estado['base']))
+        and cabecalho is not None
+    )
+    if cadeia_valida and list(cabecalho[2]) != estado['salt']:
+        # Só o checkpoint do próprio backup pode ter reiniciado o WAL, e uma vez só
+        cadeia_valida = estado.get('proximo_salt') == cabecalho[2][0]
+        if cadeia_valida:
+            estado.update(salt=list(cabecalho[2]), offset=0, checksum=None, proximo_salt=None)
+    if not cadeia_valida:
+        return backup_completo(caminho_db, pasta, paginas_por_passo, pausa, max_reinicios), True
+
+    big_endian, page_size, salt, checksum_cabecalho = cabecalho
+    offset = estado['offset'] or WAL_HEADER
+    s1, s2 = estado['checksum'] or checksum_cabecalho
+    tamanho_frame = FRAME_HEADER + page_size
+
+    ultimo_commit = offset
+    checksum_commit = (s1, s2)
+    with open(caminho_db + '-wal', 'rb') as f:
+        f.seek(offset)
+        posicao = offset
+        while True:
+            frame = f.read(tamanho_frame)
+            if len(frame) < tamanho_frame:
+                break
+            _pagina, tamanho_db, fsalt1, fsalt2, ck1, ck2 = struct.unpack('>6I', frame[:FRAME_HEADER])
+            if (fsalt1, fsalt2) != salt:
+                break
+            s1, s2 = _checksum_wal(frame[:8], s1, s2, big_endian)
+            s1, s2 = _checksum_wal(frame[FRAME_HEADER:], s1, s2, big_endian)
+            if (s1, s2) != (ck1, ck2):
+                # Frame sendo escrito agora (ou resto de uma geração antiga do WAL)
+                break
+            posicao += tamanho_frame
+            if tamanho_db:
+                ultimo_commit, checksum_commit = posicao, (s1, s2)
+
+        dados = None
+        if ultimo_commit > offset:
+            # O primeiro segmento de cada geração leva o cabeçalho do WAL junto
+            inicio = 0 if not estado['offset'] else offset
+            f.seek(inicio)
+            dados = f.read(ultimo_commit - inicio)
+
+    caminho = None
+    if dados is not None:
+        estado['segmentos'] += 1
+        caminho = os.path.join(pasta, f"{estado['base']}.wal.{estado['segmentos']:04d}.gz")
+        with gzip.open(caminho, 'wb', compresslevel=6) as saida:
+            saida.write(dados)
+        estado['offset'] = ultimo_commit
+        estado['checksum'] = list(checksum_commit)
+
+    _reiniciar_wal(caminho_db, estado, tamanho_frame)
+    _salvar_estado(pasta, estado)
+    return caminho, False
+
+
+def aplicar_retencao(pasta, dias):
+    """Remove bases (e seus segmentos) mais antigas que `dias`, preservando a cadeia atual."""
+    estado = _carregar_estado(pasta) or {}
+    limite = time.time() - dias * 86400
+    removidos = []
+
+    for caminho in glob.glob(os.path.join(pasta, 'mrx_*.db.gz')):
+        nome = os.path.basename(caminho)[:-len('.db.gz')]
+        if nome == estado.get('base') or os.path.getmtime(caminho) >= limite:
+            continue
+        for arquivo in [caminho] + glob.glob(os.path.join(pasta, f'{nome}.wal.*.gz')):
+            os.remove(arquivo)
+            removidos.append(arquivo)
+    return removidos
+
+
+def restaurar_backup(arquivo_base, destino):
+    """Descompacta a base, reaplica os segmentos de WAL da cadeia e verifica o resultado."""
+    if os.path.exists(destino):
+        raise BackupError(f"{destino} já existe; restaure para um caminho novo.")
+
+    with gzip.open(arquivo_base, 'rb') as entrada, open(destino, 'wb') as saida:
+        shutil.copyfileobj(entrada, saida, 1024 * 1024)
+
+    prefixo = arquivo_base[:-len('.db.gz')]
+    segmentos = sorted(glob.glob(f'{prefixo}.wal.*.gz'))
+
+    # Cada geração do WAL começa num segmento com o cabeçalho e é aplicada separada
+    geracoes = []
+    for segmento in segmentos:
+        with gzip.open(segmento, 'rb') as entrada:
+            inicio = entrada.read(4)
+        if not geracoes or (len(inicio) == 4 and struct.unpack('>I', inicio)[0] in WAL_MAGICOS):
+            geracoes.append([])
+        geracoes[-1].append(segmento)
+
+    for geracao in geracoes or [[]]:
+        if geracao:
+            with open(destino + '-wal', 'wb') as saida:
+                for segmento in geracao:
+                    with gzip.open(segmento, 'rb') as entrada:
+                        shutil.copyfileobj(entrada, saida, 1024 * 1024)
+        conn = sqlite3.connect(destino)
+        try:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        finally:
+            conn.close()
+    verificar_integridade(destino)
+    return len(segmentos)
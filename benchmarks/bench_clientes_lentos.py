@@ -0,0 +1,262 @@
+"""
+Benchmark de clientes lentos: scanners em 3G contra /api/validar-peca.
+
+Sobe o gunicorn em cada modo (gthread: o deploy antigo, workers com 2
+threads; gevent: o atual com PostgreSQL, com o monkey patch no
+gunicorn_config.py) e abre ao mesmo tempo:
+
+- clientes lentos, que mandam a requisição aos pedaços (--pedaco bytes a
+  cada --atraso-ms), como um celular com rede ruim;
+- clientes rápidos, que mandam a requisição de uma vez, em sequência.
+
+Mede, por tipo de cliente, requisições concluídas por segundo, erros e
+p50/p95/p99 da latência. No gthread cada cliente lento ocupa uma thread
+até terminar de enviar; no gevent ele ocupa só um greenlet.
+
+O app recusa gevent com SQLite (ver concorrencia.py): o modo gevent só
+roda com --banco (ou DATABASE_URL) de PostgreSQL.
+
+Uso:
+    python benchmarks/bench_clientes_lentos.py --modos gthread --lentos 200 --rapidos 10 --segundos 20
+    python benchmarks/bench_clientes_lentos.py --banco postgresql://localhost/mrx_bench --workers 4 -o clientes_lentos.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, RAIZ)
+
+EMAIL_BENCH = 'benchmark@mrx.com.br'
+SENHA_BENCH = 'Benchmark@123'
+PECAS = 500
+TIMEOUT_CLIENTE = 60
+
+CONFIG_GUNICORN = {
+    # Como o setup_gunicorn.sh antigo: workers síncronos com 2 threads
+    'gthread': 'worker_class = "gthread"\nthreads = 2\n',
+    # Como o atual: monkey patch antes de o master importar o app
+    'gevent': 'from gevent import monkey\nmonkey.patch_all()\n\nworker_class = "gevent"\nworker_connections = 1000\n',
+}
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    if not ordenados:
+        return None
+    k = (len(ordenados) - 1) * p / 100
+    i = int(k)
+    j = min(i + 1, len(ordenados) - 1)
+    return ordenados[i] + (ordenados[j] - ordenados[i]) * (k - i)
+
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def preparar_banco():
+    """Usuário do benchmark e um fornecedor com PECAS itens com código de barras. Retorna (fornecedor_id, códigos)."""
+    from app import create_app
+    from models import db, Fornecedor, RoleEnum, TabelaPreco, Usuario
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        if not Usuario.query.filter_by(email=EMAIL_BENCH).first():
+            usuario = Usuario(nome='Benchmark', email=EMAIL_BENCH, papel=RoleEnum.ADMIN)
+            usuario.set_password(SENHA_BENCH)
+            db.session.add(usuario)
+        fornecedor = Fornecedor.query.filter_by(nome_social='Benchmark Clientes Lentos').first()
+        if not fornecedor:
+            fornecedor = Fornecedor(nome_social='Benchmark Clientes Lentos')
+            db.session.add(fornecedor)
+            db.session.flush()
+            db.session.add_all(
+                TabelaPreco(fornecedor_id=fornecedor.id, nome_item=f'Peça {i}', preco_por_kg=1.0 + i % 50,
+                            codigo_barras=f'BENCH{fornecedor.id:04d}{i:06d}')
+                for i in range(PECAS)
+            )
+        db.session.commit()
+        codigos = [codigo for (codigo,) in db.session.query(TabelaPreco.codigo_barras).filter(
+            TabelaPreco.fornecedor_id == fornecedor.id, TabelaPreco.codigo_barras.isnot(None))]
+        return fornecedor.id, codigos
+
+
+def subir_gunicorn(modo, workers, env):
+    porta = porta_livre()
+    config = tempfile.NamedTemporaryFile('w', suffix='.py', delete=False)
+    with config:
+        config.write(CONFIG_GUNICORN[modo])
+        config.write(f'bind = "127.0.0.1:{porta}"\nworkers = {workers}\npreload_app = True\n'
+                     'timeout = 120\nbacklog = 2048\n')
+    processo = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', config.name, 'app:app'],
+        cwd=RAIZ, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    inicio = time.perf_counter()
+    while time.perf_counter() - inicio < 60:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{porta}/login', timeout=1).read()
+            return processo, porta, config.name
+        except OSError:
+            time.sleep(0.1)
+    processo.terminate()
+    raise RuntimeError(f'gunicorn ({modo}) não respondeu em 60 s')
+
+
+def cookie_sessao(porta):
+    """Faz login e devolve o cabeçalho Cookie da sessão."""
+    class SemRedirecionar(urllib.request.HTTPRedirectHandler):
+        def redirect_request(self, *args, **kwargs):
+            return None
+
+    dados = urllib.parse.urlencode({'email': EMAIL_BENCH, 'senha': SENHA_BENCH}).encode()
+    try:
+        resposta = urllib.request.build_opener(SemRedirecionar).open(f'http://127.0.0.1:{porta}/login', dados)
+    except urllib.error.HTTPError as erro:
+        resposta = erro  # o 302 do login chega como erro sem o redirecionamento
+    cookies = [c.split(';', 1)[0] for c in resposta.headers.get_all('Set-Cookie') or []]
+    if not any(c.startswith('session=') for c in cookies):
+        raise RuntimeError('Login do benchmark falhou')
+    return '; '.join(cookies)
+
+
+async def requisitar(porta, cookie, corpo, pedaco=None, atraso=0.0):
+    """POST /api/validar-peca; com `pedaco`, envia `pedaco` bytes a cada `atraso` segundos. Retorna o status."""
+    leitor, escritor = await asyncio.open_connection('127.0.0.1', porta)
+    try:
+        dados = (
+            'POST /api/validar-peca HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: application/json\r\n'
+            f'Content-Length: {len(corpo)}\r\nCookie: {cookie}\r\nConnection: close\r\n\r\n'
+        ).encode() + corpo
+        passo = pedaco or len(dados)
+        for inicio in range(0, len(dados), passo):
+            escritor.write(dados[inicio:inicio + passo])
+            await escritor.drain()
+            if pedaco and inicio + passo < len(dados):
+                await asyncio.sleep(atraso)
+        linha = await leitor.readline()
+        await leitor.read()
+        return int(linha.split()[1])
+    finally:
+        escritor.close()
+
+
+async def cliente(porta, cookie, corpos, fim, resultados, pedaco=None, atraso=0.0):
+    n = 0
+    while time.perf_counter() < fim:
+        corpo = corpos[n % len(corpos)]
+        n += 1
+        t0 = time.perf_counter()
+        try:
+            status = await asyncio.wait_for(requisitar(porta, cookie, corpo, pedaco, atraso), TIMEOUT_CLIENTE)
+        except (OSError, asyncio.TimeoutError, IndexError, ValueError):
+            resultados['erros'] += 1
+            continue
+        if status != 200:
+            resultados['erros'] += 1
+            continue
+        resultados['latencias'].append((time.perf_counter() - t0) * 1000)
+
+
+def resumo(resultados, segundos):
+    latencias = resultados['latencias']
+    return {
+        'concluidas': len(latencias),
+        'req_por_s': round(len(latencias) / segundos, 1),
+        'erros': resultados['erros'],
+        **{f'p{p}_ms': round(percentil(latencias, p), 1) if latencias else None for p in (50, 95, 99)},
+    }
+
+
+async def carga(porta, cookie, corpos, args):
+    lentos = {'latencias': [], 'erros': 0}
+    rapidos = {'latencias': [], 'erros': 0}
+    inicio = time.perf_counter()
+    fim = inicio + args.segundos
+    tarefas = [
+        cliente(porta, cookie, corpos[i::args.lentos] or corpos, fim, lentos, args.pedaco, args.atraso_ms / 1000)
+        for i in range(args.lentos)
+    ] + [cliente(porta, cookie, corpos, fim, rapidos) for _ in range(args.rapidos)]
+    await asyncio.gather(*tarefas)
+    duracao = time.perf_counter() - inicio
+    return {'lentos': resumo(lentos, duracao), 'rapidos': resumo(rapidos, duracao)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--modos', default='gthread,gevent', help='Workers a comparar (gthread, gevent).')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--lentos', type=int, default=200, help='Clientes lentos simultâneos.')
+    parser.add_argument('--rapidos', type=int, default=10, help='Clientes rápidos simultâneos.')
+    parser.add_argument('--pedaco', type=int, default=48, help='Bytes por envio dos clientes lentos.')
+    parser.add_argument('--atraso-ms', type=float, default=150, help='Intervalo entre envios dos clientes lentos.')
+    parser.add_argument('--segundos', type=float, default=20)
+    parser.add_argument('--banco', default='sqlite:////tmp/mrx_bench_clientes_lentos.db')
+    parser.add_argument('-o', '--saida', help='Arquivo JSON de resultados.')
+    args = parser.parse_args()
+
+    os.environ.setdefault('DATABASE_URL', args.banco)
+    env = dict(os.environ, FLASK_ENV='production')
+    fornecedor_id, codigos = preparar_banco()
+    corpos = [json.dumps({'codigo_barras': c, 'fornecedor_id': fornecedor_id}).encode() for c in codigos]
+    print(f"banco: {os.environ['DATABASE_URL']} | {args.lentos} lentos ({args.pedaco} B a cada "
+          f"{args.atraso_ms:g} ms) + {args.rapidos} rápidos | {args.workers} workers | {args.segundos:g} s")
+
+    modos = {}
+    for modo in filter(None, (m.strip() for m in args.modos.split(','))):
+        if modo == 'gevent':
+            try:
+                import gevent  # noqa: F401
+            except ImportError:
+                print('gevent não instalado; pulando.')
+                continue
+            if os.environ['DATABASE_URL'].startswith('sqlite'):
+                print('gevent só com PostgreSQL (ver concorrencia.py); pulando.')
+                continue
+        processo, porta, config = subir_gunicorn(modo, args.workers, env)
+        try:
+            modos[modo] = asyncio.run(carga(porta, cookie_sessao(porta), corpos, args))
+        finally:
+            processo.terminate()
+            processo.wait(timeout=30)
+            os.remove(config)
+        for tipo, r in modos[modo].items():
+            print(f"{modo:<8} {tipo:<8} {r['req_por_s']:>7.1f} req/s | erros {r['erros']:>5} | "
+                  f"p50 {r['p50_ms'] or 0:>8.1f} ms | p95 {r['p95_ms'] or 0:>8.1f} ms | p99 {r['p99_ms'] or 0:>8.1f} ms")
+
+    if args.saida:
+        with open(args.saida, 'w') as f:
+            json.dump({
+                'meta': {
+                    'data': datetime.now().isoformat(timespec='seconds'),
+                    'banco': os.environ['DATABASE_URL'],
+                    'python': platform.python_version(),
+                    'workers': args.workers,
+                    'lentos': args.lentos,
+                    'rapidos': args.rapidos,
+                    'pedaco': args.pedaco,
+                    'atraso_ms': args.atraso_ms,
+                    'segundos': args.segundos,
+                },
+                'modos': modos,
+            }, f, indent=2, ensure_ascii=False)
+        print(f"\nResultados gravados em {args.saida}")
+
+
+if __name__ == '__main__':
+    main()
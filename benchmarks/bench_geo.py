@@ -0,0 +1,158 @@
+"""
+Benchmark das consultas geográficas (geo.py): p50/p95 das buscas por raio e
+por retângulo com o índice de geohash, comparadas com a varredura por
+latitude/longitude BETWEEN (sem índice) que faria a mesma consulta.
+
+Uso:
+    # banco com volume (ver flask gerar-dados; a meta é < 20 ms com 1M compras)
+    DATABASE_URL=sqlite:////tmp/carga.db python benchmarks/bench_geo.py -n 200
+    DATABASE_URL=sqlite:////tmp/carga.db python benchmarks/bench_geo.py -n 200 -o geo.json
+
+Os pontos de consulta são sorteados em volta das regiões de coleta de
+dados_sinteticos.py, onde as compras estão concentradas.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))]
+
+
+def resumo(tempos, quantidades):
+    return {
+        'p50_ms': round(percentil(tempos, 50), 2),
+        'p95_ms': round(percentil(tempos, 95), 2),
+        'max_ms': round(max(tempos), 2),
+        'resultados_medio': round(statistics.mean(quantidades), 1),
+    }
+
+
+def varredura_raio(latitude, longitude, raio_km):
+    """Referência sem índice: BETWEEN em latitude/longitude + haversine."""
+    import math
+    import numpy as np
+    from sqlalchemy import select
+    from database import sessao_leitura
+    from geo import RAIO_TERRA_KM, haversine_km
+    from models import Compra
+
+    delta_lat = math.degrees(raio_km / RAIO_TERRA_KM)
+    delta_lon = math.degrees(raio_km / (RAIO_TERRA_KM * math.cos(math.radians(latitude))))
+    linhas = sessao_leitura().execute(select(Compra.id, Compra.latitude, Compra.longitude).where(
+        Compra.tipo_coleta == 'coleta',
+        Compra.latitude.between(latitude - delta_lat, latitude + delta_lat),
+        Compra.longitude.between(longitude - delta_lon, longitude + delta_lon),
+    )).all()
+    if not linhas:
+        return set()
+    distancias = haversine_km(latitude, longitude, np.array([l.latitude for l in linhas]),
+                              np.array([l.longitude for l in linhas]))
+    return {linhas[i].id for i in np.flatnonzero(distancias <= raio_km)}
+
+
+def medir(funcao, consultas):
+    tempos, quantidades, resultados = [], [], []
+    for argumentos in consultas:
+        inicio = time.perf_counter()
+        resultado = funcao(*argumentos)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+        quantidades.append(len(resultado))
+        resultados.append(resultado)
+    return tempos, quantidades, resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-n', '--repeticoes', type=int, default=200, help='Consultas por cenário.')
+    parser.add_argument('--raios', default='0.5,1,2,5', help='Raios (km) testados, separados por vírgula.')
+    parser.add_argument('--limite', type=int, default=500)
+    parser.add_argument('--sem-referencia', action='store_true', help='Não mede a varredura sem índice.')
+    parser.add_argument('--semente', type=int, default=7)
+    parser.add_argument('-o', '--saida', help='Arquivo JSON de resultados.')
+    args = parser.parse_args()
+
+    from app import app
+    from dados_sinteticos import REGIOES
+    from geo import compras_no_raio, compras_no_retangulo
+    from models import db, Compra
+
+    rnd = random.Random(args.semente)
+    cenarios = {}
+    with app.app_context():
+        volumes = {
+            'compras': db.session.query(db.func.count(Compra.id)).scalar(),
+            'com_geohash': db.session.query(db.func.count(Compra.id)).filter(Compra.geohash.isnot(None)).scalar(),
+        }
+        print(f"compras: {volumes['compras']} | com geohash: {volumes['com_geohash']}")
+
+        for raio in (float(r) for r in args.raios.split(',')):
+            consultas = []
+            for _ in range(args.repeticoes):
+                lat, lon = rnd.choice(REGIOES)
+                consultas.append((lat + rnd.gauss(0, 0.05), lon + rnd.gauss(0, 0.05), raio))
+
+            compras_no_raio(*consultas[0])  # aquecimento (numpy, cache de páginas)
+            tempos, quantidades, resultados = medir(
+                lambda lat, lon, r: compras_no_raio(lat, lon, r, limite=args.limite), consultas)
+            cenario = {'geohash': resumo(tempos, quantidades)}
+
+            if not args.sem_referencia:
+                tempos_ref, quantidades_ref, resultados_ref = medir(varredura_raio, consultas)
+                cenario['varredura'] = resumo(tempos_ref, quantidades_ref)
+                # Mesmo conjunto de compras (quando o limite não cortou o resultado)
+                divergencias = sum(
+                    1 for obtido, esperado in zip(resultados, resultados_ref)
+                    if len(obtido) < args.limite and {c['id'] for c in obtido} != esperado
+                )
+                cenario['divergencias'] = divergencias
+            cenarios[f'raio_{raio:g}km'] = cenario
+            linha = (f"raio {raio:>4g} km: p50 {cenario['geohash']['p50_ms']:>7.2f} ms | "
+                     f"p95 {cenario['geohash']['p95_ms']:>7.2f} ms | {cenario['geohash']['resultados_medio']:>7.1f} compras")
+            if 'varredura' in cenario:
+                linha += (f" || varredura p50 {cenario['varredura']['p50_ms']:>7.2f} ms | "
+                          f"p95 {cenario['varredura']['p95_ms']:>7.2f} ms | divergências {cenario['divergencias']}")
+            print(linha)
+
+        consultas = []
+        for _ in range(args.repeticoes):
+            lat, lon = rnd.choice(REGIOES)
+            lat, lon = lat + rnd.gauss(0, 0.05), lon + rnd.gauss(0, 0.05)
+            consultas.append((lat - 0.01, lon - 0.01, lat + 0.01, lon + 0.01))
+        tempos, quantidades, _ = medir(
+            lambda *retangulo: compras_no_retangulo(*retangulo, limite=args.limite), consultas)
+        cenarios['retangulo_0.02graus'] = {'geohash': resumo(tempos, quantidades)}
+        print(f"retângulo 0.02°: p50 {percentil(tempos, 50):.2f} ms | p95 {percentil(tempos, 95):.2f} ms | "
+              f"{statistics.mean(quantidades):.1f} compras")
+
+        banco = db.engine.url.render_as_string(hide_password=True)
+
+    if args.saida:
+        with open(args.saida, 'w') as f:
+            json.dump({
+                'meta': {
+                    'data': datetime.now().isoformat(timespec='seconds'),
+                    'banco': banco,
+                    'volumes': volumes,
+                    'python': platform.python_version(),
+                    'repeticoes': args.repeticoes,
+                    'limite': args.limite,
+                },
+                'cenarios': cenarios,
+            }, f, indent=2, ensure_ascii=False)
+        print(f"\nResultados gravados em {args.saida}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Benchmark da importação de tabelas de preços (importacao.py): catálogo CSV e
+XLSX gerado na hora, primeira carga (inserções) e recarga (atualizações), e
+cópia da tabela para outro fornecedor.
+
+Uso:
+    # banco descartável: o benchmark cria fornecedores e itens
+    DATABASE_URL=sqlite:////tmp/importacao.db python benchmarks/bench_importacao.py
+    DATABASE_URL=sqlite:////tmp/importacao.db python benchmarks/bench_importacao.py --linhas 50000 -o imp.json
+
+A meta é importar 50 mil linhas em poucos segundos. Metade das linhas tem
+código de barras (upsert pelo código) e metade não (upsert pelo nome).
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+def gerar_linhas(n, semente, base_codigo):
+    linhas = [('nome_item', 'preco_por_kg', 'codigo_barras', 'unidade')]
+    for i in range(n):
+        codigo = str(base_codigo + i) if i % 2 == 0 else ''
+        linhas.append((f'Item {semente}-{i}', f'{(i * 37) % 9000 / 100 + 0.5:.2f}'.replace('.', ','), codigo, 'kg'))
+    return linhas
+
+
+def arquivo_csv(linhas):
+    return io.BytesIO('\n'.join(';'.join(linha) for linha in linhas).encode('utf-8'))
+
+
+def arquivo_xlsx(linhas):
+    from openpyxl import Workbook
+
+    planilha = Workbook(write_only=True)
+    aba = planilha.create_sheet()
+    for linha in linhas:
+        aba.append(list(linha))
+    arquivo = io.BytesIO()
+    planilha.save(arquivo)
+    return arquivo
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--linhas', type=int, default=50000)
+    parser.add_argument('--sem-xlsx', action='store_true', help='Não mede a importação de XLSX.')
+    parser.add_argument('-o', '--saida', help='Arquivo JSON de resultados.')
+    args = parser.parse_args()
+
+    from app import app
+    from importacao import clonar_tabela, importar_catalogo
+    from models import db, Fornecedor
+
+    carimbo = int(time.time())
+    resultados = {}
+
+    def medir(nome, funcao, *argumentos):
+        inicio = time.perf_counter()
+        retorno = funcao(*argumentos)
+        segundos = time.perf_counter() - inicio
+        resultados[nome] = {'segundos': round(segundos, 3), 'resultado': retorno}
+        print(f'{nome:<22} {segundos:>7.2f} s | {retorno}')
+
+    with app.app_context():
+        db.create_all()
+        fornecedores = [Fornecedor(nome_social=f'Benchmark importação {carimbo}-{i}') for i in range(3)]
+        db.session.add_all(fornecedores)
+        db.session.commit()
+        csv_id, xlsx_id, copia_id = (f.id for f in fornecedores)
+
+        def importar(fornecedor_id, arquivo, nome):
+            resultado = importar_catalogo(fornecedor_id, arquivo, nome)
+            return {chave: resultado[chave] for chave in ('linhas', 'inseridos', 'atualizados', 'total_erros')}
+
+        linhas = gerar_linhas(args.linhas, carimbo, carimbo * 10 ** 6)
+        medir('csv_insercao', importar, csv_id, arquivo_csv(linhas), 'catalogo.csv')
+        medir('csv_atualizacao', importar, csv_id, arquivo_csv(linhas), 'catalogo.csv')
+        medir('clonagem', clonar_tabela, csv_id, copia_id)
+        if not args.sem_xlsx:
+            linhas = gerar_linhas(args.linhas, carimbo + 1, (carimbo + 1) * 10 ** 6)
+            medir('xlsx_insercao', importar, xlsx_id, arquivo_xlsx(linhas), 'catalogo.xlsx')
+
+        banco = db.engine.url.render_as_string(hide_password=True)
+
+    if args.saida:
+        with open(args.saida, 'w') as f:
+            json.dump({
+                'meta': {
+                    'data': datetime.now().isoformat(timespec='seconds'),
+                    'banco': banco,
+                    'python': platform.python_version(),
+                    'linhas': args.linhas,
+                },
+                'resultados': resultados,
+            }, f, indent=2, ensure_ascii=False)
+        print(f"\nResultados gravados em {args.saida}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+"""
+Benchmark de inicialização: tempo para importar e criar o app (create_app) e
+memória por worker do gunicorn com e sem preload_app.
+
+Uso:
+    python benchmarks/bench_inicializacao.py -n 5
+    python benchmarks/bench_inicializacao.py --workers 4 -o inicializacao.json
+
+RSS conta páginas compartilhadas em cada worker; PSS divide as páginas
+compartilhadas entre os processos e mostra o ganho real do copy-on-write.
+"""
+
+import argparse
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from datetime import datetime
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Executado em um processo novo a cada medição (sem cache de módulos)
+MEDIR_IMPORTACAO = r'''
+import json, sys, time
+inicio = time.perf_counter()
+import app as modulo
+importado = time.perf_counter()
+modulo.create_app()
+criado = time.perf_counter()
+with open('/proc/self/status') as f:
+    rss = next(int(l.split()[1]) for l in f if l.startswith('VmRSS:'))
+print(json.dumps({
+    'importacao_ms': (importado - inicio) * 1000,
+    'create_app_ms': (criado - importado) * 1000,
+    'rss_kb': rss,
+    'reportlab_carregado': 'reportlab' in sys.modules,
+    'alembic_carregado': 'alembic' in sys.modules,
+}))
+'''
+
+
+def medir_importacao(repeticoes, env):
+    amostras = []
+    for _ in range(repeticoes):
+        saida = subprocess.check_output([sys.executable, '-c', MEDIR_IMPORTACAO], cwd=RAIZ, env=env, text=True)
+        amostras.append(json.loads(saida.strip().splitlines()[-1]))
+    return {
+        'importacao_ms': round(statistics.median(a['importacao_ms'] for a in amostras), 1),
+        'create_app_ms': round(statistics.median(a['create_app_ms'] for a in amostras), 1),
+        'rss_kb': int(statistics.median(a['rss_kb'] for a in amostras)),
+        'reportlab_carregado': amostras[0]['reportlab_carregado'],
+        'alembic_carregado': amostras[0]['alembic_carregado'],
+    }
+
+
+def maiores_importacoes(env, quantidade=10):
+    """Módulos de topo mais caros segundo python -X importtime."""
+    resultado = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app; app.create_app()'],
+        cwd=RAIZ, env=env, capture_output=True, text=True,
+    )
+    tempos = []
+    for linha in resultado.stderr.splitlines():
+        if not linha.startswith('import time:') or '|' not in linha:
+            continue
+        _, cumulativo, nome = linha.split('|')
+        # Importações diretas do app: um nível de recuo abaixo de "app"
+        if not nome.startswith('   ') or nome.startswith('    ') or not cumulativo.strip().isdigit():
+            continue
+        tempos.append((nome.strip(), int(cumulativo) / 1000))
+    return [{'modulo': n, 'ms': round(t, 1)} for n, t in sorted(tempos, key=lambda x: -x[1])[:quantidade]]
+
+
+def memoria(pid):
+    """(RSS, PSS) em KiB do processo."""
+    valores = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for linha in f:
+                partes = linha.split()
+                if partes[0] in ('Rss:', 'Pss:'):
+                    valores[partes[0]] = int(partes[1])
+    except FileNotFoundError:
+        return None, None
+    return valores.get('Rss:'), valores.get('Pss:')
+
+
+def filhos(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            return [int(p) for p in f.read().split()]
+    except FileNotFoundError:
+        return []
+
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def medir_gunicorn(workers, preload, env):
+    """Sobe o gunicorn, espera todos os workers responderem e mede boot e memória."""
+    porta = porta_livre()
+    comando = [sys.executable, '-m', 'gunicorn', '-w', str(workers), '-b', f'127.0.0.1:{porta}', 'app:app']
+    if preload:
+        comando.insert(3, '--preload')
+
+    inicio = time.perf_counter()
+    processo = subprocess.Popen(comando, cwd=RAIZ, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        pronto = None
+        while time.perf_counter() - inicio < 60:
+            try:
+                urllib.request.urlopen(f'http://127.0.0.1:{porta}/login', timeout=1).read()
+                if len(filhos(processo.pid)) >= workers:
+                    pronto = time.perf_counter() - inicio
+                    break
+            except OSError:
+                pass
+            time.sleep(0.05)
+        if pronto is None:
+            raise RuntimeError('gunicorn não respondeu em 60 s')
+
+        # Uma requisição por worker (aproximadamente) para carregar o caminho comum
+        for _ in range(workers * 2):
+            urllib.request.urlopen(f'http://127.0.0.1:{porta}/login').read()
+
+        rss_master, pss_master = memoria(processo.pid)
+        medidas = [memoria(pid) for pid in filhos(processo.pid)]
+        rss = [r for r, _ in medidas if r]
+        pss = [p for _, p in medidas if p]
+        return {
+            'preload': preload,
+            'workers': workers,
+            'boot_s': round(pronto, 2),
+            'rss_worker_kb': int(statistics.mean(rss)),
+            'pss_worker_kb': int(statistics.mean(pss)),
+            'pss_total_kb': sum(pss) + (pss_master or 0),
+            'rss_master_kb': rss_master,
+        }
+    finally:
+        processo.terminate()
+        processo.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-n', '--repeticoes', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--banco', default='sqlite:////tmp/mrx_bench_inicializacao.db')
+    parser.add_argument('-o', '--saida', help='Arquivo JSON de resultados.')
+    args = parser.parse_args()
+
+    env = dict(os.environ, DATABASE_URL=os.environ.get('DATABASE_URL', args.banco))
+    env.pop('PROMETHEUS_MULTIPROC_DIR', None)
+
+    importacao = medir_importacao(args.repeticoes, env)
+    print(f"import app: {importacao['importacao_ms']} ms | create_app: {importacao['create_app_ms']} ms "
+          f"| RSS {importacao['rss_kb']} KiB | reportlab carregado: {importacao['reportlab_carregado']} "
+          f"| alembic carregado: {importacao['alembic_carregado']}")
+
+    mais_caros = maiores_importacoes(env)
+    print('Importações mais caras:')
+    for item in mais_caros:
+        print(f"  {item['modulo']:<25} {item['ms']:>7.1f} ms")
+
+    gunicorn = []
+    try:
+        import gunicorn as _  # noqa: F401
+    except ImportError:
+        print('gunicorn não instalado; pulando medição dos workers.')
+    else:
+        for preload in (False, True):
+            resultado = medir_gunicorn(args.workers, preload, env)
+            gunicorn.append(resultado)
+            print(f"gunicorn preload={preload}: boot {resultado['boot_s']} s | "
+                  f"RSS/worker {resultado['rss_worker_kb']} KiB | PSS/worker {resultado['pss_worker_kb']} KiB | "
+                  f"PSS total {resultado['pss_total_kb']} KiB")
+
+    if args.saida:
+        with open(args.saida, 'w') as f:
+            json.dump({
+                'meta': {
+                    'data': datetime.now().isoformat(timespec='seconds'),
+                    'python': platform.python_version(),
+                    'repeticoes': args.repeticoes,
+                },
+                'importacao': importacao,
+                'importacoes_mais_caras': mais_caros,
+                'gunicorn': gunicorn,
+            }, f, indent=2, ensure_ascii=False)
+        print(f"\nResultados gravados em {args.saida}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""
+Benchmark dos rankings (rankings.py): p50/p95 de cada ranking sem cache
+(consulta com RANK/LAG sobre o cubo diário) e com o resultado em cache, e a
+mesma consulta de fornecedores feita direto na tabela compras como referência.
+
+Uso:
+    # banco com volume (ver flask gerar-dados; a meta é responder com 5M compras)
+    DATABASE_URL=sqlite:////tmp/carga.db python benchmarks/bench_rankings.py -n 50
+    DATABASE_URL=sqlite:////tmp/carga.db python benchmarks/bench_rankings.py -n 50 -o rankings.json
+
+Os períodos terminam em dias sorteados do último ano. A referência confere
+também se os fornecedores e as posições no período batem com os do cubo.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))]
+
+
+def resumo(tempos):
+    return {
+        'p50_ms': round(percentil(tempos, 50), 2),
+        'p95_ms': round(percentil(tempos, 95), 2),
+        'max_ms': round(max(tempos), 2),
+    }
+
+
+def ranking_direto(inicio, fim, medida, limite):
+    """Referência: ranking de fornecedores com RANK/LAG agrupando a tabela compras."""
+    from sqlalchemy import case, func, select
+    from database import sessao_leitura
+    from models import Compra
+
+    colunas = {'quantidade_kg': Compra.quantidade_kg, 'valor_total': Compra.valor_total,
+               'valor_comissao': Compra.valor_comissao, 'compras': Compra.id}
+    inicio_anterior = inicio - timedelta(days=(fim - inicio).days + 1)
+    ate = datetime.combine(fim + timedelta(days=1), datetime.min.time())
+    de = datetime.combine(inicio, datetime.min.time())
+    periodo = case((Compra.data >= de, 1), else_=0)
+    total = func.count(Compra.id) if medida == 'compras' else func.sum(colunas[medida])
+    totais = select(Compra.fornecedor_id, periodo.label('periodo'), total.label('total')).where(
+        Compra.status_aprovacao != 'rejeitada',
+        Compra.data >= datetime.combine(inicio_anterior, datetime.min.time()), Compra.data < ate,
+    ).group_by(Compra.fornecedor_id, periodo).subquery()
+    ranqueado = select(totais, func.rank().over(
+        partition_by=totais.c.periodo, order_by=totais.c.total.desc()).label('posicao')).subquery()
+    comparado = select(ranqueado, func.lag(ranqueado.c.posicao).over(
+        partition_by=ranqueado.c.fornecedor_id, order_by=ranqueado.c.periodo).label('anterior')).subquery()
+    return sessao_leitura().connection().execute(
+        select(comparado.c.fornecedor_id, comparado.c.posicao, comparado.c.anterior)
+        .where(comparado.c.periodo == 1, comparado.c.posicao <= limite).order_by(comparado.c.posicao)
+    ).all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-n', '--repeticoes', type=int, default=50, help='Consultas por cenário.')
+    parser.add_argument('--sem-referencia', action='store_true', help='Não mede a consulta direto em compras.')
+    parser.add_argument('--semente', type=int, default=7)
+    parser.add_argument('-o', '--saida', help='Arquivo JSON de resultados.')
+    args = parser.parse_args()
+
+    import rankings
+    from app import app
+    from models import db, Compra
+
+    cenarios_ranking = {
+        'fornecedores_kg_30d': (rankings.ranking_fornecedores, 30, 'quantidade_kg', 10),
+        'fornecedores_valor_90d': (rankings.ranking_fornecedores, 90, 'valor_total', 10),
+        'itens_top10_fornecedores_30d': (rankings.ranking_itens, 30, 'quantidade_kg', 5),
+        'compradores_comissao_30d': (rankings.ranking_compradores, 30, 'valor_comissao', 10),
+        'compradores_comissao_365d': (rankings.ranking_compradores, 365, 'valor_comissao', 10),
+    }
+    rnd = random.Random(args.semente)
+    cenarios = {}
+    # Contexto de requisição: o cache lê RANKING_CACHE_SEGUNDOS do app e as versões das tabelas
+    with app.test_request_context():
+        volumes = {'compras': db.session.query(db.func.count(Compra.id)).scalar()}
+        print(f"compras: {volumes['compras']}")
+        hoje = datetime.utcnow().date()
+
+        for nome, (funcao, dias, medida, limite) in cenarios_ranking.items():
+            periodos = []
+            for _ in range(args.repeticoes):
+                fim = hoje - timedelta(days=rnd.randrange(365))
+                periodos.append((fim - timedelta(days=dias - 1), fim))
+
+            frio, quente = [], []
+            for inicio, fim in periodos:
+                rankings._cache.clear()
+                t0 = time.perf_counter()
+                funcao(inicio, fim, medida, limite)
+                frio.append((time.perf_counter() - t0) * 1000)
+                t0 = time.perf_counter()
+                funcao(inicio, fim, medida, limite)
+                quente.append((time.perf_counter() - t0) * 1000)
+            cenario = {'sem_cache': resumo(frio), 'com_cache': resumo(quente)}
+            linha = (f"{nome:<30} sem cache p50 {cenario['sem_cache']['p50_ms']:>8.2f} ms | "
+                     f"p95 {cenario['sem_cache']['p95_ms']:>8.2f} ms || com cache p50 "
+                     f"{cenario['com_cache']['p50_ms']:>6.3f} ms")
+
+            if funcao is rankings.ranking_fornecedores and not args.sem_referencia:
+                tempos, divergencias = [], 0
+                for inicio, fim in periodos[:max(1, args.repeticoes // 5)]:
+                    t0 = time.perf_counter()
+                    esperado = ranking_direto(inicio, fim, medida, limite)
+                    tempos.append((time.perf_counter() - t0) * 1000)
+                    obtido = funcao(inicio, fim, medida, limite)
+                    # Posição anterior fica de fora: somas em ordem diferente desempatam diferente
+                    divergencias += [(l['fornecedor_id'], l['posicao']) for l in obtido] \
+                        != [(linha.fornecedor_id, linha.posicao) for linha in esperado]
+                cenario['direto_em_compras'] = resumo(tempos)
+                cenario['divergencias'] = divergencias
+                linha += (f" || direto p50 {cenario['direto_em_compras']['p50_ms']:>8.2f} ms"
+                          f" | divergências {divergencias}")
+            cenarios[nome] = cenario
+            print(linha)
+
+        banco = db.engine.url.render_as_string(hide_password=True)
+
+    if args.saida:
+        with open(args.saida, 'w') as f:
+            json.dump({
+                'meta': {
+                    'data': datetime.now().isoformat(timespec='seconds'),
+                    'banco': banco,
+                    'volumes': volumes,
+                    'python': platform.python_version(),
+                    'repeticoes': args.repeticoes,
+                },
+                'cenarios': cenarios,
+            }, f, indent=2, ensure_ascii=False)
+        print(f"\nResultados gravados em {args.saida}")
+
+
+if __name__ == '__main__':
+    main()
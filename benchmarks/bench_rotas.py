@@ -0,0 +1,298 @@
+"""
+Benchmark de latência por rota: percorre todas as rotas GET do app.py (e a API
+do scanner) e grava p50/p95/p99, consultas SQL por requisição e RSS em JSON.
+
+Uso:
+    # banco com volume (ver flask gerar-dados)
+    DATABASE_URL=sqlite:////tmp/carga.db python benchmarks/bench_rotas.py -n 50 -o resultados.json
+
+    # contra um gunicorn local já rodando (sem contagem de consultas)
+    python benchmarks/bench_rotas.py --url http://127.0.0.1:8000 -o resultados.json
+
+    # comparar com uma execução anterior
+    python benchmarks/bench_rotas.py -n 50 --comparar resultados_antigos.json
+"""
+
+import argparse
+import http.cookiejar
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+EMAIL_BENCH = 'benchmark@mrx.com.br'
+SENHA_BENCH = 'Benchmark@123'
+
+# Rotas que geram arquivos grandes: limitadas a poucas repetições
+ROTAS_PESADAS = {'exportar_compras_pdf', 'exportar_despesas_pdf'}
+
+
+def rss_kb(pids=None):
+    """RSS atual (KiB) deste processo ou da soma dos PIDs informados."""
+    total = 0
+    for pid in pids or ['self']:
+        try:
+            with open(f'/proc/{pid}/status') as f:
+                for linha in f:
+                    if linha.startswith('VmRSS:'):
+                        total += int(linha.split()[1])
+        except FileNotFoundError:
+            continue
+    if not total and not pids:
+        total = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return total
+
+
+def pids_gunicorn():
+    pids = []
+    for pid in filter(str.isdigit, os.listdir('/proc')):
+        try:
+            with open(f'/proc/{pid}/cmdline', 'rb') as f:
+                if b'gunicorn' in f.read():
+                    pids.append(pid)
+        except OSError:
+            continue
+    return pids
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    if not ordenados:
+        return None
+    k = (len(ordenados) - 1) * p / 100
+    i = int(k)
+    j = min(i + 1, len(ordenados) - 1)
+    return ordenados[i] + (ordenados[j] - ordenados[i]) * (k - i)
+
+
+class ClienteTeste:
+    """Executa as rotas in-process pelo test client do Flask, contando consultas SQL."""
+
+    def __init__(self, app):
+        from sqlalchemy import event
+        from models import db
+
+        # Erros viram respostas 500 medidas, mesmo com DEBUG ligado
+        app.config['PROPAGATE_EXCEPTIONS'] = False
+        self.app = app
+        self.client = app.test_client()
+        self.consultas = 0
+
+        def contar(*args, **kwargs):
+            self.consultas += 1
+
+        with app.app_context():
+            for engine in db.engines.values():
+                event.listen(engine, 'before_cursor_execute', contar)
+
+    def login(self):
+        self.client.post('/login', data={'email': EMAIL_BENCH, 'senha': SENHA_BENCH})
+
+    def requisitar(self, metodo, url, json_corpo=None):
+        self.consultas = 0
+        resposta = self.client.open(url, method=metodo, json=json_corpo)
+        resposta.get_data()
+        return resposta.status_code, self.consultas
+
+    def rss(self):
+        return rss_kb()
+
+
+class ClienteHTTP:
+    """Executa as rotas contra um servidor (ex.: gunicorn local) via HTTP."""
+
+    def __init__(self, base):
+        self.base = base.rstrip('/')
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+        )
+
+    def login(self):
+        dados = urllib.parse.urlencode({'email': EMAIL_BENCH, 'senha': SENHA_BENCH}).encode()
+        self.opener.open(self.base + '/login', data=dados).read()
+
+    def requisitar(self, metodo, url, json_corpo=None):
+        dados = json.dumps(json_corpo).encode() if json_corpo is not None else None
+        req = urllib.request.Request(self.base + url, data=dados, method=metodo)
+        if dados is not None:
+            req.add_header('Content-Type', 'application/json')
+        try:
+            with self.opener.open(req) as resposta:
+                resposta.read()
+                return resposta.status, None
+        except urllib.error.HTTPError as erro:
+            return erro.code, None
+
+    def rss(self):
+        return rss_kb(pids_gunicorn()) or None
+
+
+def preparar_usuario_e_amostras(app):
+    """Garante o usuário admin do benchmark e escolhe IDs de exemplo para as rotas com parâmetros."""
+    from models import db, Usuario, RoleEnum, Funcionario, Fornecedor, Compra, Despesa, TabelaPreco
+
+    with app.app_context():
+        db.create_all()
+        usuario = Usuario.query.filter_by(email=EMAIL_BENCH).first()
+        if not usuario:
+            usuario = Usuario(nome='Benchmark', email=EMAIL_BENCH, papel=RoleEnum.ADMIN)
+            usuario.set_password(SENHA_BENCH)
+            db.session.add(usuario)
+            db.session.commit()
+
+        def primeiro(modelo):
+            return db.session.query(db.func.min(modelo.id)).scalar()
+
+        peca = TabelaPreco.query.filter(TabelaPreco.codigo_barras.isnot(None)).first()
+        return {
+            'funcionario': primeiro(Funcionario),
+            'fornecedor': primeiro(Fornecedor),
+            'compra': primeiro(Compra),
+            'despesa': primeiro(Despesa),
+            'usuario': usuario.id,
+            'comprador': usuario.id,
+            'comissao': usuario.id,
+            'tabela': primeiro(TabelaPreco),
+            'peca': {'codigo_barras': peca.codigo_barras, 'fornecedor_id': peca.fornecedor_id} if peca else None,
+        }
+
+
+def montar_rotas(app, amostras):
+    """Lista (endpoint, método, url, corpo) para cada rota do app com GET."""
+    rotas = []
+    for regra in sorted(app.url_map.iter_rules(), key=lambda r: r.rule):
+        if regra.endpoint in ('static', 'logout') or 'GET' not in regra.methods:
+            continue
+
+        valores = {}
+        for argumento in regra.arguments:
+            if argumento == 'id':
+                chave = next((k for k in amostras if k in regra.endpoint), None)
+            else:
+                chave = argumento.replace('_id', '')
+            valor = amostras.get(chave) if chave else None
+            if valor is None:
+                break
+            valores[argumento] = valor
+        else:
+            with app.test_request_context():
+                from flask import url_for
+                rotas.append((regra.endpoint, 'GET', url_for(regra.endpoint, **valores), None))
+
+    if amostras.get('peca'):
+        rotas.append(('api_validar_peca', 'POST', '/api/validar-peca', amostras['peca']))
+    return rotas
+
+
+def executar(cliente, rotas, repeticoes, aquecimento):
+    resultados = {}
+    for endpoint, metodo, url, corpo in rotas:
+        pesada = endpoint in ROTAS_PESADAS
+        n = max(1, repeticoes // 10) if pesada else repeticoes
+        for _ in range(0 if pesada else aquecimento):
+            cliente.requisitar(metodo, url, corpo)
+
+        latencias, consultas, status = [], [], {}
+        for _ in range(n):
+            inicio = time.perf_counter()
+            codigo, qtd = cliente.requisitar(metodo, url, corpo)
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            status[codigo] = status.get(codigo, 0) + 1
+            if qtd is not None:
+                consultas.append(qtd)
+
+        resultados[f'{metodo} {url}'] = {
+            'endpoint': endpoint,
+            'n': n,
+            'status': status,
+            'p50_ms': round(percentil(latencias, 50), 2),
+            'p95_ms': round(percentil(latencias, 95), 2),
+            'p99_ms': round(percentil(latencias, 99), 2),
+            'media_ms': round(sum(latencias) / n, 2),
+            'consultas_por_requisicao': round(sum(consultas) / len(consultas), 1) if consultas else None,
+            'rss_kb': cliente.rss(),
+        }
+        print(
+            f"{metodo:<4} {url:<45} p50={resultados[f'{metodo} {url}']['p50_ms']:>8.1f}ms "
+            f"p95={resultados[f'{metodo} {url}']['p95_ms']:>8.1f}ms "
+            f"sql={resultados[f'{metodo} {url}']['consultas_por_requisicao']} status={status}"
+        )
+    return resultados
+
+
+def comparar(atual, arquivo_anterior):
+    with open(arquivo_anterior) as f:
+        anterior = json.load(f)['rotas']
+    print(f"\nComparação com {arquivo_anterior} (p95):")
+    for chave, dados in atual.items():
+        if chave in anterior:
+            antes, depois = anterior[chave]['p95_ms'], dados['p95_ms']
+            variacao = (depois - antes) / antes * 100 if antes else 0
+            print(f"  {chave:<50} {antes:>8.1f} -> {depois:>8.1f} ms ({variacao:+.0f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-n', '--repeticoes', type=int, default=30)
+    parser.add_argument('--aquecimento', type=int, default=2)
+    parser.add_argument('--url', help='Servidor em execução (ex.: gunicorn local); padrão: test client.')
+    parser.add_argument('-o', '--saida', help='Arquivo JSON de resultados.')
+    parser.add_argument('--comparar', help='JSON de uma execução anterior para comparar.')
+    args = parser.parse_args()
+
+    from app import app
+    from models import db, Compra, Fornecedor, TabelaPreco
+
+    amostras = preparar_usuario_e_amostras(app)
+    rotas = montar_rotas(app, amostras)
+    cliente = ClienteHTTP(args.url) if args.url else ClienteTeste(app)
+    cliente.login()
+
+    with app.app_context():
+        volumes = {
+            'compras': Compra.query.count(),
+            'fornecedores': Fornecedor.query.count(),
+            'tabela_precos': TabelaPreco.query.count(),
+        }
+        banco = db.engine.url.render_as_string(hide_password=True)
+
+    resultados = executar(cliente, rotas, args.repeticoes, args.aquecimento)
+
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    relatorio = {
+        'meta': {
+            'data': datetime.now().isoformat(timespec='seconds'),
+            'commit': commit,
+            'modo': 'http' if args.url else 'test_client',
+            'banco': banco,
+            'volumes': volumes,
+            'python': platform.python_version(),
+            'repeticoes': args.repeticoes,
+        },
+        'rotas': resultados,
+    }
+
+    if args.saida:
+        with open(args.saida, 'w') as f:
+            json.dump(relatorio, f, indent=2, ensure_ascii=False)
+        print(f"\nResultados gravados em {args.saida}")
+
+    if args.comparar:
+        comparar(resultados, args.comparar)
+
+
+if __name__ == '__main__':
+    main()
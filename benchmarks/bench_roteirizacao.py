@@ -0,0 +1,91 @@
+"""
+Benchmark da roteirização (roteirizacao.py): tempo e distância com paradas
+sorteadas em volta de São Paulo, sem banco de dados.
+
+Uso:
+    python benchmarks/bench_roteirizacao.py
+    python benchmarks/bench_roteirizacao.py --paradas 500 1000 --caminhoes 4 -o rotas.json
+
+A meta é resolver 500 paradas em poucos segundos num núcleo.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+DEPOSITO = (-23.53, -46.62)
+
+
+def comprimento(distancias, rotas):
+    total = 0.0
+    for rota in rotas:
+        caminho = [0, *(parada + 1 for parada in rota), 0]
+        total += sum(distancias[a, b] for a, b in zip(caminho, caminho[1:]))
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--paradas', type=int, nargs='+', default=[100, 250, 500])
+    parser.add_argument('--caminhoes', type=int, default=1)
+    parser.add_argument('--capacidade-kg', type=float, default=None,
+                        help='Padrão: carga total dividida pelos caminhões, com 15%% de folga.')
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('-o', '--saida', help='Arquivo JSON de resultados.')
+    args = parser.parse_args()
+
+    import numpy as np
+    from roteirizacao import _vizinho_mais_proximo, matriz_distancias, otimizar_rotas
+
+    rng = np.random.default_rng(args.semente)
+    resultados = []
+    for n in args.paradas:
+        latitudes = DEPOSITO[0] + rng.normal(0, 0.12, n)
+        longitudes = DEPOSITO[1] + rng.normal(0, 0.12, n)
+        pesos = np.round(rng.lognormal(3.5, 1.0, n), 1)
+        capacidade = args.capacidade_kg or pesos.sum() / args.caminhoes * 1.15
+
+        inicio = time.perf_counter()
+        rotas, sobra = otimizar_rotas(DEPOSITO, latitudes, longitudes, pesos, args.caminhoes, capacidade)
+        segundos = time.perf_counter() - inicio
+
+        # Referência: só o vizinho mais próximo, sem 2-opt
+        distancias = matriz_distancias([DEPOSITO[0], *latitudes], [DEPOSITO[1], *longitudes])
+        iniciais, _ = _vizinho_mais_proximo(distancias, np.array([0.0, *pesos]), capacidade, args.caminhoes)
+        km_vizinho = comprimento(distancias, [[p - 1 for p in rota] for rota in iniciais])
+        km_final = comprimento(distancias, rotas)
+
+        resultados.append({
+            'paradas': n,
+            'caminhoes': len(rotas),
+            'nao_atendidas': len(sobra),
+            'segundos': round(segundos, 3),
+            'km_vizinho_mais_proximo': round(km_vizinho, 1),
+            'km_2opt': round(km_final, 1),
+            'reducao_pct': round(100 * (1 - km_final / km_vizinho), 1) if km_vizinho else 0.0,
+        })
+        r = resultados[-1]
+        print(f"{n:>5} paradas: {r['segundos']:>6.2f} s | vizinho mais próximo {r['km_vizinho_mais_proximo']:>8.1f} km "
+              f"-> 2-opt {r['km_2opt']:>8.1f} km ({r['reducao_pct']}% menor) | não atendidas {r['nao_atendidas']}")
+
+    if args.saida:
+        with open(args.saida, 'w') as f:
+            json.dump({
+                'meta': {
+                    'data': datetime.now().isoformat(timespec='seconds'),
+                    'python': platform.python_version(),
+                    'caminhoes': args.caminhoes,
+                },
+                'resultados': resultados,
+            }, f, indent=2, ensure_ascii=False)
+        print(f"\nResultados gravados em {args.saida}")
+
+
+if __name__ == '__main__':
+    main()
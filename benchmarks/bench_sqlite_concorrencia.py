@@ -0,0 +1,113 @@
+"""
+Benchmark de concorrência do SQLite: leituras e escritas misturadas em vários
+processos (simulando os workers do Gunicorn), com e sem o perfil de produção.
+
+Uso:
+    python benchmarks/bench_sqlite_concorrencia.py --workers 9 --segundos 10
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config import ProductionConfig  # noqa: E402
+from database import aplicar_pragmas_sqlite  # noqa: E402
+
+
+def preparar_banco(caminho, linhas):
+    conn = sqlite3.connect(caminho)
+    conn.execute(
+        "CREATE TABLE compras (id INTEGER PRIMARY KEY, fornecedor_id INTEGER, "
+        "valor_total FLOAT, data DATETIME DEFAULT CURRENT_TIMESTAMP)"
+    )
+    conn.execute("CREATE INDEX idx_compras_fornecedor ON compras(fornecedor_id)")
+    conn.executemany(
+        "INSERT INTO compras (fornecedor_id, valor_total) VALUES (?, ?)",
+        ((random.randint(1, 200), random.uniform(10, 5000)) for _ in range(linhas)),
+    )
+    conn.commit()
+    conn.close()
+
+
+def worker(caminho, pragmas, segundos, proporcao_escrita, fila):
+    conn = sqlite3.connect(caminho)  # timeout padrão de 5 s, como no SQLAlchemy
+    if pragmas:
+        aplicar_pragmas_sqlite(conn, pragmas)
+
+    leituras = escritas = bloqueios = 0
+    fim = time.perf_counter() + segundos
+    while time.perf_counter() < fim:
+        try:
+            if random.random() < proporcao_escrita:
+                conn.execute(
+                    "INSERT INTO compras (fornecedor_id, valor_total) VALUES (?, ?)",
+                    (random.randint(1, 200), random.uniform(10, 5000)),
+                )
+                conn.commit()
+                escritas += 1
+            else:
+                conn.execute(
+                    "SELECT count(*), sum(valor_total) FROM compras WHERE fornecedor_id = ?",
+                    (random.randint(1, 200),),
+                ).fetchone()
+                leituras += 1
+        except sqlite3.OperationalError as erro:
+            if 'locked' not in str(erro):
+                raise
+            conn.rollback()
+            bloqueios += 1
+    conn.close()
+    fila.put((leituras, escritas, bloqueios))
+
+
+def executar(nome, pragmas, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        caminho = os.path.join(tmp, 'bench.db')
+        preparar_banco(caminho, args.linhas)
+
+        fila = multiprocessing.Queue()
+        processos = [
+            multiprocessing.Process(
+                target=worker,
+                args=(caminho, pragmas, args.segundos, args.escrita, fila),
+            )
+            for _ in range(args.workers)
+        ]
+        for p in processos:
+            p.start()
+        resultados = [fila.get() for _ in processos]
+        for p in processos:
+            p.join()
+
+    leituras = sum(r[0] for r in resultados)
+    escritas = sum(r[1] for r in resultados)
+    bloqueios = sum(r[2] for r in resultados)
+    print(
+        f"{nome:<10} leituras/s={leituras / args.segundos:>9.0f}  "
+        f"escritas/s={escritas / args.segundos:>7.0f}  "
+        f"'database is locked'={bloqueios}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count() * 2 + 1)
+    parser.add_argument('--segundos', type=float, default=10.0)
+    parser.add_argument('--linhas', type=int, default=100_000)
+    parser.add_argument('--escrita', type=float, default=0.2, help='proporção de escritas (0-1)')
+    args = parser.parse_args()
+
+    print(f"{args.workers} workers, {args.segundos:.0f}s, {args.escrita:.0%} escritas, {args.linhas} linhas iniciais")
+    executar('padrão', {}, args)
+    executar('produção', ProductionConfig.SQLITE_PRAGMAS, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Cache dos templates Jinja: bytecode compilado em disco e fragmentos de HTML.
+
+O bytecode de cada template vai para TEMPLATES_CACHE_PASTA
+(FileSystemBytecodeCache, gravação atômica): os workers do gunicorn e os
+reinícios reaproveitam a compilação em vez de refazê-la. A chave inclui o
+checksum do fonte, então um template alterado é recompilado. O deploy
+preenche a pasta antes de subir os workers (flask compilar-templates).
+
+A tag {% cache %} guarda o HTML de um trecho caro de renderizar:
+
+    {% cache 'ultimas_compras' por 'compras', 'fornecedores' %} ... {% endcache %}
+    {% cache 'tabela_precos', fornecedor.id por 'tabela_precos' %} ... {% endcache %}
+
+Depois do nome vêm as chaves que distinguem as variações do trecho (valores
+hasheáveis) e, depois de `por`, as tabelas lidas por ele. O trecho fica num
+cache do processo por até FRAGMENTOS_CACHE_SEGUNDOS e é refeito antes disso
+se a versão de alguma das tabelas mudar (versoes.py). Consultas feitas
+dentro do trecho (objetos Query passados sem .all()) só rodam quando ele é
+renderizado de novo.
+"""
+
+import os
+import threading
+import time
+import uuid
+from flask import current_app, g
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+from versoes import obter_versoes
+
+MAX_ENTRADAS_CACHE = 512
+
+_cache = {}
+_trava = threading.Lock()  # as threads do worker (gthread) inserem e despejam no mesmo dict
+
+
+def _versoes(tabelas):
+    """Versões das tabelas, lidas uma vez por requisição para todos os fragmentos da página."""
+    conhecidas = g.setdefault('versoes_fragmentos', {})
+    faltando = [tabela for tabela in tabelas if tabela not in conhecidas]
+    if faltando:
+        versoes = obter_versoes(*faltando)
+        conhecidas.update({tabela: versoes.get(tabela, (0, None))[0] for tabela in faltando})
+    return tuple(conhecidas[tabela] for tabela in tabelas)
+
+
+class FragmentoCache(Extension):
+    """Tag {% cache nome[, chave...] [por tabela, ...] %} ... {% endcache %}."""
+
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        chaves = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            chaves.append(parser.parse_expression())
+        tabelas = []
+        if parser.stream.skip_if('name:por'):
+            tabelas.append(parser.parse_expression())
+            while parser.stream.skip_if('comma'):
+                tabelas.append(parser.parse_expression())
+        corpo = parser.parse_statements(['name:endcache'], drop_needle=True)
+        # Muda a cada compilação: template editado (auto_reload) não reaproveita o HTML antigo
+        origem = nodes.Const(f'{parser.name}:{lineno}:{uuid.uuid4().hex[:8]}')
+        return nodes.CallBlock(
+            self.call_method('_renderizar', [origem, nodes.List(chaves), nodes.List(tabelas)]), [], [], corpo,
+        ).set_lineno(lineno)
+
+    def _renderizar(self, origem, chaves, tabelas, caller):
+        segundos = current_app.config.get('FRAGMENTOS_CACHE_SEGUNDOS', 300)
+        if segundos <= 0:
+            return caller()
+        chave = (origem, tuple(chaves))
+        versoes = _versoes(tabelas)
+        agora = time.monotonic()
+        entrada = _cache.get(chave)
+        if entrada is not None and entrada[0] > agora and entrada[1] == versoes:
+            return entrada[2]
+        html = caller()
+        with _trava:
+            _cache.pop(chave, None)
+            _cache[chave] = (agora + segundos, versoes, html)
+            while len(_cache) > MAX_ENTRADAS_CACHE:
+                _cache.pop(next(iter(_cache)), None)  # o mais antigo
+        return html
+
+
+def compilar_templates(app):
+    """Compila todos os templates, gravando o bytecode na pasta do cache. Retorna quantos."""
+    nomes = [nome for nome in app.jinja_env.list_templates() if nome.endswith('.html')]
+    for nome in nomes:
+        app.jinja_env.get_template(nome)
+    return len(nomes)
+
+
+def configurar_cache_templates(app):
+    """Liga o cache de bytecode em disco e a tag {% cache %} nos templates."""
+    pasta = app.config.get('TEMPLATES_CACHE_PASTA')
+    if pasta:
+        os.makedirs(pasta, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(pasta)
+    app.jinja_env.add_extension(FragmentoCache)
@@ -0,0 +1,258 @@
+"""
+Comandos de linha de comando (flask <comando>) para manutenção do sistema.
+"""
+
+import os
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from models import db
+from database import otimizar_banco
+from dados_sinteticos import gerar_dados
+from estaticos import construir_estaticos
+from cache_templates import compilar_templates
+from geo import preencher_geohash
+from agregados import reconstruir_cubo, reconstruir_grid
+from historico_precos import sincronizar_historico
+from anomalias import JANELA_DIAS, recalcular_estatisticas
+from previsao import HORIZONTE_MESES, MESES_HISTORICO, recalcular_previsoes
+from arquivo import arquivar
+from importacao import ImportacaoError, importar_fornecedores
+from versoes import marcar_alteracao
+from backup import (
+    BackupError, backup_completo, backup_incremental, aplicar_retencao, restaurar_backup
+)
+
+
+@click.command('atualizar-esquema')
+@with_appcontext
+def atualizar_esquema_command():
+    """Cria as tabelas novas do models.py (colunas novas: ver SQL_NOVAS_TABELAS.sql)."""
+    db.create_all()
+    click.echo('Tabelas verificadas/criadas.')
+
+
+@click.command('otimizar-banco')
+@with_appcontext
+def otimizar_banco_command():
+    """Checkpoint do WAL e PRAGMA optimize (agendado via systemd timer)."""
+    if db.engine.dialect.name != 'sqlite':
+        click.echo('Banco não é SQLite; nada a fazer.')
+        return
+
+    # Com o backup incremental o checkpoint é dele: aqui reiniciaria o WAL e quebraria a cadeia
+    incremental = current_app.config.get('BACKUP_INCREMENTAL', False)
+    resultado = otimizar_banco(checkpoint=not incremental)
+    if resultado is None:
+        click.echo('PRAGMA optimize executado; checkpoint do WAL fica com o backup-banco --incremental.')
+        return
+
+    busy, paginas_wal, paginas_copiadas = resultado
+    if busy:
+        click.echo(f'Checkpoint parcial: {paginas_copiadas}/{paginas_wal} páginas (leitores ativos).')
+    else:
+        click.echo(f'Checkpoint concluído: {paginas_copiadas} páginas copiadas; PRAGMA optimize executado.')
+
+
+@click.command('backup-banco')
+@click.option('--incremental', is_flag=True, help='Envia só os frames novos do WAL desde o último backup.')
+@click.option('--destino', default=None, help='Pasta de destino (padrão: BACKUP_FOLDER).')
+@with_appcontext
+def backup_banco_command(incremental, destino):
+    """Backup online do SQLite: cópia em passos, compactação, verificação e retenção."""
+    if db.engine.dialect.name != 'sqlite':
+        raise click.ClickException('backup-banco só suporta SQLite; use pg_dump para PostgreSQL.')
+
+    config = current_app.config
+    caminho_db = db.engine.url.database
+    pasta = destino or config['BACKUP_FOLDER']
+    passo = (config['BACKUP_PAGINAS_POR_PASSO'], config['BACKUP_PAUSA'], config['BACKUP_MAX_REINICIOS'])
+
+    try:
+        if incremental:
+            caminho, completo = backup_incremental(caminho_db, pasta, *passo)
+        else:
+            caminho, completo = backup_completo(caminho_db, pasta, *passo), True
+    except BackupError as erro:
+        raise click.ClickException(str(erro))
+
+    if caminho is None:
+        click.echo('Nenhuma alteração desde o último backup.')
+    elif completo:
+        click.echo(f'Backup completo verificado: {caminho}')
+    else:
+        click.echo(f'Segmento incremental: {caminho}')
+
+    for arquivo in aplicar_retencao(pasta, config['BACKUP_RETENTION_DAYS']):
+        click.echo(f'Removido pela retenção: {arquivo}')
+
+
+@click.command('restaurar-banco')
+@click.argument('arquivo')
+@click.argument('destino')
+def restaurar_banco_command(arquivo, destino):
+    """Restaura ARQUIVO (.db.gz) e seus segmentos incrementais em DESTINO."""
+    try:
+        segmentos = restaurar_backup(arquivo, destino)
+    except BackupError as erro:
+        raise click.ClickException(str(erro))
+    click.echo(f'Banco restaurado em {destino} ({segmentos} segmentos de WAL aplicados).')
+
+
+@click.command('gerar-dados')
+@click.option('--compradores', default=20, show_default=True)
+@click.option('--fornecedores', default=10000, show_default=True)
+@click.option('--itens-por-fornecedor', default=5, show_default=True)
+@click.option('--compras', default=100000, show_default=True)
+@click.option('--despesas', default=10000, show_default=True)
+@click.option('--dias', default=3 * 365, show_default=True, help='Janela de datas das compras/despesas.')
+@click.option('--lote', default=5000, show_default=True, help='Registros por INSERT/commit.')
+@click.option('--semente', default=42, show_default=True)
+@with_appcontext
+def gerar_dados_command(compradores, fornecedores, itens_por_fornecedor, compras, despesas, dias, lote, semente):
+    """Gera dados sintéticos em volume para testes de carga (não use em produção)."""
+    db.create_all()
+    contagens = gerar_dados(
+        compradores=compradores, fornecedores=fornecedores,
+        itens_por_fornecedor=itens_por_fornecedor, compras=compras, despesas=despesas,
+        dias=dias, tamanho_lote=lote, semente=semente, progresso=click.echo,
+    )
+    click.echo(f'Dados gerados: {contagens}')
+
+
+@click.command('build-static')
+@with_appcontext
+def build_static_command():
+    """Gera static/dist: nomes com hash, .gz/.br, PNG/WebP otimizados e manifest.json."""
+    manifesto, bytes_origem, bytes_dist = construir_estaticos(current_app.static_folder)
+    for original, com_hash in sorted(manifesto['arquivos'].items()):
+        click.echo(f'{original} -> dist/{com_hash}')
+    if not manifesto['brotli']:
+        click.echo('Módulo brotli não instalado: variantes .br não geradas.')
+    click.echo(f'{len(manifesto["arquivos"])} arquivos: {bytes_origem // 1024} KiB -> {bytes_dist // 1024} KiB. '
+               'Reinicie a aplicação para carregar o novo manifesto.')
+
+
+@click.command('compilar-templates')
+@with_appcontext
+def compilar_templates_command():
+    """Grava o bytecode de todos os templates em TEMPLATES_CACHE_PASTA (antes de subir os workers)."""
+    if not current_app.config.get('TEMPLATES_CACHE_PASTA'):
+        raise click.ClickException('TEMPLATES_CACHE_PASTA não configurada.')
+    quantidade = compilar_templates(current_app)
+    click.echo(f"{quantidade} templates compilados em {current_app.config['TEMPLATES_CACHE_PASTA']}.")
+
+
+@click.command('preencher-geohash')
+@click.option('--todos', is_flag=True, help='Recalcula também as compras que já têm geohash.')
+@click.option('--lote', default=5000, show_default=True, help='Registros por UPDATE/commit.')
+@with_appcontext
+def preencher_geohash_command(todos, lote):
+    """Preenche compras.geohash (compras antigas ou gravadas fora do ORM)."""
+    total = preencher_geohash(todos=todos, tamanho_lote=lote)
+    click.echo(f'{total} compras com geohash atualizado.')
+    if total:
+        # O mapa de calor agrega por geohash: compras que ganharam um entram agora
+        click.echo(f'{reconstruir_grid()} células diárias do mapa de calor recalculadas.')
+
+
+@click.command('reconstruir-grid')
+@click.option('--inicio', type=click.DateTime(formats=['%Y-%m-%d']), default=None, help='Primeiro dia (AAAA-MM-DD).')
+@click.option('--fim', type=click.DateTime(formats=['%Y-%m-%d']), default=None, help='Último dia (AAAA-MM-DD).')
+@with_appcontext
+def reconstruir_grid_command(inicio, fim):
+    """Recalcula compras_grid_dia (mapa de calor) após cargas em lote fora do ORM."""
+    total = reconstruir_grid(inicio.date() if inicio else None, fim.date() if fim else None)
+    click.echo(f'{total} células diárias gravadas.')
+
+
+@click.command('reconstruir-cubo')
+@click.option('--inicio', type=click.DateTime(formats=['%Y-%m-%d']), default=None, help='Primeiro dia (AAAA-MM-DD).')
+@click.option('--fim', type=click.DateTime(formats=['%Y-%m-%d']), default=None, help='Último dia (AAAA-MM-DD).')
+@with_appcontext
+def reconstruir_cubo_command(inicio, fim):
+    """Recalcula compras_cubo_dia (API analítica) após cargas em lote fora do ORM."""
+    total = reconstruir_cubo(inicio.date() if inicio else None, fim.date() if fim else None)
+    click.echo(f'{total} linhas diárias do cubo gravadas.')
+
+
+@click.command('sincronizar-historico-precos')
+@with_appcontext
+def sincronizar_historico_precos_command():
+    """Registra no histórico os preços atuais que ainda não estão lá (itens antigos, cargas em lote)."""
+    total = sincronizar_historico(db.session.connection())
+    if total:
+        marcar_alteracao('tabela_precos')
+    db.session.commit()
+    click.echo(f'{total} intervalos de preço abertos no histórico.')
+
+
+@click.command('recalcular-anomalias')
+@click.option('--janela-dias', default=JANELA_DIAS, show_default=True, help='Dias de histórico considerados.')
+@with_appcontext
+def recalcular_anomalias_command(janela_dias):
+    """Recalcula a mediana/MAD por item e comprador usadas para notar compras novas."""
+    grupos = recalcular_estatisticas(janela_dias)
+    click.echo(f"Estatísticas gravadas: {grupos['item']} itens, {grupos['comprador']} compradores.")
+
+
+@click.command('recalcular-previsoes')
+@click.option('--horizonte', default=HORIZONTE_MESES, show_default=True, help='Meses previstos (a partir do atual).')
+@click.option('--meses-historico', default=MESES_HISTORICO, show_default=True, help='Meses fechados usados no ajuste.')
+@with_appcontext
+def recalcular_previsoes_command(horizonte, meses_historico):
+    """Reajusta os modelos de volume mensal e grava as previsões por item, fornecedor e total."""
+    series = recalcular_previsoes(horizonte, meses_historico)
+    click.echo(f"Previsões gravadas: {series['item']} itens, {series['fornecedor']} fornecedores, "
+               f"{series['total']} total.")
+
+
+@click.command('arquivar')
+@click.option('--horizonte-dias', default=None, type=int, help='Padrão: ARQUIVO_HORIZONTE_DIAS.')
+@with_appcontext
+def arquivar_command(horizonte_dias):
+    """Move compras e despesas antigas para as tabelas de arquivo, um mês por transação."""
+    try:
+        movidas = arquivar(horizonte_dias or current_app.config['ARQUIVO_HORIZONTE_DIAS'])
+    except ValueError as erro:
+        raise click.ClickException(str(erro))
+    click.echo(f"Arquivadas: {movidas['compras']} compras, {movidas['despesas']} despesas.")
+
+
+@click.command('importar-fornecedores')
+@click.argument('arquivo', type=click.Path(exists=True, dir_okay=False))
+@click.option('--ignorar-erros', is_flag=True, help='Importa as linhas válidas mesmo com linhas recusadas.')
+@with_appcontext
+def importar_fornecedores_command(arquivo, ignorar_erros):
+    """Cria ou atualiza (pelo CNPJ/CPF) os fornecedores de um CSV/XLSX."""
+    pasta = current_app.config['IMPORTACAO_PASTA']
+    try:
+        with open(arquivo, 'rb') as stream:
+            resultado = importar_fornecedores(stream, os.path.basename(arquivo), pasta, ignorar_erros)
+    except ImportacaoError as erro:
+        raise click.ClickException(str(erro))
+    click.echo(f"{resultado['linhas']} linhas: {resultado['inseridos']} fornecedores novos, "
+               f"{resultado['atualizados']} atualizados, {resultado['total_erros']} recusadas.")
+    if resultado['relatorio']:
+        click.echo(f"Recusadas: {os.path.join(pasta, resultado['relatorio'])}")
+        if not ignorar_erros:
+            raise click.ClickException('Nada foi gravado (use --ignorar-erros para importar as linhas válidas).')
+
+
+def registrar_comandos(app):
+    """Registra os comandos CLI na aplicação."""
+    app.cli.add_command(atualizar_esquema_command)
+    app.cli.add_command(otimizar_banco_command)
+    app.cli.add_command(backup_banco_command)
+    app.cli.add_command(restaurar_banco_command)
+    app.cli.add_command(gerar_dados_command)
+    app.cli.add_command(build_static_command)
+    app.cli.add_command(compilar_templates_command)
+    app.cli.add_command(preencher_geohash_command)
+    app.cli.add_command(reconstruir_grid_command)
+    app.cli.add_command(reconstruir_cubo_command)
+    app.cli.add_command(sincronizar_historico_precos_command)
+    app.cli.add_command(recalcular_anomalias_command)
+    app.cli.add_command(recalcular_previsoes_command)
+    app.cli.add_command(arquivar_command)
+    app.cli.add_command(importar_fornecedores_command)
@@ -0,0 +1,104 @@
+"""
+Execução em workers assíncronos (gunicorn com worker_class = "gevent").
+
+Com o gevent cada requisição é um greenlet: um worker atende centenas de
+conexões lentas (scanners em 3G) sem uma thread por conexão. Em troca,
+nada pode parar o processo sem devolver a vez ao loop de eventos:
+
+- O monkey patch vem antes de qualquer import do app. Com preload_app o
+  master importa app.py: os locks do pool do SQLAlchemy e as travas da
+  auditoria, das notificações e dos caches nascem ali, e o psycopg
+  escolhe ao ser importado como esperar o PostgreSQL (a espera em C não
+  cede a vez). Por isso o gunicorn_config.py faz o patch na primeira
+  linha; se ele vier tarde, a primeira requisição de cada worker
+  registra um erro no log.
+- Corpos pequenos (o JSON do scanner) são lidos inteiros antes da view:
+  o login já abre uma transação, e um cliente lento mandando o corpo
+  seguraria uma conexão do pool o tempo todo. A resposta é enviada depois
+  do teardown, com a sessão já devolvida.
+- Trabalho de CPU demorado (montar o PDF, otimizar as rotas) roda no pool
+  de threads nativas do gevent com em_thread(), e os outros greenlets
+  continuam sendo atendidos. Só vão para lá funções que não usam o banco
+  nem o contexto do Flask.
+- db.session e sessao_leitura() são por contexto da aplicação, que o Flask
+  guarda em contextvars: cada greenlet tem os seus.
+
+gevent só com PostgreSQL. O sqlite3 roda as consultas em C sem ceder a
+vez: uma escrita esperando o lock (busy_timeout, 5 s por padrão) pararia
+todos os greenlets do worker. configurar_concorrencia() recusa subir com
+gevent e SQLite, e o gunicorn_config.py do deploy usa gthread quando
+DATABASE_URL não é de PostgreSQL.
+"""
+
+import logging
+import os
+import sys
+import threading
+from flask import request
+from models import db
+
+logger = logging.getLogger('mrx.concorrencia')
+
+_config = {}
+_verificado = None  # pid do processo que já conferiu o monkey patch
+
+
+def gevent_ativo():
+    """Se o processo roda com o monkey patch do gevent (worker gevent do gunicorn)."""
+    monkey = sys.modules.get('gevent.monkey')
+    return monkey is not None and monkey.is_module_patched('socket')
+
+
+def em_thread(funcao, *args, **kwargs):
+    """Executa `funcao` no pool de threads do gevent e devolve o resultado; sem gevent, chama direto."""
+    if not gevent_ativo():
+        return funcao(*args, **kwargs)
+    import gevent
+    return gevent.get_hub().threadpool.apply(funcao, args, kwargs)
+
+
+def _verificar_patch():
+    """Registra um erro se o gevent foi aplicado depois do psycopg ou dos módulos com travas próprias."""
+    global _verificado
+    _verificado = os.getpid()
+    if not gevent_ativo():
+        return
+    waiting = sys.modules.get('psycopg.waiting')
+    if waiting is not None and getattr(waiting, 'wait_c', None) is waiting.wait:
+        logger.error(
+            'gevent aplicado depois do psycopg: cada consulta ao PostgreSQL bloqueia o worker inteiro. '
+            'Faça o monkey patch na primeira linha do gunicorn_config.py.'
+        )
+    # Trava nativa criada no import: um greenlet esperando por ela para o worker inteiro (e quem a segura)
+    tipo = type(threading.Lock())
+    nativas = [nome for nome in ('auditoria', 'notificacoes', 'rankings', 'cache_templates')
+               if nome in sys.modules and type(sys.modules[nome]._trava) is not tipo]
+    if nativas:
+        logger.error(
+            'gevent aplicado depois de importar %s: as travas desses módulos são nativas e podem parar o worker. '
+            'Faça o monkey patch na primeira linha do gunicorn_config.py.', ', '.join(nativas)
+        )
+
+
+def _ler_corpo():
+    if _verificado != os.getpid():
+        _verificar_patch()
+    tamanho = request.content_length
+    if tamanho and tamanho <= _config['corpo_max']:
+        # Formulários e JSON são lidos depois a partir desta cópia
+        request.get_data(cache=True)
+
+
+def configurar_concorrencia(app):
+    """Prepara as requisições para workers gevent (ver docstring do módulo); recusa gevent com SQLite."""
+    if gevent_ativo():
+        with app.app_context():
+            urls = [engine.url for engine in db.engines.values()]
+        sqlite = [url for url in urls if url.get_backend_name() == 'sqlite']
+        if sqlite:
+            raise RuntimeError(
+                f'gevent com SQLite ({sqlite[0].render_as_string(hide_password=True)}): cada consulta bloqueia '
+                'o worker inteiro. Use worker_class = "gthread" ou um DATABASE_URL de PostgreSQL.'
+            )
+    _config['corpo_max'] = app.config.get('CORPO_ANTECIPADO_MAX', 64 * 1024)
+    app.before_request(_ler_corpo)
@@ -10,12 +10,69 @@ INSTANCE_DIR = os.path.join(BASE_DIR, 'instance')
 # Garante que a pasta 'instance' existe
 os.makedirs(INSTANCE_DIR, exist_ok=True)
 
+def _normalizar_url(url):
+    """Provedores costumam entregar postgres://; o SQLAlchemy 2 exige o nome
+    do dialeto e aqui usamos o driver psycopg (v3)."""
+    for prefixo in ('postgres://', 'postgresql://'):
+        if url.startswith(prefixo):
+            return 'postgresql+psycopg://' + url[len(prefixo):]
+    return url
+
+def _database_url():
+    """URL do banco: DATABASE_URL (PostgreSQL) ou o SQLite dentro da pasta instance."""
+    url = os.environ.get('DATABASE_URL')
+    if not url:
+        return f"sqlite:///{os.path.join(INSTANCE_DIR, 'mrx.db')}"
+    return _normalizar_url(url)
+
+def _sqlite_memoria(url):
+    """SQLite em memória: sqlite://, sqlite:///:memory: ou URI com mode=memory."""
+    if not url.startswith('sqlite'):
+        return False
+    caminho = url.split('://', 1)[-1]
+    return caminho in ('', '/') or ':memory:' in caminho or 'mode=memory' in caminho
+
+def _engine_options(url, prefixo='DB'):
+    """Configuração do pool de conexões (variáveis <prefixo>_POOL_*)."""
+    if _sqlite_memoria(url):
+        # Banco em memória usa StaticPool (Flask-SQLAlchemy), sem tamanho de pool
+        return {}
+
+    return {
+        'pool_size': int(os.environ.get(f'{prefixo}_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get(f'{prefixo}_MAX_OVERFLOW', 10)),
+        'pool_pre_ping': os.environ.get(f'{prefixo}_POOL_PRE_PING', '1') == '1',
+        'pool_recycle': int(os.environ.get(f'{prefixo}_POOL_RECYCLE', 1800)),  # segundos
+    }
+
+def _binds(url):
+    """Bind 'leitura' para relatórios e dashboard, com pool próprio.
+
+    Usa DATABASE_REPLICA_URL quando definida; caso contrário abre o mesmo banco
+    em modo somente leitura (PRAGMA query_only no SQLite, aplicado em
+    database.py, e default_transaction_read_only no PostgreSQL).
+    """
+    if _sqlite_memoria(url):
+        # Outra conexão a :memory: seria outro banco; leituras usam o engine principal
+        return {}
+
+    replica = os.environ.get('DATABASE_REPLICA_URL')
+    url_leitura = _normalizar_url(replica) if replica else url
+
+    opcoes = _engine_options(url_leitura, prefixo='DB_LEITURA')
+    if url_leitura.startswith('postgresql'):
+        opcoes['connect_args'] = {'options': '-c default_transaction_read_only=on'}
+
+    return {'leitura': {'url': url_leitura, **opcoes}}
+
 class Config:
     """Configuração base da aplicação."""
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
 
-    # Banco de dados dentro da pasta instance
-    SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(INSTANCE_DIR, 'mrx.db')}"
+    # Banco de dados: DATABASE_URL ou SQLite dentro da pasta instance
+    SQLALCHEMY_DATABASE_URI = _database_url()
+    SQLALCHEMY_ENGINE_OPTIONS = _engine_options(SQLALCHEMY_DATABASE_URI)
+    SQLALCHEMY_BINDS = _binds(SQLALCHEMY_DATABASE_URI)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     PERMANENT_SESSION_LIFETIME = timedelta(days=7)
 
@@ -25,6 +82,70 @@ class Config:
 
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16 MB para upload
     UPLOAD_FOLDER = os.path.join(BASE_DIR, 'static', 'uploads')
+    UPLOAD_EXTENSOES = {'.jpg', '.jpeg', '.png', '.webp', '.pdf'}
+    # Uploads em andamento: fora de static/ (não servidos); na mesma partição de UPLOAD_FOLDER o
+    # arquivo final é um hard link, sem cópia (ver uploads.py)
+    UPLOAD_TEMP_FOLDER = os.environ.get('UPLOAD_TMP_DIR') or os.path.join(INSTANCE_DIR, 'uploads_tmp')
+    MINIATURA_TAMANHO = 320  # lado maior, em pixels
+    MINIATURA_WORKERS = int(os.environ.get('MINIATURA_WORKERS', 2))  # threads por worker do gunicorn
+
+    # Pragmas aplicados em cada nova conexão SQLite (ver database.py)
+    SQLITE_PRAGMAS = {}
+
+    # Backup online (flask backup-banco)
+    BACKUP_FOLDER = os.environ.get('BACKUP_DIR') or os.path.join(INSTANCE_DIR, 'backups')
+    BACKUP_RETENTION_DAYS = int(os.environ.get('BACKUP_RETENTION_DAYS', 30))
+    BACKUP_PAGINAS_POR_PASSO = 256  # páginas copiadas por passo da API de backup
+    BACKUP_PAUSA = 0.05  # segundos entre passos, libera o banco para os workers
+    BACKUP_MAX_REINICIOS = 5  # recomeços da cópia (escritas no meio) antes de cair para VACUUM INTO
+    # Backup incremental agendado (mrx_gestao_backup.timer): otimizar-banco deixa o checkpoint
+    # do WAL com o backup-banco. O checkpoint automático continua ligado; quando ele reinicia o
+    # WAL entre duas execuções, a seguinte faz um backup completo
+    BACKUP_INCREMENTAL = os.environ.get('BACKUP_INCREMENTAL', '1') != '0'
+
+    # Profiling por requisição e /metrics (ver metricas.py)
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '1') != '0'
+    SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 200))
+    # Valores dos parâmetros no log de SQL lento (senhas, CPF/CNPJ, PIX): só para depurar
+    SLOW_QUERY_LOG_PARAMETROS = os.environ.get('SLOW_QUERY_LOG_PARAMETROS') == '1'
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # acesso do Prometheus sem login
+
+    # URLs de static/ apontam para static/dist quando existe o manifesto do build
+    STATIC_USAR_MANIFESTO = os.environ.get('STATIC_USAR_MANIFESTO', '1') != '0'
+
+    # Roteirização das coletas (ver roteirizacao.py); o pedido pode sobrescrever
+    ROTA_DEPOSITO_LATITUDE = float(os.environ['ROTA_DEPOSITO_LATITUDE']) if os.environ.get('ROTA_DEPOSITO_LATITUDE') else None
+    ROTA_DEPOSITO_LONGITUDE = float(os.environ['ROTA_DEPOSITO_LONGITUDE']) if os.environ.get('ROTA_DEPOSITO_LONGITUDE') else None
+    ROTA_CAMINHOES = int(os.environ.get('ROTA_CAMINHOES', 1))
+    ROTA_CAPACIDADE_KG = float(os.environ.get('ROTA_CAPACIDADE_KG', 5000))
+
+    # Rankings (ver rankings.py): resultado reaproveitado por até N segundos, enquanto as tabelas não mudam
+    RANKING_CACHE_SEGUNDOS = int(os.environ.get('RANKING_CACHE_SEGUNDOS', 60))
+
+    # Templates (ver cache_templates.py): bytecode em disco compartilhado pelos workers e
+    # fragmentos {% cache %} reaproveitados por até N segundos, enquanto as tabelas não mudam (0 = desligado)
+    TEMPLATES_CACHE_PASTA = os.environ.get('TEMPLATES_CACHE_DIR') or os.path.join(INSTANCE_DIR, 'jinja')
+    FRAGMENTOS_CACHE_SEGUNDOS = int(os.environ.get('FRAGMENTOS_CACHE_SEGUNDOS', 300))
+
+    # Arquivamento (flask arquivar, ver arquivo.py): compras/despesas de antes do mês de N dias atrás
+    ARQUIVO_HORIZONTE_DIAS = int(os.environ.get('ARQUIVO_HORIZONTE_DIAS', 730))
+
+    # Auditoria (ver auditoria.py): eventos gravados em lote a cada N segundos (0 = na hora, no commit)
+    AUDITORIA_INTERVALO_SEGUNDOS = float(os.environ.get('AUDITORIA_INTERVALO_SEGUNDOS', 2))
+    AUDITORIA_LOTE = 500
+    AUDITORIA_PASTA = os.environ.get('AUDITORIA_DIR') or os.path.join(INSTANCE_DIR, 'auditoria')
+
+    # Relatórios de linhas recusadas nas importações de fornecedores (ver importacao.py)
+    IMPORTACAO_PASTA = os.path.join(INSTANCE_DIR, 'importacoes')
+
+    # Corpos até este tamanho são lidos antes da view, sem segurar conexão do banco (ver concorrencia.py)
+    CORPO_ANTECIPADO_MAX = 64 * 1024
+
+    # Notificações SSE (ver notificacoes.py): arquivo de eventos compartilhado pelos workers
+    NOTIFICACOES_PASTA = os.environ.get('NOTIFICACOES_DIR') or os.path.join(INSTANCE_DIR, 'notificacoes')
+    NOTIFICACOES_INTERVALO = 0.25  # segundos entre leituras do arquivo em cada worker
+    NOTIFICACOES_HEARTBEAT = 15  # segundos sem evento até mandar um comentário de keep-alive
+    NOTIFICACOES_MAX_CONEXOES = int(os.environ.get('NOTIFICACOES_MAX_CONEXOES', 500))  # por worker
 
 class DevelopmentConfig(Config):
     DEBUG = True
@@ -33,6 +154,21 @@ class ProductionConfig(Config):
     DEBUG = False
     SESSION_COOKIE_SECURE = True
 
+    # Perfil de produção do SQLite: WAL deixa leitores e o escritor trabalharem
+    # em paralelo e busy_timeout faz os workers esperarem o lock em vez de
+    # falharem com "database is locked".
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+        'synchronous': 'NORMAL',  # seguro com WAL; só o último commit pode se perder em queda de energia
+        'cache_size': -64000,  # valor negativo = KiB (64 MB por conexão)
+        'mmap_size': 268435456,  # 256 MB
+        'temp_store': 'MEMORY',
+        # Checkpoint automático a cada 1000 páginas: o WAL não cresce sem limite mesmo sem o timer
+        # de backup, e com leitores o tempo todo (o backup incremental só faz um completo a mais)
+        'wal_autocheckpoint': 1000,
+    }
+
 config = {
     'development': DevelopmentConfig,
     'production': ProductionConfig,
@@ -0,0 +1,207 @@
+"""
+Gerador de dados sintéticos para testes de carga (flask gerar-dados).
+
+Insere em lotes com executemany direto na tabela, sem instanciar objetos do
+ORM, para chegar a milhões de compras em poucos minutos.
+"""
+
+import random
+from datetime import datetime, timedelta
+from werkzeug.security import generate_password_hash
+from models import db, Usuario, RoleEnum, Fornecedor, TabelaPreco, Compra, Despesa, ComissaoComprador
+from versoes import marcar_alteracao
+from geo import codificar_geohash
+from agregados import reconstruir_cubo, reconstruir_grid
+from historico_precos import sincronizar_historico
+from anomalias import recalcular_estatisticas
+from previsao import recalcular_previsoes
+
+MATERIAIS = [
+    ('Cobre mel', 38.0), ('Cobre misto', 32.0), ('Latão', 22.0), ('Bronze', 24.0),
+    ('Alumínio lata', 6.5), ('Alumínio perfil', 8.0), ('Alumínio bloco', 7.2),
+    ('Inox 304', 5.5), ('Ferro pesado', 0.9), ('Ferro leve', 0.6), ('Chumbo', 4.8),
+    ('Bateria automotiva', 3.2), ('Metal duro', 45.0), ('Radiador cobre/alumínio', 14.0),
+    ('Fio desencapado', 34.0), ('Fio com capa', 12.0), ('Motor elétrico', 2.8),
+    ('Placa eletrônica', 18.0), ('Papelão', 0.7), ('PET', 2.1),
+]
+
+# Regiões de coleta (lat, lon) para os pontos ficarem agrupados como na prática
+REGIOES = [(-23.55, -46.63), (-23.96, -46.33), (-22.91, -47.06), (-23.19, -45.88), (-23.50, -47.45)]
+
+FORMAS_PAGAMENTO = ['pix', 'ted', 'boleto', 'cheque']
+
+
+def _inserir_em_lotes(tabela, linhas, tamanho_lote):
+    """Consome o gerador `linhas` inserindo `tamanho_lote` registros por commit."""
+    total = 0
+    lote = []
+    for linha in linhas:
+        lote.append(linha)
+        if len(lote) >= tamanho_lote:
+            db.session.execute(tabela.insert(), lote)
+            db.session.commit()
+            total += len(lote)
+            lote = []
+    if lote:
+        db.session.execute(tabela.insert(), lote)
+        db.session.commit()
+        total += len(lote)
+    # insert() direto não passa pelo flush do ORM: versão (ETags) atualizada à mão
+    marcar_alteracao(tabela.name)
+    db.session.commit()
+    return total
+
+
+def _proximo_id(modelo):
+    return (db.session.query(db.func.max(modelo.id)).scalar() or 0) + 1
+
+
+def gerar_dados(compradores=20, fornecedores=10000, itens_por_fornecedor=5, compras=100000,
+                despesas=10000, dias=3 * 365, tamanho_lote=5000, semente=42, progresso=None):
+    """Gera volumes configuráveis de dados realistas. Retorna contagens inseridas por tabela."""
+    rnd = random.Random(semente)
+    progresso = progresso or (lambda mensagem: None)
+    agora = datetime.utcnow()
+    contagens = {}
+
+    # Compradores: mesma senha para todos, hash calculado uma vez só
+    senha_hash = generate_password_hash('Carga@123')
+    inicio = _proximo_id(Usuario)
+    contagens['usuarios'] = _inserir_em_lotes(Usuario.__table__, (
+        {
+            'nome': f'Comprador Carga {inicio + i}',
+            'email': f'carga{inicio + i}@mrx.com.br',
+            'senha_hash': senha_hash,
+            'papel': RoleEnum.COMPRADOR,
+            'ativo': True,
+            'criado_em': agora,
+            'atualizado_em': agora,
+        } for i in range(compradores)
+    ), tamanho_lote)
+    ids_compradores = [i for (i,) in db.session.query(Usuario.id).filter(
+        Usuario.id >= inicio, Usuario.email.like('carga%'))]
+    comissoes = {cid: rnd.choice([0.0, 1.0, 2.0, 3.0, 5.0]) for cid in ids_compradores}
+    _inserir_em_lotes(ComissaoComprador.__table__, (
+        {'comprador_id': cid, 'percentual_comissao': pct, 'criado_em': agora, 'atualizado_em': agora}
+        for cid, pct in comissoes.items()
+    ), tamanho_lote)
+    progresso(f"{contagens['usuarios']} compradores")
+
+    inicio = _proximo_id(Fornecedor)
+    contagens['fornecedores'] = _inserir_em_lotes(Fornecedor.__table__, (
+        {
+            'nome_social': f'Ferro Velho {inicio + i} Ltda',
+            'cnpj': f'{inicio + i:012d}00',
+            'endereco_coleta': f'Rua Sintética, {rnd.randint(1, 9999)}',
+            'telefone': f'(11) 9{rnd.randint(1000, 9999)}-{rnd.randint(1000, 9999)}',
+            'preco_maximo_automatico': rnd.choice([500.0, 1000.0, 2000.0, 5000.0]),
+            'criado_em': agora,
+            'atualizado_em': agora,
+        } for i in range(fornecedores)
+    ), tamanho_lote)
+    # IDs lidos de volta: não dependemos de autoincremento contíguo (sequências no PostgreSQL)
+    precos_maximos = dict(db.session.query(Fornecedor.id, Fornecedor.preco_maximo_automatico).filter(
+        Fornecedor.id >= inicio, Fornecedor.cnpj.isnot(None)))
+    ids_fornecedores = sorted(precos_maximos)
+    progresso(f"{contagens['fornecedores']} fornecedores")
+
+    # Itens: preço base do material com variação por fornecedor
+    inicio_item = _proximo_id(TabelaPreco)
+
+    def linhas_itens():
+        sequencia = inicio_item
+        for fornecedor_id in ids_fornecedores:
+            for nome, preco_base in rnd.sample(MATERIAIS, min(itens_por_fornecedor, len(MATERIAIS))):
+                sequencia += 1
+                yield {
+                    'fornecedor_id': fornecedor_id,
+                    'nome_item': nome,
+                    'codigo_barras': f'MRX{sequencia:010d}',
+                    'preco_por_kg': round(preco_base * rnd.uniform(0.85, 1.15), 2),
+                    'unidade': 'kg',
+                    'ativo': True,
+                    'criado_em': agora,
+                    'atualizado_em': agora,
+                }
+
+    contagens['tabela_precos'] = _inserir_em_lotes(TabelaPreco.__table__, linhas_itens(), tamanho_lote)
+    progresso(f"{contagens['tabela_precos']} itens de tabela de preços")
+    sincronizar_historico(db.session.connection(), db.select(TabelaPreco.id).where(TabelaPreco.id >= inicio_item))
+    db.session.commit()
+
+    itens = db.session.query(TabelaPreco.id, TabelaPreco.fornecedor_id, TabelaPreco.preco_por_kg).filter(
+        TabelaPreco.id >= inicio_item, TabelaPreco.codigo_barras.like('MRX%')
+    ).all()
+
+    def linhas_compras():
+        for _ in range(compras):
+            item_id, fornecedor_id, preco = rnd.choice(itens)
+            comprador_id = rnd.choice(ids_compradores)
+            quantidade = round(rnd.lognormvariate(3.5, 1.0), 1) or 1.0
+            valor_total = round(quantidade * preco, 2)
+            preco_maximo = precos_maximos[fornecedor_id]
+            if valor_total <= preco_maximo:
+                status_preco = 'menor' if valor_total < preco_maximo else 'igual'
+                status_aprovacao = 'aprovada'
+            else:
+                status_preco = 'maior'
+                status_aprovacao = rnd.choices(['pendente', 'aprovada', 'rejeitada'], [2, 7, 1])[0]
+            lat, lon = rnd.choice(REGIOES)
+            data = agora - timedelta(seconds=rnd.randint(0, dias * 86400))
+            tipo_coleta = rnd.choice(['coleta', 'entrega'])
+            comissao = comissoes[comprador_id]
+            if tipo_coleta == 'coleta':
+                latitude = round(lat + rnd.gauss(0, 0.08), 6)
+                longitude = round(lon + rnd.gauss(0, 0.08), 6)
+                geohash = codificar_geohash(latitude, longitude)
+            else:
+                latitude = longitude = geohash = None
+            yield {
+                'fornecedor_id': fornecedor_id,
+                'tabela_preco_id': item_id,
+                'quantidade_kg': quantidade,
+                'preco_unitario': preco,
+                'valor_total': valor_total,
+                'preco_maximo': preco_maximo,
+                'status_preco': status_preco,
+                'status_aprovacao': status_aprovacao,
+                'tipo_coleta': tipo_coleta,
+                'comprador_id': comprador_id,
+                'latitude': latitude,
+                'longitude': longitude,
+                'geohash': geohash,
+                'comissao_percentual': comissao,
+                'valor_comissao': round(valor_total * comissao / 100, 2),
+                'data': data,
+                'criado_em': data,
+                'atualizado_em': data,
+            }
+
+    if itens and ids_compradores:
+        contagens['compras'] = _inserir_em_lotes(Compra.__table__, linhas_compras(), tamanho_lote)
+        progresso(f"{contagens['compras']} compras")
+        # insert() em lote não passa pelos eventos do ORM que mantêm os agregados
+        reconstruir_grid()
+        reconstruir_cubo()
+        recalcular_estatisticas()
+        recalcular_previsoes()
+
+    def linhas_despesas():
+        for _ in range(despesas):
+            data = agora - timedelta(seconds=rnd.randint(0, dias * 86400))
+            yield {
+                'nome_social': f'Despesa {rnd.choice(["Combustível", "Manutenção", "Pedágio", "Frete"])}',
+                'vendedor_id': rnd.choice(ids_compradores),
+                'forma_pagamento': rnd.choice(FORMAS_PAGAMENTO),
+                'condicao_pagamento': rnd.choice(['a_vista', 'parcelado']),
+                'data': data,
+                'valor': round(rnd.lognormvariate(5.0, 0.8), 2),
+                'criado_em': data,
+                'atualizado_em': data,
+            }
+
+    if ids_compradores:
+        contagens['despesas'] = _inserir_em_lotes(Despesa.__table__, linhas_despesas(), tamanho_lote)
+        progresso(f"{contagens['despesas']} despesas")
+
+    return contagens
@@ -0,0 +1,101 @@
+"""
+Ajustes do banco de dados: pragmas do SQLite, sessão somente leitura e
+tarefas de manutenção.
+"""
+
+import os
+import weakref
+from flask import g
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models import db
+
+# Bind usado por relatórios, dashboard e endpoints analíticos (ver config._binds)
+BIND_LEITURA = 'leitura'
+
+# Engines dos apps criados neste processo; somem junto com o app
+_engines = weakref.WeakSet()
+
+
+def aplicar_pragmas_sqlite(dbapi_connection, pragmas):
+    """Executa os pragmas informados em uma conexão sqlite3 recém-aberta."""
+    cursor = dbapi_connection.cursor()
+    try:
+        for nome, valor in pragmas.items():
+            cursor.execute(f"PRAGMA {nome}={valor}")
+    finally:
+        cursor.close()
+
+
+def _registrar_pragmas(engine, pragmas):
+    @event.listens_for(engine, 'connect')
+    def _ao_conectar(dbapi_connection, connection_record):
+        aplicar_pragmas_sqlite(dbapi_connection, pragmas)
+
+
+def configurar_banco(app):
+    """Aplica SQLITE_PRAGMAS em cada engine SQLite e prepara a sessão de leitura."""
+    pragmas = app.config.get('SQLITE_PRAGMAS') or {}
+
+    with app.app_context():
+        _engines.update(db.engines.values())
+        for bind_key, engine in db.engines.items():
+            if engine.dialect.name != 'sqlite':
+                continue
+
+            pragmas_engine = dict(pragmas)
+            if bind_key == BIND_LEITURA:
+                # Mesmo arquivo, mas a conexão recusa qualquer escrita
+                pragmas_engine['query_only'] = 'ON'
+            if pragmas_engine:
+                _registrar_pragmas(engine, pragmas_engine)
+
+    app.teardown_appcontext(_fechar_sessao_leitura)
+
+
+def _descartar_pools():
+    """Com preload_app o app nasce no master do gunicorn: cada worker descarta o
+    pool herdado no fork para não compartilhar conexões com os outros processos."""
+    for engine in list(_engines):
+        engine.dispose(close=False)
+
+
+# Registrado uma vez por processo (não a cada create_app); o Windows não tem fork
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_descartar_pools)
+
+
+def sessao_leitura():
+    """Sessão no bind somente leitura, reaproveitada durante o contexto da aplicação.
+
+    Sem o bind configurado (ex.: SQLite em memória) usa o engine principal.
+    """
+    if 'sessao_leitura' not in g:
+        engine = db.engines.get(BIND_LEITURA, db.engine)
+        g.sessao_leitura = Session(bind=engine, autoflush=False)
+    return g.sessao_leitura
+
+
+def _fechar_sessao_leitura(exception=None):
+    sessao = g.pop('sessao_leitura', None)
+    if sessao is not None:
+        sessao.close()
+
+
+def otimizar_banco(checkpoint=True):
+    """Roda PRAGMA optimize e, se `checkpoint`, o checkpoint do WAL.
+
+    Retorna o resultado do checkpoint, ou None se não houve (banco não é
+    SQLite ou o checkpoint é feito pelo backup incremental, ver backup.py).
+    """
+    if db.engine.dialect.name != 'sqlite':
+        return None
+
+    resultado = None
+    with db.engine.connect() as conn:
+        if checkpoint:
+            # TRUNCATE zera o arquivo -wal; se houver leitores ativos o SQLite
+            # devolve busy=1 e o checkpoint fica para a próxima execução.
+            resultado = conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+        conn.exec_driver_sql("PRAGMA optimize")
+    return tuple(resultado) if resultado else None
@@ -72,23 +72,60 @@ pip install --upgrade pip setuptools wheel
 pip install -r "${APP_DIR}/requirements.txt"
 pip install gunicorn
 
+# Assets com hash e pré-comprimidos (static/dist)
+(cd "${APP_DIR}" && FLASK_APP=app.py FLASK_ENV=production flask build-static)
+
+# Bytecode dos templates em instance/jinja: os workers não compilam nada ao subir
+(cd "${APP_DIR}" && FLASK_APP=app.py FLASK_ENV=production flask compilar-templates)
+
+# Criar tabelas que ainda não existem no banco
+(cd "${APP_DIR}" && FLASK_APP=app.py FLASK_ENV=production flask atualizar-esquema)
+
 # 5. Configurar Gunicorn
 echo -e "\n${YELLOW}[5/7] Configurando Gunicorn...${NC}"
 
 # Criar arquivo de configuração
 sudo tee "${APP_DIR}/gunicorn_config.py" > /dev/null << 'EOF'
-import multiprocessing
 import os
 
+# gevent só com PostgreSQL (ver concorrencia.py); com SQLite, threads
+GEVENT = os.environ.get("DATABASE_URL", "").startswith(("postgres://", "postgresql"))
+if GEVENT:
+    # Antes de qualquer outro import: o app é carregado no master (preload_app)
+    from gevent import monkey
+    monkey.patch_all()
+
+import multiprocessing
+
 bind = "127.0.0.1:8000"
 workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = "sync"
+if GEVENT:
+    worker_class = "gevent"  # conexões SSE abertas viram greenlets (ver notificacoes.py)
+    worker_connections = 1000
+else:
+    worker_class = "gthread"
+    threads = 8
+    os.environ.setdefault("NOTIFICACOES_MAX_CONEXOES", str(threads // 2))  # cada conexão SSE ocupa uma thread
+preload_app = True
 timeout = 30
 keepalive = 2
 accesslog = "/var/log/mrx_gestao/gunicorn_access.log"
 errorlog = "/var/log/mrx_gestao/gunicorn_error.log"
 loglevel = "info"
 raw_env = ["FLASK_ENV=production", "FLASK_APP=app.py"]
+
+# Métricas Prometheus agregadas entre workers (ver metricas.py)
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/var/run/mrx_gestao/prometheus")
+
+def on_starting(server):
+    pasta = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    os.makedirs(pasta, exist_ok=True)
+    for arquivo in os.listdir(pasta):
+        os.remove(os.path.join(pasta, arquivo))
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
 EOF
 
 # Criar diretórios de log
@@ -117,6 +154,7 @@ WorkingDirectory=${APP_DIR}
 Environment="PATH=${APP_DIR}/venv/bin"
 Environment="FLASK_ENV=production"
 Environment="FLASK_APP=app.py"
+Environment="PROMETHEUS_MULTIPROC_DIR=/var/run/mrx_gestao/prometheus"
 ExecStart=${APP_DIR}/venv/bin/gunicorn \\
     --config ${APP_DIR}/gunicorn_config.py \\
     --access-logfile /var/log/mrx_gestao/gunicorn_access.log \\
@@ -130,6 +168,16 @@ RestartSec=10
 WantedBy=multi-user.target
 EOF
 
+# Agendar checkpoint do WAL / PRAGMA optimize
+sudo cp "${APP_DIR}/mrx_gestao_otimizar.service" /etc/systemd/system/
+sudo cp "${APP_DIR}/mrx_gestao_otimizar.timer" /etc/systemd/system/
+
+# Agendar backup online incremental do banco
+sudo mkdir -p /backup
+sudo chown www-data:www-data /backup
+sudo cp "${APP_DIR}/mrx_gestao_backup.service" /etc/systemd/system/
+sudo cp "${APP_DIR}/mrx_gestao_backup.timer" /etc/systemd/system/
+
 # 6. Configurar Nginx
 echo -e "\n${YELLOW}[6/7] Configurando Nginx...${NC}"
 
@@ -184,10 +232,28 @@ server {
         proxy_redirect off;
     }
 
+    # Arquivos com hash no nome (flask build-static): cache imutável de um ano
+    location /static/dist/ {
+        alias ${APP_DIR}/static/dist/;
+        gzip_static on;
+        # brotli_static on;  # requer o módulo ngx_brotli
+        expires 1y;
+        add_header Cache-Control "public, max-age=31536000, immutable";
+        access_log off;
+    }
+
+    # Comprovantes e miniaturas: nome é o SHA-256 do conteúdo, nunca mudam
+    location ~ ^/static/uploads/(comprovantes|miniaturas)/ {
+        root ${APP_DIR};
+        expires 1y;
+        add_header Cache-Control "public, max-age=31536000, immutable";
+    }
+
+    # Arquivos estáticos sem hash
     location /static/ {
         alias ${APP_DIR}/static/;
-        expires 30d;
-        add_header Cache-Control "public, immutable";
+        expires 1h;
+        add_header Cache-Control "public";
     }
 
     location ~ /\. {
@@ -227,6 +293,8 @@ echo -e "\n${YELLOW}Iniciando serviços...${NC}"
 sudo systemctl daemon-reload
 sudo systemctl enable mrx_gestao
 sudo systemctl start mrx_gestao
+sudo systemctl enable --now mrx_gestao_otimizar.timer
+sudo systemctl enable --now mrx_gestao_backup.timer
 sudo systemctl restart nginx
 
 # Verificar status
@@ -0,0 +1,178 @@
+"""
+Pipeline de arquivos estáticos (flask build-static).
+
+Copia static/ para static/dist/ com o hash do conteúdo no nome
+(css/style.3f2a9c1b7e4d.css), gera variantes .gz e .br para o nginx servir
+direto (gzip_static/brotli_static), otimiza PNGs e cria versões WebP com o
+Pillow. O manifest.json liga o nome original ao nome com hash; com ele
+presente, url_for('static', filename='css/style.css') aponta para a versão em
+dist/, que pode ser cacheada por um ano como imutável.
+"""
+
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+
+PASTA_DIST = 'dist'
+MANIFESTO = 'manifest.json'
+
+# Não fazem parte do build: envios de usuários e a própria saída
+IGNORAR = {'uploads', PASTA_DIST}
+
+COMPRIMIVEIS = {'.css', '.js', '.svg', '.json', '.txt', '.map', '.ico'}
+
+# Altura máxima em pixels: 2x a altura exibida no style.css (telas de alta densidade)
+ALTURA_MAXIMA = {
+    'img/escudo.png': 100,  # .navbar-brand img
+    'img/logo.png': 160,  # .login-card .logo img
+}
+
+_manifesto = {}
+
+
+def _hash(dados):
+    return hashlib.sha256(dados).hexdigest()[:12]
+
+
+def _nome_com_hash(caminho, digest, extensao=None):
+    raiz, ext = os.path.splitext(caminho)
+    return f'{raiz}.{digest}{extensao or ext}'
+
+
+def _gravar(destino, relativo, dados):
+    caminho = os.path.join(destino, relativo)
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    with open(caminho, 'wb') as f:
+        f.write(dados)
+    return caminho
+
+
+def _otimizar_png(dados, altura_maxima=None):
+    """Retorna (png, webp ou None) otimizados; redimensiona se a altura passar do limite."""
+    from PIL import Image
+
+    imagem = Image.open(io.BytesIO(dados))
+    imagem.load()
+    if altura_maxima and imagem.height > altura_maxima:
+        paleta = imagem.mode == 'P'
+        largura = round(imagem.width * altura_maxima / imagem.height)
+        imagem = imagem.convert('RGBA').resize((largura, altura_maxima), Image.LANCZOS)
+        if paleta:
+            # Mantém PNG de paleta (8 bits) quando a original já era
+            imagem = imagem.quantize(colors=256, method=Image.Quantize.FASTOCTREE)
+
+    png = io.BytesIO()
+    imagem.save(png, 'PNG', optimize=True)
+    webp = io.BytesIO()
+    imagem.convert('RGBA').save(webp, 'WEBP', quality=85, method=6)
+
+    png = png.getvalue()
+    if len(png) >= len(dados) and not altura_maxima:
+        png = dados
+    # WebP só vale a pena se for menor que o PNG (paletas pequenas às vezes não são)
+    webp = webp.getvalue()
+    return png, (webp if len(webp) < len(png) else None)
+
+
+def _comprimir(caminho, dados, brotli):
+    """Grava .gz (e .br se o módulo brotli estiver instalado) ao lado do arquivo."""
+    with open(caminho + '.gz', 'wb') as saida:
+        # mtime=0: mesmo conteúdo gera o mesmo .gz a cada build
+        with gzip.GzipFile(fileobj=saida, mode='wb', compresslevel=9, mtime=0) as gz:
+            gz.write(dados)
+    if brotli is not None:
+        with open(caminho + '.br', 'wb') as saida:
+            saida.write(brotli.compress(dados, quality=11))
+
+
+def construir_estaticos(pasta_static, limpar=True):
+    """Gera static/dist e o manifesto. Retorna (manifesto, bytes_origem, bytes_dist)."""
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+
+    destino = os.path.join(pasta_static, PASTA_DIST)
+    if limpar and os.path.isdir(destino):
+        shutil.rmtree(destino)
+    os.makedirs(destino, exist_ok=True)
+
+    manifesto = {'arquivos': {}, 'webp': {}, 'brotli': brotli is not None}
+    bytes_origem = bytes_dist = 0
+
+    for raiz, pastas, arquivos in os.walk(pasta_static):
+        if raiz == pasta_static:
+            pastas[:] = [p for p in pastas if p not in IGNORAR]
+        for nome in sorted(arquivos):
+            caminho = os.path.join(raiz, nome)
+            relativo = os.path.relpath(caminho, pasta_static).replace(os.sep, '/')
+            if nome.startswith('.'):
+                continue
+            with open(caminho, 'rb') as f:
+                dados = f.read()
+            bytes_origem += len(dados)
+            extensao = os.path.splitext(nome)[1].lower()
+
+            webp = None
+            if extensao == '.png':
+                dados, webp = _otimizar_png(dados, ALTURA_MAXIMA.get(relativo))
+
+            # Hash do conteúdo final: mudar o redimensionamento também troca a URL
+            digest = _hash(dados)
+            saida = _nome_com_hash(relativo, digest)
+            _gravar(destino, saida, dados)
+            manifesto['arquivos'][relativo] = saida
+            bytes_dist += len(dados)
+
+            if webp is not None:
+                saida_webp = _nome_com_hash(relativo, _hash(webp), '.webp')
+                _gravar(destino, saida_webp, webp)
+                manifesto['webp'][relativo] = saida_webp
+                bytes_dist += len(webp)
+
+            if extensao in COMPRIMIVEIS:
+                _comprimir(os.path.join(destino, saida), dados, brotli)
+
+    with open(os.path.join(destino, MANIFESTO + '.tmp'), 'w') as f:
+        json.dump(manifesto, f, indent=2, sort_keys=True)
+    os.replace(os.path.join(destino, MANIFESTO + '.tmp'), os.path.join(destino, MANIFESTO))
+    return manifesto, bytes_origem, bytes_dist
+
+
+def carregar_manifesto(pasta_static):
+    try:
+        with open(os.path.join(pasta_static, PASTA_DIST, MANIFESTO)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _url_estatico_com_hash(endpoint, values):
+    if endpoint != 'static' or not _manifesto:
+        return
+    filename = values.get('filename')
+    if filename in _manifesto['arquivos']:
+        values['filename'] = f"{PASTA_DIST}/{_manifesto['arquivos'][filename]}"
+
+
+def url_webp(filename):
+    """URL da variante WebP de uma imagem, ou None se o build não a gerou."""
+    from flask import url_for
+
+    if not _manifesto or filename not in _manifesto['webp']:
+        return None
+    return url_for('static', filename=f"{PASTA_DIST}/{_manifesto['webp'][filename]}")
+
+
+def configurar_estaticos(app):
+    """Lê o manifesto do build (se houver) e passa a gerar URLs com hash."""
+    global _manifesto
+
+    app.jinja_env.globals['url_webp'] = url_webp
+    if not app.config.get('STATIC_USAR_MANIFESTO', True):
+        return
+    _manifesto = carregar_manifesto(app.static_folder) or {}
+    app.url_defaults(_url_estatico_com_hash)
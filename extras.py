@@ -1,259 +1,99 @@
 """
-Módulo com funcionalidades extras: filtros, exportação PDF, etc.
+Módulo com funcionalidades extras: filtros e resumos por período.
+Os relatórios em PDF ficam em relatorios_pdf.py.
+
+Todas as consultas daqui usam sessao_leitura(), para que relatórios longos
+não disputem conexões com as rotas de escrita. Períodos que começam antes
+do corte do arquivamento leem também as tabelas de arquivo (arquivo.py).
 """
 
 from datetime import datetime, timedelta
-from models import Compra, Despesa, db
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
-from reportlab.lib import colors
-from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_LEFT
-import io
+from models import Compra, CompraArquivo, Despesa, DespesaArquivo, TabelaPreco, db
+from database import sessao_leitura
+from arquivo import precisa_arquivo, somar_arquivo
 
-def gerar_relatorio_compras_pdf(data_inicio=None, data_fim=None, fornecedor_id=None):
-    """Gera relatório de compras em PDF."""
-    
-    # Construir query
-    query = Compra.query
-    
-    if data_inicio:
-        query = query.filter(Compra.data >= data_inicio)
-    
-    if data_fim:
-        query = query.filter(Compra.data <= data_fim)
-    
-    if fornecedor_id:
-        query = query.filter(Compra.fornecedor_id == fornecedor_id)
-    
-    compras = query.order_by(Compra.data.desc()).all()
-    
-    # Criar PDF
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=0.5*inch, bottomMargin=0.5*inch)
-    
-    # Estilos
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=16,
-        textColor=colors.HexColor('#006600'),
-        spaceAfter=30,
-        alignment=TA_CENTER
-    )
-    
-    # Elementos do documento
-    elements = []
-    
-    # Título
-    elements.append(Paragraph('Relatório de Compras - MRX Gestão', title_style))
-    elements.append(Spacer(1, 0.3*inch))
-    
-    # Informações de filtro
-    filtro_text = f"Gerado em: {datetime.now().strftime('%d/%m/%Y %H:%M')}"
-    if data_inicio or data_fim:
-        filtro_text += " | Período: "
+def filtrar_compras(data_inicio=None, data_fim=None, fornecedor_id=None, material=None):
+    """Filtra compras com base em critérios (e no arquivo, se o período começa antes do corte)."""
+    modelos = [Compra, CompraArquivo] if precisa_arquivo('compras', data_inicio) else [Compra]
+    compras = []
+    for modelo in modelos:
+        query = sessao_leitura().query(modelo)
+        
         if data_inicio:
-            filtro_text += f"de {data_inicio.strftime('%d/%m/%Y')}"
-        if data_fim:
-            filtro_text += f" até {data_fim.strftime('%d/%m/%Y')}"
-    
-    elements.append(Paragraph(filtro_text, styles['Normal']))
-    elements.append(Spacer(1, 0.2*inch))
-    
-    # Tabela de compras
-    if compras:
-        data = [['Material', 'Fornecedor', 'Valor', 'Tipo', 'Data']]
+            query = query.filter(modelo.data >= data_inicio)
         
-        for compra in compras:
-            data.append([
-                compra.material[:30],
-                compra.fornecedor.nome_social[:25],
-                f"R$ {compra.valor_tabela:.2f}",
-                compra.tipo_coleta,
-                compra.data.strftime('%d/%m/%Y')
-            ])
+        if data_fim:
+            query = query.filter(modelo.data <= data_fim)
         
-        # Totalizador
-        total = sum(c.valor_tabela for c in compras)
-        data.append(['', '', f'TOTAL: R$ {total:.2f}', '', ''])
+        if fornecedor_id:
+            query = query.filter(modelo.fornecedor_id == fornecedor_id)
         
-        table = Table(data, colWidths=[2*inch, 2*inch, 1.2*inch, 1*inch, 1*inch])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#006600')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -2), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#004d00')),
-            ('TEXTCOLOR', (0, -1), (-1, -1), colors.whitesmoke),
-            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-        ]))
+        if material:
+            query = query.join(modelo.tabela_preco).filter(TabelaPreco.nome_item.ilike(f'%{material}%'))
         
-        elements.append(table)
-    else:
-        elements.append(Paragraph('Nenhuma compra encontrada para os filtros especificados.', styles['Normal']))
+        compras += query.order_by(modelo.data.desc()).all()
     
-    # Gerar PDF
-    doc.build(elements)
-    buffer.seek(0)
-    return buffer
+    return sorted(compras, key=lambda compra: compra.data, reverse=True) if len(modelos) > 1 else compras
 
-def gerar_relatorio_despesas_pdf(data_inicio=None, data_fim=None, forma_pagamento=None):
-    """Gera relatório de despesas em PDF."""
-    
-    # Construir query
-    query = Despesa.query
-    
-    if data_inicio:
-        query = query.filter(Despesa.data >= data_inicio)
-    
-    if data_fim:
-        query = query.filter(Despesa.data <= data_fim)
-    
-    if forma_pagamento:
-        query = query.filter(Despesa.forma_pagamento == forma_pagamento)
-    
-    despesas = query.order_by(Despesa.data.desc()).all()
-    
-    # Criar PDF
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=0.5*inch, bottomMargin=0.5*inch)
-    
-    # Estilos
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=16,
-        textColor=colors.HexColor('#006600'),
-        spaceAfter=30,
-        alignment=TA_CENTER
-    )
-    
-    # Elementos do documento
-    elements = []
-    
-    # Título
-    elements.append(Paragraph('Relatório de Despesas - MRX Gestão', title_style))
-    elements.append(Spacer(1, 0.3*inch))
-    
-    # Informações de filtro
-    filtro_text = f"Gerado em: {datetime.now().strftime('%d/%m/%Y %H:%M')}"
-    if data_inicio or data_fim:
-        filtro_text += " | Período: "
+def filtrar_despesas(data_inicio=None, data_fim=None, forma_pagamento=None, valor_min=None, valor_max=None):
+    """Filtra despesas com base em critérios (e no arquivo, se o período começa antes do corte)."""
+    modelos = [Despesa, DespesaArquivo] if precisa_arquivo('despesas', data_inicio) else [Despesa]
+    despesas = []
+    for modelo in modelos:
+        query = sessao_leitura().query(modelo)
+        
         if data_inicio:
-            filtro_text += f"de {data_inicio.strftime('%d/%m/%Y')}"
+            query = query.filter(modelo.data >= data_inicio)
+        
         if data_fim:
-            filtro_text += f" até {data_fim.strftime('%d/%m/%Y')}"
-    
-    elements.append(Paragraph(filtro_text, styles['Normal']))
-    elements.append(Spacer(1, 0.2*inch))
-    
-    # Tabela de despesas
-    if despesas:
-        data = [['Descrição', 'Valor', 'Forma de Pagamento', 'Data']]
+            query = query.filter(modelo.data <= data_fim)
         
-        for despesa in despesas:
-            data.append([
-                despesa.nome_social[:35],
-                f"R$ {despesa.valor:.2f}",
-                despesa.forma_pagamento or '-',
-                despesa.data.strftime('%d/%m/%Y')
-            ])
+        if forma_pagamento:
+            query = query.filter(modelo.forma_pagamento == forma_pagamento)
         
-        # Totalizador
-        total = sum(d.valor for d in despesas)
-        data.append(['', f'TOTAL: R$ {total:.2f}', '', ''])
+        if valor_min:
+            query = query.filter(modelo.valor >= valor_min)
         
-        table = Table(data, colWidths=[2.5*inch, 1.5*inch, 1.5*inch, 1.2*inch])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#004d00')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -2), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#006600')),
-            ('TEXTCOLOR', (0, -1), (-1, -1), colors.whitesmoke),
-            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-        ]))
+        if valor_max:
+            query = query.filter(modelo.valor <= valor_max)
         
-        elements.append(table)
-    else:
-        elements.append(Paragraph('Nenhuma despesa encontrada para os filtros especificados.', styles['Normal']))
-    
-    # Gerar PDF
-    doc.build(elements)
-    buffer.seek(0)
-    return buffer
-
-def filtrar_compras(data_inicio=None, data_fim=None, fornecedor_id=None, material=None):
-    """Filtra compras com base em critérios."""
-    query = Compra.query
-    
-    if data_inicio:
-        query = query.filter(Compra.data >= data_inicio)
+        despesas += query.order_by(modelo.data.desc()).all()
     
-    if data_fim:
-        query = query.filter(Compra.data <= data_fim)
-    
-    if fornecedor_id:
-        query = query.filter(Compra.fornecedor_id == fornecedor_id)
-    
-    if material:
-        query = query.filter(Compra.material.ilike(f'%{material}%'))
-    
-    return query.order_by(Compra.data.desc()).all()
-
-def filtrar_despesas(data_inicio=None, data_fim=None, forma_pagamento=None, valor_min=None, valor_max=None):
-    """Filtra despesas com base em critérios."""
-    query = Despesa.query
-    
-    if data_inicio:
-        query = query.filter(Despesa.data >= data_inicio)
-    
-    if data_fim:
-        query = query.filter(Despesa.data <= data_fim)
-    
-    if forma_pagamento:
-        query = query.filter(Despesa.forma_pagamento == forma_pagamento)
-    
-    if valor_min:
-        query = query.filter(Despesa.valor >= valor_min)
-    
-    if valor_max:
-        query = query.filter(Despesa.valor <= valor_max)
-    
-    return query.order_by(Despesa.data.desc()).all()
+    return sorted(despesas, key=lambda despesa: despesa.data, reverse=True) if len(modelos) > 1 else despesas
 
 def obter_resumo_periodo(data_inicio, data_fim):
     """Obtém resumo de compras e despesas para um período."""
     
-    compras = Compra.query.filter(
+    leitura = sessao_leitura()
+    
+    quantidade_compras, total_compras = leitura.query(
+        db.func.count(Compra.id),
+        db.func.coalesce(db.func.sum(Compra.valor_total), 0)
+    ).filter(
         Compra.data >= data_inicio,
         Compra.data <= data_fim
-    ).all()
+    ).one()
     
-    despesas = Despesa.query.filter(
+    quantidade_despesas, total_despesas = leitura.query(
+        db.func.count(Despesa.id),
+        db.func.coalesce(db.func.sum(Despesa.valor), 0)
+    ).filter(
         Despesa.data >= data_inicio,
         Despesa.data <= data_fim
-    ).all()
+    ).one()
     
-    total_compras = sum(c.valor_tabela for c in compras)
-    total_despesas = sum(d.valor for d in despesas)
+    # Parte do período que já foi para o arquivo: meses inteiros pelos totais guardados
+    arquivadas, valor_arquivado = somar_arquivo('compras', data_inicio, data_fim)
+    quantidade_compras += arquivadas
+    total_compras = float(total_compras) + valor_arquivado
+    arquivadas, valor_arquivado = somar_arquivo('despesas', data_inicio, data_fim)
+    quantidade_despesas += arquivadas
+    total_despesas = float(total_despesas) + valor_arquivado
     
     return {
         'total_compras': total_compras,
         'total_despesas': total_despesas,
-        'quantidade_compras': len(compras),
-        'quantidade_despesas': len(despesas),
+        'quantidade_compras': quantidade_compras,
+        'quantidade_despesas': quantidade_despesas,
         'saldo': total_compras - total_despesas
     }
@@ -0,0 +1,311 @@
+"""
+Consultas geográficas sobre o local das compras.
+
+Cada compra com latitude/longitude guarda o geohash (precisão 9, ~5 m) na
+coluna indexada compras.geohash, preenchida pelos eventos before_insert e
+before_update. Uma consulta por raio ou retângulo vira poucas faixas
+contíguas de geohash (prefixos que cobrem o retângulo), resolvidas pelo
+índice (tipo_coleta, geohash, latitude, longitude, status_aprovacao) sem
+tocar na tabela; o filtro exato (retângulo ou haversine) é feito depois,
+vetorizado com NumPy, e só as compras que entram no resultado têm os
+detalhes buscados.
+
+Retângulos que cruzam o antimeridiano não são suportados.
+"""
+
+import math
+from functools import lru_cache
+from sqlalchemy import bindparam, event, select, union_all, update
+from models import db, Compra, Fornecedor
+from database import sessao_leitura
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+PRECISAO = 9
+RAIO_TERRA_KM = 6371.0088
+
+# Máximo de células de geohash na cobertura do retângulo: mais células
+# cercam melhor a área, mas geram mais faixas no WHERE
+MAX_CELULAS = 32
+
+TIPOS_COLETA = ('coleta', 'entrega')
+
+# Primeiro raio tentado por compras_no_raio antes de expandir até o pedido
+RAIO_INICIAL_KM = 1.0
+
+# Ids por consulta ao buscar os detalhes (abaixo do limite de parâmetros do SQLite)
+TAMANHO_BLOCO_IDS = 500
+
+
+def codificar_geohash(latitude, longitude, precisao=PRECISAO):
+    """Geohash padrão (base32) do ponto."""
+    lat_min, lat_max = -90.0, 90.0
+    lon_min, lon_max = -180.0, 180.0
+    codigo = []
+    bits = 0
+    valor = 0
+    par = True  # bits pares refinam a longitude
+    while len(codigo) < precisao:
+        if par:
+            meio = (lon_min + lon_max) / 2
+            if longitude >= meio:
+                valor = valor * 2 + 1
+                lon_min = meio
+            else:
+                valor *= 2
+                lon_max = meio
+        else:
+            meio = (lat_min + lat_max) / 2
+            if latitude >= meio:
+                valor = valor * 2 + 1
+                lat_min = meio
+            else:
+                valor *= 2
+                lat_max = meio
+        par = not par
+        bits += 1
+        if bits == 5:
+            codigo.append(BASE32[valor])
+            bits = 0
+            valor = 0
+    return ''.join(codigo)
+
+
+@lru_cache(maxsize=65536)
+def limites_geohash(codigo):
+    """(min_lat, min_lon, max_lat, max_lon) da célula do geohash."""
+    lat_min, lat_max = -90.0, 90.0
+    lon_min, lon_max = -180.0, 180.0
+    par = True
+    for caractere in codigo:
+        valor = BASE32.index(caractere)
+        for bit in range(4, -1, -1):
+            if par:
+                meio = (lon_min + lon_max) / 2
+                if valor >> bit & 1:
+                    lon_min = meio
+                else:
+                    lon_max = meio
+            else:
+                meio = (lat_min + lat_max) / 2
+                if valor >> bit & 1:
+                    lat_min = meio
+                else:
+                    lat_max = meio
+            par = not par
+    return lat_min, lon_min, lat_max, lon_max
+
+
+def tamanho_celula(precisao):
+    """(altura, largura) em graus de uma célula de geohash."""
+    bits_lat = 5 * precisao // 2
+    bits_lon = 5 * precisao - bits_lat
+    return 180.0 / 2 ** bits_lat, 360.0 / 2 ** bits_lon
+
+
+def _proximo_prefixo(prefixo):
+    """Menor geohash maior que todos os que começam com `prefixo` (None se não houver)."""
+    caracteres = list(prefixo)
+    while caracteres:
+        indice = BASE32.index(caracteres[-1])
+        if indice + 1 < len(BASE32):
+            caracteres[-1] = BASE32[indice + 1]
+            return ''.join(caracteres)
+        caracteres.pop()
+    return None
+
+
+def faixas_geohash(min_lat, min_lon, max_lat, max_lon, precisao_maxima=PRECISAO):
+    """Faixas [inicio, fim) de geohash que cobrem o retângulo."""
+    min_lat, max_lat = max(min_lat, -90.0), min(max_lat, 90.0)
+    min_lon, max_lon = max(min_lon, -180.0), min(max_lon, 180.0)
+
+    for precisao in range(precisao_maxima, 0, -1):
+        altura, largura = tamanho_celula(precisao)
+        linhas = math.floor((max_lat + 90) / altura) - math.floor((min_lat + 90) / altura) + 1
+        colunas = math.floor((max_lon + 180) / largura) - math.floor((min_lon + 180) / largura) + 1
+        if linhas * colunas <= MAX_CELULAS:
+            break
+
+    primeira_linha = math.floor((min_lat + 90) / altura)
+    primeira_coluna = math.floor((min_lon + 180) / largura)
+    celulas = sorted({
+        codificar_geohash(
+            min((primeira_linha + i + 0.5) * altura - 90, 90.0),
+            min((primeira_coluna + j + 0.5) * largura - 180, 180.0),
+            precisao,
+        )
+        for i in range(linhas) for j in range(colunas)
+    })
+
+    # Células vizinhas na ordem do geohash viram uma faixa só
+    faixas = []
+    for celula in celulas:
+        fim = _proximo_prefixo(celula)
+        if faixas and faixas[-1][1] == celula:
+            faixas[-1][1] = fim
+        else:
+            faixas.append([celula, fim])
+    return [tuple(faixa) for faixa in faixas]
+
+
+def _consulta_candidatos(faixas, tipos, status):
+    # Um SELECT por faixa, unidos com UNION ALL: cada um é uma busca por
+    # intervalo que lê só o índice (um OR único faz o SQLite ir à tabela)
+    consultas = []
+    for tipo in tipos:
+        for inicio, fim in faixas:
+            consulta = select(Compra.id, Compra.latitude, Compra.longitude).where(
+                Compra.tipo_coleta == tipo, Compra.geohash >= inicio
+            )
+            if fim is not None:
+                consulta = consulta.where(Compra.geohash < fim)
+            if status:
+                consulta = consulta.where(Compra.status_aprovacao.in_(status))
+            consultas.append(consulta)
+    return consultas[0] if len(consultas) == 1 else union_all(*consultas)
+
+
+def _candidatos(min_lat, min_lon, max_lat, max_lon, tipo_coleta='coleta', status=None):
+    """(ids, latitudes, longitudes) das compras nas células que cobrem o retângulo.
+
+    Só lê colunas do índice (tipo_coleta, geohash, latitude, longitude,
+    status_aprovacao): a consulta não toca na tabela.
+    """
+    import numpy as np
+
+    consulta = _consulta_candidatos(
+        faixas_geohash(min_lat, min_lon, max_lat, max_lon), [tipo_coleta] if tipo_coleta else TIPOS_COLETA, status
+    )
+    linhas = sessao_leitura().connection().execute(consulta).all()
+    if not linhas:
+        vazio = np.empty(0)
+        return vazio.astype(np.int64), vazio, vazio
+    ids, latitudes, longitudes = zip(*linhas)
+    return np.array(ids, dtype=np.int64), np.array(latitudes, dtype=float), np.array(longitudes, dtype=float)
+
+
+def _detalhes(ids):
+    """{id: linha} com os dados exibidos das compras escolhidas (consultas em blocos)."""
+    colunas = (
+        Compra.id, Compra.latitude, Compra.longitude, Compra.fornecedor_id, Fornecedor.nome_social,
+        Compra.quantidade_kg, Compra.valor_total, Compra.status_aprovacao, Compra.endereco_coleta, Compra.data,
+    )
+    conexao = sessao_leitura().connection()
+    linhas = {}
+    for inicio in range(0, len(ids), TAMANHO_BLOCO_IDS):
+        bloco = [int(id_) for id_ in ids[inicio:inicio + TAMANHO_BLOCO_IDS]]
+        consulta = select(*colunas).join(Fornecedor, Fornecedor.id == Compra.fornecedor_id).where(Compra.id.in_(bloco))
+        linhas.update((linha.id, linha) for linha in conexao.execute(consulta))
+    return linhas
+
+
+def _serializar(linha, distancia=None):
+    item = {
+        'id': linha.id,
+        'latitude': linha.latitude,
+        'longitude': linha.longitude,
+        'fornecedor_id': linha.fornecedor_id,
+        'fornecedor': linha.nome_social,
+        'quantidade_kg': linha.quantidade_kg,
+        'valor_total': linha.valor_total,
+        'status_aprovacao': linha.status_aprovacao,
+        'endereco_coleta': linha.endereco_coleta,
+        'data': linha.data.isoformat() if linha.data else None,
+    }
+    if distancia is not None:
+        item['distancia_km'] = round(float(distancia), 3)
+    return item
+
+
+def haversine_km(latitude, longitude, latitudes, longitudes):
+    """Distância (km) do ponto a cada posição dos arrays, vetorizada."""
+    import numpy as np
+
+    lat1, lon1 = np.radians(latitude), np.radians(longitude)
+    lat2, lon2 = np.radians(latitudes), np.radians(longitudes)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RAIO_TERRA_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def compras_no_retangulo(min_lat, min_lon, max_lat, max_lon, tipo_coleta='coleta', status=None, limite=500):
+    """Compras dentro do retângulo, das cadastradas por último para as mais antigas."""
+    import numpy as np
+
+    ids, latitudes, longitudes = _candidatos(min_lat, min_lon, max_lat, max_lon, tipo_coleta, status)
+    dentro = (latitudes >= min_lat) & (latitudes <= max_lat) & (longitudes >= min_lon) & (longitudes <= max_lon)
+    escolhidos = np.sort(ids[dentro])[::-1][:limite]
+    linhas = _detalhes(escolhidos)
+    return [_serializar(linhas[id_]) for id_ in escolhidos.tolist() if id_ in linhas]
+
+
+def compras_no_raio(latitude, longitude, raio_km, tipo_coleta='coleta', status=None, limite=500):
+    """Compras a até `raio_km` do ponto, da mais próxima para a mais distante."""
+    import numpy as np
+
+    # Busca em raios crescentes: em área densa as `limite` mais próximas já
+    # aparecem num raio menor, sem ler todas as compras do raio pedido
+    raio_busca = min(raio_km / 2, RAIO_INICIAL_KM)
+    while True:
+        delta_lat = math.degrees(raio_busca / RAIO_TERRA_KM)
+        cos_lat = max(math.cos(math.radians(latitude)), 1e-6)
+        delta_lon = min(math.degrees(raio_busca / (RAIO_TERRA_KM * cos_lat)), 180.0)
+
+        ids, latitudes, longitudes = _candidatos(latitude - delta_lat, longitude - delta_lon,
+                                                 latitude + delta_lat, longitude + delta_lon, tipo_coleta, status)
+        distancias = haversine_km(latitude, longitude, latitudes, longitudes)
+        dentro = np.flatnonzero(distancias <= raio_busca)
+        if len(dentro) >= limite or raio_busca >= raio_km:
+            break
+        # Próximo raio pela densidade observada (área ~ raio²), com folga de 20%
+        fator = math.sqrt(limite / len(dentro)) * 1.2 if len(dentro) else 4.0
+        raio_busca = min(raio_busca * min(max(fator, 1.5), 4.0), raio_km)
+
+    ordem = dentro[np.argsort(distancias[dentro], kind='stable')][:limite]
+    linhas = _detalhes(ids[ordem])
+    return [
+        _serializar(linhas[id_], distancia)
+        for id_, distancia in zip(ids[ordem].tolist(), distancias[ordem].tolist()) if id_ in linhas
+    ]
+
+
+def preencher_geohash(todos=False, tamanho_lote=5000):
+    """Calcula compras.geohash das linhas sem ele (ou de todas). Retorna quantas foram gravadas."""
+    from versoes import marcar_alteracao
+
+    tabela = Compra.__table__
+    comando = update(tabela).where(tabela.c.id == bindparam('b_id')).values(geohash=bindparam('b_geohash'))
+    ultimo_id = 0
+    total = 0
+    while True:
+        consulta = select(tabela.c.id, tabela.c.latitude, tabela.c.longitude).where(
+            tabela.c.id > ultimo_id, tabela.c.latitude.isnot(None), tabela.c.longitude.isnot(None)
+        ).order_by(tabela.c.id).limit(tamanho_lote)
+        if not todos:
+            consulta = consulta.where(tabela.c.geohash.is_(None))
+        linhas = db.session.execute(consulta).all()
+        if not linhas:
+            break
+        db.session.execute(comando, [
+            {'b_id': id_, 'b_geohash': codificar_geohash(latitude, longitude)} for id_, latitude, longitude in linhas
+        ])
+        db.session.commit()
+        total += len(linhas)
+        ultimo_id = linhas[-1][0]
+    if total:
+        marcar_alteracao(tabela.name)
+        db.session.commit()
+    return total
+
+
+def _preencher_geohash(mapper, connection, alvo):
+    if alvo.latitude is not None and alvo.longitude is not None:
+        alvo.geohash = codificar_geohash(alvo.latitude, alvo.longitude)
+    else:
+        alvo.geohash = None
+
+
+def configurar_geo(app):
+    """Mantém compras.geohash atualizado em toda escrita pelo ORM."""
+    if not event.contains(Compra, 'before_insert', _preencher_geohash):
+        event.listen(Compra, 'before_insert', _preencher_geohash)
+        event.listen(Compra, 'before_update', _preencher_geohash)
@@ -0,0 +1,102 @@
+"""
+Histórico de preços dos itens da tabela de preços (historico_precos).
+
+Cada mudança de preco_por_kg fecha o intervalo aberto do item (valido_ate)
+e abre outro a partir do mesmo instante: o histórico só cresce e os
+intervalos de um item são contíguos. Escritas pelo ORM são registradas no
+flush; caminhos em lote (importação de catálogo, gerar-dados) chamam
+sincronizar_historico() na mesma transação.
+
+As leituras usam o índice (tabela_preco_id, valido_de): o preço vigente
+numa data é uma busca por item e a evolução num período começa no
+intervalo vigente no início, sem percorrer o histórico anterior.
+"""
+
+from datetime import datetime
+from sqlalchemy import case, event, exists, func, insert, inspect, literal, select, update
+from models import db, HistoricoPreco, TabelaPreco
+from database import sessao_leitura
+
+_historico = HistoricoPreco.__table__
+_itens = TabelaPreco.__table__
+
+
+def sincronizar_historico(conexao, itens=None, quando=None):
+    """Registra o preço atual dos itens (ids ou select de ids; None = todos) que mudaram.
+
+    Item sem histórico entra com valido_de = atualizado_em (o preço vale ao
+    menos desde a última alteração). Retorna quantos intervalos foram abertos.
+    """
+    quando = quando or datetime.utcnow()
+    filtro_historico, filtro_itens = [], []
+    if itens is not None:
+        filtro_historico.append(_historico.c.tabela_preco_id.in_(itens))
+        filtro_itens.append(_itens.c.id.in_(itens))
+
+    preco_atual = select(_itens.c.preco_por_kg).where(_itens.c.id == _historico.c.tabela_preco_id).scalar_subquery()
+    conexao.execute(update(_historico).where(
+        _historico.c.valido_ate.is_(None), _historico.c.preco_por_kg != preco_atual, *filtro_historico,
+    ).values(valido_ate=quando))
+
+    com_historico = exists().where(_historico.c.tabela_preco_id == _itens.c.id)
+    aberto = exists().where(_historico.c.tabela_preco_id == _itens.c.id, _historico.c.valido_ate.is_(None))
+    valido_de = case((com_historico, literal(quando)), else_=func.coalesce(_itens.c.atualizado_em, literal(quando)))
+    return conexao.execute(insert(_historico).from_select(
+        ['tabela_preco_id', 'preco_por_kg', 'valido_de'],
+        select(_itens.c.id, _itens.c.preco_por_kg, valido_de).where(~aberto, *filtro_itens),
+    ).execution_options(preserve_rowcount=True)).rowcount  # sem isso o PostgreSQL devolve -1
+
+
+def _apos_flush(sessao, contexto):
+    ids = [
+        obj.id for obj in sessao.new | sessao.dirty
+        if isinstance(obj, TabelaPreco) and obj not in sessao.deleted
+        and (obj in sessao.new or inspect(obj).attrs.preco_por_kg.history.has_changes())
+    ]
+    if ids:
+        sincronizar_historico(sessao.connection(), ids)
+
+
+def precos_em(itens, quando):
+    """{tabela_preco_id: preço por kg vigente em `quando`} numa consulta só.
+
+    Itens sem preço na data (criados depois, ou fora do histórico) ficam de fora.
+    """
+    itens = list(itens)
+    if not itens:
+        return {}
+    vigente = select(_historico.c.preco_por_kg).where(
+        _historico.c.tabela_preco_id == _itens.c.id, _historico.c.valido_de <= quando,
+    ).order_by(_historico.c.valido_de.desc()).limit(1).scalar_subquery()
+    linhas = sessao_leitura().execute(select(_itens.c.id, vigente).where(_itens.c.id.in_(itens)))
+    return {item_id: preco for item_id, preco in linhas if preco is not None}
+
+
+def evolucao_preco(item_id, inicio=None, fim=None):
+    """Intervalos de preço do item que tocam [inicio, fim), em ordem."""
+    filtro = [_historico.c.tabela_preco_id == item_id]
+    if inicio:
+        # Começa no intervalo vigente no início (último valido_de <= inicio), pelo índice
+        vigente_no_inicio = select(func.max(_historico.c.valido_de)).where(
+            _historico.c.tabela_preco_id == item_id, _historico.c.valido_de <= inicio,
+        ).scalar_subquery()
+        filtro.append(_historico.c.valido_de >= func.coalesce(vigente_no_inicio, inicio))
+    if fim:
+        filtro.append(_historico.c.valido_de < fim)
+    consulta = select(
+        _historico.c.preco_por_kg, _historico.c.valido_de, _historico.c.valido_ate,
+    ).where(*filtro).order_by(_historico.c.valido_de)
+    return [
+        {
+            'preco_por_kg': linha.preco_por_kg,
+            'valido_de': linha.valido_de.isoformat(),
+            'valido_ate': linha.valido_ate.isoformat() if linha.valido_ate else None,
+        }
+        for linha in sessao_leitura().execute(consulta)
+    ]
+
+
+def configurar_historico_precos(app):
+    """Registra no histórico as mudanças de preço gravadas pelo ORM."""
+    if not event.contains(db.session, 'after_flush', _apos_flush):
+        event.listen(db.session, 'after_flush', _apos_flush)
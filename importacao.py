@@ -0,0 +1,648 @@
+"""
+Importação de tabelas de preços (clonagem entre fornecedores e catálogo em
+CSV/XLSX) e de listas de fornecedores em CSV/XLSX.
+
+Tudo em comandos de conjunto, sem objetos do ORM por linha:
+
+- clonar_tabela: um único INSERT ... SELECT copia os itens ativos de um
+  fornecedor para outro (itens que o destino já tem com o mesmo nome ficam).
+- importar_catalogo: o arquivo é lido em streaming (csv ou openpyxl em
+  read_only) e as linhas válidas vão em lotes para uma tabela temporária.
+  Daí, uma consulta contra o índice único de codigo_barras acha códigos
+  repetidos no arquivo ou já usados por outro fornecedor; depois um UPDATE
+  ... FROM atualiza os itens existentes (por código de barras ou, sem
+  código, pelo nome) e um INSERT ... SELECT cria os novos.
+- importar_fornecedores: mesmo esquema de carga. CPF/CNPJ são normalizados
+  linha a linha e os dígitos verificadores conferidos em NumPy a cada lote;
+  os fornecedores existentes são achados pelos índices únicos de cnpj/cpf
+  (uma subconsulta por linha da carga, num UPDATE só) e as gravações saem
+  em UPDATE ... FROM / INSERT ... SELECT por faixa de linhas. As linhas
+  recusadas vão, com o motivo, para um relatório CSV escrito à medida que
+  aparecem.
+
+Como as escritas não passam pelo flush do ORM, a versão de tabela_precos
+(ETags) é incrementada com marcar_alteracao() e as mudanças de preço vão
+para o histórico com sincronizar_historico() e a trilha de auditoria recebe
+um evento por importação/clonagem (registrar_evento()).
+"""
+
+import csv
+import io
+import math
+import os
+import re
+import unicodedata
+from datetime import datetime
+from sqlalchemy import (
+    Column, Float, Index, Integer, MetaData, String, Table, Text,
+    and_, delete, exists, func, insert, literal, select, update,
+)
+from models import db, Fornecedor, TabelaPreco
+from auth import formatar_cnpj, formatar_cpf
+from versoes import marcar_alteracao
+from historico_precos import sincronizar_historico
+from auditoria import registrar_evento
+
+TAMANHO_LOTE = 5000
+MAX_ERROS_EXIBIDOS = 100
+EXTENSOES_CATALOGO = {'.csv', '.xlsx'}
+# Pesos dos dígitos verificadores: o primeiro usa do segundo peso em diante
+PESOS_CNPJ = (6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2)
+PESOS_CPF = (11, 10, 9, 8, 7, 6, 5, 4, 3, 2)
+
+# Cabeçalhos aceitos (sem acento, minúsculos) para cada coluna
+COLUNAS = {
+    'nome_item': {'nome_item', 'nome', 'item', 'produto', 'material', 'descricao_item'},
+    'preco_por_kg': {'preco_por_kg', 'preco', 'preco_kg', 'valor', 'valor_kg'},
+    'codigo_barras': {'codigo_barras', 'codigo', 'cod_barras', 'ean', 'barcode'},
+    'unidade': {'unidade', 'un', 'und'},
+    'descricao': {'descricao', 'observacao', 'obs'},
+}
+COLUNAS_FORNECEDOR = {
+    'nome_social': {'nome_social', 'nome', 'razao_social', 'fornecedor'},
+    'documento': {'documento', 'cpf_cnpj', 'cnpj_cpf', 'cpf/cnpj', 'cnpj/cpf', 'doc'},  # CPF ou CNPJ, pelo tamanho
+    'cnpj': {'cnpj'},
+    'cpf': {'cpf'},
+    'telefone': {'telefone', 'fone', 'celular'},
+    'email': {'email', 'e_mail'},
+    'endereco_coleta': {'endereco_coleta', 'endereco'},
+    'endereco_emissao': {'endereco_emissao'},
+    'chave_pix': {'chave_pix', 'pix'},
+    'banco': {'banco'},
+    'agencia': {'agencia'},
+    'conta': {'conta'},
+}
+_CAMPOS_FORNECEDOR = ['telefone', 'email', 'endereco_coleta', 'endereco_emissao', 'chave_pix', 'banco', 'agencia', 'conta']
+
+_tabela_precos = TabelaPreco.__table__
+_fornecedores = Fornecedor.__table__
+
+# Tabela temporária de carga: fora de db.metadata, criada e removida a cada importação
+_metadata_carga = MetaData()
+_carga = Table(
+    'carga_tabela_precos', _metadata_carga,
+    Column('linha', Integer, primary_key=True),
+    Column('nome_item', String(255), nullable=False),
+    Column('codigo_barras', String(255)),
+    Column('preco_por_kg', Float, nullable=False),
+    Column('unidade', String(20)),
+    Column('descricao', Text),
+    # Os UPDATE ... FROM procuram cada item existente na carga pelo código ou pelo nome
+    Index('ix_carga_codigo_barras', 'codigo_barras'),
+    Index('ix_carga_nome_item', 'nome_item'),
+    prefixes=['TEMPORARY'],
+)
+_carga_fornecedores = Table(
+    'carga_fornecedores', _metadata_carga,
+    Column('linha', Integer, primary_key=True),
+    Column('nome_social', String(200), nullable=False),
+    Column('cnpj', String(18)),  # formatado, como no cadastro
+    Column('cnpj_digitos', String(14)),
+    Column('cpf', String(14)),
+    Column('cpf_digitos', String(11)),
+    *(Column(campo, String(255)) for campo in _CAMPOS_FORNECEDOR),
+    Column('fornecedor_id', Integer),  # fornecedor já cadastrado com o mesmo CNPJ/CPF
+    Index('ix_carga_fornecedores_cnpj', 'cnpj_digitos'),
+    Index('ix_carga_fornecedores_cpf', 'cpf_digitos'),
+    Index('ix_carga_fornecedores_fornecedor', 'fornecedor_id'),
+    prefixes=['TEMPORARY'],
+)
+
+
+class ImportacaoError(Exception):
+    """Arquivo de catálogo que não pode ser lido (formato, cabeçalho)."""
+
+
+def _itens_do_fornecedor(fornecedor_id):
+    return select(_tabela_precos.c.id).where(_tabela_precos.c.fornecedor_id == fornecedor_id)
+
+
+def clonar_tabela(origem_id, destino_id):
+    """Copia os itens ativos de `origem_id` para `destino_id`. Retorna quantos foram criados.
+
+    Códigos de barras não são copiados: são únicos e pertencem à origem.
+    """
+    origem = _tabela_precos.alias('origem')
+    agora = datetime.utcnow()
+    ja_existe = exists().where(
+        _tabela_precos.c.fornecedor_id == destino_id,
+        _tabela_precos.c.nome_item == origem.c.nome_item,
+    )
+    # O SQLAlchemy só garante rowcount de UPDATE/DELETE: no PostgreSQL o de um
+    # INSERT ... SELECT volta -1 sem preserve_rowcount
+    resultado = db.session.execute(insert(_tabela_precos).from_select(
+        ['fornecedor_id', 'nome_item', 'preco_por_kg', 'unidade', 'descricao', 'ativo', 'criado_em', 'atualizado_em'],
+        select(
+            literal(destino_id), origem.c.nome_item, origem.c.preco_por_kg, origem.c.unidade, origem.c.descricao,
+            literal(True), literal(agora), literal(agora),
+        ).where(origem.c.fornecedor_id == origem_id, origem.c.ativo.is_(True), ~ja_existe),
+    ).execution_options(preserve_rowcount=True))
+    if resultado.rowcount:
+        sincronizar_historico(db.session.connection(), _itens_do_fornecedor(destino_id), agora)
+        marcar_alteracao(_tabela_precos.name)
+        registrar_evento('fornecedores', destino_id, 'clonagem_tabela', {'origem_id': origem_id, 'criados': resultado.rowcount})
+    db.session.commit()
+    return resultado.rowcount
+
+
+def _normalizar_cabecalho(nome):
+    nome = unicodedata.normalize('NFKD', str(nome or '')).encode('ascii', 'ignore').decode()
+    return nome.strip().lower().replace(' ', '_').replace('-', '_')
+
+
+def _mapear_colunas(cabecalho, colunas=COLUNAS, obrigatorias=('nome_item', 'preco_por_kg')):
+    """{coluna: posição} a partir da linha de cabeçalho."""
+    posicoes = {}
+    for posicao, nome in enumerate(cabecalho):
+        normalizado = _normalizar_cabecalho(nome)
+        for coluna, aliases in colunas.items():
+            if normalizado in aliases and coluna not in posicoes:
+                posicoes[coluna] = posicao
+    faltando = [coluna for coluna in obrigatorias if coluna not in posicoes]
+    if faltando:
+        raise ImportacaoError(f"Cabeçalho sem a(s) coluna(s): {', '.join(faltando)}.")
+    return posicoes
+
+
+def _converter_preco(valor):
+    """Aceita número, '12.5', '12,50' e '1.234,56'."""
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    texto = str(valor or '').strip().replace('R$', '').replace(' ', '')
+    if ',' in texto:
+        texto = texto.replace('.', '').replace(',', '.')
+    return float(texto)
+
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)  # códigos numéricos lidos do Excel como float
+    return str(valor).strip()
+
+
+def _linhas_csv(stream):
+    texto = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    amostra = texto.read(4096)
+    texto.seek(0)
+    try:
+        dialeto = csv.Sniffer().sniff(amostra, delimiters=';,\t')
+    except csv.Error:
+        dialeto = csv.excel
+    try:
+        yield from csv.reader(texto, dialeto)
+    finally:
+        texto.detach()
+
+
+def _linhas_xlsx(stream):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportacaoError('Suporte a XLSX indisponível (instale openpyxl); envie o catálogo em CSV.')
+    # read_only: lê a planilha em streaming, sem montar todas as células na memória
+    planilha = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        yield from planilha.active.iter_rows(values_only=True)
+    finally:
+        planilha.close()
+
+
+def _linhas_arquivo(stream, nome_arquivo):
+    """(numero_linha, valores) das linhas não vazias do CSV/XLSX, começando pelo cabeçalho."""
+    extensao = os.path.splitext(nome_arquivo or '')[1].lower()
+    if extensao not in EXTENSOES_CATALOGO:
+        raise ImportacaoError('Envie o arquivo em CSV ou XLSX.')
+    linhas = _linhas_xlsx(stream) if extensao == '.xlsx' else _linhas_csv(stream)
+    vazio = True
+    for numero, linha in enumerate(linhas, start=1):
+        if linha and any(_texto(valor) != '' for valor in linha):
+            vazio = False
+            yield numero, linha
+    if vazio:
+        raise ImportacaoError('Arquivo vazio.')
+
+
+def _ler_catalogo(stream, nome_arquivo):
+    """Gera (numero_linha, dados ou None, erro ou None) para cada linha do arquivo."""
+    posicoes = None
+    for numero, linha in _linhas_arquivo(stream, nome_arquivo):
+        if posicoes is None:
+            posicoes = _mapear_colunas(linha)
+            continue
+
+        def campo(coluna):
+            posicao = posicoes.get(coluna)
+            return linha[posicao] if posicao is not None and posicao < len(linha) else None
+
+        nome_item = _texto(campo('nome_item'))[:255]
+        if not nome_item:
+            yield numero, None, 'Nome do item vazio.'
+            continue
+        try:
+            preco = _converter_preco(campo('preco_por_kg'))
+        except ValueError:
+            yield numero, None, f'Preço inválido: {campo("preco_por_kg")!r}.'
+            continue
+        if not (preco > 0 and math.isfinite(preco)):
+            yield numero, None, 'Preço deve ser maior que zero.'
+            continue
+        yield numero, {
+            'linha': numero,
+            'nome_item': nome_item,
+            'codigo_barras': _texto(campo('codigo_barras'))[:255] or None,
+            'preco_por_kg': round(preco, 4),
+            'unidade': _texto(campo('unidade'))[:20] or 'kg',
+            'descricao': _texto(campo('descricao')) or None,
+        }, None
+
+
+def _validar_carga(conexao, fornecedor_id):
+    """Linhas da carga com código de barras (ou nome, sem código) repetido, ou código de outro fornecedor."""
+    repetidos = select(_carga.c.codigo_barras).where(_carga.c.codigo_barras.isnot(None)) \
+        .group_by(_carga.c.codigo_barras).having(func.count() > 1)
+    erros = [
+        (linha, f'Código de barras {codigo} repetido no arquivo.')
+        for linha, codigo in conexao.execute(
+            select(_carga.c.linha, _carga.c.codigo_barras).where(_carga.c.codigo_barras.in_(repetidos))
+        )
+    ]
+    nomes_repetidos = select(_carga.c.nome_item).where(_carga.c.codigo_barras.is_(None)) \
+        .group_by(_carga.c.nome_item).having(func.count() > 1)
+    erros += [
+        (linha, f'Item "{nome}" sem código de barras repetido no arquivo.')
+        for linha, nome in conexao.execute(
+            select(_carga.c.linha, _carga.c.nome_item)
+            .where(_carga.c.codigo_barras.is_(None), _carga.c.nome_item.in_(nomes_repetidos))
+        )
+    ]
+    # Uma consulta só, pelo índice único de tabela_precos.codigo_barras
+    erros += [
+        (linha, f'Código de barras {codigo} já pertence ao fornecedor {dono}.')
+        for linha, codigo, dono in conexao.execute(
+            select(_carga.c.linha, _carga.c.codigo_barras, _tabela_precos.c.fornecedor_id)
+            .join(_tabela_precos, _tabela_precos.c.codigo_barras == _carga.c.codigo_barras)
+            .where(_tabela_precos.c.fornecedor_id != fornecedor_id)
+        )
+    ]
+    return erros
+
+
+def _gravar_carga(conexao, fornecedor_id):
+    """Atualiza itens existentes e insere os novos. Retorna (atualizados, inseridos)."""
+    agora = datetime.utcnow()
+    valores = {
+        'preco_por_kg': _carga.c.preco_por_kg,
+        'unidade': _carga.c.unidade,
+        'descricao': func.coalesce(_carga.c.descricao, _tabela_precos.c.descricao),
+        'ativo': True,
+        'atualizado_em': agora,
+    }
+    # Com código de barras: o código identifica o item (o nome pode mudar)
+    por_codigo = conexao.execute(
+        update(_tabela_precos)
+        .where(_tabela_precos.c.codigo_barras == _carga.c.codigo_barras,
+               _tabela_precos.c.fornecedor_id == fornecedor_id)
+        .values(nome_item=_carga.c.nome_item, **valores)
+    ).rowcount
+    # Sem código de barras: pelo nome do item dentro do fornecedor
+    por_nome = conexao.execute(
+        update(_tabela_precos)
+        .where(_carga.c.codigo_barras.is_(None),
+               _tabela_precos.c.nome_item == _carga.c.nome_item,
+               _tabela_precos.c.fornecedor_id == fornecedor_id)
+        .values(**valores)
+    ).rowcount
+
+    # Dois INSERT ... SELECT, cada um com NOT EXISTS num índice: o código de
+    # barras (único) ou (fornecedor_id, nome_item) para as linhas sem código
+    existente = _tabela_precos.alias('existente')
+    colunas = ['fornecedor_id', 'nome_item', 'codigo_barras', 'preco_por_kg', 'unidade', 'descricao', 'ativo',
+               'criado_em', 'atualizado_em']
+    linhas = select(
+        literal(fornecedor_id), _carga.c.nome_item, _carga.c.codigo_barras, _carga.c.preco_por_kg,
+        _carga.c.unidade, _carga.c.descricao, literal(True), literal(agora), literal(agora),
+    ).order_by(_carga.c.linha)
+    inseridos = conexao.execute(insert(_tabela_precos).from_select(colunas, linhas.where(
+        _carga.c.codigo_barras.isnot(None),
+        ~exists().where(existente.c.codigo_barras == _carga.c.codigo_barras),
+    )).execution_options(preserve_rowcount=True)).rowcount
+    inseridos += conexao.execute(insert(_tabela_precos).from_select(colunas, linhas.where(
+        _carga.c.codigo_barras.is_(None),
+        ~exists().where(existente.c.fornecedor_id == fornecedor_id, existente.c.nome_item == _carga.c.nome_item),
+    )).execution_options(preserve_rowcount=True)).rowcount
+    if por_codigo or por_nome or inseridos:
+        sincronizar_historico(conexao, _itens_do_fornecedor(fornecedor_id), agora)
+    return por_codigo + por_nome, inseridos
+
+
+def importar_catalogo(fornecedor_id, stream, nome_arquivo, ignorar_erros=False):
+    """Importa o catálogo (CSV/XLSX) para o fornecedor.
+
+    Com erros e ignorar_erros=False nada é gravado. Retorna dict com linhas,
+    inseridos, atualizados e erros [(linha, mensagem)] (até MAX_ERROS_EXIBIDOS).
+    """
+    stream.seek(0)
+    conexao = db.session.connection()
+    _carga.drop(conexao, checkfirst=True)
+    _carga.create(conexao)
+    try:
+        erros = []
+        total = 0
+        lote = []
+        for numero, dados, erro in _ler_catalogo(stream, nome_arquivo):
+            total += 1
+            if erro:
+                erros.append((numero, erro))
+                continue
+            lote.append(dados)
+            if len(lote) >= TAMANHO_LOTE:
+                conexao.execute(insert(_carga), lote)
+                lote = []
+        if lote:
+            conexao.execute(insert(_carga), lote)
+
+        erros_codigo = _validar_carga(conexao, fornecedor_id)
+        if erros_codigo:
+            linhas_com_erro = sorted({linha for linha, _ in erros_codigo})
+            for inicio in range(0, len(linhas_com_erro), TAMANHO_LOTE):
+                conexao.execute(delete(_carga).where(
+                    _carga.c.linha.in_(linhas_com_erro[inicio:inicio + TAMANHO_LOTE])))
+        erros = sorted(erros + erros_codigo)
+
+        resultado = {'linhas': total, 'inseridos': 0, 'atualizados': 0,
+                     'total_erros': len(erros), 'erros': erros[:MAX_ERROS_EXIBIDOS]}
+        if erros and not ignorar_erros:
+            db.session.rollback()
+            return resultado
+
+        resultado['atualizados'], resultado['inseridos'] = _gravar_carga(conexao, fornecedor_id)
+        _carga.drop(conexao)
+        if resultado['atualizados'] or resultado['inseridos']:
+            marcar_alteracao(_tabela_precos.name)
+            registrar_evento('fornecedores', fornecedor_id, 'importacao_catalogo', {
+                'arquivo': nome_arquivo, 'atualizados': resultado['atualizados'], 'inseridos': resultado['inseridos'],
+            })
+        db.session.commit()
+        return resultado
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+# ---------------------------------------------------------------- fornecedores
+
+def _normalizar_documento(valor, tamanho):
+    """Só letras e dígitos, maiúsculos. Número vindo do Excel perdeu os zeros à esquerda: volta com zfill."""
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return _texto(valor).zfill(tamanho)
+    return re.sub(r'[^0-9A-Za-z]', '', _texto(valor)).upper()
+
+
+def _ler_fornecedores(stream, nome_arquivo):
+    """Gera (numero_linha, dados ou None, erro ou None); os dígitos verificadores ficam para o lote."""
+    posicoes = None
+    for numero, linha in _linhas_arquivo(stream, nome_arquivo):
+        if posicoes is None:
+            posicoes = _mapear_colunas(linha, COLUNAS_FORNECEDOR, ('nome_social',))
+            if not {'documento', 'cnpj', 'cpf'} & set(posicoes):
+                raise ImportacaoError('Cabeçalho sem coluna de CPF/CNPJ (documento, cnpj ou cpf).')
+            continue
+
+        def campo(coluna):
+            posicao = posicoes.get(coluna)
+            return linha[posicao] if posicao is not None and posicao < len(linha) else None
+
+        nome_social = _texto(campo('nome_social'))[:200]
+        cnpj = _normalizar_documento(campo('cnpj'), 14)
+        cpf = _normalizar_documento(campo('cpf'), 11)
+        documento = campo('documento')
+        if documento is not None and _texto(documento):
+            normalizado = _normalizar_documento(documento, 11 if len(_texto(documento)) <= 11 else 14)
+            if len(normalizado) == 14 and not cnpj:
+                cnpj = normalizado
+            elif len(normalizado) == 11 and not cpf:
+                cpf = normalizado
+            elif len(normalizado) not in (11, 14):
+                yield numero, None, f'CPF/CNPJ com {len(normalizado)} caracteres: {_texto(documento)!r}.'
+                continue
+        if not nome_social:
+            yield numero, None, 'Nome social vazio.'
+            continue
+        if not cnpj and not cpf:
+            yield numero, None, 'Sem CPF/CNPJ.'
+            continue
+        if cnpj and len(cnpj) != 14:
+            yield numero, None, f'CNPJ com {len(cnpj)} caracteres: {_texto(campo("cnpj"))!r}.'
+            continue
+        if cpf and len(cpf) != 11:
+            yield numero, None, f'CPF com {len(cpf)} caracteres: {_texto(campo("cpf"))!r}.'
+            continue
+        yield numero, {
+            'linha': numero,
+            'nome_social': nome_social,
+            'cnpj_digitos': cnpj or None,
+            'cpf_digitos': cpf or None,
+            **{c: _texto(campo(c))[:255] or None for c in _CAMPOS_FORNECEDOR},
+        }, None
+
+
+def _documentos_validos(documentos, pesos, so_digitos):
+    """Máscara NumPy dos documentos (mesmo tamanho, normalizados) com os dois dígitos verificadores certos.
+
+    Cada caractere vale código ASCII - 48, como no CNPJ alfanumérico (letras
+    só nas posições antes dos verificadores). Sequências repetidas
+    (000..., 111...) são recusadas.
+    """
+    import numpy as np
+
+    if not documentos:
+        return np.zeros(0, dtype=bool)
+    tamanho = len(pesos) + 1
+    valores = np.frombuffer(''.join(documentos).encode('ascii'), dtype=np.uint8) \
+        .reshape(-1, tamanho).astype(np.int64) - 48
+    base, verificadores = valores[:, :-2], valores[:, -2:]
+    digito = (base >= 0) & (base <= 9)
+    caracteres_ok = (digito if so_digitos else digito | ((base >= 17) & (base <= 42))).all(axis=1)
+    caracteres_ok &= ((verificadores >= 0) & (verificadores <= 9)).all(axis=1)
+
+    pesos = np.asarray(pesos)
+    resto = (base @ pesos[1:]) % 11
+    primeiro = np.where(resto < 2, 0, 11 - resto)
+    resto = (np.column_stack([base, primeiro]) @ pesos) % 11
+    segundo = np.where(resto < 2, 0, 11 - resto)
+    repetido = (valores == valores[:, :1]).all(axis=1)
+    return caracteres_ok & (verificadores[:, 0] == primeiro) & (verificadores[:, 1] == segundo) & ~repetido
+
+
+def _validar_lote_fornecedores(lote):
+    """Separa o lote em (válidos, [(linha, motivo)]), conferindo os verificadores de todos de uma vez."""
+    recusados = {}
+    for chave, pesos, nome, so_digitos in (
+        ('cnpj_digitos', PESOS_CNPJ, 'CNPJ', False), ('cpf_digitos', PESOS_CPF, 'CPF', True),
+    ):
+        com_documento = [dados for dados in lote if dados[chave]]
+        validos = _documentos_validos([dados[chave] for dados in com_documento], pesos, so_digitos)
+        for dados, valido in zip(com_documento, validos):
+            if not valido:
+                recusados.setdefault(dados['linha'], f'{nome} inválido: {dados[chave]}.')
+    validos = []
+    for dados in lote:
+        if dados['linha'] in recusados:
+            continue
+        dados['cnpj'] = formatar_cnpj(dados['cnpj_digitos']) if dados['cnpj_digitos'] else None
+        dados['cpf'] = formatar_cpf(dados['cpf_digitos']) if dados['cpf_digitos'] else None
+        validos.append(dados)
+    return validos, sorted(recusados.items())
+
+
+def _recusar_na_carga(conexao, consulta, mensagem, recusar):
+    """Recusa as linhas (linha, ...) da consulta com `mensagem(*colunas)` e as tira da carga."""
+    linhas = []
+    for linha, *colunas in conexao.execute(consulta).all():
+        recusar(linha, mensagem(*colunas))
+        linhas.append(linha)
+    for inicio in range(0, len(linhas), TAMANHO_LOTE):
+        conexao.execute(delete(_carga_fornecedores).where(
+            _carga_fornecedores.c.linha.in_(linhas[inicio:inicio + TAMANHO_LOTE])))
+
+
+def _conferir_carga_fornecedores(conexao, recusar):
+    """Repetidos no arquivo, fornecedor existente de cada linha (pelos índices únicos) e conflitos."""
+    carga, anterior = _carga_fornecedores, _carga_fornecedores.alias('anterior')
+    for chave, nome in (('cnpj_digitos', 'CNPJ'), ('cpf_digitos', 'CPF')):
+        _recusar_na_carga(conexao, select(carga.c.linha, func.min(anterior.c.linha)).join(
+            anterior, and_(anterior.c[chave] == carga.c[chave], anterior.c.linha < carga.c.linha),
+        ).group_by(carga.c.linha), lambda primeira, nome=nome: f'{nome} repetido no arquivo (linha {primeira}).',
+            recusar)
+
+    # Cadastro feito pelo formulário pode ter o documento formatado ou só com dígitos: procura os dois
+    def dono(coluna, formatado, digitos):
+        return select(_fornecedores.c.id).where(coluna.in_([formatado, digitos])).limit(1).scalar_subquery()
+
+    dono_cnpj = dono(_fornecedores.c.cnpj, carga.c.cnpj, carga.c.cnpj_digitos)
+    dono_cpf = dono(_fornecedores.c.cpf, carga.c.cpf, carga.c.cpf_digitos)
+    conexao.execute(update(carga).where(carga.c.cnpj_digitos.isnot(None)).values(fornecedor_id=dono_cnpj))
+    conexao.execute(update(carga).where(carga.c.fornecedor_id.is_(None), carga.c.cpf_digitos.isnot(None))
+                    .values(fornecedor_id=dono_cpf))
+
+    _recusar_na_carga(conexao, select(carga.c.linha, carga.c.cpf, dono_cpf).where(
+        carga.c.cpf_digitos.isnot(None), carga.c.fornecedor_id.isnot(None), dono_cpf != carga.c.fornecedor_id,
+    ), lambda cpf, outro: f'CPF {cpf} já pertence a outro fornecedor ({outro}).', recusar)
+    for coluna, formatado, digitos, nome in (
+        ('cnpj', carga.c.cnpj, carga.c.cnpj_digitos, 'CNPJ'), ('cpf', carga.c.cpf, carga.c.cpf_digitos, 'CPF'),
+    ):
+        _recusar_na_carga(conexao, select(carga.c.linha, _fornecedores.c.id, _fornecedores.c[coluna]).join(
+            _fornecedores, _fornecedores.c.id == carga.c.fornecedor_id,
+        ).where(
+            formatado.isnot(None), _fornecedores.c[coluna].isnot(None),
+            _fornecedores.c[coluna].notin_([formatado, digitos]),
+        ), lambda fornecedor_id, atual, nome=nome: f'O fornecedor {fornecedor_id} já tem outro {nome} ({atual}).',
+            recusar)
+
+    # CNPJ numa linha e CPF em outra podem levar ao mesmo fornecedor
+    _recusar_na_carga(conexao, select(carga.c.linha, func.min(anterior.c.linha)).join(
+        anterior, and_(anterior.c.fornecedor_id == carga.c.fornecedor_id, anterior.c.linha < carga.c.linha),
+    ).group_by(carga.c.linha), lambda primeira: f'Mesmo fornecedor da linha {primeira}.', recusar)
+
+
+def _gravar_carga_fornecedores(conexao):
+    """Atualiza os fornecedores existentes e insere os novos, por faixas de linhas. Retorna (atualizados, inseridos)."""
+    carga = _carga_fornecedores
+    agora = datetime.utcnow()
+    ultima = conexao.execute(select(func.max(carga.c.linha))).scalar() or 0
+    atualizados = inseridos = 0
+    colunas = ['nome_social', 'cnpj', 'cpf', *_CAMPOS_FORNECEDOR, 'criado_em', 'atualizado_em']
+    for inicio in range(0, ultima + 1, TAMANHO_LOTE):
+        faixa = [carga.c.linha >= inicio, carga.c.linha < inicio + TAMANHO_LOTE]
+        # Documento existente não é trocado; campos vazios no arquivo mantêm o cadastro
+        atualizados += conexao.execute(update(_fornecedores).where(
+            _fornecedores.c.id == carga.c.fornecedor_id, *faixa,
+        ).values(
+            nome_social=carga.c.nome_social,
+            cnpj=func.coalesce(_fornecedores.c.cnpj, carga.c.cnpj),
+            cpf=func.coalesce(_fornecedores.c.cpf, carga.c.cpf),
+            atualizado_em=agora,
+            **{c: func.coalesce(carga.c[c], _fornecedores.c[c]) for c in _CAMPOS_FORNECEDOR},
+        )).rowcount
+        inseridos += conexao.execute(insert(_fornecedores).from_select(colunas, select(
+            carga.c.nome_social, carga.c.cnpj, carga.c.cpf, *(carga.c[c] for c in _CAMPOS_FORNECEDOR),
+            literal(agora), literal(agora),
+        ).where(carga.c.fornecedor_id.is_(None), *faixa).order_by(carga.c.linha))
+            .execution_options(preserve_rowcount=True)).rowcount
+    return atualizados, inseridos
+
+
+def importar_fornecedores(stream, nome_arquivo, pasta_relatorio, ignorar_erros=False):
+    """Importa (cria ou atualiza pelo CNPJ/CPF) os fornecedores de um CSV/XLSX.
+
+    As linhas recusadas vão para um CSV em `pasta_relatorio` (linha, motivo).
+    Com recusas e ignorar_erros=False nada é gravado. Retorna dict com
+    linhas, inseridos, atualizados, total_erros, erros [(linha, mensagem)]
+    (até MAX_ERROS_EXIBIDOS) e relatorio (nome do arquivo ou None).
+    """
+    stream.seek(0)
+    os.makedirs(pasta_relatorio, exist_ok=True)
+    relatorio = os.path.join(pasta_relatorio, f"fornecedores-recusados-{datetime.utcnow():%Y%m%d-%H%M%S-%f}.csv")
+    resultado = {'linhas': 0, 'inseridos': 0, 'atualizados': 0, 'total_erros': 0, 'erros': [], 'relatorio': None}
+    conexao = db.session.connection()
+    _carga_fornecedores.drop(conexao, checkfirst=True)
+    _carga_fornecedores.create(conexao)
+    try:
+        with open(relatorio, 'w', encoding='utf-8', newline='') as arquivo_relatorio:
+            escritor = csv.writer(arquivo_relatorio, delimiter=';')
+            escritor.writerow(['linha', 'motivo'])
+
+            def recusar(linha, motivo):
+                escritor.writerow([linha, motivo])
+                resultado['total_erros'] += 1
+                if len(resultado['erros']) < MAX_ERROS_EXIBIDOS:
+                    resultado['erros'].append((linha, motivo))
+
+            lote = []
+            for numero, dados, erro in _ler_fornecedores(stream, nome_arquivo):
+                resultado['linhas'] += 1
+                if erro:
+                    recusar(numero, erro)
+                    continue
+                lote.append(dados)
+                if len(lote) >= TAMANHO_LOTE:
+                    validos, recusados = _validar_lote_fornecedores(lote)
+                    for linha, motivo in recusados:
+                        recusar(linha, motivo)
+                    if validos:
+                        conexao.execute(insert(_carga_fornecedores), validos)
+                    lote = []
+            validos, recusados = _validar_lote_fornecedores(lote)
+            for linha, motivo in recusados:
+                recusar(linha, motivo)
+            if validos:
+                conexao.execute(insert(_carga_fornecedores), validos)
+
+            _conferir_carga_fornecedores(conexao, recusar)
+
+        resultado['erros'].sort()
+        if resultado['total_erros']:
+            resultado['relatorio'] = os.path.basename(relatorio)
+        else:
+            os.remove(relatorio)
+        if resultado['total_erros'] and not ignorar_erros:
+            db.session.rollback()
+            return resultado
+
+        resultado['atualizados'], resultado['inseridos'] = _gravar_carga_fornecedores(conexao)
+        _carga_fornecedores.drop(conexao)
+        if resultado['atualizados'] or resultado['inseridos']:
+            marcar_alteracao(_fornecedores.name)
+            registrar_evento('fornecedores', None, 'importacao_fornecedores', {
+                'arquivo': nome_arquivo, 'atualizados': resultado['atualizados'], 'inseridos': resultado['inseridos'],
+                'recusados': resultado['total_erros'],
+            })
+        db.session.commit()
+        return resultado
+    except Exception:
+        db.session.rollback()
+        if resultado['relatorio'] is None and os.path.exists(relatorio):
+            os.remove(relatorio)
+        raise
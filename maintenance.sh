@@ -17,9 +17,17 @@ NC='\033[0m' # No Color
 # Configurações
 APP_DIR="/var/www/mrx_gestao"
 LOG_DIR="/var/log/mrx_gestao"
+DB_FILE="${APP_DIR}/instance/mrx.db"
 BACKUP_DIR="/backup"
 BACKUP_RETENTION_DAYS=30
 
+# Executa um comando Flask da aplicação como www-data
+flask_cmd() {
+    (cd "${APP_DIR}" && sudo -u www-data env FLASK_APP=app.py FLASK_ENV=production \
+        BACKUP_DIR="${BACKUP_DIR}" BACKUP_RETENTION_DAYS="${BACKUP_RETENTION_DAYS}" \
+        "${APP_DIR}/venv/bin/flask" "$@")
+}
+
 # Menu
 show_menu() {
     echo -e "${BLUE}"
@@ -93,13 +101,12 @@ make_backup() {
     
     # Criar diretório de backup
     sudo mkdir -p "${BACKUP_DIR}"
+    sudo chown www-data:www-data "${BACKUP_DIR}"
     
-    # Backup do banco de dados
-    BACKUP_FILE="${BACKUP_DIR}/mrx_db_$(date +%Y%m%d_%H%M%S).db"
-    sudo cp "${APP_DIR}/mrx.db" "${BACKUP_FILE}"
-    sudo chown $(whoami):$(whoami) "${BACKUP_FILE}"
+    # Backup online do banco (API de backup do SQLite, verificado e compactado)
+    flask_cmd backup-banco
     
-    echo -e "${GREEN}✓ Backup do banco de dados criado: ${BACKUP_FILE}${NC}"
+    echo -e "${GREEN}✓ Backup do banco de dados criado em ${BACKUP_DIR}${NC}"
     
     # Backup completo (opcional)
     read -p "Deseja fazer backup completo da aplicação? (s/n) " full_backup
@@ -135,7 +142,10 @@ restore_backup() {
         sudo tar -xzf "${BACKUP_DIR}/${backup_file}" -C /var/www
     else
         echo -e "${YELLOW}Restaurando banco de dados...${NC}"
-        sudo cp "${BACKUP_DIR}/${backup_file}" "${APP_DIR}/mrx.db"
+        RESTORE_TMP="${APP_DIR}/instance/restaurado_$(date +%Y%m%d_%H%M%S).db"
+        flask_cmd restaurar-banco "${BACKUP_DIR}/${backup_file}" "${RESTORE_TMP}"
+        sudo rm -f "${DB_FILE}-wal" "${DB_FILE}-shm"
+        sudo mv "${RESTORE_TMP}" "${DB_FILE}"
     fi
     
     sudo chown -R www-data:www-data "${APP_DIR}"
@@ -154,8 +164,8 @@ cleanup() {
     sudo find /var/log/mrx_gestao -type f -name "*.log" -mtime +30 -delete
     sudo find /var/log/nginx -type f -name "*mrx*" -mtime +30 -delete
     
-    # Limpar backups antigos
-    sudo find "${BACKUP_DIR}" -type f -name "mrx*" -mtime +${BACKUP_RETENTION_DAYS} -delete
+    # Limpar backups completos da aplicação (os do banco seguem a retenção do backup-banco)
+    sudo find "${BACKUP_DIR}" -type f -name "mrx_full_*" -mtime +${BACKUP_RETENTION_DAYS} -delete
     
     # Limpar cache do Nginx
     sudo rm -rf /var/cache/nginx/*
@@ -175,7 +185,7 @@ update_app() {
     
     # Fazer backup antes de atualizar
     echo -e "${YELLOW}Fazendo backup antes da atualização...${NC}"
-    sudo cp mrx.db "${BACKUP_DIR}/mrx_before_update_$(date +%Y%m%d_%H%M%S).db"
+    flask_cmd backup-banco
     
     # Parar aplicação
     echo -e "${YELLOW}Parando aplicação...${NC}"
@@ -190,6 +200,13 @@ update_app() {
     source venv/bin/activate
     pip install --upgrade -r requirements.txt
     
+    # Criar tabelas novas
+    flask_cmd atualizar-esquema
+    
+    # Regerar assets com hash (static/dist)
+    echo -e "${YELLOW}Gerando arquivos estáticos...${NC}"
+    flask_cmd build-static
+    
     # Iniciar aplicação
     echo -e "${YELLOW}Iniciando aplicação...${NC}"
     sudo systemctl start mrx_gestao
@@ -245,8 +262,8 @@ health_check() {
     
     # Banco de dados
     echo -e "\n${YELLOW}Banco de dados:${NC}"
-    if [ -f "${APP_DIR}/mrx.db" ]; then
-        DB_SIZE=$(du -h "${APP_DIR}/mrx.db" | cut -f1)
+    if [ -f "${DB_FILE}" ]; then
+        DB_SIZE=$(du -h "${DB_FILE}" | cut -f1)
         echo -e "${GREEN}✓ Banco de dados: ${DB_SIZE}${NC}"
     else
         echo -e "${RED}✗ Banco de dados não encontrado${NC}"
@@ -0,0 +1,184 @@
+"""
+Profiling por requisição e métricas Prometheus.
+
+Para cada rota mede latência, quantidade e tempo de SQL (eventos
+before/after_cursor_execute), linhas retornadas e tempo de renderização de
+template. Consultas acima de SLOW_QUERY_MS vão para o log com o tipo e o
+tamanho de cada parâmetro; os valores (senhas, CPF/CNPJ, chaves PIX) só com
+SLOW_QUERY_LOG_PARAMETROS ligado, para depurar.
+
+Com vários workers do Gunicorn, defina PROMETHEUS_MULTIPROC_DIR (ver
+setup_gunicorn.sh): cada worker grava seus valores lá e /metrics agrega todos.
+"""
+
+import logging
+import os
+import time
+from flask import g, has_request_context, request, Response, abort, before_render_template, template_rendered
+from flask_login import current_user
+from sqlalchemy import event
+from prometheus_client import (
+    CollectorRegistry, Counter, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest, multiprocess
+)
+from models import db, RoleEnum
+
+logger = logging.getLogger('mrx.sql')
+
+LATENCIA = Histogram(
+    'mrx_http_request_duration_seconds', 'Latência das requisições HTTP',
+    ['endpoint', 'method', 'status'],
+    buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30),
+)
+SQL_CONSULTAS = Histogram(
+    'mrx_sql_statements_per_request', 'Comandos SQL por requisição', ['endpoint'],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 500, 1000),
+)
+SQL_TEMPO = Histogram(
+    'mrx_sql_duration_seconds_per_request', 'Tempo total em SQL por requisição', ['endpoint'],
+    buckets=(.001, .005, .01, .025, .05, .1, .25, .5, 1, 5),
+)
+SQL_LINHAS = Histogram(
+    'mrx_sql_rows_per_request', 'Linhas retornadas/afetadas por requisição', ['endpoint'],
+    buckets=(0, 1, 10, 50, 100, 500, 1000, 10000, 100000),
+)
+TEMPLATE_TEMPO = Histogram(
+    'mrx_template_render_seconds', 'Tempo de renderização de templates por requisição', ['endpoint'],
+    buckets=(.001, .005, .01, .025, .05, .1, .25, .5, 1),
+)
+SQL_LENTAS = Counter('mrx_sql_slow_statements_total', 'Comandos SQL acima de SLOW_QUERY_MS', ['endpoint'])
+
+
+def _perfil():
+    """Acumuladores da requisição atual, ou None fora de requisição (CLI, threads)."""
+    if not has_request_context():
+        return None
+    if 'perfil' not in g:
+        g.perfil = {'inicio': time.perf_counter(), 'consultas': 0, 'tempo_sql': 0.0,
+                    'linhas': 0, 'tempo_template': 0.0, 'inicio_template': None}
+    return g.perfil
+
+
+def _resumir_parametros(parametros):
+    """Tipo (e tamanho, para texto) de cada parâmetro, sem o valor."""
+    if isinstance(parametros, dict):
+        return {nome: _resumir_parametros(valor) for nome, valor in parametros.items()}
+    if isinstance(parametros, (list, tuple)):
+        if parametros and isinstance(parametros[0], (dict, list, tuple)):
+            # executemany: uma linha de exemplo basta
+            return f'{len(parametros)} x {_resumir_parametros(parametros[0])!r}'
+        return tuple(_resumir_parametros(valor) for valor in parametros)
+    if isinstance(parametros, (str, bytes)):
+        return f'{type(parametros).__name__}[{len(parametros)}]'
+    return type(parametros).__name__
+
+
+def _registrar_eventos_sql(engine, limite_lento, mostrar_parametros=False):
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('inicio_consulta', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _depois(conn, cursor, statement, parameters, context, executemany):
+        duracao = time.perf_counter() - conn.info['inicio_consulta'].pop()
+        perfil = _perfil()
+        endpoint = request.endpoint if perfil is not None else None
+
+        if perfil is not None:
+            perfil['consultas'] += 1
+            perfil['tempo_sql'] += duracao
+            # rowcount vale para INSERT/UPDATE/DELETE; SELECTs são contados no evento 'load'
+            if cursor.rowcount and cursor.rowcount > 0:
+                perfil['linhas'] += cursor.rowcount
+
+        if duracao * 1000 >= limite_lento:
+            SQL_LENTAS.labels(endpoint or 'cli').inc()
+            logger.warning(
+                'SQL lento (%.1f ms) em %s: %s | parâmetros: %.500r',
+                duracao * 1000, endpoint or 'cli', ' '.join(statement.split()),
+                parameters if mostrar_parametros else _resumir_parametros(parameters),
+            )
+
+    @event.listens_for(engine, 'handle_error')
+    def _erro(contexto):
+        # after_cursor_execute não roda quando o comando falha
+        conexao = contexto.connection
+        if conexao is not None and conexao.info.get('inicio_consulta'):
+            conexao.info['inicio_consulta'].pop()
+
+
+def _ao_carregar(alvo, contexto):
+    perfil = _perfil()
+    if perfil is not None:
+        perfil['linhas'] += 1
+
+
+def _antes_template(sender, template, context, **extra):
+    perfil = _perfil()
+    if perfil is not None:
+        perfil['inicio_template'] = time.perf_counter()
+
+
+def _depois_template(sender, template, context, **extra):
+    perfil = _perfil()
+    if perfil is not None and perfil['inicio_template'] is not None:
+        perfil['tempo_template'] += time.perf_counter() - perfil['inicio_template']
+        perfil['inicio_template'] = None
+
+
+def _iniciar_requisicao():
+    _perfil()
+
+
+def _finalizar_requisicao(response):
+    perfil = g.pop('perfil', None)
+    if perfil is None:
+        return response
+
+    endpoint = request.endpoint or 'nao_encontrado'
+    LATENCIA.labels(endpoint, request.method, str(response.status_code)).observe(
+        time.perf_counter() - perfil['inicio']
+    )
+    SQL_CONSULTAS.labels(endpoint).observe(perfil['consultas'])
+    SQL_TEMPO.labels(endpoint).observe(perfil['tempo_sql'])
+    SQL_LINHAS.labels(endpoint).observe(perfil['linhas'])
+    if perfil['tempo_template']:
+        TEMPLATE_TEMPO.labels(endpoint).observe(perfil['tempo_template'])
+    return response
+
+
+def metrics():
+    """Exposição Prometheus: admin logado ou Authorization: Bearer METRICS_TOKEN."""
+    from flask import current_app
+
+    token = current_app.config.get('METRICS_TOKEN')
+    autorizado_por_token = token and request.headers.get('Authorization') == f'Bearer {token}'
+    admin = current_user.is_authenticated and current_user.papel == RoleEnum.ADMIN
+    if not (autorizado_por_token or admin):
+        abort(403)
+
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registro = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registro)
+    else:
+        registro = REGISTRY
+    return Response(generate_latest(registro), mimetype=CONTENT_TYPE_LATEST)
+
+
+def configurar_metricas(app):
+    """Liga o profiling por requisição e registra a rota /metrics."""
+    if not app.config.get('PROFILING_ENABLED', True):
+        return
+
+    limite_lento = app.config.get('SLOW_QUERY_MS', 200)
+    mostrar_parametros = app.config.get('SLOW_QUERY_LOG_PARAMETROS', False)
+    with app.app_context():
+        for engine in db.engines.values():
+            _registrar_eventos_sql(engine, limite_lento, mostrar_parametros)
+
+    if not event.contains(db.Model, 'load', _ao_carregar):
+        event.listen(db.Model, 'load', _ao_carregar, propagate=True)
+    before_render_template.connect(_antes_template, app)
+    template_rendered.connect(_depois_template, app)
+    app.before_request(_iniciar_requisicao)
+    app.after_request(_finalizar_requisicao)
+    app.add_url_rule('/metrics', 'metrics', metrics)
@@ -89,6 +89,10 @@ class Fornecedor(db.Model):
 class TabelaPreco(db.Model):
     """Modelo de tabela de preços por fornecedor."""
     __tablename__ = 'tabela_precos'
+    __table_args__ = (
+        # Upsert da importação de catálogo e clonagem (importacao.py): item pelo nome dentro do fornecedor
+        db.Index('ix_tabela_precos_fornecedor_nome', 'fornecedor_id', 'nome_item'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     fornecedor_id = db.Column(db.Integer, db.ForeignKey('fornecedores.id'), nullable=False)
@@ -107,6 +111,11 @@ class TabelaPreco(db.Model):
 class Compra(db.Model):
     """Modelo de compra com aprovação e comissão."""
     __tablename__ = 'compras'
+    __table_args__ = (
+        # Consultas por raio/retângulo (geo.py): faixas de geohash dentro do tipo;
+        # latitude/longitude/status no índice evitam ler a tabela na filtragem
+        db.Index('ix_compras_tipo_geohash', 'tipo_coleta', 'geohash', 'latitude', 'longitude', 'status_aprovacao'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     fornecedor_id = db.Column(db.Integer, db.ForeignKey('fornecedores.id'), nullable=False)
@@ -124,6 +133,8 @@ class Compra(db.Model):
     latitude = db.Column(db.Float)
     longitude = db.Column(db.Float)
     endereco_coleta = db.Column(db.String(255))
+    geohash = db.Column(db.String(12))  # Preenchido a partir de latitude/longitude (geo.py)
+    motivo_anomalia = db.Column(db.String(255))  # Preço/quantidade fora do padrão (anomalias.py)
     # Comissão
     comissao_percentual = db.Column(db.Float, default=0.0)  # Percentual de comissão do comprador
     valor_comissao = db.Column(db.Float, default=0.0)  # Valor calculado da comissão
@@ -185,3 +196,238 @@ class Despesa(db.Model):
     
     def __repr__(self):
         return f'<Despesa {self.nome_social}>'
+
+class VersaoTabela(db.Model):
+    """Contador de versão por tabela, incrementado a cada escrita (ver versoes.py)."""
+    __tablename__ = 'versoes_tabela'
+
+    tabela = db.Column(db.String(64), primary_key=True)
+    versao = db.Column(db.Integer, default=0, nullable=False)
+    atualizado_em = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<VersaoTabela {self.tabela}={self.versao}>'
+
+class CompraGridDia(db.Model):
+    """Soma diária das compras por célula de geohash (mapa de calor, ver agregados.py)."""
+    __tablename__ = 'compras_grid_dia'
+    # SQLite: tabela ordenada pela chave, a leitura por período não passa por outro índice
+    __table_args__ = {'sqlite_with_rowid': False}
+
+    dia = db.Column(db.Date, primary_key=True)
+    celula = db.Column(db.String(7), primary_key=True)  # geohash da compra, precisão 7 (~150 m)
+    quantidade_kg = db.Column(db.Float, default=0.0, nullable=False)
+    valor_total = db.Column(db.Float, default=0.0, nullable=False)
+    compras = db.Column(db.Integer, default=0, nullable=False)
+
+    def __repr__(self):
+        return f'<CompraGridDia {self.dia} {self.celula}>'
+
+class CompraCuboDia(db.Model):
+    """Totais diários das compras por fornecedor, item, comprador e tipo de coleta (ver agregados.py)."""
+    __tablename__ = 'compras_cubo_dia'
+    # SQLite: tabela ordenada pela chave (dia primeiro), fatias por período leem só o intervalo
+    __table_args__ = (
+        db.Index('ix_compras_cubo_dia_fornecedor_dia', 'fornecedor_id', 'dia'),
+        {'sqlite_with_rowid': False},
+    )
+
+    dia = db.Column(db.Date, primary_key=True)
+    fornecedor_id = db.Column(db.Integer, primary_key=True)
+    tabela_preco_id = db.Column(db.Integer, primary_key=True)
+    comprador_id = db.Column(db.Integer, primary_key=True)
+    tipo_coleta = db.Column(db.String(20), primary_key=True)
+    quantidade_kg = db.Column(db.Float, default=0.0, nullable=False)
+    valor_total = db.Column(db.Float, default=0.0, nullable=False)
+    valor_comissao = db.Column(db.Float, default=0.0, nullable=False)
+    compras = db.Column(db.Integer, default=0, nullable=False)
+
+    def __repr__(self):
+        return f'<CompraCuboDia {self.dia} {self.fornecedor_id}/{self.tabela_preco_id}/{self.comprador_id}>'
+
+class CompraCuboCompradorDia(db.Model):
+    """compras_cubo_dia resumido sem fornecedor e item: consultas por período, comprador e tipo."""
+    __tablename__ = 'compras_cubo_comprador_dia'
+    __table_args__ = {'sqlite_with_rowid': False}
+
+    dia = db.Column(db.Date, primary_key=True)
+    comprador_id = db.Column(db.Integer, primary_key=True)
+    tipo_coleta = db.Column(db.String(20), primary_key=True)
+    quantidade_kg = db.Column(db.Float, default=0.0, nullable=False)
+    valor_total = db.Column(db.Float, default=0.0, nullable=False)
+    valor_comissao = db.Column(db.Float, default=0.0, nullable=False)
+    compras = db.Column(db.Integer, default=0, nullable=False)
+
+    def __repr__(self):
+        return f'<CompraCuboCompradorDia {self.dia} {self.comprador_id} {self.tipo_coleta}>'
+
+class HistoricoPreco(db.Model):
+    """Preço por kg de um item da tabela de preços em cada intervalo [valido_de, valido_ate)."""
+    __tablename__ = 'historico_precos'
+    __table_args__ = (
+        # Preço vigente numa data e evolução por período (historico_precos.py) sem varrer o histórico
+        db.Index('ix_historico_precos_item_valido_de', 'tabela_preco_id', 'valido_de'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    tabela_preco_id = db.Column(db.Integer, db.ForeignKey('tabela_precos.id', ondelete='CASCADE'), nullable=False)
+    preco_por_kg = db.Column(db.Float, nullable=False)
+    valido_de = db.Column(db.DateTime, nullable=False)
+    valido_ate = db.Column(db.DateTime)  # NULL: preço atual
+
+    def __repr__(self):
+        return f'<HistoricoPreco {self.tabela_preco_id} {self.preco_por_kg} desde {self.valido_de}>'
+
+class EstatisticaCompra(db.Model):
+    """Mediana e MAD (em log) de preço e quantidade por item ou comprador (anomalias.py)."""
+    __tablename__ = 'estatisticas_compras'
+    __table_args__ = {'sqlite_with_rowid': False}
+
+    escopo = db.Column(db.String(20), primary_key=True)  # 'item' (tabela_preco_id) ou 'comprador'
+    chave = db.Column(db.Integer, primary_key=True)
+    compras = db.Column(db.Integer, nullable=False)
+    mediana_log_preco = db.Column(db.Float)  # só no escopo 'item'
+    mad_log_preco = db.Column(db.Float)
+    mediana_log_kg = db.Column(db.Float, nullable=False)
+    mad_log_kg = db.Column(db.Float, nullable=False)
+    atualizado_em = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<EstatisticaCompra {self.escopo} {self.chave}>'
+
+class PrevisaoCompra(db.Model):
+    """Volume previsto de compras por mês para um item, fornecedor ou o total (previsao.py)."""
+    __tablename__ = 'previsoes_compras'
+    __table_args__ = {'sqlite_with_rowid': False}
+
+    escopo = db.Column(db.String(20), primary_key=True)  # 'item' (tabela_preco_id), 'fornecedor' ou 'total' (chave 0)
+    chave = db.Column(db.Integer, primary_key=True)
+    mes = db.Column(db.Date, primary_key=True)  # primeiro dia do mês
+    modelo = db.Column(db.String(20), nullable=False)
+    quantidade_kg = db.Column(db.Float, nullable=False)
+    quantidade_kg_min = db.Column(db.Float, nullable=False)
+    quantidade_kg_max = db.Column(db.Float, nullable=False)
+    valor_total = db.Column(db.Float, nullable=False)
+    valor_total_min = db.Column(db.Float, nullable=False)
+    valor_total_max = db.Column(db.Float, nullable=False)
+    gerado_em = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<PrevisaoCompra {self.escopo} {self.chave} {self.mes}>'
+
+class CompraArquivo(db.Model):
+    """Compra antiga movida de compras por arquivo.py: mesmas colunas, sem chaves estrangeiras."""
+    __tablename__ = 'compras_arquivo'
+    __table_args__ = (
+        db.Index('ix_compras_arquivo_data', 'data'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # o mesmo id que tinha em compras
+    fornecedor_id = db.Column(db.Integer, nullable=False)
+    tabela_preco_id = db.Column(db.Integer, nullable=False)
+    quantidade_kg = db.Column(db.Float, nullable=False)
+    preco_unitario = db.Column(db.Float, nullable=False)
+    valor_total = db.Column(db.Float, nullable=False)
+    preco_maximo = db.Column(db.Float, nullable=False)
+    status_preco = db.Column(db.String(20))
+    status_aprovacao = db.Column(db.String(20))
+    tipo_coleta = db.Column(db.String(20), nullable=False)
+    observacao = db.Column(db.Text)
+    comprador_id = db.Column(db.Integer, nullable=False)
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    endereco_coleta = db.Column(db.String(255))
+    geohash = db.Column(db.String(12))
+    motivo_anomalia = db.Column(db.String(255))
+    comissao_percentual = db.Column(db.Float)
+    valor_comissao = db.Column(db.Float)
+    data = db.Column(db.DateTime, nullable=False)
+    criado_em = db.Column(db.DateTime)
+    atualizado_em = db.Column(db.DateTime)
+
+    # Só leitura: o fornecedor/item pode ter sido removido depois do arquivamento
+    fornecedor = db.relationship(
+        'Fornecedor', primaryjoin='foreign(CompraArquivo.fornecedor_id) == Fornecedor.id', viewonly=True)
+    tabela_preco = db.relationship(
+        'TabelaPreco', primaryjoin='foreign(CompraArquivo.tabela_preco_id) == TabelaPreco.id', viewonly=True)
+    comprador = db.relationship(
+        'Usuario', primaryjoin='foreign(CompraArquivo.comprador_id) == Usuario.id', viewonly=True)
+
+    def __repr__(self):
+        return f'<CompraArquivo {self.id}>'
+
+class DespesaArquivo(db.Model):
+    """Despesa antiga movida de despesas por arquivo.py: mesmas colunas, sem chaves estrangeiras."""
+    __tablename__ = 'despesas_arquivo'
+    __table_args__ = (
+        db.Index('ix_despesas_arquivo_data', 'data'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # o mesmo id que tinha em despesas
+    nome_social = db.Column(db.String(200), nullable=False)
+    endereco_rua = db.Column(db.String(255))
+    endereco_numero = db.Column(db.String(20))
+    endereco_cidade = db.Column(db.String(100))
+    endereco_cep = db.Column(db.String(10))
+    endereco_estado = db.Column(db.String(2))
+    telefone = db.Column(db.String(20))
+    email = db.Column(db.String(120))
+    vendedor_id = db.Column(db.Integer, nullable=False)
+    conta = db.Column(db.String(20))
+    agencia = db.Column(db.String(10))
+    chave_pix = db.Column(db.String(255))
+    banco = db.Column(db.String(100))
+    condicao_pagamento = db.Column(db.String(20))
+    forma_pagamento = db.Column(db.String(20))
+    descricao_gasto = db.Column(db.Text)
+    data = db.Column(db.DateTime, nullable=False)
+    valor = db.Column(db.Float, nullable=False)
+    observacao = db.Column(db.Text)
+    comprovante = db.Column(db.String(255))
+    criado_em = db.Column(db.DateTime)
+    atualizado_em = db.Column(db.DateTime)
+
+    vendedor = db.relationship(
+        'Usuario', primaryjoin='foreign(DespesaArquivo.vendedor_id) == Usuario.id', viewonly=True)
+
+    def __repr__(self):
+        return f'<DespesaArquivo {self.nome_social}>'
+
+class TotalArquivo(db.Model):
+    """Totais por mês do que foi arquivado de compras/despesas (arquivo.py)."""
+    __tablename__ = 'totais_arquivo'
+    __table_args__ = {'sqlite_with_rowid': False}
+
+    tabela = db.Column(db.String(20), primary_key=True)  # 'compras' ou 'despesas'
+    mes = db.Column(db.Date, primary_key=True)  # primeiro dia do mês
+    registros = db.Column(db.Integer, default=0, nullable=False)
+    valor = db.Column(db.Float, default=0.0, nullable=False)  # valor_total (compras) ou valor (despesas)
+    quantidade_kg = db.Column(db.Float, default=0.0, nullable=False)  # só compras
+    atualizado_em = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<TotalArquivo {self.tabela} {self.mes}>'
+
+class RegistroAuditoria(db.Model):
+    """Evento da trilha de auditoria: aprovação, remoção, mudança de preço... (auditoria.py)."""
+    __tablename__ = 'auditoria'
+    __table_args__ = (
+        # Histórico de uma entidade e ações de um usuário, do mais recente para trás
+        db.Index('ix_auditoria_entidade', 'entidade', 'entidade_id', 'criado_em'),
+        db.Index('ix_auditoria_usuario', 'usuario_id', 'criado_em'),
+        db.Index('ix_auditoria_criado_em', 'criado_em'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    evento = db.Column(db.String(32), unique=True, nullable=False)  # uuid: reenviar o arquivo da fila não duplica
+    criado_em = db.Column(db.DateTime, nullable=False)
+    usuario_id = db.Column(db.Integer)  # sem chave estrangeira: o registro fica se o usuário for removido
+    entidade = db.Column(db.String(64), nullable=False)  # nome da tabela
+    entidade_id = db.Column(db.Integer)
+    acao = db.Column(db.String(30), nullable=False)  # 'alteracao', 'remocao', 'importacao_catalogo', ...
+    alteracoes = db.Column(db.Text, nullable=False)  # JSON: {campo: [antes, depois]} ou a linha removida
+    origem = db.Column(db.String(120))  # endpoint da requisição ou 'cli'
+    ip = db.Column(db.String(45))
+
+    def __repr__(self):
+        return f'<RegistroAuditoria {self.entidade} {self.entidade_id} {self.acao}>'
@@ -0,0 +1,281 @@
+"""
+Notificações em tempo real (SSE) de compras pendentes e mudanças de aprovação.
+
+Compras novas que ficam pendentes, aprovações, rejeições e remoções são
+capturadas no flush do ORM e publicadas quando a transação é confirmada.
+Publicar é anexar uma linha JSON ao arquivo do dia em NOTIFICACOES_PASTA
+(eventos-AAAAMMDD.jsonl, uma escrita O_APPEND). Em cada worker uma thread
+acompanha o fim do arquivo (como tail -f) e entrega os eventos novos às
+conexões abertas naquele worker: os eventos publicados em qualquer worker
+chegam a todos, sem servidor de mensagens.
+
+O id de cada evento é o dia e a posição no arquivo: o navegador reconecta
+com Last-Event-ID e recebe o que perdeu. Uma conexão que não consome os
+eventos (fila cheia) é encerrada e retoma do mesmo jeito.
+
+Cada conexão fica aberta indefinidamente: com worker_class = "gevent"
+(PostgreSQL, ver setup_gunicorn.sh) ela ocupa um greenlet e cada worker
+aceita até NOTIFICACOES_MAX_CONEXOES (500).
+
+Limitação do deploy com SQLite: o gevent não serve (ver concorrencia.py) e
+os workers são "gthread", 8 threads cada. Uma conexão SSE prende uma
+thread, então o gunicorn_config.py baixa NOTIFICACOES_MAX_CONEXOES para 4
+por worker; acima disso /api/eventos/compras responde 503 e o navegador
+tenta de novo mais tarde. Com 4 conexões abertas o worker atende o resto
+com as 4 threads que sobram. Para mais painéis abertos ao mesmo tempo, use
+PostgreSQL.
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import event, inspect
+from models import db, Compra
+
+logger = logging.getLogger('mrx.notificacoes')
+
+DIAS_RETENCAO = 2
+TAMANHO_FILA = 200  # eventos pendentes por conexão antes de encerrá-la
+
+_trava = threading.Lock()
+_assinantes = set()
+_pid = None
+_config = {}
+
+
+class Assinante:
+    """Fila de eventos de uma conexão SSE."""
+
+    def __init__(self):
+        self.fila = queue.Queue(maxsize=TAMANHO_FILA)
+        self.atrasado = False
+
+    def entregar(self, evento):
+        try:
+            self.fila.put_nowait(evento)
+        except queue.Full:
+            self.atrasado = True
+
+
+def _dia(quando=None):
+    return (quando or datetime.utcnow()).strftime('%Y%m%d')
+
+
+def _caminho(dia):
+    return os.path.join(_config['pasta'], f'eventos-{dia}.jsonl')
+
+
+# ---------------------------------------------------------------- publicação
+
+def publicar(eventos):
+    """Anexa os eventos ({'tipo': ..., ...}) ao arquivo do dia, numa escrita só."""
+    if not eventos:
+        return
+    os.makedirs(_config['pasta'], exist_ok=True)
+    dados = ''.join(json.dumps(e, default=str, ensure_ascii=False) + '\n' for e in eventos).encode()
+    descritor = os.open(_caminho(_dia()), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(descritor, dados)
+    finally:
+        os.close(descritor)
+
+
+def _dados_compra(compra):
+    return {
+        'compra_id': compra.id, 'fornecedor_id': compra.fornecedor_id, 'comprador_id': compra.comprador_id,
+        'valor_total': compra.valor_total, 'preco_unitario': compra.preco_unitario,
+        'preco_maximo': compra.preco_maximo, 'motivo_anomalia': compra.motivo_anomalia,
+    }
+
+
+def _apos_flush(sessao, contexto):
+    eventos = []
+    for obj in sessao.new:
+        if isinstance(obj, Compra) and obj.status_aprovacao == 'pendente':
+            eventos.append({'tipo': 'compra_pendente', **_dados_compra(obj)})
+    for obj in sessao.dirty:
+        if not isinstance(obj, Compra) or obj in sessao.deleted:
+            continue
+        historico = inspect(obj).attrs.status_aprovacao.history
+        if historico.has_changes() and historico.deleted and historico.deleted[0] != obj.status_aprovacao:
+            eventos.append({
+                'tipo': 'compra_status', 'status': obj.status_aprovacao, 'anterior': historico.deleted[0],
+                **_dados_compra(obj),
+            })
+    for obj in sessao.deleted:
+        if isinstance(obj, Compra):
+            eventos.append({'tipo': 'compra_removida', 'compra_id': obj.id, 'status': obj.status_aprovacao})
+    if eventos:
+        sessao.info.setdefault('notificacoes', []).extend(eventos)
+
+
+def _apos_commit(sessao):
+    eventos = sessao.info.pop('notificacoes', None)
+    if eventos:
+        try:
+            publicar(eventos)
+        except OSError:
+            # A compra já foi gravada: a notificação se perde, a página continua mostrando a verdade
+            logger.exception('Falha ao publicar %d notificações', len(eventos))
+
+
+def _apos_rollback(sessao):
+    sessao.info.pop('notificacoes', None)
+
+
+# ---------------------------------------------------------------- distribuição
+
+def _ler(dia, posicao):
+    """Eventos completos do arquivo do dia a partir de `posicao`: ([(id, evento)], posição do fim lido)."""
+    try:
+        with open(_caminho(dia), 'rb') as f:
+            f.seek(posicao)
+            dados = f.read()
+    except FileNotFoundError:
+        return [], posicao
+    completos = dados[:dados.rfind(b'\n') + 1]  # linha sem \n ainda está sendo escrita
+    eventos = []
+    for linha in completos.splitlines(keepends=True):
+        posicao += len(linha)
+        try:
+            eventos.append(((dia, posicao), json.loads(linha)))
+        except ValueError:
+            logger.warning('Linha inválida em %s antes da posição %d', _caminho(dia), posicao)
+    return eventos, posicao
+
+
+def _distribuir(eventos):
+    with _trava:
+        assinantes = list(_assinantes)
+    for identificador, evento in eventos:
+        for assinante in assinantes:
+            assinante.entregar((identificador, evento))
+
+
+def _limpar_antigos():
+    limite = _dia(datetime.utcnow() - timedelta(days=DIAS_RETENCAO))
+    for nome in os.listdir(_config['pasta']):
+        if nome.startswith('eventos-') and nome.endswith('.jsonl') and nome[8:16] < limite:
+            try:
+                os.remove(os.path.join(_config['pasta'], nome))
+            except FileNotFoundError:
+                pass  # outro worker apagou antes
+
+
+def _acompanhar():
+    dia = _dia()
+    try:
+        posicao = os.path.getsize(_caminho(dia))
+    except FileNotFoundError:
+        posicao = 0
+    while True:
+        time.sleep(_config['intervalo'])
+        try:
+            eventos, posicao = _ler(dia, posicao)
+            hoje = _dia()
+            if hoje != dia:
+                # Virou o dia: o que sobrou do arquivo anterior já foi lido acima
+                dia, posicao = hoje, 0
+                novos, posicao = _ler(dia, posicao)
+                eventos += novos
+                _limpar_antigos()
+            if eventos:
+                _distribuir(eventos)
+        except Exception:
+            logger.exception('Falha ao acompanhar as notificações')
+
+
+def assinar():
+    """Registra uma conexão; None se o worker já está no limite de NOTIFICACOES_MAX_CONEXOES."""
+    global _pid
+    with _trava:
+        if _pid != os.getpid():
+            # Primeira conexão do processo (ou depois do fork): a thread de leitura é deste worker
+            _pid = os.getpid()
+            _assinantes.clear()
+            os.makedirs(_config['pasta'], exist_ok=True)
+            threading.Thread(target=_acompanhar, name='notificacoes', daemon=True).start()
+        if len(_assinantes) >= _config['max_conexoes']:
+            return None
+        assinante = Assinante()
+        _assinantes.add(assinante)
+    return assinante
+
+
+def cancelar(assinante):
+    with _trava:
+        _assinantes.discard(assinante)
+
+
+def _id_evento(identificador):
+    return f'{identificador[0]}:{identificador[1]}'
+
+
+def _ler_id_evento(texto):
+    """(dia, posição) de um Last-Event-ID; None se inválido ou de antes da retenção."""
+    try:
+        dia, posicao = texto.split(':')
+        datetime.strptime(dia, '%Y%m%d')
+        identificador = (dia, int(posicao))
+    except (AttributeError, ValueError):
+        return None
+    return identificador if os.path.exists(_caminho(dia)) else None
+
+
+def _perdidos(desde):
+    """Eventos publicados depois de `desde` (o dia dele e os seguintes, até hoje)."""
+    dia, posicao = desde
+    hoje = _dia()
+    eventos = []
+    while dia <= hoje:
+        lidos, _ = _ler(dia, posicao)
+        eventos += lidos
+        dia, posicao = _dia(datetime.strptime(dia, '%Y%m%d') + timedelta(days=1)), 0
+    return eventos
+
+
+def _formatar(identificador, evento):
+    return f"id: {_id_evento(identificador)}\nevent: {evento['tipo']}\ndata: {json.dumps(evento, ensure_ascii=False)}\n\n"
+
+
+def fluxo_eventos(assinante, ultimo_id=None):
+    """Gera o corpo text/event-stream de uma conexão até o cliente sair (ou ficar para trás)."""
+    try:
+        yield f"retry: {_config['reconexao_ms']}\n\n"
+        ultimo = _ler_id_evento(ultimo_id)
+        if ultimo is not None:
+            # Registrado antes de ler o arquivo: o que chegar na fila e já saiu aqui é pulado pelo id
+            for identificador, evento in _perdidos(ultimo):
+                ultimo = identificador
+                yield _formatar(identificador, evento)
+        while not assinante.atrasado:
+            try:
+                identificador, evento = assinante.fila.get(timeout=_config['heartbeat'])
+            except queue.Empty:
+                yield ': ping\n\n'  # mantém a conexão viva em proxies e detecta cliente que saiu
+                continue
+            if ultimo is not None and identificador <= ultimo:
+                continue
+            ultimo = identificador
+            yield _formatar(identificador, evento)
+    finally:
+        cancelar(assinante)
+
+
+def configurar_notificacoes(app):
+    """Liga a publicação das mudanças em compras para as conexões SSE."""
+    _config.update(
+        pasta=app.config['NOTIFICACOES_PASTA'],
+        intervalo=app.config.get('NOTIFICACOES_INTERVALO', 0.25),
+        heartbeat=app.config.get('NOTIFICACOES_HEARTBEAT', 15),
+        max_conexoes=app.config.get('NOTIFICACOES_MAX_CONEXOES', 500),
+        reconexao_ms=3000,
+    )
+    if not event.contains(db.session, 'after_flush', _apos_flush):
+        event.listen(db.session, 'after_flush', _apos_flush)
+        event.listen(db.session, 'after_commit', _apos_commit)
+        event.listen(db.session, 'after_rollback', _apos_rollback)
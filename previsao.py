@@ -0,0 +1,215 @@
+"""
+Previsão mensal do volume de compras (kg e valor) por item, fornecedor e total.
+
+As séries mensais saem do cubo diário (agregados.py), uma consulta por mês,
+e viram matrizes NumPy (série x mês). Cada série é ajustada por mínimos
+quadrados a nível + tendência + efeito do mês do ano; as séries que
+começam no mesmo mês usam a mesma matriz de desenho, então milhares de
+séries são ajustadas com um lstsq por mês de início, sem laço por série.
+Com pouco histórico o modelo é mais simples:
+
+- 'sazonal': a partir de MESES_SAZONAL meses (dois ciclos do ano)
+- 'tendencia': a partir de MESES_TENDENCIA meses
+- 'media': menos que isso
+
+recalcular_previsoes() regrava previsoes_compras (flask recalcular-previsoes,
+agendado uma vez por mês); a API só lê essa tabela.
+"""
+
+from datetime import date, datetime
+from itertools import chain
+from sqlalchemy import delete, func, insert, select
+from models import db, CompraCuboDia, Fornecedor, PrevisaoCompra, TabelaPreco
+from database import sessao_leitura
+from versoes import marcar_alteracao
+
+MESES_HISTORICO = 36
+HORIZONTE_MESES = 6
+MESES_SAZONAL = 24
+MESES_TENDENCIA = 12
+Z_FAIXA = 1.96  # faixa de ~95% em volta da previsão
+ESCOPOS_PREVISAO = ('item', 'fornecedor', 'total')
+
+_cubo = CompraCuboDia.__table__
+_previsoes = PrevisaoCompra.__table__
+
+
+def _indice_mes(valor):
+    """Meses desde o ano 0 (ano * 12 + mês - 1): aritmética de meses com inteiros."""
+    return valor.year * 12 + valor.month - 1
+
+
+def _data_do_indice(indice):
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def _carregar_series(primeiro, meses):
+    """Itens, fornecedor de cada item e matriz (medida, item, mês) de kg e valor a partir do mês `primeiro`."""
+    import numpy as np
+
+    conexao = sessao_leitura().connection()
+    lotes = []
+    # Uma consulta por mês: cada GROUP BY ordena só a fatia do mês (intervalo da chave do cubo)
+    for mes in range(meses):
+        consulta = select(
+            _cubo.c.tabela_preco_id, _cubo.c.fornecedor_id,
+            func.sum(_cubo.c.quantidade_kg), func.sum(_cubo.c.valor_total),
+        ).where(
+            _cubo.c.dia >= _data_do_indice(primeiro + mes), _cubo.c.dia < _data_do_indice(primeiro + mes + 1),
+        ).group_by(_cubo.c.tabela_preco_id, _cubo.c.fornecedor_id)
+        linhas = conexao.execute(consulta).all()
+        lote = np.fromiter(chain.from_iterable(linhas), dtype=float, count=len(linhas) * 4).reshape(-1, 4)
+        lotes.append(np.column_stack([lote, np.full(len(lote), mes)]))
+    matriz = np.concatenate(lotes) if lotes else np.empty((0, 5))
+
+    itens, linhas = np.unique(matriz[:, 0].astype(np.int64), return_inverse=True)
+    fornecedores = np.zeros(len(itens), dtype=np.int64)
+    fornecedores[linhas] = matriz[:, 1]
+    series = np.zeros((2, len(itens), meses))
+    colunas = matriz[:, 4].astype(np.int64)
+    series[0, linhas, colunas] = matriz[:, 2]
+    series[1, linhas, colunas] = matriz[:, 3]
+    return itens, fornecedores, series
+
+
+def _desenho(primeiro, meses, horizonte):
+    """Matrizes de desenho do histórico e do horizonte para séries com `meses` meses a partir de `primeiro`."""
+    import numpy as np
+
+    t = np.arange(meses + horizonte, dtype=float)
+    colunas = [np.ones_like(t)]
+    modelo = 'media'
+    if meses >= MESES_TENDENCIA:
+        colunas.append(t / 12)
+        modelo = 'tendencia'
+    if meses >= MESES_SAZONAL:
+        mes_do_ano = (primeiro + np.arange(meses + horizonte)) % 12
+        colunas += [(mes_do_ano == m).astype(float) for m in range(1, 12)]  # janeiro fica no nível
+        modelo = 'sazonal'
+    desenho = np.column_stack(colunas)
+    return desenho[:meses], desenho[meses:], modelo
+
+
+def ajustar_series(series, primeiro, horizonte=HORIZONTE_MESES):
+    """Ajusta todas as séries de `series` (medida, série, mês) de uma vez.
+
+    O histórico de cada série começa no primeiro mês com compra (no
+    seguinte, se sobrar mais de MESES_TENDENCIA meses). Retorna
+    (previsto, desvio, modelos): previsto (medida, série, horizonte), o
+    desvio padrão dos resíduos (medida, série) e o nome do modelo de cada
+    série (None se a série não tem compra nenhuma).
+    """
+    import numpy as np
+
+    medidas, quantidade, meses = series.shape
+    com_compra = (series != 0).any(axis=0)
+    ativa = com_compra.any(axis=1)
+    comeco = np.where(ativa, com_compra.argmax(axis=1), meses)
+    # O primeiro mês costuma estar incompleto (começou no meio do mês): com histórico de sobra, fica de fora
+    comeco = np.where(meses - comeco > MESES_TENDENCIA, comeco + 1, comeco)
+    previsto = np.zeros((medidas, quantidade, horizonte))
+    desvio = np.zeros((medidas, quantidade))
+    modelos = np.full(quantidade, None, dtype=object)
+
+    for inicio in np.unique(comeco[ativa]):
+        grupo = np.flatnonzero(comeco == inicio)
+        n = meses - int(inicio)
+        historico, futuro, modelo = _desenho(primeiro + int(inicio), n, horizonte)
+        # Uma coluna por (medida, série): um lstsq ajusta o grupo inteiro
+        alvo = series[:, grupo, inicio:].reshape(-1, n).T
+        coeficientes, *_ = np.linalg.lstsq(historico, alvo, rcond=None)
+        residuos = alvo - historico @ coeficientes
+        graus_liberdade = max(n - historico.shape[1], 1)
+        desvio[:, grupo] = np.sqrt((residuos ** 2).sum(axis=0) / graus_liberdade).reshape(medidas, len(grupo))
+        previsto[:, grupo] = (futuro @ coeficientes).T.reshape(medidas, len(grupo), horizonte)
+        modelos[grupo] = modelo
+    return np.maximum(previsto, 0.0), desvio, modelos
+
+
+def _linhas(escopo, chaves, previsto, desvio, modelos, primeiro_previsto, agora):
+    import numpy as np
+
+    horizonte = previsto.shape[2]
+    meses = [_data_do_indice(primeiro_previsto + h) for h in range(horizonte)]
+    minimo = np.maximum(previsto - Z_FAIXA * desvio[:, :, None], 0.0)
+    maximo = previsto + Z_FAIXA * desvio[:, :, None]
+    for s in np.flatnonzero(modelos.astype(bool)):  # None: série sem compra
+        for h, mes in enumerate(meses):
+            yield {
+                'escopo': escopo, 'chave': int(chaves[s]), 'mes': mes, 'modelo': modelos[s],
+                'quantidade_kg': round(float(previsto[0, s, h]), 2),
+                'quantidade_kg_min': round(float(minimo[0, s, h]), 2),
+                'quantidade_kg_max': round(float(maximo[0, s, h]), 2),
+                'valor_total': round(float(previsto[1, s, h]), 2),
+                'valor_total_min': round(float(minimo[1, s, h]), 2),
+                'valor_total_max': round(float(maximo[1, s, h]), 2),
+                'gerado_em': agora,
+            }
+
+
+def recalcular_previsoes(horizonte=HORIZONTE_MESES, meses_historico=MESES_HISTORICO):
+    """Regrava previsoes_compras a partir dos últimos `meses_historico` meses fechados.
+
+    Retorna {escopo: séries previstas}.
+    """
+    import numpy as np
+
+    agora = datetime.utcnow()
+    atual = _indice_mes(agora)
+    primeiro = atual - meses_historico  # o mês corrente ainda não fechou: entra na previsão
+    itens, fornecedores_itens, series_itens = _carregar_series(primeiro, meses_historico)
+
+    fornecedores, posicao = np.unique(fornecedores_itens, return_inverse=True)
+    series_fornecedores = np.zeros((2, len(fornecedores), meses_historico))
+    for medida in range(2):
+        np.add.at(series_fornecedores[medida], posicao, series_itens[medida])
+    series_total = series_itens.sum(axis=1, keepdims=True)
+
+    db.session.execute(delete(_previsoes))
+    totais = {}
+    for escopo, chaves, series in (
+        ('item', itens, series_itens),
+        ('fornecedor', fornecedores, series_fornecedores),
+        ('total', np.zeros(1, dtype=np.int64), series_total),
+    ):
+        previsto, desvio, modelos = ajustar_series(series, primeiro, horizonte)
+        totais[escopo] = int(modelos.astype(bool).sum())
+        linhas = list(_linhas(escopo, chaves, previsto, desvio, modelos, atual, agora))
+        for inicio in range(0, len(linhas), 5000):
+            db.session.execute(insert(_previsoes), linhas[inicio:inicio + 5000])
+    marcar_alteracao(_previsoes.name)
+    db.session.commit()
+    return totais
+
+
+def consultar_previsoes(escopo, chaves=None, fornecedor_id=None):
+    """Previsões gravadas do escopo, agrupadas por série (com o nome do item/fornecedor).
+
+    `chaves` filtra as séries; no escopo 'item', `fornecedor_id` pega todos os itens do fornecedor.
+    """
+    filtros = [_previsoes.c.escopo == escopo]
+    if chaves is not None:
+        filtros.append(_previsoes.c.chave.in_(chaves))
+    if fornecedor_id is not None:
+        filtros.append(_previsoes.c.chave.in_(select(TabelaPreco.id).where(TabelaPreco.fornecedor_id == fornecedor_id)))
+    conexao = sessao_leitura().connection()
+    series = {}
+    for linha in conexao.execute(select(_previsoes).where(*filtros).order_by(_previsoes.c.chave, _previsoes.c.mes)):
+        serie = series.setdefault(linha.chave, {
+            'chave': linha.chave, 'modelo': linha.modelo, 'gerado_em': linha.gerado_em.isoformat(), 'meses': [],
+        })
+        serie['meses'].append({
+            'mes': linha.mes.strftime('%Y-%m'),
+            **{coluna: linha._mapping[coluna] for coluna in (
+                'quantidade_kg', 'quantidade_kg_min', 'quantidade_kg_max',
+                'valor_total', 'valor_total_min', 'valor_total_max',
+            )},
+        })
+
+    nomes = {'item': (TabelaPreco.id, TabelaPreco.nome_item), 'fornecedor': (Fornecedor.id, Fornecedor.nome_social)}
+    if escopo in nomes and series:
+        coluna_id, coluna_nome = nomes[escopo]
+        encontrados = dict(conexao.execute(select(coluna_id, coluna_nome).where(coluna_id.in_(series))).all())
+        for chave, serie in series.items():
+            serie['nome'] = encontrados.get(chave)
+    return list(series.values())
@@ -0,0 +1,142 @@
+"""
+Rankings de fornecedores, itens e compradores com variação de posição.
+
+Calculados no banco sobre os cubos diários (agregados.py), pela faixa de
+datas da chave: os totais do período e do período anterior de mesma
+duração saem de um GROUP BY só, RANK() numera cada período e LAG() traz a
+posição anterior de cada entidade.
+
+O resultado fica num cache do processo por até RANKING_CACHE_SEGUNDOS e é
+descartado antes disso se a versão de alguma tabela lida mudar (versoes.py).
+"""
+
+import threading
+import time
+from datetime import timedelta
+from functools import wraps
+from flask import current_app
+from sqlalchemy import func, select
+from models import CompraCuboCompradorDia, CompraCuboDia, Fornecedor, TabelaPreco, Usuario
+from database import sessao_leitura
+from versoes import obter_versoes
+
+MEDIDAS_RANKING = ('quantidade_kg', 'valor_total', 'valor_comissao', 'compras')
+MAX_ENTRADAS_CACHE = 256
+
+_cubo = CompraCuboDia.__table__
+_cubo_comprador = CompraCuboCompradorDia.__table__
+_cache = {}
+_trava = threading.Lock()  # workers gthread: inserção e despejo concorrentes
+
+
+def em_cache(*tabelas):
+    """Reaproveita o resultado da função para os mesmos argumentos (ver docstring do módulo)."""
+    def decorador(funcao):
+        @wraps(funcao)
+        def envolvida(*args, **kwargs):
+            segundos = current_app.config.get('RANKING_CACHE_SEGUNDOS', 60)
+            if segundos <= 0:
+                return funcao(*args, **kwargs)
+            chave = (funcao.__name__, args, tuple(sorted(kwargs.items())))
+            versoes = obter_versoes(*tabelas)
+            agora = time.monotonic()
+            entrada = _cache.get(chave)
+            if entrada is not None and entrada[0] > agora and entrada[1] == versoes:
+                return entrada[2]
+            resultado = funcao(*args, **kwargs)
+            with _trava:
+                _cache.pop(chave, None)
+                _cache[chave] = (agora + segundos, versoes, resultado)
+                while len(_cache) > MAX_ENTRADAS_CACHE:
+                    _cache.pop(next(iter(_cache)), None)  # a mais antiga
+            return resultado
+        return envolvida
+    return decorador
+
+
+def _ranking(tabela, entidade, medida, inicio, fim, limite, particao=(), filtros=()):
+    """Top `limite` de `entidade` por `medida` em [inicio, fim] (dentro de cada `particao`).
+
+    Cada linha traz os totais do período, a posição, a posição e o total no
+    período anterior de mesma duração (None se a entidade não aparecia).
+    """
+    inicio_anterior = inicio - timedelta(days=(fim - inicio).days + 1)
+    chaves = [*particao, *entidade]
+    periodo = (tabela.c.dia >= inicio).label('periodo')  # 1 = período pedido, 0 = anterior
+    totais = select(
+        *(tabela.c[coluna] for coluna in chaves), periodo,
+        *(func.sum(tabela.c[m]).label(m) for m in MEDIDAS_RANKING),
+    ).where(
+        tabela.c.dia >= inicio_anterior, tabela.c.dia <= fim, *filtros,
+    ).group_by(*(tabela.c[coluna] for coluna in chaves), periodo).subquery('totais')
+
+    posicao = func.rank().over(
+        partition_by=[totais.c.periodo, *(totais.c[coluna] for coluna in particao)],
+        order_by=totais.c[medida].desc(),
+    )
+    ranqueado = select(totais, posicao.label('posicao')).subquery('ranqueado')
+
+    # Até duas linhas por entidade: na do período pedido, o LAG é a do anterior
+    def anterior(coluna):
+        return func.lag(coluna).over(
+            partition_by=[ranqueado.c[c] for c in chaves], order_by=ranqueado.c.periodo,
+        )
+    comparado = select(
+        ranqueado,
+        anterior(ranqueado.c.posicao).label('posicao_anterior'),
+        anterior(ranqueado.c[medida]).label('total_anterior'),
+    ).subquery('comparado')
+
+    consulta = select(comparado).where(comparado.c.periodo.is_(True), comparado.c.posicao <= limite).order_by(
+        *(comparado.c[coluna] for coluna in particao), comparado.c.posicao,
+    )
+    linhas = []
+    for linha in sessao_leitura().connection().execute(consulta):
+        dados = {coluna: linha._mapping[coluna] for coluna in chaves}
+        for m in MEDIDAS_RANKING:
+            dados[m] = int(linha._mapping[m]) if m == 'compras' else round(linha._mapping[m] or 0.0, 2)
+        dados['posicao'] = linha.posicao
+        dados['posicao_anterior'] = linha.posicao_anterior
+        dados['variacao_posicao'] = linha.posicao_anterior - linha.posicao if linha.posicao_anterior else None
+        dados['total_anterior'] = round(linha.total_anterior, 2) if linha.total_anterior is not None else None
+        linhas.append(dados)
+    return linhas
+
+
+def _com_nomes(linhas, campo_id, coluna_id, coluna_nome, campo_nome):
+    ids = {linha[campo_id] for linha in linhas}
+    nomes = dict(sessao_leitura().connection().execute(
+        select(coluna_id, coluna_nome).where(coluna_id.in_(ids))
+    ).all()) if ids else {}
+    for linha in linhas:
+        linha[campo_nome] = nomes.get(linha[campo_id])
+    return linhas
+
+
+@em_cache('compras', 'compras_cubo_dia', 'fornecedores')
+def ranking_fornecedores(inicio, fim, medida='quantidade_kg', limite=10):
+    """Top fornecedores por kg ou valor no período."""
+    linhas = _ranking(_cubo, ['fornecedor_id'], medida, inicio, fim, limite)
+    return _com_nomes(linhas, 'fornecedor_id', Fornecedor.id, Fornecedor.nome_social, 'fornecedor_nome')
+
+
+@em_cache('compras', 'compras_cubo_dia', 'fornecedores', 'tabela_precos')
+def ranking_itens(inicio, fim, medida='quantidade_kg', limite=5, fornecedores=None):
+    """Top `limite` itens de cada fornecedor (os 10 primeiros do período, se não informados)."""
+    if not fornecedores:
+        fornecedores = tuple(linha['fornecedor_id'] for linha in ranking_fornecedores(inicio, fim, medida, 10))
+    if not fornecedores:
+        return []
+    linhas = _ranking(
+        _cubo, ['tabela_preco_id'], medida, inicio, fim, limite,
+        particao=['fornecedor_id'], filtros=[_cubo.c.fornecedor_id.in_(fornecedores)],
+    )
+    _com_nomes(linhas, 'fornecedor_id', Fornecedor.id, Fornecedor.nome_social, 'fornecedor_nome')
+    return _com_nomes(linhas, 'tabela_preco_id', TabelaPreco.id, TabelaPreco.nome_item, 'nome_item')
+
+
+@em_cache('compras', 'compras_cubo_comprador_dia', 'usuarios')
+def ranking_compradores(inicio, fim, medida='valor_comissao', limite=10):
+    """Compradores por comissão, kg, valor ou número de compras no período."""
+    linhas = _ranking(_cubo_comprador, ['comprador_id'], medida, inicio, fim, limite)
+    return _com_nomes(linhas, 'comprador_id', Usuario.id, Usuario.nome, 'comprador_nome')
@@ -0,0 +1,175 @@
+"""
+Roteirização das coletas do dia (POST /api/rotas/coletas).
+
+Distâncias em linha reta (haversine) numa matriz NumPy, sem serviço de
+mapas. Cada caminhão sai do depósito e vai sempre para a coleta mais
+próxima que ainda cabe na carga (soma de quantidade_kg); quando nada mais
+cabe, volta ao depósito e o próximo caminhão começa. Depois, cada rota é
+melhorada com 2-opt: a cada passo o par de trechos cuja inversão mais
+encurta o percurso é calculado de uma vez para a rota inteira.
+"""
+
+from datetime import datetime, time, timedelta
+from sqlalchemy import select
+from models import Compra, Fornecedor
+from database import sessao_leitura
+from geo import haversine_km
+from concorrencia import em_thread
+
+# Status de aprovação de uma compra; os "a coletar" deixam as rejeitadas de fora
+STATUS_APROVACAO = ('pendente', 'aprovada', 'rejeitada')
+STATUS_A_COLETAR = ('pendente', 'aprovada')
+
+# Passos de 2-opt por rota, por parada (limite de segurança; em geral converge antes)
+PASSOS_2OPT_POR_PARADA = 10
+
+
+def matriz_distancias(latitudes, longitudes):
+    """Matriz n x n de distâncias haversine (km) entre os pontos."""
+    import numpy as np
+
+    latitudes = np.asarray(latitudes, dtype=float)
+    longitudes = np.asarray(longitudes, dtype=float)
+    return haversine_km(latitudes[:, None], longitudes[:, None], latitudes[None, :], longitudes[None, :])
+
+
+def _vizinho_mais_proximo(distancias, pesos, capacidade_kg, caminhoes):
+    """Rotas iniciais (listas de índices; 0 é o depósito) e paradas que não couberam."""
+    import numpy as np
+
+    livres = np.ones(len(pesos), dtype=bool)
+    livres[0] = False
+    rotas = []
+    for _ in range(caminhoes):
+        atual, carga, rota = 0, 0.0, []
+        while True:
+            candidatos = livres & (pesos <= capacidade_kg - carga)
+            if not candidatos.any():
+                break
+            proxima = int(np.argmin(np.where(candidatos, distancias[atual], np.inf)))
+            rota.append(proxima)
+            livres[proxima] = False
+            carga += pesos[proxima]
+            atual = proxima
+        if not rota:
+            break
+        rotas.append(rota)
+    return rotas, np.flatnonzero(livres).tolist()
+
+
+def _dois_opt(distancias, rota):
+    """Melhora a rota (depósito -> paradas -> depósito) com 2-opt vetorizado."""
+    import numpy as np
+
+    caminho = np.array([0, *rota, 0])
+    if len(rota) < 3:
+        return rota
+    for _ in range(PASSOS_2OPT_POR_PARADA * len(rota)):
+        a, b = caminho[:-1], caminho[1:]
+        trechos = distancias[a, b]
+        # Inverter caminho[i+1..j] troca os trechos (a_i, b_i) e (a_j, b_j) por (a_i, a_j) e (b_i, b_j)
+        ganho = distancias[a[:, None], a[None, :]] + distancias[b[:, None], b[None, :]] \
+            - trechos[:, None] - trechos[None, :]
+        ganho = np.triu(ganho, k=2)
+        i, j = np.unravel_index(np.argmin(ganho), ganho.shape)
+        if ganho[i, j] >= -1e-9:
+            break
+        caminho[i + 1:j + 1] = caminho[i + 1:j + 1][::-1].copy()
+    return caminho[1:-1].tolist()
+
+
+def otimizar_rotas(deposito, latitudes, longitudes, pesos, caminhoes=1, capacidade_kg=float('inf')):
+    """Roteiriza as paradas a partir do depósito (lat, lon).
+
+    Retorna (rotas, nao_atendidas): rotas é uma lista, por caminhão, de
+    índices das paradas na ordem de visita; nao_atendidas são os índices que
+    não couberam (peso acima da capacidade ou caminhões insuficientes).
+    """
+    import numpy as np
+
+    distancias = matriz_distancias([deposito[0], *latitudes], [deposito[1], *longitudes])
+    pesos = np.array([0.0, *pesos], dtype=float)
+    rotas, sobra = _vizinho_mais_proximo(distancias, pesos, capacidade_kg, caminhoes)
+    rotas = [_dois_opt(distancias, rota) for rota in rotas]
+    # Índices da matriz começam no depósito (0): volta para a numeração das paradas
+    return [[parada - 1 for parada in rota] for rota in rotas], [parada - 1 for parada in sobra]
+
+
+def _coletas_do_dia(dia, status):
+    inicio = datetime.combine(dia, time.min)
+    consulta = select(
+        Compra.id, Compra.latitude, Compra.longitude, Compra.quantidade_kg, Compra.endereco_coleta,
+        Compra.status_aprovacao, Compra.fornecedor_id, Fornecedor.nome_social,
+    ).join(Fornecedor, Fornecedor.id == Compra.fornecedor_id).where(
+        Compra.tipo_coleta == 'coleta',
+        Compra.data >= inicio,
+        Compra.data < inicio + timedelta(days=1),
+        Compra.status_aprovacao.in_(status),
+    ).order_by(Compra.id)
+    return sessao_leitura().execute(consulta).all()
+
+
+def _parada(coleta, distancia_km, acumulado_km, carga_kg):
+    return {
+        'compra_id': coleta.id,
+        'fornecedor_id': coleta.fornecedor_id,
+        'fornecedor': coleta.nome_social,
+        'endereco_coleta': coleta.endereco_coleta,
+        'latitude': coleta.latitude,
+        'longitude': coleta.longitude,
+        'quantidade_kg': coleta.quantidade_kg,
+        'status_aprovacao': coleta.status_aprovacao,
+        'distancia_km': round(distancia_km, 3),
+        'distancia_acumulada_km': round(acumulado_km, 3),
+        'carga_acumulada_kg': round(carga_kg, 1),
+    }
+
+
+def roteirizar_coletas(dia, deposito, caminhoes, capacidade_kg, status=STATUS_A_COLETAR):
+    """Rotas das coletas do dia, prontas para a API."""
+    coletas = _coletas_do_dia(dia, status)
+    com_local = [c for c in coletas if c.latitude is not None and c.longitude is not None]
+    resultado = {
+        'data': dia.isoformat(),
+        'deposito': {'latitude': deposito[0], 'longitude': deposito[1]},
+        'caminhoes': [],
+        'sem_coordenadas': [c.id for c in coletas if c.latitude is None or c.longitude is None],
+        'nao_atendidas': [],
+        'distancia_total_km': 0.0,
+    }
+    if not com_local:
+        return resultado
+
+    # Só listas de números: a otimização roda fora do loop de eventos (concorrencia.py)
+    rotas, sobra = em_thread(
+        otimizar_rotas, deposito, [c.latitude for c in com_local], [c.longitude for c in com_local],
+        [c.quantidade_kg for c in com_local], caminhoes, capacidade_kg,
+    )
+
+    for numero, rota in enumerate(rotas, start=1):
+        paradas = []
+        anterior = deposito
+        acumulado = carga = 0.0
+        for indice in rota:
+            coleta = com_local[indice]
+            trecho = float(haversine_km(anterior[0], anterior[1], coleta.latitude, coleta.longitude))
+            acumulado += trecho
+            carga += coleta.quantidade_kg
+            paradas.append(_parada(coleta, trecho, acumulado, carga))
+            anterior = (coleta.latitude, coleta.longitude)
+        retorno = float(haversine_km(anterior[0], anterior[1], deposito[0], deposito[1]))
+        resultado['caminhoes'].append({
+            'caminhao': numero,
+            'paradas': paradas,
+            'carga_kg': round(carga, 1),
+            'distancia_km': round(acumulado + retorno, 3),
+        })
+        resultado['distancia_total_km'] += acumulado + retorno
+
+    resultado['distancia_total_km'] = round(resultado['distancia_total_km'], 3)
+    resultado['nao_atendidas'] = [
+        {'compra_id': com_local[i].id, 'quantidade_kg': com_local[i].quantidade_kg,
+         'motivo': 'acima da capacidade' if com_local[i].quantidade_kg > capacidade_kg else 'sem caminhão disponível'}
+        for i in sobra
+    ]
+    return resultado
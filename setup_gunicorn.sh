@@ -78,19 +78,48 @@ cat > "${APP_DIR}/gunicorn_config.py" << 'EOF'
 Configuração do Gunicorn para MRX Gestão
 """
 
-import multiprocessing
 import os
 
+# gevent só com PostgreSQL: o sqlite3 espera o lock do banco sem ceder a vez e
+# o app recusa subir com gevent e SQLite (ver concorrencia.py)
+GEVENT = os.environ.get("DATABASE_URL", "").startswith(("postgres://", "postgresql"))
+
+if GEVENT:
+    # Antes de qualquer outro import: com preload_app o master importa o app
+    # (pool do SQLAlchemy, psycopg, travas da auditoria e das notificações) e
+    # tudo precisa nascer cooperativo
+    from gevent import monkey
+    monkey.patch_all()
+
+import multiprocessing
+
+# Métricas Prometheus agregadas entre workers (ver metricas.py); precisa
+# estar no ambiente antes de o app ser importado nos workers
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/var/run/mrx_gestao/prometheus")
+
 # Binding
 bind = "127.0.0.1:8000"
 
 # Workers
 workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = "sync"
-worker_connections = 1000
+if GEVENT:
+    # Cada requisição é um greenlet; as conexões SSE (/api/eventos/compras,
+    # ver notificacoes.py) ficam abertas sem ocupar um worker cada
+    worker_class = "gevent"
+    worker_connections = 1000
+else:
+    # SQLite: threads. Cada conexão SSE ocupa uma thread enquanto estiver aberta,
+    # então elas ficam limitadas a metade das threads do worker
+    worker_class = "gthread"
+    threads = 8
+    os.environ.setdefault("NOTIFICACOES_MAX_CONEXOES", str(threads // 2))
 max_requests = 1000
 max_requests_jitter = 50
 
+# App carregado uma vez no master e compartilhado com os workers via
+# copy-on-write (ver create_app em app.py)
+preload_app = True
+
 # Timeout
 timeout = 30
 keepalive = 2
@@ -115,10 +144,19 @@ raw_env = [
 # Hooks
 def on_starting(server):
     print("Gunicorn iniciando...")
+    # Métricas de workers de execuções anteriores não valem mais
+    pasta = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    os.makedirs(pasta, exist_ok=True)
+    for arquivo in os.listdir(pasta):
+        os.remove(os.path.join(pasta, arquivo))
 
 def when_ready(server):
     print("Gunicorn pronto. Escutando em 127.0.0.1:8000")
 
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
 def on_exit(server):
     print("Gunicorn encerrando...")
 EOF
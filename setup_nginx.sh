@@ -94,11 +94,43 @@ server {
         proxy_request_buffering off;
     }
 
-    # Arquivos estáticos
+    # Server-sent events (notificacoes.py): conexão longa, cada evento sai na hora
+    location /api/eventos/ {
+        proxy_pass http://${GUNICORN_SOCKET};
+        proxy_http_version 1.1;
+        proxy_set_header Connection "";
+        proxy_set_header Host \$host;
+        proxy_set_header X-Real-IP \$remote_addr;
+        proxy_set_header X-Forwarded-For \$proxy_add_x_forwarded_for;
+        proxy_set_header X-Forwarded-Proto \$scheme;
+        proxy_buffering off;
+        proxy_cache off;
+        gzip off;
+        proxy_read_timeout 1h;
+    }
+
+    # Arquivos com hash no nome (flask build-static): cache imutável de um ano
+    location /static/dist/ {
+        alias ${APP_DIR}/static/dist/;
+        gzip_static on;
+        # brotli_static on;  # requer o módulo ngx_brotli
+        expires 1y;
+        add_header Cache-Control "public, max-age=31536000, immutable";
+        access_log off;
+    }
+
+    # Comprovantes e miniaturas: nome é o SHA-256 do conteúdo, nunca mudam
+    location ~ ^/static/uploads/(comprovantes|miniaturas)/ {
+        root ${APP_DIR};
+        expires 1y;
+        add_header Cache-Control "public, max-age=31536000, immutable";
+    }
+
+    # Arquivos estáticos sem hash
     location /static/ {
         alias ${APP_DIR}/static/;
-        expires 30d;
-        add_header Cache-Control "public, immutable";
+        expires 1h;
+        add_header Cache-Control "public";
     }
 
     # Deny access to hidden files
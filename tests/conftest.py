@@ -0,0 +1,178 @@
+"""
+Fixtures dos testes.
+
+Cada teste que usa `app` roda no SQLite em memória e, se DATABASE_URL
+estiver definida, também nesse banco (PostgreSQL). As tabelas são criadas
+e apagadas a cada teste: use um banco descartável.
+
+    python -m pytest -q
+    DATABASE_URL=postgresql://localhost/mrx_teste python -m pytest -q
+"""
+
+import itertools
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from config import Config, _binds, _database_url, _engine_options, config
+from models import Compra, Despesa, Fornecedor, RoleEnum, TabelaPreco, Usuario, db
+
+SENHA = 'Teste@123'
+
+BANCOS = [pytest.param('sqlite://', id='sqlite')]
+if os.environ.get('DATABASE_URL'):
+    BANCOS.append(pytest.param(_database_url(), id='postgresql'))
+else:
+    BANCOS.append(pytest.param(None, id='postgresql', marks=pytest.mark.skip('DATABASE_URL não definida')))
+
+
+def criar_config(url, pasta):
+    """Config de teste para `url`, com as pastas de trabalho dentro de `pasta`."""
+    class ConfigTeste(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = url
+        SQLALCHEMY_ENGINE_OPTIONS = _engine_options(url)
+        SQLALCHEMY_BINDS = _binds(url)
+        SQLITE_PRAGMAS = {}
+        STATIC_USAR_MANIFESTO = False
+        UPLOAD_FOLDER = str(pasta / 'uploads')
+        UPLOAD_TEMP_FOLDER = str(pasta / 'uploads_tmp')
+        BACKUP_FOLDER = str(pasta / 'backups')
+        TEMPLATES_CACHE_PASTA = str(pasta / 'jinja')
+        AUDITORIA_PASTA = str(pasta / 'auditoria')
+        AUDITORIA_INTERVALO_SEGUNDOS = 0
+        IMPORTACAO_PASTA = str(pasta / 'importacoes')
+        NOTIFICACOES_PASTA = str(pasta / 'notificacoes')
+
+    return ConfigTeste
+
+
+def montar_app(url, pasta, **ajustes):
+    """create_app() com a config de teste; `ajustes` sobrescrevem atributos da config."""
+    from app import create_app
+
+    config['teste'] = type('ConfigTeste', (criar_config(url, pasta),), ajustes)
+    try:
+        return create_app('teste')
+    finally:
+        del config['teste']
+
+
+@pytest.fixture(params=BANCOS)
+def app(request, tmp_path):
+    marcador = request.node.get_closest_marker('config')
+    app = montar_app(request.param, tmp_path, **(marcador.kwargs if marcador else {}))
+    with app.app_context():
+        db.create_all(bind_key=None)  # o bind de leitura não tem tabelas próprias
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all(bind_key=None)
+        engines = list(db.engines.values())
+    for engine in engines:
+        engine.dispose()
+
+
+@pytest.fixture
+def contexto(app):
+    """Contexto da aplicação para chamar os módulos direto (sem requisição)."""
+    with app.app_context():
+        yield
+        db.session.rollback()
+
+
+@pytest.fixture
+def fabrica():
+    return Fabrica()
+
+
+@pytest.fixture
+def cliente(app):
+    """Cliente HTTP com um administrador logado (cliente.usuario_id)."""
+    with app.app_context():
+        usuario = Fabrica().usuario(papel=RoleEnum.ADMIN)
+        db.session.commit()
+        usuario_id, email = usuario.id, usuario.email
+    cliente = app.test_client()
+    resposta = cliente.post('/login', data={'email': email, 'senha': SENHA})
+    assert resposta.status_code == 302, 'login do cliente de teste falhou'
+    cliente.usuario_id = usuario_id
+    return cliente
+
+
+@pytest.fixture
+def renderizados(app):
+    """(nome, contexto) de cada template renderizado durante o teste."""
+    from flask import template_rendered
+
+    lista = []
+
+    def _registrar(sender, template, context, **extra):
+        lista.append((template.name, context))
+
+    template_rendered.connect(_registrar, app)
+    yield lista
+    template_rendered.disconnect(_registrar, app)
+
+
+@pytest.fixture
+def amanha(monkeypatch):
+    """Faz as views de app.py e os ETags (versoes.py) verem o dia seguinte (datetime.utcnow() + 1 dia)."""
+    class AmanhaUTC(datetime):
+        @classmethod
+        def utcnow(cls):
+            return datetime.utcnow() + timedelta(days=1)
+
+    monkeypatch.setattr('app.datetime', AmanhaUTC)
+    monkeypatch.setattr('versoes.datetime', AmanhaUTC)
+    yield
+    monkeypatch.undo()
+
+
+class Fabrica:
+    """Registros mínimos válidos. Cada método adiciona à db.session, faz flush e devolve o objeto."""
+
+    def __init__(self):
+        self._seq = itertools.count(1)
+
+    def _salvar(self, objeto):
+        db.session.add(objeto)
+        db.session.flush()
+        return objeto
+
+    def usuario(self, papel=RoleEnum.COMPRADOR, senha=SENHA, **campos):
+        n = next(self._seq)
+        usuario = Usuario(nome=campos.pop('nome', f'Usuário {n}'), email=campos.pop('email', f'usuario{n}@mrx.test'),
+                          papel=papel, **campos)
+        usuario.set_password(senha)
+        return self._salvar(usuario)
+
+    def fornecedor(self, **campos):
+        campos.setdefault('nome_social', f'Fornecedor {next(self._seq)}')
+        return self._salvar(Fornecedor(**campos))
+
+    def item(self, fornecedor=None, **campos):
+        fornecedor = fornecedor or self.fornecedor()
+        campos.setdefault('nome_item', f'Item {next(self._seq)}')
+        campos.setdefault('preco_por_kg', 10.0)
+        return self._salvar(TabelaPreco(fornecedor_id=fornecedor.id, **campos))
+
+    def compra(self, item=None, comprador=None, quantidade_kg=10.0, preco_unitario=None, **campos):
+        item = item or self.item()
+        comprador = comprador or self.usuario()
+        preco_unitario = item.preco_por_kg if preco_unitario is None else preco_unitario
+        campos.setdefault('data', datetime.utcnow())
+        campos.setdefault('tipo_coleta', 'coleta')
+        campos.setdefault('preco_maximo', item.preco_por_kg)
+        return self._salvar(Compra(
+            fornecedor_id=item.fornecedor_id, tabela_preco_id=item.id, comprador_id=comprador.id,
+            quantidade_kg=quantidade_kg, preco_unitario=preco_unitario,
+            valor_total=quantidade_kg * preco_unitario, **campos,
+        ))
+
+    def despesa(self, vendedor=None, valor=100.0, **campos):
+        vendedor = vendedor or self.usuario()
+        campos.setdefault('nome_social', f'Despesa {next(self._seq)}')
+        campos.setdefault('data', datetime.utcnow())
+        return self._salvar(Despesa(vendedor_id=vendedor.id, valor=valor, **campos))
@@ -0,0 +1,225 @@
+"""Agregados diários das compras: grade do mapa de calor e cubos analíticos (agregados.py)."""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+from agregados import (PRECISAO_GRID, consultar_cubo, mapa_calor, precisao_para_zoom, reconstruir_cubo,
+                       reconstruir_grid)
+from geo import codificar_geohash
+from models import CompraCuboCompradorDia, CompraCuboDia, CompraGridDia, db
+
+SAO_PAULO = (-23.5505, -46.6333)
+CAMPINAS = (-22.9099, -47.0626)
+
+
+def _grade():
+    linhas = db.session.execute(select(CompraGridDia.dia, CompraGridDia.celula, CompraGridDia.quantidade_kg,
+                                       CompraGridDia.valor_total, CompraGridDia.compras))
+    return {(dia, celula): (round(kg, 6), round(valor, 6), compras) for dia, celula, kg, valor, compras in linhas}
+
+
+def _cubos():
+    cubo = {(linha.dia, linha.fornecedor_id, linha.tabela_preco_id, linha.comprador_id, linha.tipo_coleta):
+            (round(linha.quantidade_kg, 6), round(linha.valor_total, 6), round(linha.valor_comissao, 6), linha.compras)
+            for linha in db.session.execute(select(CompraCuboDia.__table__))}
+    por_comprador = {(linha.dia, linha.comprador_id, linha.tipo_coleta):
+                     (round(linha.quantidade_kg, 6), round(linha.valor_total, 6), round(linha.valor_comissao, 6),
+                      linha.compras)
+                     for linha in db.session.execute(select(CompraCuboCompradorDia.__table__))}
+    return cubo, por_comprador
+
+
+def test_grade_acompanha_as_escritas(contexto, fabrica):
+    dia = datetime(2026, 3, 10, 9)
+    celula = codificar_geohash(*SAO_PAULO)[:PRECISAO_GRID]
+    item = fabrica.item(preco_por_kg=2.0)
+    comprador = fabrica.usuario()
+    primeira = fabrica.compra(item, comprador, quantidade_kg=10, data=dia, latitude=SAO_PAULO[0], longitude=SAO_PAULO[1])
+    fabrica.compra(item, comprador, quantidade_kg=5, data=dia, latitude=SAO_PAULO[0], longitude=SAO_PAULO[1])
+    fabrica.compra(item, comprador, data=dia)  # sem local: fora da grade
+    assert _grade() == {(dia.date(), celula): (15, 30, 2)}
+
+    primeira.status_aprovacao = 'rejeitada'
+    db.session.flush()
+    assert _grade() == {(dia.date(), celula): (5, 10, 1)}
+
+    primeira.status_aprovacao = 'aprovada'
+    primeira.latitude, primeira.longitude = CAMPINAS
+    db.session.flush()
+    assert _grade() == {
+        (dia.date(), celula): (5, 10, 1),
+        (dia.date(), codificar_geohash(*CAMPINAS)[:PRECISAO_GRID]): (10, 20, 1),
+    }
+
+    db.session.delete(primeira)
+    db.session.flush()
+    assert _grade() == {(dia.date(), celula): (5, 10, 1)}
+
+    db.session.rollback()
+    assert _grade() == {}
+
+
+def test_reconstruir_grid_igual_aos_deltas(contexto, fabrica):
+    item = fabrica.item()
+    comprador = fabrica.usuario()
+    for n in range(6):
+        fabrica.compra(item, comprador, quantidade_kg=n + 1, data=datetime(2026, 3, 1 + n % 3, 8),
+                       latitude=SAO_PAULO[0] + n * 0.01, longitude=SAO_PAULO[1],
+                       status_aprovacao='rejeitada' if n == 4 else 'pendente')
+    db.session.commit()
+    incremental = _grade()
+
+    db.session.execute(CompraGridDia.__table__.delete())
+    db.session.commit()
+    assert reconstruir_grid() == len(incremental)
+    assert _grade() == incremental
+
+
+def test_mapa_calor_por_periodo_precisao_e_retangulo(contexto, fabrica):
+    item = fabrica.item()
+    comprador = fabrica.usuario()
+    for data, local in ((datetime(2026, 3, 1), SAO_PAULO), (datetime(2026, 3, 2), SAO_PAULO),
+                        (datetime(2026, 3, 2), CAMPINAS), (datetime(2026, 4, 1), SAO_PAULO)):
+        fabrica.compra(item, comprador, quantidade_kg=10, data=data, latitude=local[0], longitude=local[1])
+    db.session.commit()
+
+    marco = mapa_calor(datetime(2026, 3, 1).date(), datetime(2026, 3, 31).date(), 4)
+    assert {c['celula']: c['compras'] for c in marco} == {
+        codificar_geohash(*SAO_PAULO, 4): 2, codificar_geohash(*CAMPINAS, 4): 1}
+
+    (regiao,) = mapa_calor(datetime(2026, 3, 1).date(), datetime(2026, 3, 31).date(), 2)
+    assert regiao['compras'] == 3 and regiao['quantidade_kg'] == 30
+
+    (so_capital,) = mapa_calor(datetime(2026, 3, 1).date(), datetime(2026, 3, 31).date(), 5,
+                               (-23.7, -46.8, -23.4, -46.5))
+    assert so_capital['compras'] == 2
+    assert abs(so_capital['latitude'] - SAO_PAULO[0]) < 0.05
+
+
+def test_precisao_para_zoom():
+    assert precisao_para_zoom(0) == 1
+    assert precisao_para_zoom(20) == PRECISAO_GRID
+    assert [precisao_para_zoom(z) for z in range(21)] == sorted(precisao_para_zoom(z) for z in range(21))
+
+
+def test_api_mapa_calor_etag_anda_com_o_dia(app, cliente, fabrica, request):
+    with app.app_context():
+        fabrica.compra(data=datetime.utcnow(), latitude=SAO_PAULO[0], longitude=SAO_PAULO[1])
+        db.session.commit()
+    with cliente.session_transaction() as sessao:
+        sessao.pop('_flashes', None)
+
+    hoje = cliente.get('/api/compras/mapa-calor?zoom=8')
+    assert hoje.status_code == 200 and len(hoje.get_json()['celulas']) == 1
+    etag, ultima_alteracao = hoje.headers['ETag'], hoje.headers['Last-Modified']
+    assert cliente.get('/api/compras/mapa-calor?zoom=8', headers={'If-None-Match': etag}).status_code == 304
+
+    # O período padrão (últimos 30 dias) termina em outro dia: não vale a cópia de ontem
+    request.getfixturevalue('amanha')
+    amanha = cliente.get('/api/compras/mapa-calor?zoom=8', headers={'If-None-Match': etag})
+    assert amanha.status_code == 200
+    assert amanha.get_json()['fim'] == (datetime.utcnow() + timedelta(days=1)).date().isoformat()
+    assert cliente.get('/api/compras/mapa-calor?zoom=8',
+                       headers={'If-Modified-Since': ultima_alteracao}).status_code == 200
+
+
+@pytest.mark.parametrize('parametros', ['inicio=2026-13-01', 'inicio=2026-03-02&fim=2026-03-01', 'min_lat=1'])
+def test_api_mapa_calor_recusa_parametros(cliente, parametros):
+    assert cliente.get(f'/api/compras/mapa-calor?{parametros}').status_code == 400
+
+
+def test_cubos_acompanham_as_escritas(contexto, fabrica):
+    dia = datetime(2026, 3, 10, 9)
+    item = fabrica.item(preco_por_kg=2.0)
+    comprador, outro = fabrica.usuario(), fabrica.usuario()
+    compra = fabrica.compra(item, comprador, quantidade_kg=10, data=dia, valor_comissao=1.0)
+    fabrica.compra(item, comprador, quantidade_kg=5, data=dia, tipo_coleta='entrega')
+    chave = (dia.date(), item.fornecedor_id, item.id)
+    assert _cubos() == (
+        {(*chave, comprador.id, 'coleta'): (10, 20, 1, 1), (*chave, comprador.id, 'entrega'): (5, 10, 0, 1)},
+        {(dia.date(), comprador.id, 'coleta'): (10, 20, 1, 1), (dia.date(), comprador.id, 'entrega'): (5, 10, 0, 1)},
+    )
+
+    compra.comprador_id = outro.id
+    compra.quantidade_kg, compra.valor_total = 20, 40
+    db.session.flush()
+    cubo, por_comprador = _cubos()
+    assert (*chave, comprador.id, 'coleta') not in cubo
+    assert cubo[(*chave, outro.id, 'coleta')] == (20, 40, 1, 1)
+    assert por_comprador[(dia.date(), outro.id, 'coleta')] == (20, 40, 1, 1)
+
+    compra.status_aprovacao = 'rejeitada'
+    db.session.flush()
+    assert len(_cubos()[0]) == len(_cubos()[1]) == 1
+
+    db.session.delete(compra)
+    db.session.commit()
+    assert len(_cubos()[0]) == 1
+
+
+def test_reconstruir_cubo_igual_aos_deltas(contexto, fabrica):
+    itens = [fabrica.item(), fabrica.item()]
+    compradores = [fabrica.usuario(), fabrica.usuario()]
+    for n in range(8):
+        fabrica.compra(itens[n % 2], compradores[n // 4], quantidade_kg=n + 1, data=datetime(2026, 3, 1 + n % 3, 8),
+                       valor_comissao=n * 0.5, status_aprovacao='rejeitada' if n == 5 else 'aprovada')
+    db.session.commit()
+    incremental = _cubos()
+
+    db.session.execute(CompraCuboDia.__table__.delete())
+    db.session.execute(CompraCuboCompradorDia.__table__.delete())
+    db.session.commit()
+    assert reconstruir_cubo() == len(incremental[0])
+    assert _cubos() == incremental
+
+    # Só um período: o resto fica como estava
+    db.session.execute(CompraCuboDia.__table__.delete().where(CompraCuboDia.dia == datetime(2026, 3, 2).date()))
+    db.session.commit()
+    reconstruir_cubo(datetime(2026, 3, 2).date(), datetime(2026, 3, 2).date())
+    assert _cubos() == incremental
+
+
+def test_consultar_cubo(contexto, fabrica):
+    fornecedor_a, fornecedor_b = fabrica.fornecedor(nome_social='A'), fabrica.fornecedor(nome_social='B')
+    item_a, item_b = fabrica.item(fornecedor_a), fabrica.item(fornecedor_b)
+    comprador = fabrica.usuario()
+    for item, data, kg in ((item_a, datetime(2026, 3, 1), 10), (item_a, datetime(2026, 4, 1), 20),
+                           (item_b, datetime(2026, 4, 2), 50), (item_b, datetime(2025, 12, 31), 1000)):
+        fabrica.compra(item, comprador, quantidade_kg=kg, data=data)
+    db.session.commit()
+    inicio, fim = datetime(2026, 1, 1).date(), datetime(2026, 12, 31).date()
+
+    linhas, totais = consultar_cubo(inicio, fim, ['fornecedor'], ordem='quantidade_kg')
+    assert [(l['fornecedor'], l['fornecedor_nome'], l['quantidade_kg'], l['compras']) for l in linhas] == [
+        (fornecedor_b.id, 'B', 50, 1), (fornecedor_a.id, 'A', 30, 2)]
+    assert totais['quantidade_kg'] == 80 and totais['compras'] == 3
+
+    linhas, _ = consultar_cubo(inicio, fim, ['mes'])
+    assert [(l['mes'], l['quantidade_kg']) for l in linhas] == [('2026-03', 10), ('2026-04', 70)]
+
+    linhas, totais = consultar_cubo(inicio, fim, ['dia', 'comprador'], {'fornecedor': fornecedor_a.id})
+    assert [l['dia'] for l in linhas] == ['2026-03-01', '2026-04-01']
+    assert linhas[0]['comprador_nome'] == comprador.nome and totais['quantidade_kg'] == 30
+
+    # Sem fornecedor/item a consulta lê o resumo por comprador e dá os mesmos totais
+    assert consultar_cubo(inicio, fim, ['ano'])[0] == [
+        {'ano': '2026', 'quantidade_kg': 80, 'valor_total': 800, 'valor_comissao': 0, 'compras': 3}]
+    assert consultar_cubo(inicio, fim, [], limite=1)[1]['compras'] == 3
+
+
+def test_api_analitico_etag_anda_com_o_dia(cliente, request):
+    with cliente.session_transaction() as sessao:
+        sessao.pop('_flashes', None)
+    hoje = cliente.get('/api/analitico/compras?dimensoes=fornecedor,mes')
+    assert hoje.status_code == 200 and hoje.get_json()['linhas'] == []
+
+    request.getfixturevalue('amanha')
+    amanha = cliente.get('/api/analitico/compras?dimensoes=fornecedor,mes', headers={'If-None-Match': hoje.headers['ETag']})
+    assert amanha.status_code == 200
+
+    assert cliente.get('/api/analitico/compras?dimensoes=cor').status_code == 400
+    assert cliente.get('/api/analitico/compras?dimensoes=dia,dia').status_code == 400
+    assert cliente.get('/api/analitico/compras?ordem=peso').status_code == 400
+    assert cliente.get('/api/analitico/compras?fornecedor=x').status_code == 400
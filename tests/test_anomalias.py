@@ -0,0 +1,92 @@
+"""Detecção de compras atípicas (anomalias.py)."""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from anomalias import (MIN_COMPRAS, _mediana_mad_por_grupo, _z, _z_janela_movel, avaliar_compra, detectar_anomalias,
+                       recalcular_estatisticas)
+from models import db
+
+
+def test_mediana_e_mad_por_grupo():
+    aleatorio = np.random.default_rng(1)
+    grupos = aleatorio.integers(0, 5, 200)
+    valores = aleatorio.normal(size=200)
+
+    chaves, contagens, medianas, mads = _mediana_mad_por_grupo(grupos, valores)
+    for chave, n, mediana, mad in zip(chaves, contagens, medianas, mads):
+        do_grupo = valores[grupos == chave]
+        assert n == len(do_grupo)
+        assert mediana == pytest.approx(np.median(do_grupo))
+        assert mad == pytest.approx(np.median(np.abs(do_grupo - np.median(do_grupo))))
+
+
+def test_janela_movel_igual_ao_calculo_direto():
+    aleatorio = np.random.default_rng(2)
+    grupos = np.sort(aleatorio.integers(0, 3, 120))
+    valores = aleatorio.normal(size=120)
+    janela = 15
+
+    z = _z_janela_movel(grupos, valores, janela)
+    for i in range(len(valores)):
+        anteriores = valores[max(0, i - janela):i][grupos[max(0, i - janela):i] == grupos[i]]
+        if len(anteriores) < MIN_COMPRAS:
+            assert np.isnan(z[i])
+        else:
+            mediana = np.median(anteriores)
+            assert z[i] == pytest.approx(_z(valores[i], mediana, np.median(np.abs(anteriores - mediana))))
+
+
+def _historico(fabrica, quantidade=MIN_COMPRAS + 2, inicio=None):
+    """Compras de um item com preço e peso estáveis (variação de ~2%), uma por dia."""
+    item = fabrica.item(preco_por_kg=10.0)
+    comprador = fabrica.usuario()
+    inicio = inicio or datetime.utcnow() - timedelta(days=quantidade + 1)
+    for n in range(quantidade):
+        fator = 1 + 0.02 * ((n % 5) - 2) / 2
+        fabrica.compra(item, comprador, quantidade_kg=100 * fator, preco_unitario=10.0 * fator,
+                       data=inicio + timedelta(days=n))
+    return item, comprador
+
+
+def test_estatisticas_e_avaliacao_de_compra_nova(contexto, fabrica):
+    item, comprador = _historico(fabrica)
+    db.session.commit()
+
+    assert recalcular_estatisticas() == {'item': 1, 'comprador': 1}
+    assert avaliar_compra(item.id, comprador.id, 10.1, 99) == []
+
+    motivos = avaliar_compra(item.id, comprador.id, 50.0, 100)
+    assert len(motivos) == 1 and motivos[0].startswith('preço/kg fora do padrão do item')
+    assert len(avaliar_compra(item.id, comprador.id, 10.0, 5000)) == 2  # do item e do comprador
+    # Sem histórico suficiente não há padrão
+    assert avaliar_compra(item.id + 1000, comprador.id + 1000, 50.0, 5000) == []
+
+
+def test_detectar_no_periodo(contexto, fabrica):
+    inicio = datetime(2026, 2, 1)
+    item, comprador = _historico(fabrica, inicio=inicio)
+    fora = fabrica.compra(item, comprador, quantidade_kg=100, preco_unitario=40.0, data=inicio + timedelta(days=20))
+    fabrica.compra(item, comprador, quantidade_kg=100, preco_unitario=60.0, data=inicio + timedelta(days=21),
+                   status_aprovacao='rejeitada')
+    db.session.commit()
+
+    (anomalia,) = detectar_anomalias(inicio + timedelta(days=15), inicio + timedelta(days=30))
+    assert anomalia['compra_id'] == fora.id and anomalia['z_preco_item'] > 3.5
+    assert detectar_anomalias(inicio, inicio + timedelta(days=15)) == []
+
+
+def test_api_anomalias_etag_anda_com_o_dia(app, cliente, request):
+    with cliente.session_transaction() as sessao:
+        sessao.pop('_flashes', None)
+    hoje = cliente.get('/api/compras/anomalias')
+    assert hoje.status_code == 200 and hoje.get_json()['anomalias'] == []
+
+    request.getfixturevalue('amanha')
+    amanha = cliente.get('/api/compras/anomalias', headers={'If-None-Match': hoje.headers['ETag']})
+    assert amanha.status_code == 200
+    assert amanha.get_json()['fim'] > hoje.get_json()['fim']
+
+    assert cliente.get('/api/compras/anomalias?inicio=2026-02-10&fim=2026-02-01').status_code == 400
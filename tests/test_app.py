@@ -0,0 +1,49 @@
+"""Fábrica da aplicação: imports pesados adiados e instância criada sob demanda (app.py)."""
+
+import json
+import os
+import subprocess
+import sys
+
+from models import db
+
+VERIFICAR_IMPORTS = r'''
+import json, sys
+import app as modulo
+criado_no_import = 'app' in vars(modulo)
+modulo.create_app('production')
+print(json.dumps({
+    'criado_no_import': criado_no_import,
+    'reportlab': 'reportlab' in sys.modules,
+    'flask_migrate': 'flask_migrate' in sys.modules,
+}))
+'''
+
+
+def test_create_app_nao_carrega_modulos_pesados(tmp_path):
+    saida = subprocess.run(
+        [sys.executable, '-c', VERIFICAR_IMPORTS], capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env={'DATABASE_URL': f"sqlite:///{tmp_path / 'mrx.db'}", 'PATH': ''},
+    ).stdout
+    assert json.loads(saida.splitlines()[-1]) == {'criado_no_import': False, 'reportlab': False, 'flask_migrate': False}
+
+
+def test_apps_independentes(app, tmp_path):
+    from conftest import montar_app
+
+    outro = montar_app('sqlite://', tmp_path)
+    assert outro is not app
+    assert set(outro.view_functions) == set(app.view_functions)
+
+
+def test_relatorio_pdf_importa_reportlab_na_rota(cliente, app, fabrica):
+    with app.app_context():
+        fabrica.compra()
+        db.session.commit()
+
+    resposta = cliente.get('/compras/exportar-pdf')
+
+    assert resposta.status_code == 200
+    assert resposta.mimetype == 'application/pdf'
+    assert resposta.data.startswith(b'%PDF')
@@ -0,0 +1,152 @@
+"""Arquivamento de compras e despesas antigas (arquivo.py)."""
+
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import select
+
+from agregados import reconstruir_cubo
+from arquivo import arquivar, corte_arquivo, precisa_arquivo, somar_arquivo, totais_arquivados
+from extras import filtrar_compras, filtrar_despesas, obter_resumo_periodo
+from models import ComissaoComprador, Compra, CompraArquivo, CompraCuboDia, Despesa, DespesaArquivo, TotalArquivo, db
+
+
+def _antigas(fabrica):
+    """Compras de jan a mar/2024 (valores 10, 20, 40, 80), uma despesa de jan/2024 e uma compra e uma
+    despesa de hoje, criadas por último para que a linha de maior id seja a recente."""
+    item = fabrica.item()
+    for valor, data in ((10, datetime(2024, 1, 10)), (20, datetime(2024, 1, 25)), (40, datetime(2024, 2, 15)),
+                        (80, datetime(2024, 3, 5))):
+        fabrica.compra(item, quantidade_kg=1.0, preco_unitario=valor, data=data)
+    fabrica.despesa(valor=30.0, data=datetime(2024, 1, 15))
+    fabrica.compra(item, quantidade_kg=1.0, preco_unitario=5.0)
+    fabrica.despesa(valor=7.0)
+    db.session.commit()
+    return item
+
+
+def _cubo():
+    return {tuple(linha) for linha in db.session.execute(select(CompraCuboDia.__table__))}
+
+
+def test_arquivar_move_os_meses_antigos(contexto, fabrica):
+    _antigas(fabrica)
+
+    assert arquivar(365) == {'compras': 4, 'despesas': 1}
+    assert db.session.query(Compra).count() == 1 and db.session.query(CompraArquivo).count() == 4
+    assert db.session.query(Despesa).count() == 1 and db.session.query(DespesaArquivo).count() == 1
+    totais = db.session.execute(select(TotalArquivo.tabela, TotalArquivo.mes, TotalArquivo.registros,
+                                       TotalArquivo.valor).order_by(TotalArquivo.tabela, TotalArquivo.mes))
+    assert [tuple(linha) for linha in totais] == [
+        ('compras', date(2024, 1, 1), 2, 30.0), ('compras', date(2024, 2, 1), 1, 40.0),
+        ('compras', date(2024, 3, 1), 1, 80.0), ('despesas', date(2024, 1, 1), 1, 30.0),
+    ]
+    assert totais_arquivados('compras') == (4, 150.0)
+    assert arquivar(365) == {'compras': 0, 'despesas': 0}
+
+
+def test_linha_de_maior_id_fica_na_tabela_quente(contexto, fabrica):
+    item = fabrica.item()
+    fabrica.compra(item, data=datetime(2024, 1, 10))
+    ultima = fabrica.compra(item, data=datetime(2024, 1, 20))
+    db.session.commit()
+
+    assert arquivar(365)['compras'] == 1
+    assert [compra.id for compra in db.session.query(Compra)] == [ultima.id]
+
+
+def test_horizonte_minimo(app):
+    with app.app_context(), pytest.raises(ValueError):
+        arquivar(189)
+
+    resultado = app.test_cli_runner().invoke(args=['arquivar', '--horizonte-dias', '30'])
+    assert resultado.exit_code == 1 and 'horizonte mínimo' in resultado.output
+
+
+def test_corte_e_precisa_arquivo(contexto, fabrica):
+    assert corte_arquivo('compras') is None and not precisa_arquivo('compras', None)
+    _antigas(fabrica)
+    arquivar(365)
+
+    assert corte_arquivo('compras') == datetime(2024, 4, 1)
+    assert corte_arquivo('despesas') == datetime(2024, 2, 1)
+    assert precisa_arquivo('compras', None) and precisa_arquivo('compras', datetime(2024, 3, 31))
+    assert not precisa_arquivo('compras', datetime(2024, 4, 1))
+
+
+def test_somar_arquivo_meses_inteiros_e_pontas(contexto, fabrica):
+    assert somar_arquivo('compras', None, None) == (0, 0.0)
+    _antigas(fabrica)
+    arquivar(365)
+
+    assert somar_arquivo('compras', None, None) == (4, 150.0)
+    assert somar_arquivo('compras', datetime(2024, 1, 20), datetime(2024, 3, 10)) == (3, 140.0)
+    assert somar_arquivo('compras', datetime(2024, 2, 1), datetime(2024, 2, 29, 23, 59)) == (1, 40.0)
+    assert somar_arquivo('compras', None, datetime(2024, 1, 20)) == (1, 10.0)
+    assert somar_arquivo('compras', datetime(2024, 4, 1), None) == (0, 0.0)
+    assert somar_arquivo('despesas', datetime(2024, 1, 1), datetime.utcnow()) == (1, 30.0)
+
+
+def test_filtros_e_resumo_leem_o_arquivo(contexto, fabrica):
+    _antigas(fabrica)
+    arquivar(365)
+    inicio, fim = datetime(2024, 1, 1), datetime.utcnow()
+
+    compras = filtrar_compras(inicio, fim)
+    assert [compra.valor_total for compra in compras] == [5.0, 80.0, 40.0, 20.0, 10.0]
+    assert [compra.valor_total for compra in filtrar_compras(datetime(2024, 4, 1), fim)] == [5.0]
+    assert [despesa.valor for despesa in filtrar_despesas(inicio, fim)] == [7.0, 30.0]
+
+    resumo = obter_resumo_periodo(inicio, fim)
+    assert (resumo['quantidade_compras'], resumo['total_compras']) == (5, 155.0)
+    assert (resumo['quantidade_despesas'], resumo['total_despesas']) == (2, 37.0)
+
+
+def test_cubo_nao_muda_com_o_arquivamento(contexto, fabrica):
+    _antigas(fabrica)
+    antes = _cubo()
+    arquivar(365)
+
+    assert _cubo() == antes
+    reconstruir_cubo()
+    assert _cubo() == antes
+
+
+def test_comando_e_dashboard(app, cliente, fabrica, renderizados):
+    with app.app_context():
+        _antigas(fabrica)
+
+    resultado = app.test_cli_runner().invoke(args=['arquivar', '--horizonte-dias', '365'])
+    assert resultado.exit_code == 0
+    assert resultado.output == 'Arquivadas: 4 compras, 1 despesas.\n'
+
+    assert cliente.get('/dashboard').status_code == 200
+    contexto = dict(renderizados)['dashboard.html']
+    assert (contexto['total_compras'], contexto['compras_valor']) == (5, 155.0)
+
+
+def test_comissao_de_mes_arquivado(app, cliente, fabrica):
+    with app.app_context():
+        comprador = fabrica.usuario(email='comprador@mrx.test')  # o `cliente` já usa usuario1@
+        item = fabrica.item()
+        for valor, data in ((10, datetime(2024, 1, 10)), (20, datetime(2024, 1, 25)), (40, datetime(2024, 2, 15))):
+            fabrica.compra(item, comprador, quantidade_kg=1.0, preco_unitario=valor, data=data,
+                           status_aprovacao='aprovada')
+        fabrica.compra(item, comprador, quantidade_kg=1.0, preco_unitario=5.0)
+        db.session.add(ComissaoComprador(comprador_id=comprador.id, percentual_comissao=10.0))
+        db.session.commit()
+        comprador_id = comprador.id
+    app.test_cli_runner().invoke(args=['arquivar', '--horizonte-dias', '365'])
+    with cliente.session_transaction() as sessao:
+        sessao.pop('_flashes', None)  # o do login
+
+    for mes in ('2024-13', '2024-00', '2024'):
+        resposta = cliente.post(f'/comissoes/{comprador_id}/calcular', data={'mes_referencia': mes})
+        assert resposta.status_code == 302
+        with cliente.session_transaction() as sessao:
+            assert sessao.pop('_flashes') == [('danger', 'Formato de mês inválido.')]
+
+    cliente.post(f'/comissoes/{comprador_id}/calcular', data={'mes_referencia': '2024-01'})
+    with cliente.session_transaction() as sessao:
+        (categoria, mensagem), = sessao.pop('_flashes')
+    assert categoria == 'success' and 'Total de compras: R$ 30.00, Comissão: R$ 3.00' in mensagem
@@ -0,0 +1,143 @@
+"""Trilha de auditoria (auditoria.py). Nos testes AUDITORIA_INTERVALO_SEGUNDOS = 0: grava no commit."""
+
+import json
+import os
+from datetime import datetime
+
+import auditoria
+from auditoria import consultar_auditoria, descarregar, registrar_evento
+from models import db
+
+
+def _pendentes():
+    return sorted(os.listdir(auditoria._config['pasta']))
+
+
+def test_alteracao_e_remocao_so_depois_do_commit(contexto, fabrica):
+    compra = fabrica.compra(quantidade_kg=10.0, preco_unitario=5.0)
+    usuario = fabrica.usuario()
+    db.session.commit()
+    compra_id, usuario_id = compra.id, usuario.id
+
+    compra.status_aprovacao = 'rejeitada'
+    db.session.flush()
+    db.session.rollback()
+    assert consultar_auditoria() == []
+
+    compra.status_aprovacao = 'aprovada'  # expirado pelo rollback: o valor antigo vem do banco
+    compra.tipo_coleta = 'entrega'  # campo não auditado
+    db.session.commit()
+    (evento,) = consultar_auditoria()
+    assert (evento['entidade'], evento['entidade_id'], evento['acao'], evento['origem']) == \
+        ('compras', compra_id, 'alteracao', 'cli')
+    assert evento['alteracoes'] == {'status_aprovacao': ['pendente', 'aprovada']}
+
+    db.session.delete(usuario)
+    db.session.commit()
+    (remocao,) = consultar_auditoria(entidade='usuarios', entidade_id=usuario_id)
+    assert remocao['acao'] == 'remocao' and remocao['alteracoes']['email'] == usuario.email
+    assert 'senha_hash' not in remocao['alteracoes']
+    assert _pendentes() == []  # o arquivo da fila sai depois de gravado
+
+
+def test_registrar_evento_fora_do_orm(contexto, fabrica):
+    fabrica.item()  # transação aberta, como nas cargas em lote
+    registrar_evento('tabela_precos', 7, 'importacao', {'preco_por_kg': [10.0, 12.0]})
+    db.session.rollback()
+    registrar_evento('tabela_precos', 8, 'importacao', {'preco_por_kg': [10.0, 12.0]})
+    db.session.commit()
+
+    assert [evento['entidade_id'] for evento in consultar_auditoria(entidade='tabela_precos')] == [8]
+
+
+def test_falha_na_gravacao_fica_no_arquivo_e_e_reenviada(contexto, fabrica, monkeypatch):
+    compra = fabrica.compra()
+    db.session.commit()
+
+    def _falhar(eventos):
+        raise RuntimeError('banco fora')
+
+    monkeypatch.setattr(auditoria, '_gravar', _falhar)
+    compra.status_aprovacao = 'aprovada'
+    db.session.commit()
+    assert consultar_auditoria() == [] and len(_pendentes()) == 1
+
+    monkeypatch.undo()
+    descarregar()
+    assert len(consultar_auditoria()) == 1 and _pendentes() == []
+
+
+def test_arquivo_de_processo_encerrado(contexto, fabrica):
+    os.makedirs(auditoria._config['pasta'], exist_ok=True)
+    evento = auditoria._evento('despesas', 3, 'remocao', {'valor': 10.0}, (None, 'cli', None))
+    linha = json.dumps(evento, default=auditoria._valor_json)
+    caminho = os.path.join(auditoria._config['pasta'], 'auditoria-999999999-0.jsonl')
+    with open(caminho, 'w', encoding='utf-8') as f:
+        f.write(f'{linha}\n{linha}\n{linha[:20]}')  # repetido e com a última linha cortada
+
+    descarregar()
+    (gravado,) = consultar_auditoria()
+    assert gravado['entidade'] == 'despesas' and _pendentes() == []
+
+
+def test_recuperacao_com_o_arquivo_atual_aberto(contexto, monkeypatch):
+    """Um arquivo de processo encerrado é recuperado sem tocar no que está recebendo eventos."""
+    os.makedirs(auditoria._config['pasta'], exist_ok=True)
+    antigo = auditoria._evento('despesas', 1, 'remocao', {'valor': 10.0}, (None, 'cli', None))
+    with open(os.path.join(auditoria._config['pasta'], 'auditoria-999999999-0.jsonl'), 'w', encoding='utf-8') as f:
+        f.write(json.dumps(antigo, default=auditoria._valor_json) + '\n')
+
+    # Gravação em segundo plano (sem iniciar a thread): o evento fica no arquivo atual
+    monkeypatch.setitem(auditoria._config, 'intervalo', 60)
+    for nome, valor in (('_pid', os.getpid()), ('_fila', []), ('_arquivo', None), ('_sequencia', 0)):
+        monkeypatch.setattr(auditoria, nome, valor)
+    auditoria._enfileirar([auditoria._evento('despesas', 2, 'remocao', {'valor': 20.0}, (None, 'cli', None))])
+    atual = auditoria._arquivo.name
+
+    auditoria._recuperar()
+    assert [evento['entidade_id'] for evento in consultar_auditoria()] == [1]
+    assert _pendentes() == [os.path.basename(atual)]
+    with open(atual, encoding='utf-8') as f:
+        assert json.loads(f.read())['entidade_id'] == 2
+
+    assert descarregar() == 1
+    assert sorted(evento['entidade_id'] for evento in consultar_auditoria()) == [1, 2] and _pendentes() == []
+
+
+def test_paginacao_com_eventos_no_mesmo_instante(contexto):
+    eventos = [auditoria._evento('despesas', n, 'remocao', {}, (None, 'cli', None)) for n in range(5)]
+    for evento in eventos:
+        evento['criado_em'] = eventos[0]['criado_em']
+    auditoria._gravar(eventos)
+
+    vistos, antes = [], None
+    while True:
+        pagina = consultar_auditoria(antes=antes, limite=2)
+        vistos += [evento['entidade_id'] for evento in pagina]
+        if len(pagina) < 2:
+            break
+        antes = (datetime.fromisoformat(pagina[-1]['criado_em']), pagina[-1]['id'])
+    assert vistos == [4, 3, 2, 1, 0]
+
+
+def test_api_auditoria(app, cliente, fabrica):
+    with app.app_context():
+        compras = [fabrica.compra() for _ in range(3)]
+        db.session.commit()
+        ids = [compra.id for compra in compras]
+    for compra_id in ids:
+        assert cliente.post(f'/compras/{compra_id}/aprovar').status_code == 302
+
+    resposta = cliente.get(f'/api/auditoria?entidade=compras&id={ids[0]}')
+    (evento,) = resposta.get_json()['eventos']
+    assert evento['usuario_id'] == cliente.usuario_id and evento['origem'] == 'aprovar_compra'
+    assert evento['usuario_nome'] is not None
+
+    primeira = cliente.get('/api/auditoria?limite=2').get_json()
+    assert [e['entidade_id'] for e in primeira['eventos']] == [ids[2], ids[1]]
+    segunda = cliente.get(f"/api/auditoria?limite=2&antes={primeira['proximo']}").get_json()
+    assert [e['entidade_id'] for e in segunda['eventos']] == [ids[0]] and segunda['proximo'] is None
+
+    assert cliente.get('/api/auditoria?entidade=senhas').status_code == 400
+    assert cliente.get('/api/auditoria?inicio=ontem').status_code == 400
+    assert cliente.get(f"/api/auditoria?antes={primeira['proximo'].split(',')[0]}").status_code == 400
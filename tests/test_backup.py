@@ -0,0 +1,148 @@
+"""Backup online do SQLite: cópia completa, cadeia incremental de WAL e restauração (backup.py)."""
+
+import glob
+import logging
+import os
+import sqlite3
+import threading
+
+import pytest
+
+from backup import backup_completo, backup_incremental, restaurar_backup
+from conftest import montar_app
+
+
+@pytest.fixture
+def caminho_db(tmp_path):
+    return str(tmp_path / 'mrx.db')
+
+
+@pytest.fixture
+def banco(caminho_db):
+    """Banco em WAL sem checkpoint automático, com uma conexão aberta como a dos workers."""
+    conn = sqlite3.connect(caminho_db, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA wal_autocheckpoint=0')
+    conn.execute('CREATE TABLE itens (id INTEGER PRIMARY KEY, nome TEXT)')
+    yield conn
+    conn.close()
+
+
+def _inserir(conn, *nomes):
+    conn.executemany('INSERT INTO itens (nome) VALUES (?)', [(nome,) for nome in nomes])
+
+
+def _restaurar(pasta, destino):
+    base, = glob.glob(os.path.join(pasta, 'mrx_*.db.gz'))
+    restaurar_backup(base, destino)
+    conn = sqlite3.connect(destino)
+    try:
+        return [nome for (nome,) in conn.execute('SELECT nome FROM itens ORDER BY id')]
+    finally:
+        conn.close()
+
+
+def test_cadeia_incremental_atravessa_o_checkpoint_do_backup(banco, caminho_db, tmp_path):
+    pasta = str(tmp_path / 'backups')
+    _inserir(banco, 'a', 'b')
+    assert backup_incremental(caminho_db, pasta)[1] is True  # sem base: completo
+
+    _inserir(banco, 'c')
+    caminho, completo = backup_incremental(caminho_db, pasta)
+    assert caminho.endswith('.wal.0001.gz') and not completo
+
+    # O checkpoint do backup reiniciou o WAL; a próxima escrita abre uma nova geração
+    _inserir(banco, 'd', 'e')
+    caminho, completo = backup_incremental(caminho_db, pasta)
+    assert caminho.endswith('.wal.0002.gz') and not completo
+
+    _inserir(banco, 'f')
+    assert backup_incremental(caminho_db, pasta)[0].endswith('.wal.0003.gz')
+    assert backup_incremental(caminho_db, pasta) == (None, False)
+
+    assert len(glob.glob(os.path.join(pasta, 'mrx_*.db.gz'))) == 1
+    assert _restaurar(pasta, str(tmp_path / 'restaurado.db')) == ['a', 'b', 'c', 'd', 'e', 'f']
+
+
+def test_checkpoint_fora_do_backup_gera_backup_completo(banco, caminho_db, tmp_path):
+    pasta = str(tmp_path / 'backups')
+    _inserir(banco, 'a')
+    backup_incremental(caminho_db, pasta)
+    _inserir(banco, 'b')
+    backup_incremental(caminho_db, pasta)
+
+    _inserir(banco, 'c')
+    banco.execute('PRAGMA wal_checkpoint(TRUNCATE)')  # como o checkpoint automático
+    _inserir(banco, 'd')
+
+    caminho, completo = backup_incremental(caminho_db, pasta)
+    assert completo and caminho.endswith('.db.gz')
+
+
+def test_copia_que_recomeca_demais_cai_para_vacuum_into(banco, caminho_db, tmp_path, caplog):
+    _inserir(banco, *(f'item {i}' * 50 for i in range(2000)))
+    parar = threading.Event()
+
+    def escrever():
+        conn = sqlite3.connect(caminho_db, isolation_level=None, timeout=5)
+        while not parar.is_set():
+            _inserir(conn, 'concorrente')
+        conn.close()
+
+    escritor = threading.Thread(target=escrever)
+    escritor.start()
+    try:
+        with caplog.at_level(logging.WARNING, logger='mrx.backup'):
+            base = backup_completo(caminho_db, str(tmp_path / 'backups'), paginas_por_passo=1, pausa=0.001,
+                                   max_reinicios=2)
+    finally:
+        parar.set()
+        escritor.join()
+
+    assert 'VACUUM INTO' in caplog.text
+    restaurar_backup(base, str(tmp_path / 'restaurado.db'))
+    conn = sqlite3.connect(str(tmp_path / 'restaurado.db'))
+    assert conn.execute('PRAGMA journal_mode').fetchone() == ('wal',)
+    assert conn.execute("SELECT count(*) FROM itens WHERE nome LIKE 'item%'").fetchone() == (2000,)
+    conn.close()
+
+
+def test_otimizar_banco_deixa_o_checkpoint_para_o_backup_incremental(tmp_path):
+    app = montar_app(f"sqlite:///{tmp_path / 'mrx.db'}", tmp_path, BACKUP_INCREMENTAL=True)
+    resultado = app.test_cli_runner().invoke(args=['otimizar-banco'])
+    assert 'checkpoint do WAL fica com o backup-banco' in resultado.output
+
+    app = montar_app(f"sqlite:///{tmp_path / 'mrx.db'}", tmp_path, BACKUP_INCREMENTAL=False)
+    resultado = app.test_cli_runner().invoke(args=['otimizar-banco'])
+    assert 'Checkpoint concluído' in resultado.output
+
+
+def test_wal_limitado_pelo_checkpoint_automatico_com_leitor(caminho_db, tmp_path):
+    """Com o perfil de produção o WAL reinicia sozinho, mesmo sem o timer de backup e com leitores."""
+    from config import ProductionConfig
+
+    app = montar_app(f'sqlite:///{caminho_db}', tmp_path, SQLITE_PRAGMAS=ProductionConfig.SQLITE_PRAGMAS)
+    pasta = str(tmp_path / 'backups')
+    with app.app_context():
+        from models import db
+
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql('CREATE TABLE itens (id INTEGER PRIMARY KEY, nome TEXT)')
+        backup_incremental(caminho_db, pasta)
+
+        leitor = sqlite3.connect(caminho_db, isolation_level=None)
+        try:
+            for _ in range(60):
+                leitor.execute('SELECT count(*) FROM itens').fetchone()  # leitura entre as escritas
+                with db.engine.begin() as conn:
+                    conn.exec_driver_sql('INSERT INTO itens (nome) VALUES ' + ', '.join(["('" + 'x' * 1000 + "')"] * 200))
+            limite = 2 * 1000 * leitor.execute('PRAGMA page_size').fetchone()[0]
+            assert os.path.getsize(caminho_db + '-wal') < limite
+        finally:
+            leitor.close()
+
+        # O checkpoint automático reiniciou o WAL fora do backup: a cadeia termina num completo
+        caminho, completo = backup_incremental(caminho_db, pasta)
+        assert completo and caminho.endswith('.db.gz')
+        for engine in db.engines.values():
+            engine.dispose()
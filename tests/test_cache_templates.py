@@ -0,0 +1,103 @@
+"""Bytecode dos templates em disco e a tag {% cache %} (cache_templates.py)."""
+
+import itertools
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import cache_templates
+from models import db
+from versoes import marcar_alteracao
+
+TRECHO = "{% cache 'trecho', chave por 'compras' %}{{ contar() }}{% endcache %}"
+
+
+@pytest.fixture
+def renderizar(app):
+    """Renderiza TRECHO com `chave`, cada chamada numa requisição; o corpo devolve 1, 2, 3..."""
+    template = app.jinja_env.from_string(TRECHO)
+    contador = itertools.count(1)
+
+    def _renderizar(chave=None):
+        with app.test_request_context():
+            return template.render(chave=chave, contar=lambda: next(contador))
+
+    return _renderizar
+
+
+def test_fragmento_refeito_quando_a_tabela_muda(app, renderizar):
+    assert renderizar() == '1'
+    assert renderizar() == '1'
+    assert renderizar('outra') == '2'
+
+    with app.app_context():
+        marcar_alteracao('fornecedores')
+        db.session.commit()
+    assert renderizar() == '1'
+
+    with app.app_context():
+        marcar_alteracao('compras')
+        db.session.commit()
+    assert renderizar() == '3'
+
+
+def test_fragmento_expira(renderizar, monkeypatch):
+    agora = [1000.0]
+    monkeypatch.setattr(cache_templates.time, 'monotonic', lambda: agora[0])
+    assert renderizar() == '1'
+    agora[0] += 299
+    assert renderizar() == '1'
+    agora[0] += 2
+    assert renderizar() == '2'
+
+
+@pytest.mark.config(FRAGMENTOS_CACHE_SEGUNDOS=0)
+def test_fragmento_sem_cache(renderizar):
+    assert [renderizar(), renderizar()] == ['1', '2']
+
+
+def test_fragmentos_disputados_por_threads(app, monkeypatch):
+    """Workers gthread: várias threads inserindo e despejando ao mesmo tempo."""
+    monkeypatch.setattr(cache_templates, 'MAX_ENTRADAS_CACHE', 8)
+    monkeypatch.setattr(cache_templates, '_versoes', lambda tabelas: ())
+    template = app.jinja_env.from_string("{% cache 'trecho', n %}{{ n * 2 }}{% endcache %}")
+
+    def renderizar(inicio):
+        with app.test_request_context():
+            return [int(template.render(n=n)) for n in range(inicio, inicio + 1000)]
+
+    intervalo = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        with ThreadPoolExecutor(8) as executor:
+            resultados = list(executor.map(renderizar, range(0, 8000, 1000)))
+    finally:
+        sys.setswitchinterval(intervalo)
+    assert sum(resultados, []) == [n * 2 for n in range(8000)]
+    assert len(cache_templates._cache) == 8
+
+
+def test_dashboard_mostra_compra_nova(app, cliente, fabrica):
+    assert 'Nenhuma compra registrada' in cliente.get('/dashboard').get_data(as_text=True)
+    with app.app_context():
+        fabrica.compra(fabrica.item(nome_item='Cobre Mel'))
+        db.session.commit()
+
+    assert 'Cobre Mel' in cliente.get('/dashboard').get_data(as_text=True)
+
+
+def test_comando_compilar_templates(app):
+    pasta = app.config['TEMPLATES_CACHE_PASTA']
+    templates = [nome for nome in app.jinja_env.list_templates() if nome.endswith('.html')]
+
+    resultado = app.test_cli_runner().invoke(args=['compilar-templates'])
+    assert resultado.exit_code == 0 and resultado.output.startswith(f'{len(templates)} templates compilados')
+    assert len(os.listdir(pasta)) == len(templates)
+
+
+@pytest.mark.config(TEMPLATES_CACHE_PASTA=None)
+def test_comando_sem_pasta(app):
+    resultado = app.test_cli_runner().invoke(args=['compilar-templates'])
+    assert resultado.exit_code == 1 and 'TEMPLATES_CACHE_PASTA' in resultado.output
@@ -0,0 +1,57 @@
+"""Workers gevent (concorrencia.py)."""
+
+import logging
+import os
+import threading
+
+import pytest
+from flask import request
+
+import concorrencia
+import notificacoes
+from concorrencia import em_thread
+
+
+def test_em_thread_sem_gevent_chama_direto():
+    assert em_thread(sorted, [3, 1, 2], reverse=True) == [3, 2, 1]
+
+
+@pytest.mark.config(CORPO_ANTECIPADO_MAX=16)
+def test_corpo_pequeno_lido_antes_da_view(app):
+    with app.test_request_context('/', method='POST', json={'a': 1}):
+        concorrencia._ler_corpo()
+        assert request.stream.read() == b''
+        assert request.get_json() == {'a': 1}
+
+    with app.test_request_context('/', method='POST', json={'a': 'x' * 32}):
+        concorrencia._ler_corpo()
+        assert request.stream.read().startswith(b'{"a"')  # grande: fica para a view
+
+
+def test_gevent_com_sqlite_recusado(tmp_path, monkeypatch):
+    from conftest import montar_app
+
+    monkeypatch.setattr(concorrencia, 'gevent_ativo', lambda: True)
+    with pytest.raises(RuntimeError, match='gevent com SQLite'):
+        montar_app('sqlite://', tmp_path)
+
+
+@pytest.mark.skipif(not os.environ.get('DATABASE_URL'), reason='DATABASE_URL não definida')
+def test_gevent_com_postgresql_aceito(tmp_path, monkeypatch):
+    from config import _normalizar_url
+    from conftest import montar_app
+
+    monkeypatch.setattr(concorrencia, 'gevent_ativo', lambda: True)
+    assert montar_app(_normalizar_url(os.environ['DATABASE_URL']), tmp_path) is not None
+
+
+def test_trava_nativa_com_gevent_registra_erro(monkeypatch, caplog):
+    monkeypatch.setattr(concorrencia, 'gevent_ativo', lambda: True)
+    caplog.set_level(logging.ERROR, 'mrx.concorrencia')
+
+    concorrencia._verificar_patch()
+    assert not any('travas' in registro.getMessage() for registro in caplog.records)
+
+    monkeypatch.setattr(notificacoes, '_trava', threading.RLock())  # criada antes do patch
+    concorrencia._verificar_patch()
+    assert 'importar notificacoes:' in caplog.records[-1].getMessage()
@@ -0,0 +1,84 @@
+"""Consultas do dashboard e de extras.py, que rodam igual no SQLite e no PostgreSQL."""
+
+from datetime import datetime, timedelta
+
+from extras import filtrar_compras, filtrar_despesas, obter_resumo_periodo
+from models import db
+
+
+def _meses():
+    """Meio-dia do dia 1 do mês atual e do anterior (UTC), longe das viradas de mês."""
+    atual = datetime.utcnow().replace(day=1, hour=12, minute=0, second=0, microsecond=0)
+    anterior = (atual - timedelta(days=1)).replace(day=1)
+    return anterior, atual
+
+
+def test_dashboard_series_por_mes(app, cliente, fabrica, renderizados):
+    anterior, atual = _meses()
+    with app.app_context():
+        fabrica.compra(quantidade_kg=10, preco_unitario=5, data=anterior)
+        fabrica.compra(quantidade_kg=4, preco_unitario=5, data=atual)
+        fabrica.compra(quantidade_kg=2, preco_unitario=5, data=atual + timedelta(hours=1))
+        fabrica.compra(quantidade_kg=100, preco_unitario=5, data=atual - timedelta(days=400))  # fora dos 6 meses
+        fabrica.despesa(valor=30, data=anterior)
+        db.session.commit()
+
+    resposta = cliente.get('/dashboard')
+
+    assert resposta.status_code == 200
+    contexto = dict(renderizados)['dashboard.html']
+    assert contexto['compras_por_mes'] == [
+        {'mes': anterior.strftime('%Y-%m'), 'total': 50.0},
+        {'mes': atual.strftime('%Y-%m'), 'total': 30.0},
+    ]
+    assert contexto['despesas_por_mes'] == [{'mes': anterior.strftime('%Y-%m'), 'total': 30.0}]
+    assert contexto['total_compras'] == 4
+
+
+def test_filtrar_compras_por_material_periodo_e_fornecedor(contexto, fabrica):
+    cobre = fabrica.item(nome_item='Cobre Mel')
+    aluminio = fabrica.item(nome_item='Alumínio Lata')
+    ontem = datetime.utcnow() - timedelta(days=1)
+    antiga = fabrica.compra(item=cobre, data=ontem - timedelta(days=10))
+    recente = fabrica.compra(item=cobre, data=ontem)
+    fabrica.compra(item=aluminio, data=ontem)
+    db.session.commit()
+
+    assert [c.id for c in filtrar_compras(material='cobre')] == [recente.id, antiga.id]
+    assert [c.id for c in filtrar_compras(data_inicio=ontem - timedelta(days=1), material='COBRE')] == [recente.id]
+    assert len(filtrar_compras(fornecedor_id=aluminio.fornecedor_id)) == 1
+    assert filtrar_compras(material='ferro') == []
+
+
+def test_filtrar_despesas(contexto, fabrica):
+    fabrica.despesa(valor=50, forma_pagamento='pix')
+    fabrica.despesa(valor=500, forma_pagamento='pix')
+    fabrica.despesa(valor=80, forma_pagamento='boleto')
+    db.session.commit()
+
+    assert sorted(d.valor for d in filtrar_despesas(forma_pagamento='pix')) == [50, 500]
+    assert sorted(d.valor for d in filtrar_despesas(valor_min=60, valor_max=100)) == [80]
+
+
+def test_resumo_periodo(contexto, fabrica):
+    inicio = datetime.utcnow() - timedelta(days=30)
+    fim = datetime.utcnow()
+    fabrica.compra(quantidade_kg=10, preco_unitario=3, data=inicio + timedelta(days=1))
+    fabrica.compra(quantidade_kg=5, preco_unitario=2, data=fim - timedelta(days=1))
+    fabrica.compra(quantidade_kg=99, preco_unitario=9, data=inicio - timedelta(days=5))
+    fabrica.despesa(valor=15, data=fim - timedelta(hours=1))
+    db.session.commit()
+
+    assert obter_resumo_periodo(inicio, fim) == {
+        'total_compras': 40.0,
+        'total_despesas': 15.0,
+        'quantidade_compras': 2,
+        'quantidade_despesas': 1,
+        'saldo': 25.0,
+    }
+
+
+def test_resumo_periodo_vazio(contexto):
+    resumo = obter_resumo_periodo(datetime(2020, 1, 1), datetime(2020, 2, 1))
+    assert resumo['quantidade_compras'] == 0
+    assert resumo['total_compras'] == 0.0
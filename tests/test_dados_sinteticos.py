@@ -0,0 +1,39 @@
+"""Gerador de dados sintéticos para os benchmarks (dados_sinteticos.py)."""
+
+import pytest
+
+from dados_sinteticos import gerar_dados
+from models import Compra, CompraCuboDia, Despesa, Fornecedor, HistoricoPreco, TabelaPreco, Usuario, db
+
+VOLUMES = dict(compradores=3, fornecedores=4, itens_por_fornecedor=2, compras=60, despesas=5, dias=90, tamanho_lote=25)
+
+
+def test_gera_os_volumes_pedidos(contexto):
+    contagens = gerar_dados(**VOLUMES)
+
+    assert contagens == {'usuarios': 3, 'fornecedores': 4, 'tabela_precos': 8, 'compras': 60, 'despesas': 5}
+    assert Compra.query.count() == 60
+    assert Despesa.query.count() == 5
+    assert HistoricoPreco.query.count() == 8
+
+
+def test_compras_consistentes_e_agregados_reconstruidos(contexto):
+    gerar_dados(**VOLUMES)
+
+    for compra in Compra.query:
+        assert compra.valor_total == pytest.approx(compra.quantidade_kg * compra.preco_unitario, abs=0.01)
+        assert compra.fornecedor_id == compra.tabela_preco.fornecedor_id
+        assert (compra.geohash is not None) == (compra.tipo_coleta == 'coleta')
+    # Compras rejeitadas ficam fora dos agregados
+    total = db.session.query(db.func.sum(Compra.valor_total)).filter(Compra.status_aprovacao != 'rejeitada').scalar()
+    assert db.session.query(db.func.sum(CompraCuboDia.valor_total)).scalar() == pytest.approx(total)
+
+
+def test_segunda_carga_acrescenta_sem_colidir(contexto):
+    gerar_dados(**VOLUMES)
+    gerar_dados(**VOLUMES)
+
+    assert Usuario.query.count() == 6
+    assert Fornecedor.query.count() == 8
+    assert db.session.query(db.func.count(db.distinct(TabelaPreco.codigo_barras))).scalar() == 16
+    assert Compra.query.count() == 120
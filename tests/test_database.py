@@ -0,0 +1,81 @@
+"""Sessão somente leitura e pools de conexão depois do fork (database.py)."""
+
+import gc
+import os
+import weakref
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+import database
+from conftest import montar_app
+from database import sessao_leitura
+from models import Fornecedor, db
+
+
+@pytest.fixture
+def app_leitura(app, tmp_path):
+    """O `app`, mas com o SQLite em arquivo: em memória não existe o bind de leitura."""
+    if app.config['SQLALCHEMY_BINDS']:
+        yield app
+        return
+    app = montar_app(f"sqlite:///{tmp_path / 'mrx.db'}", tmp_path)
+    with app.app_context():
+        db.create_all(bind_key=None)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def test_sessao_leitura_recusa_escrita(app_leitura):
+    with app_leitura.app_context():
+        db.session.add(Fornecedor(nome_social='Gravado no principal'))
+        db.session.commit()
+
+        leitura = sessao_leitura()
+        assert leitura.query(Fornecedor.nome_social).scalar() == 'Gravado no principal'
+        assert leitura is sessao_leitura()
+        with pytest.raises(DBAPIError):
+            leitura.execute(text("INSERT INTO fornecedores (nome_social) VALUES ('x')"))
+        leitura.rollback()
+
+
+def test_sessao_leitura_fechada_no_fim_do_contexto(app):
+    with app.app_context():
+        sessao = sessao_leitura()
+        sessao.execute(text('SELECT 1'))
+        assert sessao.in_transaction()
+    assert not sessao.in_transaction()
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='sem fork nesta plataforma')
+def test_fork_descarta_pool_herdado(contexto):
+    with db.engine.connect() as conexao:
+        conexao.execute(text('SELECT 1'))
+    pool = db.engine.pool
+
+    pid = os.fork()
+    if pid == 0:
+        os._exit(0 if db.engine.pool is not pool else 1)
+    _, status = os.waitpid(pid, 0)
+
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert db.engine.pool is pool  # o processo pai continua com o seu
+
+
+def test_registro_de_engines_nao_segura_o_app(tmp_path):
+    app = montar_app('sqlite://', tmp_path)
+    with app.app_context():
+        engine = weakref.ref(db.engine)
+    assert engine() in database._engines
+
+    # Módulos como auditoria.py guardam o engine do último app configurado
+    outro = montar_app('sqlite://', tmp_path)
+    del app
+    for _ in range(3):  # o pool só é liberado depois do ciclo engine/eventos
+        gc.collect()
+
+    assert engine() is None
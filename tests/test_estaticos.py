@@ -0,0 +1,83 @@
+"""Build dos arquivos estáticos com hash no nome e variantes comprimidas (estaticos.py)."""
+
+import gzip
+import io
+import os
+
+import pytest
+from flask import url_for
+from PIL import Image
+
+import estaticos
+from conftest import montar_app
+from estaticos import PASTA_DIST, construir_estaticos
+
+
+@pytest.fixture
+def pasta_static(tmp_path):
+    pasta = tmp_path / 'static'
+    (pasta / 'css').mkdir(parents=True)
+    (pasta / 'css' / 'style.css').write_text('body { color: #222; }\n' * 200)
+    (pasta / 'img').mkdir()
+    Image.new('RGBA', (400, 400), (20, 120, 60, 255)).save(pasta / 'img' / 'logo.png')
+    (pasta / 'uploads').mkdir()
+    (pasta / 'uploads' / 'comprovante.pdf').write_bytes(b'%PDF')
+    return pasta
+
+
+def test_build_gera_nomes_com_hash_e_variantes(pasta_static):
+    manifesto, bytes_origem, bytes_dist = construir_estaticos(str(pasta_static))
+
+    css = manifesto['arquivos']['css/style.css']
+    assert css.startswith('css/style.') and css.endswith('.css') and css != 'css/style.css'
+    dist = pasta_static / PASTA_DIST
+    dados = (pasta_static / 'css' / 'style.css').read_bytes()
+    assert (dist / css).read_bytes() == dados
+    assert gzip.decompress((dist / f'{css}.gz').read_bytes()) == dados
+    if manifesto['brotli']:
+        import brotli
+        assert brotli.decompress((dist / f'{css}.br').read_bytes()) == dados
+
+    assert 'uploads/comprovante.pdf' not in manifesto['arquivos']
+    assert 'img/logo.png' in manifesto['arquivos']
+    assert bytes_dist > 0 and bytes_origem > 0
+
+
+def test_imagem_acima_da_altura_maxima_e_reduzida(pasta_static, monkeypatch):
+    monkeypatch.setitem(estaticos.ALTURA_MAXIMA, 'img/logo.png', 100)
+
+    manifesto, _, _ = construir_estaticos(str(pasta_static))
+
+    with Image.open(pasta_static / PASTA_DIST / manifesto['arquivos']['img/logo.png']) as imagem:
+        assert imagem.size == (100, 100)
+    if 'img/logo.png' in manifesto['webp']:
+        assert os.path.exists(pasta_static / PASTA_DIST / manifesto['webp']['img/logo.png'])
+
+
+def test_build_reproduzivel(pasta_static):
+    manifesto, _, _ = construir_estaticos(str(pasta_static))
+    css = pasta_static / PASTA_DIST / f"{manifesto['arquivos']['css/style.css']}.gz"
+    primeiro = css.read_bytes()
+
+    assert construir_estaticos(str(pasta_static))[0] == manifesto
+    assert css.read_bytes() == primeiro
+
+
+def test_url_for_aponta_para_o_arquivo_com_hash(pasta_static, tmp_path, monkeypatch):
+    manifesto, _, _ = construir_estaticos(str(pasta_static))
+    app = montar_app('sqlite://', tmp_path, STATIC_USAR_MANIFESTO=True)
+    monkeypatch.setattr(estaticos, '_manifesto', manifesto)
+
+    with app.test_request_context():
+        assert url_for('static', filename='css/style.css') == \
+            f"/static/{PASTA_DIST}/{manifesto['arquivos']['css/style.css']}"
+        assert url_for('static', filename='nao/existe.js') == '/static/nao/existe.js'
+
+
+def test_png_otimizado_nunca_maior_que_o_original():
+    original = io.BytesIO()
+    Image.new('P', (8, 8)).save(original, 'PNG')
+
+    png, _webp = estaticos._otimizar_png(original.getvalue())
+
+    assert len(png) <= len(original.getvalue())
@@ -0,0 +1,136 @@
+"""Geohash e consultas por raio/retângulo (geo.py)."""
+
+import random
+
+import pytest
+from sqlalchemy import update
+
+from geo import (codificar_geohash, compras_no_raio, compras_no_retangulo, faixas_geohash, haversine_km,
+                 limites_geohash, preencher_geohash)
+from models import Compra, db
+
+# Praça da Sé, São Paulo
+CENTRO = (-23.5505, -46.6333)
+
+
+def _ponto(norte_km, leste_km):
+    """Ponto deslocado do CENTRO (aproximação plana, suficiente para poucos km)."""
+    import math
+
+    latitude = CENTRO[0] + norte_km / 111.32
+    longitude = CENTRO[1] + leste_km / (111.32 * math.cos(math.radians(CENTRO[0])))
+    return latitude, longitude
+
+
+def test_geohash_conhecido_e_limites():
+    assert codificar_geohash(57.64911, 10.40744) == 'u4pruydqq'
+    assert codificar_geohash(57.64911, 10.40744, 5) == 'u4pru'
+
+    min_lat, min_lon, max_lat, max_lon = limites_geohash('u4pruydqq')
+    assert min_lat <= 57.64911 <= max_lat and min_lon <= 10.40744 <= max_lon
+
+
+def test_faixas_cobrem_todo_o_retangulo():
+    aleatorio = random.Random(7)
+    retangulo = (-23.60, -46.70, -23.50, -46.55)
+    faixas = faixas_geohash(*retangulo)
+
+    for _ in range(500):
+        codigo = codificar_geohash(aleatorio.uniform(retangulo[0], retangulo[2]),
+                                   aleatorio.uniform(retangulo[1], retangulo[3]))
+        assert any(inicio <= codigo and (fim is None or codigo < fim) for inicio, fim in faixas)
+
+
+def test_haversine():
+    latitude, longitude = _ponto(3, 4)
+    assert haversine_km(*CENTRO, [latitude], [longitude])[0] == pytest.approx(5.0, rel=0.01)
+
+
+def test_geohash_preenchido_pelo_orm(contexto, fabrica):
+    compra = fabrica.compra(latitude=CENTRO[0], longitude=CENTRO[1])
+    assert compra.geohash == codificar_geohash(*CENTRO)
+
+    compra.latitude = compra.longitude = None
+    db.session.flush()
+    assert compra.geohash is None
+
+
+def test_raio_ordena_por_distancia_e_respeita_filtros(contexto, fabrica):
+    item = fabrica.item()
+    comprador = fabrica.usuario()
+    perto = fabrica.compra(item, comprador, latitude=_ponto(0.5, 0)[0], longitude=_ponto(0.5, 0)[1])
+    medio = fabrica.compra(item, comprador, latitude=_ponto(0, -2)[0], longitude=_ponto(0, -2)[1])
+    fabrica.compra(item, comprador, latitude=_ponto(8, 8)[0], longitude=_ponto(8, 8)[1])  # fora do raio
+    entrega = fabrica.compra(item, comprador, tipo_coleta='entrega', latitude=CENTRO[0], longitude=CENTRO[1])
+    rejeitada = fabrica.compra(item, comprador, status_aprovacao='rejeitada',
+                               latitude=_ponto(1, 1)[0], longitude=_ponto(1, 1)[1])
+    fabrica.compra(item, comprador)  # sem local
+    db.session.commit()
+
+    resultado = compras_no_raio(*CENTRO, 5)
+    assert [c['id'] for c in resultado] == [perto.id, rejeitada.id, medio.id]
+    assert resultado[0]['distancia_km'] == pytest.approx(0.5, rel=0.02)
+    assert resultado[0]['fornecedor'] == item.fornecedor.nome_social
+
+    assert [c['id'] for c in compras_no_raio(*CENTRO, 5, limite=1)] == [perto.id]
+    assert [c['id'] for c in compras_no_raio(*CENTRO, 5, tipo_coleta='entrega')] == [entrega.id]
+    assert entrega.id in [c['id'] for c in compras_no_raio(*CENTRO, 5, tipo_coleta=None)]
+    pendentes = compras_no_raio(*CENTRO, 5, status=['pendente', 'aprovada'])
+    assert rejeitada.id not in [c['id'] for c in pendentes]
+
+
+def test_raio_grande_expande_a_busca(contexto, fabrica):
+    item = fabrica.item()
+    comprador = fabrica.usuario()
+    longe = fabrica.compra(item, comprador, latitude=_ponto(40, 0)[0], longitude=_ponto(40, 0)[1])
+    db.session.commit()
+
+    assert [c['id'] for c in compras_no_raio(*CENTRO, 50)] == [longe.id]
+    assert compras_no_raio(*CENTRO, 30) == []
+
+
+def test_retangulo_mais_recentes_primeiro(contexto, fabrica):
+    item = fabrica.item()
+    comprador = fabrica.usuario()
+    dentro = [fabrica.compra(item, comprador, latitude=lat, longitude=lon)
+              for lat, lon in (_ponto(1, 1), _ponto(-1, 2), _ponto(0, -1))]
+    fabrica.compra(item, comprador, latitude=_ponto(10, 0)[0], longitude=_ponto(10, 0)[1])
+    db.session.commit()
+
+    min_lat, min_lon = _ponto(-3, -3)
+    max_lat, max_lon = _ponto(3, 3)
+    resultado = compras_no_retangulo(min_lat, min_lon, max_lat, max_lon)
+    assert [c['id'] for c in resultado] == [c.id for c in reversed(dentro)]
+    assert len(compras_no_retangulo(min_lat, min_lon, max_lat, max_lon, limite=2)) == 2
+
+
+def test_preencher_geohash(contexto, fabrica):
+    compras = [fabrica.compra(latitude=lat, longitude=lon) for lat, lon in (_ponto(1, 0), _ponto(0, 1))]
+    fabrica.compra()
+    db.session.execute(update(Compra).values(geohash=None))
+    db.session.commit()
+
+    assert preencher_geohash(tamanho_lote=1) == 2
+    assert preencher_geohash() == 0
+    assert preencher_geohash(todos=True) == 2
+    db.session.expire_all()
+    assert [db.session.get(Compra, c.id).geohash for c in compras] == [
+        codificar_geohash(c.latitude, c.longitude) for c in compras]
+
+
+def test_api_raio_e_bbox(app, cliente, fabrica):
+    with app.app_context():
+        compra = fabrica.compra(latitude=CENTRO[0], longitude=CENTRO[1])
+        db.session.commit()
+        compra_id = compra.id
+
+    resposta = cliente.get(f'/api/compras/raio?lat={CENTRO[0]}&lon={CENTRO[1]}&raio_km=1')
+    assert resposta.status_code == 200
+    assert [c['id'] for c in resposta.get_json()['compras']] == [compra_id]
+
+    resposta = cliente.get('/api/compras/bbox?min_lat=-24&min_lon=-47&max_lat=-23&max_lon=-46&tipo=todos')
+    assert resposta.get_json()['total'] == 1
+
+    assert cliente.get('/api/compras/raio?lat=1&lon=1&raio_km=900').status_code == 400
+    assert cliente.get('/api/compras/raio?lat=1&lon=1&raio_km=1&tipo=aviao').status_code == 400
+    assert cliente.get('/api/compras/bbox?min_lat=10&min_lon=0&max_lat=0&max_lon=1').status_code == 400
@@ -0,0 +1,99 @@
+"""Histórico de preços com consultas por data (historico_precos.py)."""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+
+from historico_precos import evolucao_preco, precos_em, sincronizar_historico
+from models import HistoricoPreco, TabelaPreco, db
+
+T0 = datetime(2026, 1, 1)
+
+
+def _intervalos(item_id):
+    linhas = db.session.execute(select(HistoricoPreco.preco_por_kg, HistoricoPreco.valido_de, HistoricoPreco.valido_ate)
+                                .where(HistoricoPreco.tabela_preco_id == item_id).order_by(HistoricoPreco.valido_de))
+    return [tuple(linha) for linha in linhas]
+
+
+def _mudar_preco_em_lote(item_id, preco, quando):
+    """Como as cargas em lote: UPDATE fora do ORM e sincronizar_historico() depois."""
+    db.session.execute(update(TabelaPreco).where(TabelaPreco.id == item_id).values(preco_por_kg=preco))
+    return sincronizar_historico(db.session.connection(), [item_id], quando)
+
+
+def test_orm_abre_e_fecha_intervalos(contexto, fabrica):
+    item = fabrica.item(preco_por_kg=10.0, atualizado_em=T0)
+    assert _intervalos(item.id) == [(10.0, T0, None)]
+
+    item.descricao = 'Sem mudança de preço'
+    db.session.flush()
+    assert len(_intervalos(item.id)) == 1
+
+    item.preco_por_kg = 12.0
+    db.session.flush()
+    (antigo, atual) = _intervalos(item.id)
+    assert antigo[0] == 10.0 and antigo[2] == atual[1]  # contíguos
+    assert atual[0] == 12.0 and atual[2] is None
+
+
+def test_sincronizar_so_itens_que_mudaram(contexto, fabrica):
+    item, outro = fabrica.item(preco_por_kg=10.0, atualizado_em=T0), fabrica.item(preco_por_kg=5.0, atualizado_em=T0)
+
+    assert _mudar_preco_em_lote(item.id, 11.0, T0 + timedelta(days=10)) == 1
+    assert _mudar_preco_em_lote(item.id, 11.0, T0 + timedelta(days=20)) == 0
+    assert sincronizar_historico(db.session.connection()) == 0
+    assert _intervalos(item.id) == [(10.0, T0, T0 + timedelta(days=10)), (11.0, T0 + timedelta(days=10), None)]
+    assert _intervalos(outro.id) == [(5.0, T0, None)]
+
+
+def test_precos_em_e_evolucao(contexto, fabrica):
+    item = fabrica.item(preco_por_kg=10.0, atualizado_em=T0)
+    _mudar_preco_em_lote(item.id, 12.0, T0 + timedelta(days=10))
+    _mudar_preco_em_lote(item.id, 15.0, T0 + timedelta(days=20))
+    novo = fabrica.item(preco_por_kg=3.0, atualizado_em=T0 + timedelta(days=15))
+    db.session.commit()
+
+    assert precos_em([item.id, novo.id], T0 - timedelta(days=1)) == {}
+    assert precos_em([item.id, novo.id], T0 + timedelta(days=10)) == {item.id: 12.0}
+    assert precos_em([item.id, novo.id], T0 + timedelta(days=16)) == {item.id: 12.0, novo.id: 3.0}
+    assert precos_em([], T0) == {}
+
+    assert [p['preco_por_kg'] for p in evolucao_preco(item.id)] == [10.0, 12.0, 15.0]
+    # O intervalo vigente no início entra; o que começa no fim (exclusivo) não
+    assert [p['preco_por_kg'] for p in evolucao_preco(item.id, T0 + timedelta(days=12), T0 + timedelta(days=20))] \
+        == [12.0]
+    ultimo = evolucao_preco(item.id, T0 + timedelta(days=25))
+    assert ultimo == [{'preco_por_kg': 15.0, 'valido_de': (T0 + timedelta(days=20)).isoformat(), 'valido_ate': None}]
+
+
+def test_comando_sincronizar(app, fabrica):
+    with app.app_context():
+        item = fabrica.item(preco_por_kg=10.0)
+        db.session.execute(HistoricoPreco.__table__.delete())
+        db.session.commit()
+        item_id = item.id
+
+    resultado = app.test_cli_runner().invoke(args=['sincronizar-historico-precos'])
+    assert resultado.exit_code == 0
+    assert resultado.output.startswith('1 intervalos')
+    with app.app_context():
+        assert [preco for preco, *_ in _intervalos(item_id)] == [10.0]
+
+
+def test_api_precos_vigentes(app, cliente, fabrica):
+    with app.app_context():
+        item = fabrica.item(preco_por_kg=10.0, atualizado_em=T0)
+        _mudar_preco_em_lote(item.id, 12.0, T0 + timedelta(days=10))
+        db.session.commit()
+        item_id = item.id
+
+    resposta = cliente.get(f'/api/precos/vigentes?itens={item_id},999999&em=2026-01-05T12:00')
+    assert resposta.get_json()['precos'] == {str(item_id): 10.0}
+    assert resposta.get_json()['sem_preco'] == [999999]
+
+    resposta = cliente.get(f'/api/tabela-precos/{item_id}/historico?inicio=2026-01-11')
+    assert [p['preco_por_kg'] for p in resposta.get_json()['historico']] == [12.0]
+
+    assert cliente.get('/api/precos/vigentes?itens=').status_code == 400
+    assert cliente.get('/api/precos/vigentes?itens=1&em=ontem').status_code == 400
@@ -0,0 +1,214 @@
+"""Importação de catálogos e de fornecedores e clonagem de tabelas de preços (importacao.py)."""
+
+import csv
+import io
+import os
+
+import pytest
+from sqlalchemy import select
+
+from importacao import ImportacaoError, clonar_tabela, importar_catalogo, importar_fornecedores
+from models import Fornecedor, TabelaPreco, db
+from versoes import obter_versoes
+
+
+def _csv(texto):
+    return io.BytesIO(texto.encode('utf-8'))
+
+
+def _itens(fornecedor_id):
+    linhas = db.session.execute(
+        select(TabelaPreco.nome_item, TabelaPreco.codigo_barras, TabelaPreco.preco_por_kg, TabelaPreco.ativo)
+        .where(TabelaPreco.fornecedor_id == fornecedor_id).order_by(TabelaPreco.nome_item))
+    return [tuple(linha) for linha in linhas]
+
+
+def test_catalogo_atualiza_por_codigo_e_nome_e_insere(contexto, fabrica):
+    fornecedor = fabrica.fornecedor()
+    fabrica.item(fornecedor, nome_item='Cobre antigo', codigo_barras='111', preco_por_kg=30.0)
+    fabrica.item(fornecedor, nome_item='Alumínio', preco_por_kg=5.0, ativo=False)
+    db.session.commit()
+
+    resultado = importar_catalogo(fornecedor.id, _csv(
+        'Produto;Preço;EAN;Unidade\n'
+        'Cobre mel;1.234,56;111;kg\n'
+        'Alumínio;6,5;;\n'
+        'Latão;R$ 12,00;222;\n'
+        '\n'
+        'Ferro;2.5;;t\n'
+    ), 'catalogo.csv')
+
+    assert resultado == {'linhas': 4, 'inseridos': 2, 'atualizados': 2, 'total_erros': 0, 'erros': []}
+    assert _itens(fornecedor.id) == [
+        ('Alumínio', None, 6.5, True),
+        ('Cobre mel', '111', 1234.56, True),
+        ('Ferro', None, 2.5, True),
+        ('Latão', '222', 12.0, True),
+    ]
+    assert obter_versoes('tabela_precos')['tabela_precos'][0] >= 2
+
+
+def test_catalogo_com_erros_nao_grava_nada(contexto, fabrica):
+    fornecedor, outro = fabrica.fornecedor(), fabrica.fornecedor()
+    fabrica.item(outro, codigo_barras='999')
+    db.session.commit()
+    arquivo = (
+        'nome,preco,codigo\n'
+        'Cobre,10,123\n'
+        'Cobre 2,11,123\n'
+        ',5,\n'
+        'Latão,abc,\n'
+        'Bronze,-1,\n'
+        'Inox,4,999\n'
+        'Papelão,1,\n'
+        'Papelão,2,\n'
+        'Plástico,3,\n'
+    )
+
+    resultado = importar_catalogo(fornecedor.id, _csv(arquivo), 'catalogo.csv')
+    assert resultado['inseridos'] == resultado['atualizados'] == 0
+    assert [linha for linha, _ in resultado['erros']] == [2, 3, 4, 5, 6, 7, 8, 9]
+    assert resultado['erros'][5] == (7, f'Código de barras 999 já pertence ao fornecedor {outro.id}.')
+    assert _itens(fornecedor.id) == []
+
+    resultado = importar_catalogo(fornecedor.id, _csv(arquivo), 'catalogo.csv', ignorar_erros=True)
+    assert resultado['inseridos'] == 1 and resultado['total_erros'] == 8
+    assert _itens(fornecedor.id) == [('Plástico', None, 3.0, True)]
+
+
+def test_catalogo_xlsx(contexto, fabrica):
+    openpyxl = pytest.importorskip('openpyxl')
+    fornecedor = fabrica.fornecedor()
+    db.session.commit()
+    planilha = openpyxl.Workbook()
+    planilha.active.append(['Material', 'Valor kg', 'Código'])
+    planilha.active.append(['Cobre', 31.5, 7891234567895.0])  # o Excel guarda códigos numéricos como float
+    arquivo = io.BytesIO()
+    planilha.save(arquivo)
+
+    assert importar_catalogo(fornecedor.id, arquivo, 'catalogo.xlsx')['inseridos'] == 1
+    assert _itens(fornecedor.id) == [('Cobre', '7891234567895', 31.5, True)]
+
+
+@pytest.mark.parametrize('arquivo, nome', [
+    ('nome;preco\n', 'catalogo.txt'),
+    ('', 'catalogo.csv'),
+    ('nome;codigo\nCobre;1\n', 'catalogo.csv'),
+])
+def test_catalogo_recusa_arquivo(contexto, fabrica, arquivo, nome):
+    fornecedor = fabrica.fornecedor()
+    db.session.commit()
+    with pytest.raises(ImportacaoError):
+        importar_catalogo(fornecedor.id, _csv(arquivo), nome)
+
+
+def test_clonar_copia_ativos_sem_codigo_e_sem_repetir(contexto, fabrica):
+    origem, destino = fabrica.fornecedor(), fabrica.fornecedor()
+    fabrica.item(origem, nome_item='Cobre', codigo_barras='123', preco_por_kg=30.0)
+    fabrica.item(origem, nome_item='Latão', preco_por_kg=12.0)
+    fabrica.item(origem, nome_item='Inativo', ativo=False)
+    fabrica.item(destino, nome_item='Latão', preco_por_kg=11.0)
+    db.session.commit()
+
+    assert clonar_tabela(origem.id, destino.id) == 1
+    assert _itens(destino.id) == [('Cobre', None, 30.0, True), ('Latão', None, 11.0, True)]
+    assert clonar_tabela(origem.id, destino.id) == 0
+
+
+def test_rotas_de_importacao_e_clonagem(app, cliente, fabrica):
+    with app.app_context():
+        origem, destino = fabrica.fornecedor(), fabrica.fornecedor()
+        fabrica.item(origem, nome_item='Cobre')
+        db.session.commit()
+        origem_id, destino_id = origem.id, destino.id
+
+    url = f'/tabela-precos/{destino_id}/importar'
+    resposta = cliente.post(url, data={'arquivo': (io.BytesIO(b'nome;preco\nFerro;2,5\n'), 'catalogo.csv')},
+                            content_type='multipart/form-data')
+    assert resposta.status_code == 302 and resposta.location.endswith(f'/tabela-precos/{destino_id}')
+
+    resposta = cliente.post(url, data={'fornecedor_origem_id': origem_id})
+    assert resposta.status_code == 302 and resposta.location.endswith(f'/tabela-precos/{destino_id}')
+
+    with app.app_context():
+        assert [nome for nome, *_ in _itens(destino_id)] == ['Cobre', 'Ferro']
+
+
+def _fornecedores():
+    linhas = db.session.execute(select(Fornecedor.nome_social, Fornecedor.cnpj, Fornecedor.cpf, Fornecedor.telefone,
+                                       Fornecedor.email).order_by(Fornecedor.nome_social))
+    return [tuple(linha) for linha in linhas]
+
+
+def test_fornecedores_atualiza_pelo_documento_e_insere(contexto, fabrica, tmp_path):
+    pasta = tmp_path / 'relatorios'
+    fabrica.fornecedor(nome_social='Sucata Velha', cnpj='11222333000181', telefone='1111')
+    db.session.commit()
+    versao = obter_versoes('fornecedores')['fornecedores'][0]
+
+    resultado = importar_fornecedores(_csv(
+        'nome;documento;telefone;email\n'
+        'Sucata Nova;11.222.333/0001-81;;novo@sucata.com\n'  # cadastro só com dígitos, telefone mantido
+        'Maria;529.982.247-25;9999;\n'
+        'Alfa;12.ABC.345/01DE-35;;\n'  # CNPJ alfanumérico
+    ), 'fornecedores.csv', str(pasta))
+
+    assert (resultado['inseridos'], resultado['atualizados'], resultado['total_erros']) == (2, 1, 0)
+    assert resultado['relatorio'] is None and os.listdir(pasta) == []
+    assert _fornecedores() == [
+        ('Alfa', '12.ABC.345/01DE-35', None, None, None),
+        ('Maria', None, '529.982.247-25', '9999', None),
+        ('Sucata Nova', '11222333000181', None, '1111', 'novo@sucata.com'),
+    ]
+    assert obter_versoes('fornecedores')['fornecedores'][0] > versao
+
+
+def test_fornecedores_recusados_vao_para_o_relatorio(contexto, fabrica, tmp_path):
+    fabrica.fornecedor(nome_social='Com CPF', cnpj='11.444.777/0001-61', cpf='111.444.777-35')
+    db.session.commit()
+    arquivo = (
+        'nome;cnpj;cpf\n'
+        'Dígito errado;11.222.333/0001-82;\n'
+        'Maria;;529.982.247-25\n'
+        'Maria de novo;;52998224725\n'
+        ';11.222.333/0001-81;\n'
+        'Sem documento;;\n'
+        'Curto;;123\n'
+        'Outro CPF;11.444.777/0001-61;123.456.789-09\n'
+    )
+
+    resultado = importar_fornecedores(_csv(arquivo), 'fornecedores.csv', str(tmp_path))
+    assert (resultado['inseridos'], resultado['total_erros']) == (0, 6)
+    assert [linha for linha, _ in resultado['erros']] == [2, 4, 5, 6, 7, 8]
+    assert 'CNPJ inválido' in dict(resultado['erros'])[2]
+    assert 'repetido no arquivo (linha 3)' in dict(resultado['erros'])[4]
+    assert 'já tem outro CPF' in dict(resultado['erros'])[8]
+    with open(tmp_path / resultado['relatorio'], encoding='utf-8') as f:
+        relatorio = list(csv.reader(f, delimiter=';'))
+    assert relatorio[0] == ['linha', 'motivo'] and sorted(int(linha) for linha, _ in relatorio[1:]) == [2, 4, 5, 6, 7, 8]
+    assert [nome for nome, *_ in _fornecedores()] == ['Com CPF']  # nada gravado
+
+    resultado = importar_fornecedores(_csv(arquivo), 'fornecedores.csv', str(tmp_path), ignorar_erros=True)
+    assert (resultado['inseridos'], resultado['atualizados']) == (1, 0)
+    assert [nome for nome, *_ in _fornecedores()] == ['Com CPF', 'Maria']
+
+
+def test_fornecedores_sem_coluna_de_documento(contexto, tmp_path):
+    with pytest.raises(ImportacaoError):
+        importar_fornecedores(_csv('nome;telefone\nMaria;9999\n'), 'fornecedores.csv', str(tmp_path))
+
+
+def test_rota_e_comando_de_fornecedores(app, cliente, tmp_path):
+    resposta = cliente.post('/fornecedores/importar', data={
+        'arquivo': (io.BytesIO('nome;cpf\nMaria;529.982.247-25\nJoão;123\n'.encode()), 'fornecedores.csv'),
+    }, content_type='multipart/form-data')
+    assert resposta.status_code == 200
+    nome = os.listdir(app.config['IMPORTACAO_PASTA'])[0]
+    relatorio = cliente.get(f'/fornecedores/importar/recusados/{nome}')
+    assert relatorio.status_code == 200 and relatorio.data.decode().splitlines()[1].startswith('3;')
+
+    caminho = tmp_path / 'fornecedores.csv'
+    caminho.write_text('nome;cpf\nMaria;529.982.247-25\nJoão;111.444.777-35\n', encoding='utf-8')
+    resultado = app.test_cli_runner().invoke(args=['importar-fornecedores', str(caminho)])
+    assert resultado.exit_code == 0
+    assert resultado.output.startswith('2 linhas: 2 fornecedores novos, 0 atualizados, 0 recusadas.')
@@ -0,0 +1,55 @@
+"""Profiling por requisição, log de SQL lento e /metrics (metricas.py)."""
+
+import logging
+
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+
+from metricas import _resumir_parametros
+from models import db
+
+
+def test_resumo_dos_parametros_nao_tem_valores():
+    assert _resumir_parametros(('segredo', 42, None, b'xy')) == ('str[7]', 'int', 'NoneType', 'bytes[2]')
+    assert _resumir_parametros({'cpf': '123.456.789-09'}) == {'cpf': 'str[14]'}
+    assert _resumir_parametros([('a', 1), ('b', 2)]) == "2 x ('str[1]', 'int')"
+
+
+@pytest.mark.config(SLOW_QUERY_MS=0)
+def test_sql_lento_registra_so_tipo_e_tamanho(contexto, caplog):
+    with caplog.at_level(logging.WARNING, logger='mrx.sql'):
+        db.session.execute(text('SELECT :chave_pix'), {'chave_pix': 'fulano@pix.com'})
+
+    assert 'SQL lento' in caplog.text
+    assert 'fulano@pix.com' not in caplog.text
+    assert "'str[14]'" in caplog.text
+
+
+@pytest.mark.config(SLOW_QUERY_MS=0, SLOW_QUERY_LOG_PARAMETROS=True)
+def test_sql_lento_com_valores_quando_ligado(contexto, caplog):
+    with caplog.at_level(logging.WARNING, logger='mrx.sql'):
+        db.session.execute(text('SELECT :chave_pix'), {'chave_pix': 'fulano@pix.com'})
+
+    assert 'fulano@pix.com' in caplog.text
+
+
+def test_latencia_por_endpoint(cliente):
+    rotulos = {'endpoint': 'dashboard', 'method': 'GET', 'status': '200'}
+    antes = REGISTRY.get_sample_value('mrx_http_request_duration_seconds_count', rotulos) or 0
+
+    assert cliente.get('/dashboard').status_code == 200
+
+    assert REGISTRY.get_sample_value('mrx_http_request_duration_seconds_count', rotulos) == antes + 1
+    assert REGISTRY.get_sample_value('mrx_sql_statements_per_request_count', {'endpoint': 'dashboard'}) >= 1
+
+
+@pytest.mark.config(METRICS_TOKEN='token-prometheus')
+def test_metrics_exige_admin_ou_token(app, cliente):
+    anonimo = app.test_client()
+    assert anonimo.get('/metrics').status_code == 403
+    assert anonimo.get('/metrics', headers={'Authorization': 'Bearer token-prometheus'}).status_code == 200
+
+    resposta = cliente.get('/metrics')
+    assert resposta.status_code == 200
+    assert b'mrx_http_request_duration_seconds' in resposta.data
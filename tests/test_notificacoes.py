@@ -0,0 +1,78 @@
+"""Notificações SSE de compras (notificacoes.py)."""
+
+import os
+
+import pytest
+
+import notificacoes
+from notificacoes import _dia, _id_evento, _ler, assinar, fluxo_eventos
+from models import db
+
+
+@pytest.fixture
+def sem_thread(monkeypatch):
+    """assinar() sem a thread de leitura: o teste entrega os eventos com _distribuir()."""
+    monkeypatch.setattr(notificacoes, '_pid', os.getpid())
+    monkeypatch.setattr(notificacoes, '_assinantes', set())
+
+
+def _publicados():
+    eventos, _ = _ler(_dia(), 0)
+    return [evento for _, evento in eventos]
+
+
+def test_publica_so_depois_do_commit(contexto, fabrica):
+    compra = fabrica.compra()  # _salvar faz flush
+    db.session.rollback()
+    assert _publicados() == []
+
+    compra = fabrica.compra()
+    db.session.commit()
+    compra.status_aprovacao = 'aprovada'
+    db.session.commit()
+    compra_id = compra.id
+    db.session.delete(compra)
+    db.session.commit()
+
+    assert [(e['tipo'], e['compra_id']) for e in _publicados()] == [
+        ('compra_pendente', compra_id), ('compra_status', compra_id), ('compra_removida', compra_id)]
+    assert _publicados()[1]['anterior'] == 'pendente'
+
+
+def test_fluxo_retoma_do_last_event_id(contexto, fabrica, sem_thread):
+    for _ in range(3):
+        fabrica.compra()
+        db.session.commit()
+    eventos, _ = _ler(_dia(), 0)
+    assinante = assinar()
+    notificacoes._distribuir(eventos)  # a thread entregaria os mesmos eventos de novo
+
+    fluxo = fluxo_eventos(assinante, _id_evento(eventos[0][0]))
+    assert next(fluxo).startswith('retry: ')
+    recebidos = [next(fluxo), next(fluxo)]
+    assert [r.splitlines()[0] for r in recebidos] == [f'id: {_id_evento(i)}' for i, _ in eventos[1:]]
+    assinante.atrasado = True
+    with pytest.raises(StopIteration):
+        next(fluxo)  # os repetidos da fila são pulados e a conexão atrasada encerra
+    assert not notificacoes._assinantes
+
+
+def test_last_event_id_invalido_comeca_do_agora(contexto, fabrica, sem_thread):
+    fabrica.compra()
+    db.session.commit()
+    assinante = assinar()
+    assinante.atrasado = True
+
+    assert list(fluxo_eventos(assinante, 'ontem:10')) == ['retry: 3000\n\n']
+
+
+def test_fila_cheia_marca_atrasado():
+    assinante = notificacoes.Assinante()
+    for n in range(notificacoes.TAMANHO_FILA + 1):
+        assinante.entregar(((_dia(), n), {'tipo': 'compra_pendente'}))
+    assert assinante.atrasado
+
+
+@pytest.mark.config(NOTIFICACOES_MAX_CONEXOES=0)
+def test_api_recusa_acima_do_limite(cliente, sem_thread):
+    assert cliente.get('/api/eventos/compras').status_code == 503
@@ -0,0 +1,46 @@
+"""Perfil de produção do SQLite: pragmas em cada conexão dos engines (database.py)."""
+
+import pytest
+
+from config import ProductionConfig
+from conftest import montar_app
+from database import BIND_LEITURA
+from models import db
+
+
+@pytest.fixture
+def app_producao(tmp_path):
+    """App em SQLite de arquivo com os pragmas de ProductionConfig."""
+    app = montar_app(f"sqlite:///{tmp_path / 'mrx.db'}", tmp_path, SQLITE_PRAGMAS=ProductionConfig.SQLITE_PRAGMAS)
+    yield app
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def _pragmas(engine, *nomes):
+    with engine.connect() as conn:
+        return {nome: conn.exec_driver_sql(f'PRAGMA {nome}').scalar() for nome in nomes}
+
+
+def test_pragmas_de_producao_em_cada_engine(app_producao):
+    with app_producao.app_context():
+        engines = [db.engine, db.engines[BIND_LEITURA]]
+        for engine in engines:
+            assert _pragmas(engine, 'journal_mode', 'busy_timeout', 'synchronous', 'wal_autocheckpoint',
+                            'temp_store', 'cache_size') == {
+                'journal_mode': 'wal', 'busy_timeout': ProductionConfig.SQLITE_PRAGMAS['busy_timeout'],
+                'synchronous': 1, 'wal_autocheckpoint': 1000, 'temp_store': 2, 'cache_size': -64000}
+
+        assert _pragmas(db.engine, 'query_only') == {'query_only': 0}
+        assert _pragmas(db.engines[BIND_LEITURA], 'query_only') == {'query_only': 1}
+
+
+def test_cada_conexao_nova_recebe_os_pragmas(app_producao):
+    with app_producao.app_context():
+        with db.engine.connect() as primeira, db.engine.connect() as segunda:
+            assert primeira.connection.dbapi_connection is not segunda.connection.dbapi_connection
+            for conn in (primeira, segunda):
+                assert conn.exec_driver_sql('PRAGMA busy_timeout').scalar() == \
+                    ProductionConfig.SQLITE_PRAGMAS['busy_timeout']
+                assert conn.exec_driver_sql('PRAGMA mmap_size').scalar() == 268435456
@@ -0,0 +1,72 @@
+"""Previsão mensal do volume de compras (previsao.py)."""
+
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from models import db
+from previsao import _data_do_indice, _indice_mes, ajustar_series, consultar_previsoes, recalcular_previsoes
+
+PRIMEIRO = _indice_mes(datetime(2023, 1, 1))
+
+
+def test_indice_de_mes():
+    assert _data_do_indice(_indice_mes(datetime(2026, 12, 31)) + 1) == datetime(2027, 1, 1).date()
+
+
+def test_modelo_conforme_o_historico():
+    meses = 30
+    t = np.arange(meses)
+    series = np.zeros((2, 4, meses))
+    series[:, 0] = 100 + 5 * t  # tendência
+    series[:, 1] = 50 + 20 * ((PRIMEIRO + t) % 12 == 6)  # julho mais forte, dois anos e meio
+    series[:, 2, -6:] = 30  # só 6 meses de histórico
+    # série 3 sem compras
+
+    previsto, desvio, modelos = ajustar_series(series, PRIMEIRO, horizonte=12)
+
+    assert list(modelos) == ['sazonal', 'sazonal', 'media', None]
+    futuro = np.arange(meses, meses + 12)
+    np.testing.assert_allclose(previsto[0, 0], 100 + 5 * futuro, rtol=1e-6)
+    np.testing.assert_allclose(previsto[0, 1], 50 + 20 * ((PRIMEIRO + futuro) % 12 == 6), atol=1e-6)
+    np.testing.assert_allclose(previsto[:, 2], 30)
+    np.testing.assert_allclose(desvio[:, :3], 0, atol=1e-6)
+    assert (previsto[:, 3] == 0).all()
+
+
+def test_tendencia_sem_sazonalidade_e_sem_previsao_negativa():
+    meses = 16
+    series = np.zeros((2, 1, meses))
+    series[:, 0] = 400 - 20 * np.arange(meses)
+
+    previsto, _desvio, modelos = ajustar_series(series, PRIMEIRO, horizonte=6)
+    assert list(modelos) == ['tendencia']
+    assert previsto[0, 0, 0] == pytest.approx(400 - 20 * meses)
+    assert (previsto >= 0).all()  # a reta cruza o zero dentro do horizonte
+
+
+def test_recalcular_e_consultar(app, cliente, fabrica):
+    hoje = datetime.utcnow()
+    with app.app_context():
+        item = fabrica.item(nome_item='Cobre')
+        for meses_atras in range(1, 8):
+            indice = _indice_mes(hoje) - meses_atras
+            data = datetime.combine(_data_do_indice(indice), datetime.min.time()).replace(day=10)
+            fabrica.compra(item, quantidade_kg=100.0, data=data)
+        db.session.commit()
+        item_id, fornecedor_id = item.id, item.fornecedor_id
+
+        assert recalcular_previsoes(horizonte=3) == {'item': 1, 'fornecedor': 1, 'total': 1}
+        (serie,) = consultar_previsoes('item', [item_id])
+        assert serie['nome'] == 'Cobre' and serie['modelo'] == 'media'
+        assert [mes['mes'] for mes in serie['meses']][0] == hoje.strftime('%Y-%m')
+        assert {mes['quantidade_kg'] for mes in serie['meses']} == {100.0}
+        assert consultar_previsoes('item', fornecedor_id=fornecedor_id)[0]['chave'] == item_id
+        assert consultar_previsoes('fornecedor', [fornecedor_id])[0]['nome'] == item.fornecedor.nome_social
+
+    resposta = cliente.get('/api/previsoes/total')
+    assert resposta.status_code == 200 and len(resposta.get_json()['series'][0]['meses']) == 3
+    assert cliente.get(f'/api/previsoes/item?fornecedor_id={fornecedor_id}').get_json()['series'][0]['chave'] == item_id
+    assert cliente.get('/api/previsoes/item').status_code == 400
+    assert cliente.get('/api/previsoes/comprador').status_code == 404
@@ -0,0 +1,148 @@
+"""Rankings de fornecedores, itens e compradores (rankings.py)."""
+
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+import pytest
+
+import rankings
+from models import db
+from rankings import ranking_compradores, ranking_fornecedores, ranking_itens
+
+INICIO, FIM = date(2026, 3, 1), date(2026, 3, 31)  # período anterior: 29/01 a 28/02
+
+
+@pytest.fixture(autouse=True)
+def cache_vazio():
+    rankings._cache.clear()
+    yield
+    rankings._cache.clear()
+
+
+def _compras(fabrica, item, quantidades, data, **campos):
+    for quantidade in quantidades:
+        fabrica.compra(item, quantidade_kg=quantidade, data=data, **campos)
+
+
+def test_fornecedores_com_posicao_anterior(contexto, fabrica):
+    a, b, c = (fabrica.item(fabrica.fornecedor(nome_social=nome)) for nome in 'ABC')
+    _compras(fabrica, a, [100], datetime(2026, 2, 10))
+    _compras(fabrica, b, [50], datetime(2026, 2, 10))
+    _compras(fabrica, a, [10], datetime(2026, 3, 5))
+    _compras(fabrica, b, [30, 40], datetime(2026, 3, 5))
+    _compras(fabrica, c, [20], datetime(2026, 3, 6))
+    _compras(fabrica, c, [999], datetime(2026, 1, 20))  # antes do período anterior
+    db.session.commit()
+
+    linhas = ranking_fornecedores(INICIO, FIM)
+    assert [(l['fornecedor_nome'], l['quantidade_kg'], l['compras'], l['posicao'], l['posicao_anterior'],
+             l['variacao_posicao'], l['total_anterior']) for l in linhas] == [
+        ('B', 70, 2, 1, 2, 1, 50),
+        ('C', 20, 1, 2, None, None, None),
+        ('A', 10, 1, 3, 1, -2, 100),
+    ]
+    assert [l['fornecedor_nome'] for l in ranking_fornecedores(INICIO, FIM, 'compras', limite=1)] == ['B']
+
+
+def test_empates_dividem_a_posicao(contexto, fabrica):
+    itens = [fabrica.item() for _ in range(3)]
+    for item in itens:
+        _compras(fabrica, item, [10], datetime(2026, 3, 2))
+    db.session.commit()
+
+    assert [l['posicao'] for l in ranking_fornecedores(INICIO, FIM)] == [1, 1, 1]
+
+
+def test_itens_por_fornecedor(contexto, fabrica):
+    fornecedor, outro = fabrica.fornecedor(), fabrica.fornecedor()
+    cobre, latao, papel = fabrica.item(fornecedor, nome_item='Cobre'), fabrica.item(fornecedor, nome_item='Latão'), \
+        fabrica.item(outro, nome_item='Papel')
+    _compras(fabrica, cobre, [5], datetime(2026, 3, 3))
+    _compras(fabrica, latao, [8], datetime(2026, 3, 3))
+    _compras(fabrica, papel, [100], datetime(2026, 3, 3))
+    db.session.commit()
+
+    linhas = ranking_itens(INICIO, FIM, limite=1)  # os fornecedores do período, um item de cada
+    assert [(l['fornecedor_id'], l['nome_item'], l['posicao']) for l in linhas] == [
+        (fornecedor.id, 'Latão', 1), (outro.id, 'Papel', 1)]
+    assert [l['nome_item'] for l in ranking_itens(INICIO, FIM, fornecedores=(fornecedor.id,))] == ['Latão', 'Cobre']
+    assert ranking_itens(date(2020, 1, 1), date(2020, 1, 31)) == []
+
+
+def test_compradores_por_comissao(contexto, fabrica):
+    item = fabrica.item()
+    ana, bia = fabrica.usuario(nome='Ana'), fabrica.usuario(nome='Bia')
+    fabrica.compra(item, ana, data=datetime(2026, 3, 4), valor_comissao=5.0)
+    fabrica.compra(item, bia, data=datetime(2026, 3, 4), valor_comissao=7.5)
+    fabrica.compra(item, bia, data=datetime(2026, 3, 4), valor_comissao=1.0, status_aprovacao='rejeitada')
+    db.session.commit()
+
+    assert [(l['comprador_nome'], l['valor_comissao']) for l in ranking_compradores(INICIO, FIM)] == [
+        ('Bia', 7.5), ('Ana', 5.0)]
+
+
+def test_cache_vale_ate_a_tabela_mudar(contexto, fabrica):
+    item = fabrica.item()
+    _compras(fabrica, item, [10], datetime(2026, 3, 2))
+    db.session.commit()
+
+    primeiro = ranking_fornecedores(INICIO, FIM)
+    assert ranking_fornecedores(INICIO, FIM) is primeiro
+
+    _compras(fabrica, item, [5], datetime(2026, 3, 3))
+    db.session.commit()
+    assert ranking_fornecedores(INICIO, FIM)[0]['quantidade_kg'] == 15
+
+
+@pytest.mark.config(RANKING_CACHE_SEGUNDOS=0)
+def test_cache_desligado(contexto, fabrica):
+    _compras(fabrica, fabrica.item(), [10], datetime(2026, 3, 2))
+    db.session.commit()
+
+    assert ranking_fornecedores(INICIO, FIM) is not ranking_fornecedores(INICIO, FIM)
+    assert not rankings._cache
+
+
+def test_cache_disputado_por_threads(app, monkeypatch):
+    """Workers gthread: várias threads inserindo e despejando ao mesmo tempo."""
+    monkeypatch.setattr(rankings, 'MAX_ENTRADAS_CACHE', 8)
+    monkeypatch.setattr(rankings, 'obter_versoes', lambda *tabelas: {})
+    dobro = rankings.em_cache('compras')(lambda n: n * 2)
+
+    def chamar(inicio):
+        with app.app_context():
+            return [dobro(n) for n in range(inicio, inicio + 2000)]
+
+    intervalo = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        with ThreadPoolExecutor(8) as executor:
+            resultados = list(executor.map(chamar, range(0, 16000, 2000)))
+    finally:
+        sys.setswitchinterval(intervalo)
+    assert sum(resultados, []) == [n * 2 for n in range(16000)]
+    assert len(rankings._cache) == 8
+
+
+def test_api_rankings(cliente, request):
+    with cliente.session_transaction() as sessao:
+        sessao.pop('_flashes', None)
+    urls = ('/api/rankings/fornecedores', '/api/rankings/itens', '/api/rankings/compradores')
+    etags = {}
+    for url in urls:
+        hoje = cliente.get(url)
+        assert hoje.status_code == 200 and hoje.get_json()['ranking'] == []
+        dias = (date.fromisoformat(hoje.get_json()['fim']) - date.fromisoformat(hoje.get_json()['inicio'])).days
+        assert dias == 29
+        etags[url] = hoje.headers['ETag']
+        assert cliente.get(url, headers={'If-None-Match': etags[url]}).status_code == 304
+
+    # Sem ?fim= o período anda com o dia: o ETag de ontem não vale mais
+    request.getfixturevalue('amanha')
+    for url in urls:
+        assert cliente.get(url, headers={'If-None-Match': etags[url]}).status_code == 200
+
+    assert cliente.get('/api/rankings/fornecedores?medida=peso').status_code == 400
+    assert cliente.get('/api/rankings/compradores?inicio=2026-03-10&fim=2026-03-01').status_code == 400
+    assert cliente.get('/api/rankings/itens?fornecedor_id=x').status_code == 400
@@ -0,0 +1,97 @@
+"""Roteirização das coletas do dia (roteirizacao.py)."""
+
+import math
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db
+from roteirizacao import matriz_distancias, otimizar_rotas
+
+DEPOSITO = (-23.5505, -46.6333)
+
+
+def _circulo(n, raio_graus=0.05):
+    return [(DEPOSITO[0] + raio_graus * math.sin(2 * math.pi * k / n),
+             DEPOSITO[1] + raio_graus * math.cos(2 * math.pi * k / n)) for k in range(n)]
+
+
+def _comprimento(pontos, rota):
+    caminho = [DEPOSITO, *(pontos[i] for i in rota), DEPOSITO]
+    latitudes, longitudes = zip(*caminho)
+    distancias = matriz_distancias(latitudes, longitudes)
+    return sum(distancias[k, k + 1] for k in range(len(caminho) - 1))
+
+
+def test_matriz_simetrica_com_diagonal_zero():
+    distancias = matriz_distancias(*zip(*_circulo(5)))
+    assert distancias.shape == (5, 5)
+    assert (distancias.diagonal() == 0).all()
+    assert (distancias == distancias.T).all()
+
+
+def test_dois_opt_desfaz_cruzamentos():
+    # Pontos num círculo em ordem embaralhada: a melhor volta percorre o círculo na ordem
+    pontos = _circulo(12)
+    ordem = list(range(12))
+    random.Random(3).shuffle(ordem)
+    embaralhados = [pontos[i] for i in ordem]
+
+    (rota,), nao_atendidas = otimizar_rotas(DEPOSITO, *zip(*embaralhados), [1.0] * 12)
+
+    assert nao_atendidas == [] and sorted(rota) == list(range(12))
+    otima = min(_comprimento(pontos, list(range(12))[k:] + list(range(12))[:k]) for k in range(12))
+    assert _comprimento(embaralhados, rota) == pytest.approx(otima, rel=1e-6)
+
+
+def test_capacidade_e_caminhoes():
+    pontos = _circulo(6)
+    pesos = [400, 400, 400, 400, 400, 2000]
+
+    rotas, nao_atendidas = otimizar_rotas(DEPOSITO, *zip(*pontos), pesos, caminhoes=2, capacidade_kg=1000)
+    assert [len(rota) for rota in rotas] == [2, 2]
+    assert all(sum(pesos[i] for i in rota) <= 1000 for rota in rotas)
+    assert 5 in nao_atendidas and len(nao_atendidas) == 2  # a pesada e uma que não coube em 2 caminhões
+
+
+def test_api_rotas_coletas(app, cliente, fabrica):
+    hoje = datetime.utcnow().replace(hour=12, minute=0, second=0, microsecond=0)
+    pontos = _circulo(4)
+    with app.app_context():
+        item = fabrica.item()
+        comprador = fabrica.usuario()
+        ids = [fabrica.compra(item, comprador, data=hoje, quantidade_kg=100, latitude=lat, longitude=lon).id
+               for lat, lon in pontos]
+        sem_local = fabrica.compra(item, comprador, data=hoje).id
+        fabrica.compra(item, comprador, data=hoje, status_aprovacao='rejeitada', latitude=pontos[0][0],
+                       longitude=pontos[0][1])
+        fabrica.compra(item, comprador, data=hoje, tipo_coleta='entrega', latitude=pontos[1][0], longitude=pontos[1][1])
+        fabrica.compra(item, comprador, data=hoje - timedelta(days=1), latitude=pontos[2][0], longitude=pontos[2][1])
+        pesada = fabrica.compra(item, comprador, data=hoje, quantidade_kg=9000, latitude=pontos[3][0],
+                                longitude=pontos[3][1]).id
+        db.session.commit()
+
+    resposta = cliente.post('/api/rotas/coletas', json={
+        'data': hoje.date().isoformat(),
+        'deposito': {'latitude': DEPOSITO[0], 'longitude': DEPOSITO[1]},
+        'caminhoes': 1,
+        'capacidade_kg': 1000,
+    })
+    assert resposta.status_code == 200
+    dados = resposta.get_json()
+
+    (caminhao,) = dados['caminhoes']
+    assert sorted(p['compra_id'] for p in caminhao['paradas']) == ids
+    assert caminhao['carga_kg'] == 400
+    assert caminhao['paradas'][-1]['distancia_acumulada_km'] < caminhao['distancia_km'] == dados['distancia_total_km']
+    assert dados['sem_coordenadas'] == [sem_local]
+    assert dados['nao_atendidas'] == [{'compra_id': pesada, 'quantidade_kg': 9000, 'motivo': 'acima da capacidade'}]
+
+    assert cliente.post('/api/rotas/coletas', json={'data': 'ontem'}).status_code == 400
+    deposito = {'latitude': DEPOSITO[0], 'longitude': DEPOSITO[1]}
+    for status in (['aprovada', 'cancelada'], [['pendente']]):
+        resposta = cliente.post('/api/rotas/coletas', json={'deposito': deposito, 'status': status})
+        assert resposta.status_code == 400 and resposta.get_json()['mensagem'].startswith('Status:')
+    assert cliente.post('/api/rotas/coletas', json={'caminhoes': 0, 'deposito': {'latitude': 0, 'longitude': 0}}
+                        ).status_code == 400
@@ -0,0 +1,86 @@
+"""Comprovantes gravados em disco com deduplicação e miniaturas (uploads.py)."""
+
+import errno
+import io
+import os
+
+import pytest
+from flask import request
+from PIL import Image
+
+from uploads import UploadError, gerar_miniatura, salvar_comprovante, url_miniatura
+
+
+def _png(lado=600):
+    dados = io.BytesIO()
+    Image.new('RGB', (lado, lado), (200, 30, 30)).save(dados, 'PNG')
+    return dados.getvalue()
+
+
+def _salvar(app, dados, nome):
+    with app.test_request_context('/', method='POST', data={'comprovante': (io.BytesIO(dados), nome)}):
+        return salvar_comprovante(request.files['comprovante'])
+
+
+@pytest.mark.parametrize('tamanho', [1024, 2 * 1024 * 1024], ids=['pequeno', 'em-disco'])
+def test_mesmo_arquivo_guardado_uma_vez(app, tamanho):
+    dados = os.urandom(tamanho)
+
+    primeiro = _salvar(app, dados, 'nota.pdf')
+    segundo = _salvar(app, dados, 'outra-nota.pdf')
+
+    assert primeiro == segundo
+    assert primeiro.startswith('comprovantes/') and primeiro.endswith('.pdf')
+    caminho = os.path.join(app.config['UPLOAD_FOLDER'], primeiro)
+    with open(caminho, 'rb') as f:
+        assert f.read() == dados
+    # Os temporários do upload (fora da pasta servida) somem; só o arquivo final fica
+    assert os.listdir(app.config['UPLOAD_TEMP_FOLDER']) == []
+    assert os.listdir(app.config['UPLOAD_FOLDER']) == ['comprovantes']
+
+
+def test_sem_hard_link_copia_o_arquivo(app, monkeypatch):
+    def _sem_link(origem, destino):
+        raise OSError(errno.EXDEV, 'Invalid cross-device link')
+
+    monkeypatch.setattr(os, 'link', _sem_link)
+    dados = os.urandom(2 * 1024 * 1024)
+    relativo = _salvar(app, dados, 'nota.pdf')
+    assert _salvar(app, dados, 'nota.pdf') == relativo
+
+    pasta = os.path.join(app.config['UPLOAD_FOLDER'], os.path.dirname(relativo))
+    assert os.listdir(pasta) == [os.path.basename(relativo)]
+    with open(os.path.join(app.config['UPLOAD_FOLDER'], relativo), 'rb') as f:
+        assert f.read() == dados
+
+
+def test_recusa_extensao_e_arquivo_vazio(app):
+    with pytest.raises(UploadError, match='não permitido'):
+        _salvar(app, b'MZ', 'programa.exe')
+    with pytest.raises(UploadError, match='vazio'):
+        _salvar(app, b'', 'nota.pdf')
+
+
+def test_miniatura_webp(app, tmp_path):
+    origem = tmp_path / 'foto.png'
+    origem.write_bytes(_png())
+    destino = tmp_path / 'mini' / 'foto.webp'
+
+    gerar_miniatura(str(origem), str(destino), 320)
+
+    with Image.open(destino) as miniatura:
+        assert miniatura.format == 'WEBP'
+        assert max(miniatura.size) == 320
+
+
+def test_url_da_miniatura_so_depois_de_gerada(app):
+    relativo = _salvar(app, _png(), 'foto.png')
+
+    with app.test_request_context():
+        digest = os.path.splitext(os.path.basename(relativo))[0]
+        miniatura = os.path.join(app.config['UPLOAD_FOLDER'], 'miniaturas', digest[:2], f'{digest}.webp')
+        if not os.path.exists(miniatura):  # o pool em segundo plano pode não ter terminado
+            assert url_miniatura(relativo) is None
+            gerar_miniatura(os.path.join(app.config['UPLOAD_FOLDER'], relativo), miniatura, 320)
+        assert url_miniatura(relativo).endswith(f'{digest}.webp')
+        assert url_miniatura('comprovantes/ab/abc.pdf') is None
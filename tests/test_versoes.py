@@ -0,0 +1,80 @@
+"""Versões por tabela e GET condicional (versoes.py)."""
+
+from models import TabelaPreco, VersaoTabela, db
+from versoes import marcar_alteracao, obter_versoes
+
+
+def _versao(tabela):
+    return obter_versoes(tabela).get(tabela, (0, None))[0]
+
+
+def test_versao_sobe_no_commit_e_nao_no_flush(contexto, fabrica):
+    fabrica.fornecedor()
+    assert db.session.get(VersaoTabela, 'fornecedores') is None  # nada travado durante a transação
+
+    db.session.commit()
+    assert _versao('fornecedores') == 1
+
+    fornecedor = fabrica.fornecedor()
+    fornecedor.nome_social = 'Outro nome'
+    db.session.commit()
+    assert _versao('fornecedores') == 2
+
+
+def test_rollback_nao_sobe_versao(contexto, fabrica):
+    fabrica.fornecedor()
+    marcar_alteracao('compras')
+    db.session.rollback()
+    db.session.commit()
+
+    assert obter_versoes('fornecedores', 'compras') == {}
+
+
+def test_marcar_alteracao_sobe_no_commit(contexto):
+    marcar_alteracao('compras', 'compras_cubo_dia')
+    db.session.commit()
+
+    versoes = obter_versoes('compras', 'compras_cubo_dia')
+    assert {tabela: versao for tabela, (versao, _data) in versoes.items()} == {'compras': 1, 'compras_cubo_dia': 1}
+
+
+def test_etag_responde_304_ate_a_tabela_mudar(app, cliente, fabrica):
+    with app.app_context():
+        item = fabrica.item(codigo_barras='7891234567895')
+        db.session.commit()
+        item_id, url = item.id, f'/api/validar-peca?codigo_barras=7891234567895&fornecedor_id={item.fornecedor_id}'
+
+    with cliente.session_transaction() as sessao:
+        sessao.pop('_flashes', None)  # mensagem do login: com flash pendente a view sempre roda
+
+    primeira = cliente.get(url)
+    assert primeira.status_code == 200 and primeira.headers['ETag']
+    assert 'no-cache' in primeira.headers['Cache-Control']
+
+    repetida = cliente.get(url, headers={'If-None-Match': primeira.headers['ETag']})
+    assert repetida.status_code == 304
+
+    with app.app_context():
+        db.session.get(TabelaPreco, item_id).preco_por_kg = 12.5
+        db.session.commit()
+
+    depois = cliente.get(url, headers={'If-None-Match': primeira.headers['ETag']})
+    assert depois.status_code == 200
+    assert depois.headers['ETag'] != primeira.headers['ETag']
+    assert depois.get_json()['peca']['preco_por_kg'] == 12.5
+
+
+def test_etag_e_last_modified_mudam_no_dia_seguinte(app, cliente, fabrica, request):
+    with app.app_context():
+        item = fabrica.item(codigo_barras='7891234567895')
+        db.session.commit()
+        url = f'/api/validar-peca?codigo_barras=7891234567895&fornecedor_id={item.fornecedor_id}'
+    with cliente.session_transaction() as sessao:
+        sessao.pop('_flashes', None)
+
+    hoje = cliente.get(url)
+    assert cliente.get(url, headers={'If-Modified-Since': hoje.headers['Last-Modified']}).status_code == 304
+
+    request.getfixturevalue('amanha')  # nenhuma tabela mudou, mas o período padrão das páginas andou
+    assert cliente.get(url, headers={'If-None-Match': hoje.headers['ETag']}).status_code == 200
+    assert cliente.get(url, headers={'If-Modified-Since': hoje.headers['Last-Modified']}).status_code == 200
@@ -0,0 +1,185 @@
+"""
+Armazenamento de comprovantes enviados por upload.
+
+O corpo multipart é gravado em disco em blocos, direto num arquivo temporário
+em UPLOAD_TEMP_FOLDER (fora de static/: o nginx não serve upload pela metade),
+calculando o SHA-256 enquanto escreve (nada do arquivo fica inteiro na
+memória). Ao salvar, o temporário vira comprovantes/<ab>/<sha256>.<ext> por
+hard link, ou por cópia quando o link não é possível (pastas em sistemas de
+arquivos diferentes): o mesmo arquivo enviado duas vezes ocupa espaço uma vez
+só.
+
+Miniaturas WebP são geradas num pool de threads em segundo plano; enquanto não
+ficam prontas, as listagens mostram só o link para o arquivo.
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import Request, current_app, url_for
+
+logger = logging.getLogger('mrx.uploads')
+
+PASTA_COMPROVANTES = 'comprovantes'
+PASTA_MINIATURAS = 'miniaturas'
+
+EXTENSOES_IMAGEM = {'.jpg', '.jpeg', '.png', '.webp'}
+
+_executor = None
+
+
+class UploadError(Exception):
+    """Arquivo enviado recusado (tipo não permitido, vazio, ...)."""
+
+
+class ArquivoComHash:
+    """Arquivo temporário que calcula o SHA-256 do que é escrito nele."""
+
+    def __init__(self, pasta):
+        os.makedirs(pasta, exist_ok=True)
+        # delete=True: se ninguém salvar o upload, o temporário some ao fechar
+        self._arquivo = tempfile.NamedTemporaryFile(dir=pasta, prefix='upload-')
+        self._hash = hashlib.sha256()
+        self.tamanho = 0
+
+    def write(self, dados):
+        self._hash.update(dados)
+        self.tamanho += len(dados)
+        return self._arquivo.write(dados)
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+    @property
+    def name(self):
+        return self._arquivo.name
+
+    def __iter__(self):
+        return iter(self._arquivo)
+
+    def __getattr__(self, nome):
+        return getattr(self._arquivo, nome)
+
+
+class RequestComHash(Request):
+    """Request que grava os arquivos do multipart em ArquivoComHash."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return ArquivoComHash(current_app.config['UPLOAD_TEMP_FOLDER'])
+
+
+def _extensao(nome_arquivo):
+    return os.path.splitext(nome_arquivo or '')[1].lower()
+
+
+def _caminho_miniatura(digest):
+    return f'{PASTA_MINIATURAS}/{digest[:2]}/{digest}.webp'
+
+
+def salvar_comprovante(arquivo):
+    """Guarda o FileStorage enviado e devolve o caminho relativo a UPLOAD_FOLDER."""
+    config = current_app.config
+    extensao = _extensao(arquivo.filename)
+    if extensao not in config['UPLOAD_EXTENSOES']:
+        raise UploadError(f"Tipo de arquivo não permitido: {extensao or 'sem extensão'}.")
+
+    stream = arquivo.stream
+    if not isinstance(stream, ArquivoComHash):
+        # Upload pequeno demais para o parser chamar _get_file_stream, ou outro Request
+        copia = ArquivoComHash(config['UPLOAD_TEMP_FOLDER'])
+        stream.seek(0)
+        for bloco in iter(lambda: stream.read(64 * 1024), b''):
+            copia.write(bloco)
+        stream = copia
+    if not stream.tamanho:
+        raise UploadError('Arquivo vazio.')
+
+    stream.flush()
+    digest = stream.hexdigest()
+    relativo = f'{PASTA_COMPROVANTES}/{digest[:2]}/{digest}{extensao}'
+    destino = os.path.join(config['UPLOAD_FOLDER'], relativo)
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    _armazenar(stream.name, destino)
+
+    if extensao in EXTENSOES_IMAGEM:
+        _agendar_miniatura(destino, os.path.join(config['UPLOAD_FOLDER'], _caminho_miniatura(digest)),
+                           config['MINIATURA_TAMANHO'], config['MINIATURA_WORKERS'])
+    return relativo
+
+
+def _armazenar(temporario, destino):
+    """Hard link do temporário em `destino`; sem link (EXDEV, EPERM) copia para o lado e renomeia."""
+    try:
+        os.link(temporario, destino)
+    except FileExistsError:
+        pass  # mesmo conteúdo já armazenado
+    except OSError:
+        if os.path.exists(destino):
+            return
+        # Nome único por thread e a troca atômica: ninguém vê o comprovante pela metade
+        copia = f'{destino}.{os.getpid()}.{threading.get_ident()}.tmp'
+        shutil.copyfile(temporario, copia)
+        os.replace(copia, destino)
+
+
+def gerar_miniatura(origem, destino, tamanho):
+    """Grava uma miniatura WebP de `origem`; não faz nada se ela já existir."""
+    if os.path.exists(destino):
+        return destino
+    from PIL import Image, ImageOps
+
+    with Image.open(origem) as imagem:
+        imagem.draft('RGB', (tamanho * 2, tamanho * 2))  # JPEG: decodifica já reduzido
+        imagem = ImageOps.exif_transpose(imagem)
+        imagem.thumbnail((tamanho, tamanho))
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        # Nome único por thread: o mesmo arquivo pode ser enviado duas vezes seguidas
+        temporario = f'{destino}.{os.getpid()}.{threading.get_ident()}.tmp'
+        imagem.convert('RGB').save(temporario, 'WEBP', quality=70, method=4)
+    os.replace(temporario, destino)
+    return destino
+
+
+def _gerar_miniatura_em_segundo_plano(origem, destino, tamanho):
+    try:
+        gerar_miniatura(origem, destino, tamanho)
+    except Exception:
+        logger.exception('Falha ao gerar miniatura de %s', origem)
+
+
+def _agendar_miniatura(origem, destino, tamanho, workers):
+    global _executor
+    if os.path.exists(destino):
+        return
+    if _executor is None:
+        # Criado no primeiro upload, já dentro do worker (depois do fork do preload_app)
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='miniaturas')
+    _executor.submit(_gerar_miniatura_em_segundo_plano, origem, destino, tamanho)
+
+
+def url_comprovante(relativo):
+    if not relativo:
+        return None
+    return url_for('static', filename=f'uploads/{relativo}')
+
+
+def url_miniatura(relativo):
+    """URL da miniatura do comprovante, ou None se não for imagem ou ainda não existir."""
+    if not relativo or _extensao(relativo) not in EXTENSOES_IMAGEM:
+        return None
+    digest = os.path.splitext(os.path.basename(relativo))[0]
+    caminho = _caminho_miniatura(digest)
+    if not os.path.exists(os.path.join(current_app.config['UPLOAD_FOLDER'], caminho)):
+        return None
+    return url_for('static', filename=f'uploads/{caminho}')
+
+
+def configurar_uploads(app):
+    """Instala o Request com gravação em disco e os helpers de template."""
+    app.request_class = RequestComHash
+    app.jinja_env.globals['url_comprovante'] = url_comprovante
+    app.jinja_env.globals['url_miniatura'] = url_miniatura
@@ -0,0 +1,175 @@
+"""
+Versão por tabela e GET condicional (ETag / Last-Modified).
+
+Cada flush que insere, altera ou remove linhas anota a tabela na sessão e,
+depois do commit, o contador dela em versoes_tabela é incrementado numa
+transação curta à parte: a linha de versoes_tabela não fica travada até o
+fim de cada transação de escrita, o que enfileiraria os escritores do
+PostgreSQL. Caminhos que escrevem sem passar pelo ORM (insert() em lote,
+importações) chamam marcar_alteracao(). Se o processo cair entre o commit e
+o incremento, os ETags da tabela só mudam na próxima escrita nela.
+
+As versões são lidas no bind de leitura (database.sessao_leitura), o mesmo
+das páginas: com réplica, a versão e o corpo vêm do mesmo banco e o atraso
+da réplica só adia o ETag novo, nunca prende um corpo antigo sob ele.
+
+O decorador @condicional('compras', ...) monta o ETag a partir das versões
+das tabelas que a página lê, do usuário logado, dos parâmetros da
+requisição e do dia (UTC), e responde 304 antes de executar a view quando
+nada mudou. O dia entra porque várias páginas usam a data de hoje sem que
+ela apareça na URL (o período padrão termina hoje): a mesma URL responde
+outra coisa no dia seguinte.
+"""
+
+import hashlib
+import os
+from datetime import datetime
+from functools import wraps
+import logging
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+from sqlalchemy import event, inspect
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.dialects.postgresql import insert as insert_postgresql
+from sqlalchemy.dialects.sqlite import insert as insert_sqlite
+from models import db, VersaoTabela
+from database import sessao_leitura
+
+logger = logging.getLogger('mrx.versoes')
+
+_tabela_versoes = VersaoTabela.__table__
+
+
+def incrementar_versao(conexao, *tabelas):
+    """Soma 1 na versão das tabelas informadas (cria a linha na primeira vez)."""
+    tabelas = sorted(set(tabelas) - {_tabela_versoes.name})
+    if not tabelas:
+        return
+    agora = datetime.utcnow()
+    insert = insert_postgresql if conexao.dialect.name == 'postgresql' else insert_sqlite
+    comando = insert(_tabela_versoes).values(
+        [{'tabela': tabela, 'versao': 1, 'atualizado_em': agora} for tabela in tabelas]
+    ).on_conflict_do_update(
+        index_elements=[_tabela_versoes.c.tabela],
+        set_={'versao': _tabela_versoes.c.versao + 1, 'atualizado_em': agora},
+    )
+    conexao.execute(comando)
+
+
+def _anotar(sessao, tabelas):
+    sessao.info.setdefault('versoes', set()).update(tabelas)
+
+
+def marcar_alteracao(*tabelas):
+    """Para escritas fora do ORM: as versões sobem no próximo commit de db.session."""
+    _anotar(db.session, tabelas)
+
+
+def _apos_flush(sessao, contexto):
+    # new/dirty/deleted ainda mostram o estado anterior ao flush aqui
+    tabelas = {inspect(obj).mapper.local_table.name for obj in sessao.new | sessao.deleted}
+    tabelas.update(
+        inspect(obj).mapper.local_table.name
+        for obj in sessao.dirty
+        if sessao.is_modified(obj, include_collections=False)
+    )
+    if tabelas:
+        _anotar(sessao, tabelas)
+
+
+def _apos_update_delete_em_lote(contexto):
+    _anotar(contexto.session, {contexto.mapper.local_table.name})
+
+
+def _apos_commit(sessao):
+    tabelas = sessao.info.pop('versoes', None)
+    if not tabelas:
+        return
+    try:
+        with db.engine.begin() as conexao:
+            incrementar_versao(conexao, *tabelas)
+    except SQLAlchemyError:
+        # Os dados já foram gravados: os ETags dessas tabelas só mudam na próxima escrita
+        logger.exception('Falha ao incrementar as versões de %s', ', '.join(sorted(tabelas)))
+
+
+def _apos_rollback(sessao):
+    sessao.info.pop('versoes', None)
+
+
+def obter_versoes(*tabelas):
+    """{tabela: (versao, atualizado_em)} das tabelas pedidas, numa consulta no bind de leitura."""
+    linhas = sessao_leitura().query(VersaoTabela.tabela, VersaoTabela.versao, VersaoTabela.atualizado_em).filter(
+        VersaoTabela.tabela.in_(tabelas)
+    )
+    return {tabela: (versao, atualizado_em) for tabela, versao, atualizado_em in linhas}
+
+
+def _assinatura_aplicacao(app):
+    """Muda quando templates ou o build de estáticos mudam (deploy), invalidando ETags antigos."""
+    assinatura = hashlib.sha1()
+    for raiz, _pastas, arquivos in os.walk(os.path.join(app.root_path, app.template_folder)):
+        for nome in sorted(arquivos):
+            caminho = os.path.join(raiz, nome)
+            assinatura.update(f'{caminho}:{os.path.getmtime(caminho)}'.encode())
+    manifesto = os.path.join(app.static_folder, 'dist', 'manifest.json')
+    if os.path.exists(manifesto):
+        assinatura.update(f'{manifesto}:{os.path.getmtime(manifesto)}'.encode())
+    return assinatura.hexdigest()[:12]
+
+
+def condicional(*tabelas):
+    """Responde 304 para GET/HEAD quando as tabelas lidas pela view não mudaram
+    e o dia (UTC) é o mesmo da resposta guardada pelo navegador."""
+    def decorador(view):
+        @wraps(view)
+        def envolvida(*args, **kwargs):
+            # Mensagens flash pendentes são consumidas pela renderização: não dá para pular
+            if request.method not in ('GET', 'HEAD') or session.get('_flashes'):
+                return view(*args, **kwargs)
+
+            versoes = obter_versoes(*tabelas)
+            usuario = current_user.get_id() if current_user.is_authenticated else '-'
+            inicio_do_dia = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+            texto = '|'.join([
+                current_app.config['ASSINATURA_APLICACAO'],
+                request.endpoint,
+                request.full_path,
+                str(usuario),
+                inicio_do_dia.date().isoformat(),
+                *(f'{tabela}={versoes.get(tabela, (0, None))[0]}' for tabela in tabelas),
+            ])
+            etag = hashlib.sha1(texto.encode()).hexdigest()[:20]
+            # Nunca antes da meia-noite: uma cópia de ontem não vale hoje
+            datas = [data for _versao, data in versoes.values() if data]
+            ultima_alteracao = max(datas + [inicio_do_dia]).replace(microsecond=0)
+
+            if request.if_none_match.contains_weak(etag) or (
+                not request.if_none_match and request.if_modified_since
+                and ultima_alteracao <= request.if_modified_since.replace(tzinfo=None)
+            ):
+                resposta = current_app.response_class(status=304)
+            else:
+                resposta = make_response(view(*args, **kwargs))
+                if resposta.status_code != 200:
+                    return resposta
+
+            resposta.set_etag(etag, weak=True)
+            resposta.last_modified = ultima_alteracao
+            # Página por usuário: o navegador guarda, mas sempre revalida
+            resposta.cache_control.private = True
+            resposta.cache_control.no_cache = True
+            return resposta
+        return envolvida
+    return decorador
+
+
+def configurar_versoes(app):
+    """Liga o incremento automático de versões e prepara os ETags."""
+    app.config['ASSINATURA_APLICACAO'] = _assinatura_aplicacao(app)
+    if not event.contains(db.session, 'after_flush', _apos_flush):
+        event.listen(db.session, 'after_flush', _apos_flush)
+        event.listen(db.session, 'after_commit', _apos_commit)
+        event.listen(db.session, 'after_rollback', _apos_rollback)
+        event.listen(db.session, 'after_bulk_update', _apos_update_delete_em_lote)
+        event.listen(db.session, 'after_bulk_delete', _apos_update_delete_em_lote)